@@ -0,0 +1,517 @@
+"""
+知识库检索性能基准测试
+使用合成知识库测量检索各阶段的性能
+
+1. scale_filter: 规模筛选的线性扫描与有序索引对比
+2. retrieval: coarse_retrieve / fine_retrieve / semantic_retrieve / retrieve（及加权重排序、
+   单遍融合打分、批量检索）的p50/p99延迟、知识库内存和recall@k；recall以不使用ANN索引的精确检索为准，
+   各阶段的输入取被测检索器上一阶段的输出；retrieve_many的结果必须与逐个调用retrieve()
+   完全一致（顺序相同），否则报错
+
+报告为JSON，记录git提交和参数，可用 --compare 与之前的报告逐项对比。
+
+用法：
+    python -m experiments.retrieval_benchmark --sizes 100 1000 10000 100000 --output bench.json
+
+    # 包含ANN索引后端和百万级知识库
+    python -m experiments.retrieval_benchmark --suites retrieval --sizes 1000000 \
+        --backends none ivf --output bench_1m.json
+
+    # 与之前的报告对比
+    python -m experiments.retrieval_benchmark --output new.json --compare old.json
+"""
+
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.knowledge_base import KnowledgeBase
+from src.rag_retriever import RAGRetriever
+from src.utils.ann_index import faiss_available
+
+
+def generate_synthetic_cases(
+    num_cases: int,
+    embedding_dim: int = 384,
+    num_design_types: int = 4,
+    seed: int = 0
+) -> Iterator[Dict[str, Any]]:
+    """
+    生成与build_kb.py输出格式一致的合成案例
+
+    规模（模块数）服从对数均匀分布（10 ~ 1.2M），特征向量按
+    KnowledgeBaseBuilder._generate_feature_vector的9维格式生成，
+    嵌入向量围绕若干语义簇分布。
+
+    Args:
+        num_cases: 案例数量
+        embedding_dim: 嵌入维度
+        num_design_types: 设计类型数量
+        seed: 随机种子
+
+    Yields:
+        案例字典
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((64, embedding_dim)).astype(np.float32)
+    for i in range(num_cases):
+        num_modules = int(np.exp(rng.uniform(np.log(10), np.log(1.2e6))))
+        num_components = int(num_modules * rng.uniform(0.8, 1.5))
+        num_nets = int(num_components * rng.uniform(0.9, 1.3))
+        chip_area = num_components * rng.uniform(5.0, 20.0)
+        avg_net_degree = rng.uniform(2.0, 4.0)
+        avg_component_degree = rng.uniform(2.5, 5.0)
+        features = [
+            np.log1p(num_modules), np.log1p(num_components), np.log1p(num_nets),
+            avg_net_degree, float(rng.integers(10, 5000)),
+            avg_component_degree, float(rng.integers(5, 60)),
+            np.log1p(chip_area), np.log1p(num_components / chip_area),
+        ]
+        embedding = centers[rng.integers(0, len(centers))] + 0.5 * rng.standard_normal(embedding_dim)
+        yield {
+            'design_id': f'synthetic_{i}',
+            'design_type': f'type_{i % num_design_types}',
+            'features': [float(x) for x in features],
+            'partition_strategy': {'num_partitions': int(rng.choice([2, 4, 8]))},
+            'negotiation_patterns': {},
+            'quality_metrics': {
+                'num_modules': num_modules,
+                'num_nets': num_nets,
+                'hpwl': float(rng.uniform(1e5, 1e9)),
+                'boundary_cost': float(rng.uniform(0.0, 30.0)),
+            },
+            'embedding': embedding.astype(np.float32),
+        }
+
+
+def build_synthetic_kb(
+    num_cases: int,
+    ann_backend: Optional[str] = None,
+    ann_params: Optional[Dict[str, Any]] = None,
+    **kwargs
+) -> KnowledgeBase:
+    """
+    构建内存中的合成知识库（不写盘）
+
+    Args:
+        num_cases: 案例数量
+        ann_backend: ANN索引类型（None表示不建索引）
+        ann_params: 索引参数
+        **kwargs: 传给generate_synthetic_cases的参数
+
+    Returns:
+        知识库实例
+    """
+    case_file = Path(tempfile.gettempdir()) / 'synthetic_kb_cases.json'
+    kb = KnowledgeBase(str(case_file), max_cases=max(num_cases, 1),
+                       ann_backend=ann_backend, ann_params=ann_params)
+    for case in generate_synthetic_cases(num_cases, **kwargs):
+        kb.add_case(case)
+    return kb
+
+
+def _linear_scale_scan(kb: KnowledgeBase, min_scale: int, max_scale: int) -> List[Dict[str, Any]]:
+    """线性扫描筛选（二级索引之前的实现，作为对照）"""
+    filtered = []
+    for case in kb.get_all_cases():
+        metrics = case.get('quality_metrics', {})
+        if 'num_modules' in metrics and min_scale <= metrics['num_modules'] <= max_scale:
+            filtered.append(case)
+    return filtered
+
+
+def _latency_stats(latencies: List[float]) -> Dict[str, float]:
+    latencies = np.array(latencies)
+    return {
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+    }
+
+
+def _timed(fn, repeats: int) -> Dict[str, float]:
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    return _latency_stats(latencies)
+
+
+def benchmark_scale_filter(
+    sizes: List[int],
+    num_queries: int = 50,
+    window: float = 0.1,
+    seed: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    对比规模筛选的线性扫描与有序索引
+
+    查询规模窗口为 [s, s*(1+window)]，命中数量与知识库规模成正比但远小于全量，
+    索引查询耗时应随命中数而非知识库规模增长。
+
+    Args:
+        sizes: 知识库规模列表
+        num_queries: 每个规模的查询次数
+        window: 规模窗口相对宽度
+        seed: 随机种子
+
+    Returns:
+        每个规模的测量结果
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    for size in sizes:
+        kb = build_synthetic_kb(size, embedding_dim=8, seed=seed)
+        scales = np.exp(rng.uniform(np.log(10), np.log(1.2e6), num_queries)).astype(int)
+        queries = [(int(s), int(s * (1 + window))) for s in scales]
+        state = {'i': 0}
+
+        def next_query():
+            q = queries[state['i'] % len(queries)]
+            state['i'] += 1
+            return q
+
+        linear = _timed(lambda: _linear_scale_scan(kb, *next_query()), num_queries)
+        indexed = _timed(lambda: kb.get_rows_by_scale(*next_query()), num_queries)
+        hits = float(np.mean([len(kb.get_rows_by_scale(lo, hi)) for lo, hi in queries]))
+        results.append({
+            'num_cases': size,
+            'mean_hits': hits,
+            'linear_scan': linear,
+            'sorted_index': indexed,
+        })
+        print(f"  {size:>8d} cases: linear p50={linear['p50_ms']:.3f}ms, "
+              f"index p50={indexed['p50_ms']:.3f}ms, hits={hits:.1f}")
+    return results
+
+
+class QueryEmbeddingModel:
+    """按查询文本返回预生成向量的嵌入模型（基准测试中不计入模型推理耗时）"""
+
+    def __init__(self, vectors: Dict[str, np.ndarray]):
+        self.model_name = 'benchmark'
+        self.vectors = vectors
+        self.embedding_dim = len(next(iter(vectors.values()))) if vectors else 0
+
+    def encode(self, texts):
+        if isinstance(texts, str):
+            return self.vectors[texts]
+        return np.array([self.vectors[text] for text in texts], dtype=np.float32)
+
+
+def make_synthetic_queries(
+    kb: KnowledgeBase,
+    num_queries: int,
+    noise: float = 0.1,
+    with_scale: bool = False,
+    seed: int = 1
+) -> Dict[str, Any]:
+    """
+    从知识库案例加噪声生成查询
+
+    Args:
+        kb: 知识库
+        num_queries: 查询数量
+        noise: 特征的相对噪声、嵌入的绝对噪声
+        with_scale: 是否给出查询规模（源案例的模块数，触发粗粒度规模筛选）
+        seed: 随机种子
+
+    Returns:
+        {'features': (q, d), 'texts': [...], 'scales': [...], 'embeddings': {text: 向量}}
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, kb.size(), num_queries)
+    features, texts, scales, embeddings = [], [], [], {}
+    for j, row in enumerate(rows):
+        case = kb.get_case_at(int(row))
+        vector = kb.get_case_vector(int(row), 'features')
+        features.append(vector * (1.0 + noise * rng.standard_normal(len(vector))))
+        text = f"Query: {j} Design: {case['design_id']}"
+        texts.append(text)
+        embedding = kb.get_case_vector(int(row), 'embedding')
+        embeddings[text] = embedding + noise * np.linalg.norm(embedding) / np.sqrt(len(embedding)) \
+            * rng.standard_normal(len(embedding)).astype(np.float32)
+        scales.append(case['quality_metrics']['num_modules'] if with_scale else None)
+    return {
+        'features': np.array(features, dtype=np.float32),
+        'texts': texts,
+        'scales': scales,
+        'embeddings': embeddings,
+    }
+
+
+def _make_retriever(kb: KnowledgeBase, model: QueryEmbeddingModel, **kwargs) -> RAGRetriever:
+    """创建使用预生成查询向量的检索器"""
+    retriever = RAGRetriever(kb, embedding_model_name='hashing', **kwargs)
+    retriever.embedding_model = model
+    return retriever
+
+
+def _recall(found: List[List[Dict[str, Any]]], expected: List[List[Dict[str, Any]]]) -> float:
+    """found与expected（精确检索结果）的平均重合比例"""
+    values = []
+    for cases, reference in zip(found, expected):
+        if reference:
+            reference_ids = {case['design_id'] for case in reference}
+            values.append(len(reference_ids & {case['design_id'] for case in cases}) / len(reference_ids))
+        else:
+            values.append(1.0)
+    return float(np.mean(values)) if values else 1.0
+
+
+def _run_stage(fn: Callable[[int], Any], num_queries: int) -> tuple:
+    """逐个查询执行并计时，返回 (延迟统计, 每个查询的结果)"""
+    latencies, outputs = [], []
+    for j in range(num_queries):
+        start = time.perf_counter()
+        outputs.append(fn(j))
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    stats = _latency_stats(latencies)
+    stats['mean_ms'] = float(np.mean(latencies))
+    return stats, outputs
+
+
+def _rss_mb() -> Optional[float]:
+    """当前进程的常驻内存（MB，仅Linux）"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    import resource
+    return pages * resource.getpagesize() / 2 ** 20
+
+
+def benchmark_retrieval(
+    sizes: List[int],
+    backends: List[Optional[str]],
+    num_queries: int = 100,
+    embedding_dim: int = 384,
+    with_scale: bool = False,
+    retriever_params: Optional[Dict[str, Any]] = None,
+    ann_params: Optional[Dict[str, Any]] = None,
+    seed: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    测量各检索阶段的延迟、内存和recall@k
+
+    Args:
+        sizes: 知识库规模列表
+        backends: ANN索引后端列表（None表示不建索引）
+        num_queries: 每个配置的查询数
+        embedding_dim: 嵌入维度
+        with_scale: 查询是否给出设计规模
+        retriever_params: 传给RAGRetriever的参数（top_k、阈值、ann_min_candidates等）
+        ann_params: 索引参数
+        seed: 随机种子
+
+    Returns:
+        每个(规模, 后端)的测量结果
+    """
+    retriever_params = dict(retriever_params or {})
+    results = []
+    for size in sizes:
+        for backend in backends:
+            rss_before = _rss_mb()
+            start = time.perf_counter()
+            kb = build_synthetic_kb(size, ann_backend=backend, ann_params=ann_params,
+                                    embedding_dim=embedding_dim, seed=seed)
+            build_seconds = time.perf_counter() - start
+            rss_after = _rss_mb()
+
+            queries = make_synthetic_queries(kb, num_queries, with_scale=with_scale, seed=seed + 1)
+            model = QueryEmbeddingModel(queries['embeddings'])
+            retriever = _make_retriever(kb, model, **retriever_params)
+            reweighted = _make_retriever(kb, model, weighted_rerank=True, **retriever_params)
+            fused = _make_retriever(kb, model, weighted_rerank=True, rerank_scope='all', **retriever_params)
+            exact_params = dict(retriever_params, ann_min_candidates=sys.maxsize)
+            exact = _make_retriever(kb, model, **exact_params)
+            features, texts, scales = queries['features'], queries['texts'], queries['scales']
+
+            stages = {}
+            stats, coarse = _run_stage(
+                lambda j: retriever.coarse_retrieve(features[j], design_scale=scales[j]), num_queries)
+            reference = [exact.coarse_retrieve(features[j], design_scale=scales[j])
+                         for j in range(num_queries)]
+            stats[f'recall@{retriever.coarse_top_k}'] = _recall(coarse, reference)
+            stages['coarse_retrieve'] = stats
+
+            stats, fine = _run_stage(lambda j: retriever.fine_retrieve(features[j], coarse[j]), num_queries)
+            reference = [exact.fine_retrieve(features[j], coarse[j]) for j in range(num_queries)]
+            stats[f'recall@{retriever.fine_top_k}'] = _recall(fine, reference)
+            stages['fine_retrieve'] = stats
+
+            stats, semantic = _run_stage(lambda j: retriever.semantic_retrieve(texts[j], fine[j]), num_queries)
+            reference = [exact.semantic_retrieve(texts[j], fine[j]) for j in range(num_queries)]
+            stats[f'recall@{retriever.semantic_top_k}'] = _recall(semantic, reference)
+            stages['semantic_retrieve'] = stats
+
+            reference = [exact.retrieve(features[j], texts[j], scales[j]) for j in range(num_queries)]
+            looped = {}
+            for name, candidate in (('retrieve', retriever), ('retrieve_reweighted', reweighted),
+                                    ('retrieve_fused', fused)):
+                stats, looped[name] = _run_stage(
+                    lambda j: candidate.retrieve(features[j], texts[j], scales[j]), num_queries)
+                stats[f'recall@{retriever.semantic_top_k}'] = _recall(looped[name], reference)
+                stages[name] = stats
+
+            start = time.perf_counter()
+            found = retriever.retrieve_many(features, texts, scales)
+            stages['retrieve_many'] = {
+                'per_query_ms': (time.perf_counter() - start) * 1000.0 / num_queries,
+                f'recall@{retriever.semantic_top_k}': _recall(found, reference),
+            }
+            # 批量检索必须与逐个检索的结果完全一致
+            mismatched = [
+                j for j in range(num_queries)
+                if [case['design_id'] for case in found[j]]
+                != [case['design_id'] for case in looped['retrieve'][j]]
+            ]
+            if mismatched:
+                raise AssertionError(
+                    f"{size} cases [{backend or 'none'}]: retrieve_many与逐个retrieve()的结果不一致，"
+                    f"查询 {mismatched[:10]}（共{len(mismatched)}个）"
+                )
+
+            result = {
+                'num_cases': size,
+                'backend': backend or 'none',
+                'build_seconds': build_seconds,
+                'matrix_mb': (kb.features_matrix.nbytes + kb.embedding_nbytes) / 2 ** 20,
+                'rss_delta_mb': rss_after - rss_before if rss_before is not None else None,
+                'stages': stages,
+            }
+            results.append(result)
+            print(f"  {size:>8d} cases [{result['backend']}]: " + ", ".join(
+                f"{name} p50={stats['p50_ms']:.3f}ms" if 'p50_ms' in stats
+                else f"{name} {stats['per_query_ms']:.3f}ms/query"
+                for name, stats in stages.items()
+            ))
+            del kb, retriever, reweighted, fused, exact
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=project_root,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_reports(old: Dict[str, Any], new: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    逐项对比两份检索基准报告（按规模、后端、阶段匹配）
+
+    Returns:
+        每个阶段的p50延迟比值（new/old）和recall变化
+    """
+    def index(report):
+        return {
+            (entry['num_cases'], entry['backend'], stage): stats
+            for entry in report.get('retrieval', [])
+            for stage, stats in entry['stages'].items()
+        }
+
+    old_index, new_index = index(old), index(new)
+    rows = []
+    for key, stats in new_index.items():
+        before = old_index.get(key)
+        if before is None:
+            continue
+        metric = 'p50_ms' if 'p50_ms' in stats else 'per_query_ms'
+        row = {'num_cases': key[0], 'backend': key[1], 'stage': key[2],
+               'old_ms': before[metric], 'new_ms': stats[metric],
+               'ratio': stats[metric] / before[metric] if before[metric] > 0 else None}
+        for name, value in stats.items():
+            if name.startswith('recall@') and name in before:
+                row['recall_delta'] = value - before[name]
+        rows.append(row)
+    return rows
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='知识库检索性能基准测试')
+    parser.add_argument('--suites', type=str, nargs='+', default=['scale_filter', 'retrieval'],
+                       choices=['scale_filter', 'retrieval'],
+                       help='要运行的基准测试')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000],
+                       help='合成知识库规模列表')
+    parser.add_argument('--num-queries', type=int, default=50,
+                       help='每个规模的查询次数')
+    parser.add_argument('--backends', type=str, nargs='+', default=None,
+                       help='检索测试的ANN后端（none/flat/ivf/faiss，默认none和ivf，faiss可用时加上faiss）')
+    parser.add_argument('--embedding-dim', type=int, default=384,
+                       help='合成嵌入维度')
+    parser.add_argument('--with-scale', action='store_true',
+                       help='检索查询给出设计规模（触发规模筛选）')
+    parser.add_argument('--ann-min-candidates', type=int, default=4096,
+                       help='候选数达到该值时使用ANN索引')
+    parser.add_argument('--output', type=str, default=None,
+                       help='JSON报告输出路径')
+    parser.add_argument('--compare', type=str, default=None,
+                       help='与之前的JSON报告对比')
+
+    args = parser.parse_args()
+
+    backends = args.backends
+    if backends is None:
+        backends = ['none', 'ivf'] + (['faiss'] if faiss_available() else [])
+    backends = [None if backend == 'none' else backend for backend in backends]
+
+    report: Dict[str, Any] = {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'args': vars(args),
+        },
+    }
+    if 'scale_filter' in args.suites:
+        print("规模筛选：线性扫描 vs 有序索引")
+        report['scale_filter'] = benchmark_scale_filter(args.sizes, num_queries=args.num_queries)
+    if 'retrieval' in args.suites:
+        print("检索阶段：延迟 / 内存 / recall@k")
+        report['retrieval'] = benchmark_retrieval(
+            args.sizes, backends,
+            num_queries=args.num_queries,
+            embedding_dim=args.embedding_dim,
+            with_scale=args.with_scale,
+            retriever_params={'ann_min_candidates': args.ann_min_candidates},
+        )
+
+    if args.output:
+        output_path = Path(args.output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"报告已保存: {output_path}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"与 {args.compare} (commit {baseline.get('meta', {}).get('commit')}) 对比:")
+        for row in compare_reports(baseline, report):
+            recall = f", recall {row['recall_delta']:+.3f}" if 'recall_delta' in row else ''
+            print(f"  {row['num_cases']:>8d} [{row['backend']}] {row['stage']}: "
+                  f"{row['old_ms']:.3f}ms -> {row['new_ms']:.3f}ms (x{row['ratio']:.2f}){recall}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+流式BLIF转换基准测试脚本
+对titan23 BLIF网表（或合成网表）分别运行流式Verilog转换和超图转换，
+记录耗时、峰值内存（独立子进程的ru_maxrss）和输出规模，输出JSON报告
+
+用法：
+    # titan23最大设计
+    python scripts/benchmark_blif_conversion.py \
+        --blif data/titan23/benchmarks/titan23/gaussianblur/netlists/gaussianblur_stratixiv_arch_timing.blif \
+               data/titan23/benchmarks/titan23/bitcoin_miner/netlists/bitcoin_miner_stratixiv_arch_timing.blif
+
+    # 合成titan23风格网表
+    python scripts/benchmark_blif_conversion.py --synthetic 1000000
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.utils.convert_blif_to_verilog import convert_blif_to_verilog_streaming, convert_blif_to_hgr
+
+
+def write_synthetic_blif(output_blif: Path, num_cells: int, seed: int = 0):
+    """生成titan23风格的合成BLIF（stratixiv_lcell_comb子电路、寄存器和常量）"""
+    rng = random.Random(seed)
+    num_nets = max(16, num_cells)
+    with open(output_blif, 'w') as f:
+        f.write(".model top\n.inputs clk")
+        for i in range(64):
+            f.write(f" \\\n  din[{i}]")
+        f.write("\n.outputs")
+        for i in range(64):
+            f.write(f" \\\n  dout[{i}]")
+        f.write("\n.names gnd\n.names vcc\n1\n")
+        for i in range(num_cells):
+            if i % 4 == 3:
+                f.write(f".latch n{rng.randrange(num_nets)} q{i} re clk 0\n")
+                continue
+            target = f"dout[{i % 64}]" if i % 5000 == 0 else f"n{i}"
+            inputs = " ".join(
+                f"data{pin}=n{rng.randrange(num_nets)}" if rng.random() < 0.8 else f"data{pin}=q{(i | 3) - 4 if i >= 4 else 3}"
+                for pin in "abcd"
+            )
+            f.write(f".subckt stratixiv_lcell_comb {inputs} combout={target}\n")
+            if i % 100 == 0:
+                f.write(f".names din[{i % 64}] n{rng.randrange(num_nets)} b{i}\n1- 1\n-1 1\n")
+        f.write(".end\n\n.model stratixiv_lcell_comb\n.inputs dataa datab datac datad\n.outputs combout\n.blackbox\n.end\n")
+
+
+def _run(task: str, blif_file: str, output_dir: str) -> Dict:
+    """在独立子进程中运行一次转换，返回耗时、峰值内存和统计"""
+    start = time.perf_counter()
+    stem = Path(blif_file).stem
+    if task == 'verilog':
+        output = Path(output_dir) / f"{stem}.v"
+        stats = convert_blif_to_verilog_streaming(blif_file, str(output))
+        outputs = [output]
+    else:
+        output = Path(output_dir) / f"{stem}.hgr"
+        mapping = Path(output_dir) / f"{stem}.mapping.json"
+        stats = convert_blif_to_hgr(blif_file, str(output), str(mapping))
+        outputs = [output, mapping]
+    seconds = time.perf_counter() - start
+    return {
+        'seconds': seconds,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'output_mb': sum(p.stat().st_size for p in outputs) / 2 ** 20,
+        'stats': stats,
+    }
+
+
+def benchmark(blif_file: Path, output_dir: Path) -> Dict:
+    """对单个BLIF分别测量Verilog和超图转换"""
+    report = {
+        'blif': str(blif_file),
+        'blif_mb': blif_file.stat().st_size / 2 ** 20,
+    }
+    for task in ('verilog', 'hgr'):
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            report[task] = pool.submit(_run, task, str(blif_file), str(output_dir)).result()
+        print(f"  {task}: {report[task]['seconds']:.1f}s, 峰值内存 {report[task]['peak_rss_mb']:.0f}MB")
+    return report
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='流式BLIF转换基准测试')
+    parser.add_argument('--blif', type=str, nargs='+', default=None,
+                       help='BLIF网表路径（可指定多个）')
+    parser.add_argument('--synthetic', type=int, default=None,
+                       help='使用指定单元数的合成网表')
+    parser.add_argument('--output-dir', type=str, default=None,
+                       help='转换结果目录（默认使用临时目录）')
+    parser.add_argument('--output', type=str, default=None,
+                       help='报告输出路径（JSON）')
+    args = parser.parse_args()
+
+    if not args.blif and not args.synthetic:
+        print("错误：必须指定 --blif 或 --synthetic")
+        return
+
+    reports = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        output_dir = Path(args.output_dir) if args.output_dir else Path(tmpdir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        blif_files = [Path(p) for p in args.blif or []]
+        if args.synthetic:
+            synthetic = Path(tmpdir) / f"synthetic_{args.synthetic}.blif"
+            write_synthetic_blif(synthetic, args.synthetic)
+            blif_files.append(synthetic)
+        for blif_file in blif_files:
+            print(f"基准测试: {blif_file}")
+            reports.append(benchmark(blif_file, output_dir))
+
+    print(json.dumps(reports, indent=2, ensure_ascii=False))
+    if args.output:
+        output_path = Path(args.output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
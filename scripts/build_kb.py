@@ -15,6 +15,9 @@ import os
 import sys
 import json
 import re
+import time
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
 import numpy as np
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
@@ -33,11 +36,17 @@ from src.knowledge_base import KnowledgeBase
 from src.utils.def_parser import DEFParser
 from src.utils.boundary_analyzer import BoundaryAnalyzer
 from src.utils.embedding_loader import load_embedding_model, EmbeddingModel
+from src.utils.embedding_cache import CachedEmbeddingModel
+from src.utils.kb_build_manifest import BuildManifest
+from src.utils.verilog_scanner import scan_verilog_modules
 
 
 class KnowledgeBaseBuilder:
     """知识库构建器"""
     
+    # 特征/指标提取逻辑变化时递增，使构建清单中的旧结果失效
+    BUILDER_VERSION = 1
+    
     def __init__(
         self,
         kb_file: str,
@@ -45,7 +54,11 @@ class KnowledgeBaseBuilder:
         embedding_model_type: Optional[str] = None,
         embedding_cache_dir: Optional[str] = None,
         ollama_base_url: str = "http://localhost:11434",
-        config_file: Optional[str] = None
+        config_file: Optional[str] = None,
+        text_embedding_cache_dir: Optional[str] = None,
+        use_build_cache: bool = True,
+        num_workers: int = 1,
+        max_worker_memory_mb: Optional[int] = None
     ):
         """
         初始化知识库构建器
@@ -56,10 +69,16 @@ class KnowledgeBaseBuilder:
                 - sentence-transformers模型: "sentence-transformers/all-MiniLM-L6-v2"
                 - 本地模型路径: "/path/to/local/model"
                 - Ollama模型: "ollama:nomic-embed-text" 或 "nomic-embed-text" (需要设置model_type="ollama")
-            embedding_model_type: 模型类型 ('sentence-transformers', 'ollama', 'auto')
+                - 内置哈希嵌入: "hashing" 或 "hashing:384"
+            embedding_model_type: 模型类型 ('sentence-transformers', 'ollama', 'hashing', 'auto')
             embedding_cache_dir: 模型缓存目录
             ollama_base_url: Ollama服务地址（如果使用Ollama）
             config_file: 配置文件路径（可选）
+            text_embedding_cache_dir: 文本嵌入磁盘缓存目录（与RAG检索共享，相同文本不重复编码）
+            use_build_cache: 是否使用构建清单（<知识库名>.build_manifest.json），
+                输入文件未变化的设计直接复用上次的构建结果
+            num_workers: 并行提取特征/指标的进程数（1为串行，0为CPU核数）；嵌入仍在主进程批量生成
+            max_worker_memory_mb: 每个工作进程的内存上限（MB，仅Linux/macOS有效；超出时该设计构建失败）
         """
         self.kb_file = Path(kb_file)
         self.kb = KnowledgeBase(str(self.kb_file))
@@ -73,6 +92,9 @@ class KnowledgeBaseBuilder:
                 cache_dir=embedding_cache_dir,
                 ollama_base_url=ollama_base_url
             )
+            self.embedding_model = CachedEmbeddingModel(
+                self.embedding_model, cache_dir=text_embedding_cache_dir
+            )
             self.embedding_dim = self.embedding_model.get_embedding_dimension()
         except Exception as e:
             print(f"警告：加载嵌入模型失败: {e}")
@@ -84,7 +106,9 @@ class KnowledgeBaseBuilder:
             print("   - 安装Ollama: https://ollama.com/download")
             print("   - 下载嵌入模型: ollama pull nomic-embed-text")
             print("   - 在配置中设置: embedding_model_name: 'ollama:nomic-embed-text'")
-            print("3. 跳过语义嵌入功能，仅使用特征向量检索")
+            print("3. 使用内置哈希嵌入（无需下载模型，知识库须用同一模型构建）:")
+            print("   - 在配置中设置: embedding_model: 'hashing'")
+            print("4. 跳过语义嵌入功能，仅使用特征向量检索")
             self.embedding_model = None
             self.embedding_dim = 384  # all-MiniLM-L6-v2的默认维度
         
@@ -96,6 +120,34 @@ class KnowledgeBaseBuilder:
             self.config = {}
         
         self.boundary_analyzer = BoundaryAnalyzer()
+        
+        # 构建清单：按输入文件内容哈希缓存每个设计的构建结果
+        self.manifest: Optional[BuildManifest] = None
+        if use_build_cache:
+            self.manifest = BuildManifest(
+                str(self.kb_file.with_name(f"{self.kb_file.stem}.build_manifest.json")),
+                self.BUILDER_VERSION
+            )
+        self._pending_manifest: List[Tuple[str, Dict[str, Any], Dict[str, Any]]] = []
+        
+        self.num_workers = num_workers if num_workers > 0 else (os.cpu_count() or 1)
+        self.max_worker_memory_mb = max_worker_memory_mb
+    
+    @classmethod
+    def _extraction_only(cls, config: Dict[str, Any]) -> 'KnowledgeBaseBuilder':
+        """只用于提取特征/指标的构建器（工作进程中使用，不加载知识库和嵌入模型）"""
+        builder = cls.__new__(cls)
+        builder.kb_file = None
+        builder.kb = None
+        builder.embedding_model = None
+        builder.embedding_dim = 384
+        builder.config = config
+        builder.boundary_analyzer = BoundaryAnalyzer()
+        builder.manifest = None
+        builder._pending_manifest = []
+        builder.num_workers = 1
+        builder.max_worker_memory_mb = None
+        return builder
     
     def extract_design_features(
         self,
@@ -176,38 +228,15 @@ class KnowledgeBaseBuilder:
     
     def _parse_verilog_modules(self, verilog_file: str) -> Dict[str, Any]:
         """
-        解析Verilog文件，提取模块信息
+        解析Verilog文件，提取模块信息（流式单遍扫描，见scan_verilog_modules）
         
         Args:
             verilog_file: Verilog文件路径
         
         Returns:
-            模块信息字典
+            模块信息字典（num_modules, module_names, hierarchy等）
         """
-        with open(verilog_file, 'r', encoding='utf-8', errors='ignore') as f:
-            content = f.read()
-        
-        # 移除注释
-        content = re.sub(r'//.*?\n', '\n', content)
-        content = re.sub(r'/\*.*?\*/', '', content, flags=re.DOTALL)
-        
-        # 查找所有模块定义
-        module_pattern = r'\bmodule\s+(\w+)\s*[#(]'
-        modules = re.findall(module_pattern, content)
-        
-        # 构建模块层次（简单版本：查找模块实例化）
-        hierarchy = {}
-        for module in modules:
-            # 查找该模块的实例化
-            inst_pattern = rf'\b{module}\s+\w+\s*\([^)]*\)\s*;'
-            instances = re.findall(inst_pattern, content)
-            hierarchy[module] = len(instances)
-        
-        return {
-            'num_modules': len(modules),
-            'module_names': modules,
-            'hierarchy': hierarchy
-        }
+        return scan_verilog_modules(verilog_file)
     
     def _compute_graph_features(
         self,
@@ -590,13 +619,43 @@ class KnowledgeBaseBuilder:
             case: 案例字典
         
         Returns:
-            嵌入向量（numpy array）
+            嵌入向量（numpy array，生成失败时为零向量）
         """
-        if self.embedding_model is None:
+        return self.generate_embeddings([case])[0][0]
+    
+    def generate_embeddings(self, cases: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量生成语义嵌入向量（所有案例文本合并为一次编码调用）
+        
+        Args:
+            cases: 案例字典列表
+        
+        Returns:
+            (嵌入矩阵 (n, embedding_dim), 生成失败的标记 (n,))；失败的行为零向量，
+            不应写入构建清单或知识库
+        """
+        failed = np.zeros(len(cases), dtype=bool)
+        if self.embedding_model is None or not cases:
             # 如果没有嵌入模型，返回零向量
-            return np.zeros(self.embedding_dim, dtype=np.float32)
+            return np.zeros((len(cases), self.embedding_dim), dtype=np.float32), failed
+        
+        texts = [self._case_to_text(case) for case in cases]
         
-        # 构建文本描述
+        # 生成嵌入
+        try:
+            embeddings = np.asarray(self.embedding_model.encode(texts), dtype=np.float32)
+            embeddings = embeddings.reshape(len(cases), -1)
+        except Exception as e:
+            print(f"生成嵌入失败: {e}")
+            failed[:] = True
+            return np.zeros((len(cases), self.embedding_dim), dtype=np.float32), failed
+        # 模型对个别文本返回NaN/Inf时只标记这些行
+        failed = ~np.isfinite(embeddings).all(axis=1)
+        embeddings[failed] = 0.0
+        return embeddings, failed
+    
+    def _case_to_text(self, case: Dict[str, Any]) -> str:
+        """将案例转换为用于生成嵌入的文本描述"""
         text_parts = []
         
         # 设计信息
@@ -629,17 +688,33 @@ class KnowledgeBaseBuilder:
             if 'success_rate' in patterns:
                 text_parts.append(f"Success Rate: {patterns['success_rate']:.2f}")
         
-        text = " ".join(text_parts)
+        return " ".join(text_parts)
+    
+    def embed_cases(self, cases: List[Dict[str, Any]]) -> float:
+        """
+        为案例批量生成嵌入并写入case['embedding']，打印嵌入吞吐量
         
-        # 生成嵌入
-        try:
-            embedding = self.embedding_model.encode(text)
-            if not isinstance(embedding, np.ndarray):
-                embedding = np.array(embedding)
-            return embedding.astype(np.float32)
-        except Exception as e:
-            print(f"生成嵌入失败: {e}")
-            return np.zeros(self.embedding_dim, dtype=np.float32)
+        生成失败的案例不写入嵌入（case中仍没有embedding字段）
+        
+        Args:
+            cases: 案例字典列表
+        
+        Returns:
+            吞吐量（cases/s）
+        """
+        if not cases:
+            return 0.0
+        start = time.perf_counter()
+        embeddings, failed = self.generate_embeddings(cases)
+        elapsed = time.perf_counter() - start
+        for case, embedding, bad in zip(cases, embeddings, failed):
+            if not bad:
+                case['embedding'] = embedding.tolist()
+        throughput = len(cases) / elapsed if elapsed > 0 else float('inf')
+        print(f"生成语义嵌入: {len(cases)} 个案例, 耗时 {elapsed:.2f}s, {throughput:.1f} cases/s")
+        if failed.any():
+            print(f"警告: {int(failed.sum())} 个案例生成嵌入失败")
+        return throughput
     
     def build_case(
         self,
@@ -647,7 +722,8 @@ class KnowledgeBaseBuilder:
         partition_scheme_file: Optional[str] = None,
         layout_def_file: Optional[str] = None,
         log_file: Optional[str] = None,
-        runtime: Optional[float] = None
+        runtime: Optional[float] = None,
+        embed: bool = True
     ) -> Dict[str, Any]:
         """
         构建完整案例
@@ -658,6 +734,7 @@ class KnowledgeBaseBuilder:
             layout_def_file: 布局DEF文件路径（可选）
             log_file: 运行日志文件路径（可选）
             runtime: 运行时间（秒，可选）
+            embed: 是否立即生成嵌入（批量构建时为False，之后由embed_cases统一生成）
         
         Returns:
             完整案例字典
@@ -725,12 +802,137 @@ class KnowledgeBaseBuilder:
         }
         
         # 6. 生成嵌入
-        print(f"生成语义嵌入: {design_id}")
-        embedding = self.generate_embedding(case)
-        case['embedding'] = embedding.tolist()
+        if embed:
+            print(f"生成语义嵌入: {design_id}")
+            embeddings, failed = self.generate_embeddings([case])
+            if not failed[0]:
+                case['embedding'] = embeddings[0].tolist()
         
         return case
     
+    def _case_inputs(
+        self,
+        design_dir: str,
+        partition_scheme_file: Optional[str] = None,
+        layout_def_file: Optional[str] = None,
+        log_file: Optional[str] = None
+    ) -> Dict[str, Optional[str]]:
+        """build_case读取的输入文件（与build_case的默认路径一致）"""
+        design_path = Path(design_dir)
+        return {
+            'floorplan_def': str(design_path / "floorplan.def"),
+            'verilog': str(design_path / "design.v"),
+            'partition_scheme': partition_scheme_file or str(design_path / "partition_scheme.json"),
+            'log': log_file or str(design_path / "logs" / "experiment.log"),
+            'layout_def': layout_def_file or str(design_path / "layout.def"),
+        }
+    
+    def _build_cases(self, tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        构建案例（不生成嵌入），结果按任务顺序返回，与完成顺序无关
+        
+        输入文件内容未变化的设计直接复用构建清单中的结果；其余设计串行构建，
+        或在num_workers > 1时由进程池并行提取。未命中的案例在_embed_and_add生成嵌入后写入清单。
+        
+        Args:
+            tasks: build_case参数字典列表（design_dir，可选partition_scheme_file、
+                layout_def_file、log_file、runtime）
+        
+        Returns:
+            成功构建的案例列表（命中时可能已包含嵌入）
+        """
+        cases: List[Optional[Dict[str, Any]]] = [None] * len(tasks)
+        keys: List[Optional[str]] = [None] * len(tasks)
+        fingerprints: List[Optional[Dict[str, Any]]] = [None] * len(tasks)
+        model_name = self.embedding_model.model_name if self.embedding_model is not None else None
+        
+        # 1. 查询构建清单
+        misses = []
+        for index, task in enumerate(tasks):
+            if self.manifest is not None:
+                keys[index] = str(Path(task['design_dir']).resolve())
+                inputs = self._case_inputs(
+                    task['design_dir'],
+                    task.get('partition_scheme_file'),
+                    task.get('layout_def_file'),
+                    task.get('log_file')
+                )
+                fingerprints[index] = self.manifest.fingerprint(inputs, runtime=task.get('runtime'))
+                cases[index] = self.manifest.lookup(keys[index], fingerprints[index], model_name)
+                self.manifest.record(Path(task['design_dir']).name, cases[index] is not None)
+            if cases[index] is None:
+                misses.append(index)
+        
+        # 2. 提取未命中的设计
+        if misses:
+            start = time.perf_counter()
+            num_workers = min(self.num_workers, len(misses))
+            if num_workers > 1:
+                results = self._build_cases_parallel([tasks[i] for i in misses], num_workers)
+            else:
+                results = [_build_case_task(self, tasks[i]) for i in misses]
+            for index, (case, error) in zip(misses, results):
+                if error is not None:
+                    print(f"构建案例失败 {Path(tasks[index]['design_dir']).name}: {error}")
+                cases[index] = case
+            if num_workers > 1:
+                print(f"并行提取 {len(misses)} 个设计: {num_workers} 个进程, "
+                      f"耗时 {time.perf_counter() - start:.2f}s")
+        
+        # 3. 新构建或需要重新生成嵌入的案例，嵌入生成后写入清单
+        if self.manifest is not None:
+            for index, case in enumerate(cases):
+                if case is not None and case.get('embedding') is None:
+                    self._pending_manifest.append((keys[index], fingerprints[index], case))
+        
+        return [case for case in cases if case is not None]
+    
+    def _build_cases_parallel(
+        self,
+        tasks: List[Dict[str, Any]],
+        num_workers: int
+    ) -> List[Tuple[Optional[Dict[str, Any]], Optional[str]]]:
+        """
+        在进程池中构建案例，按任务顺序返回(案例, 错误信息)
+        
+        工作进程被系统终止（如超出内存）时进程池整体损坏，其余未完成的任务都会失败：
+        这些任务在新的单进程池中逐个重新运行，再次损坏时即可确定是当前设计导致，
+        只将该设计记为失败并换用新的进程池继续
+        """
+        results: List[Optional[Tuple[Optional[Dict[str, Any]], Optional[str]]]] = [None] * len(tasks)
+        unfinished = []
+        with self._new_worker_pool(num_workers) as executor:
+            futures = [executor.submit(_build_case_worker, task) for task in tasks]
+            for index, future in enumerate(futures):
+                try:
+                    results[index] = future.result()
+                except BrokenProcessPool:
+                    unfinished.append(index)
+        
+        if unfinished:
+            print(f"工作进程异常退出，{len(unfinished)} 个未完成的设计逐个重新提交")
+            executor = None
+            for index in unfinished:
+                if executor is None:
+                    executor = self._new_worker_pool(1)
+                try:
+                    results[index] = executor.submit(_build_case_worker, tasks[index]).result()
+                except BrokenProcessPool as e:
+                    results[index] = (None, f"工作进程异常退出: {e}")
+                    executor.shutdown()
+                    executor = None
+            if executor is not None:
+                executor.shutdown()
+        return results
+    
+    def _new_worker_pool(self, num_workers: int) -> concurrent.futures.ProcessPoolExecutor:
+        """创建提取用进程池（工作进程设置内存上限并创建提取专用构建器）"""
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=_init_build_worker,
+            initargs=(self.config, self.max_worker_memory_mb)
+        )
+    
     def validate_case(self, case: Dict[str, Any]) -> Tuple[bool, List[str]]:
         """
         验证案例完整性
@@ -820,10 +1022,10 @@ class KnowledgeBaseBuilder:
             print(f"结果目录不存在: {results_dir}")
             return 0
         
-        added_count = 0
+        tasks = []
         
-        # 查找所有设计目录
-        for design_dir in results_path.iterdir():
+        # 查找所有设计目录（按名称排序，保证知识库中的案例顺序确定）
+        for design_dir in sorted(results_path.iterdir()):
             if not design_dir.is_dir():
                 continue
             
@@ -849,22 +1051,15 @@ class KnowledgeBaseBuilder:
                     log_file = str(log)
                     break
             
-            # 构建案例
-            try:
-                case = self.build_case(
-                    str(design_dir),
-                    partition_scheme_file=partition_scheme_file,
-                    layout_def_file=layout_def_file,
-                    log_file=log_file
-                )
-                
-                if self.add_case_to_kb(case, validate=validate):
-                    added_count += 1
-            except Exception as e:
-                print(f"构建案例失败 {design_dir.name}: {e}")
-                continue
-        
-        return added_count
+            tasks.append({
+                'design_dir': str(design_dir),
+                'partition_scheme_file': partition_scheme_file,
+                'layout_def_file': layout_def_file,
+                'log_file': log_file,
+            })
+        
+        # 构建案例（输入未变化时复用构建清单，嵌入稍后批量生成）
+        return self._embed_and_add(self._build_cases(tasks), validate)
     
     def build_from_designs(
         self,
@@ -881,24 +1076,41 @@ class KnowledgeBaseBuilder:
         Returns:
             成功添加的案例数量
         """
-        added_count = 0
+        tasks = []
         
         for design_dir in design_dirs:
             design_path = Path(design_dir)
             if not design_path.exists():
                 print(f"设计目录不存在: {design_dir}")
                 continue
-            
-            try:
-                # 构建基本案例（没有分区方案和布局结果）
-                case = self.build_case(str(design_dir))
-                
-                if self.add_case_to_kb(case, validate=validate):
-                    added_count += 1
-            except Exception as e:
-                print(f"构建案例失败 {design_path.name}: {e}")
-                continue
+            tasks.append({'design_dir': str(design_dir)})
+        
+        # 构建基本案例（没有分区方案和布局结果），嵌入稍后批量生成
+        return self._embed_and_add(self._build_cases(tasks), validate)
+    
+    def _embed_and_add(self, cases: List[Dict[str, Any]], validate: bool) -> int:
+        """
+        为缺少嵌入的案例批量生成嵌入，更新构建清单后逐个加入知识库，返回成功添加的数量
         
+        嵌入生成失败的案例既不写入构建清单（下次构建重新生成），也不加入知识库
+        """
+        to_embed = [case for case in cases if case.get('embedding') is None]
+        self.embed_cases(to_embed)
+        failed = {id(case) for case in to_embed if case.get('embedding') is None}
+        if failed:
+            print(f"跳过 {len(failed)} 个嵌入生成失败的案例（不写入构建清单和知识库）")
+        if self.manifest is not None:
+            model_name = self.embedding_model.model_name if self.embedding_model is not None else None
+            for key, fingerprint, case in self._pending_manifest:
+                if id(case) not in failed:
+                    self.manifest.store(key, fingerprint, case, model_name)
+            self._pending_manifest = []
+            self.manifest.save()
+            self.manifest.print_summary()
+        added_count = 0
+        for case in cases:
+            if id(case) not in failed and self.add_case_to_kb(case, validate=validate):
+                added_count += 1
         return added_count
     
     def save(self) -> bool:
@@ -935,6 +1147,39 @@ class KnowledgeBaseBuilder:
         return stats
 
 
+# 工作进程中的提取专用构建器（由_init_build_worker创建）
+_worker_builder: Optional[KnowledgeBaseBuilder] = None
+
+
+def _init_build_worker(config: Dict[str, Any], max_memory_mb: Optional[int]):
+    """进程池初始化：设置内存上限并创建提取专用构建器"""
+    global _worker_builder
+    if max_memory_mb:
+        try:
+            import resource
+            limit = int(max_memory_mb) * 2 ** 20
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError) as e:
+            print(f"警告：无法设置工作进程内存上限: {e}")
+    _worker_builder = KnowledgeBaseBuilder._extraction_only(config)
+
+
+def _build_case_task(
+    builder: KnowledgeBaseBuilder,
+    task: Dict[str, Any]
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """构建单个案例（不生成嵌入），返回(案例, 错误信息)"""
+    try:
+        return builder.build_case(embed=False, **task), None
+    except Exception as e:
+        return None, str(e) or type(e).__name__
+
+
+def _build_case_worker(task: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """进程池任务"""
+    return _build_case_task(_worker_builder, task)
+
+
 def find_local_results_dirs(results_base_dir: str = "data/results") -> List[str]:
     """
     查找本地实验结果目录（递归搜索）
@@ -1110,6 +1355,12 @@ def main():
                        help='验证案例完整性')
     parser.add_argument('--stats', action='store_true',
                        help='显示知识库统计信息')
+    parser.add_argument('--no-build-cache', action='store_true',
+                       help='不使用构建清单，重新解析所有设计')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='并行提取特征/指标的进程数（覆盖配置文件，0为CPU核数）')
+    parser.add_argument('--max-worker-memory-mb', type=int, default=None,
+                       help='每个工作进程的内存上限（MB，覆盖配置文件）')
     
     args = parser.parse_args()
     
@@ -1124,12 +1375,18 @@ def main():
         embedding_model_type = kb_config.get('embedding_model_type', 'auto')
         embedding_cache_dir = kb_config.get('embedding_cache_dir', None)
         ollama_base_url = kb_config.get('ollama_base_url', 'http://localhost:11434')
+        text_embedding_cache_dir = kb_config.get('text_embedding_cache_dir', None)
+        build_workers = kb_config.get('build_workers', 1)
+        max_worker_memory_mb = kb_config.get('max_worker_memory_mb', None)
     else:
         kb_file = args.kb_file or 'data/knowledge_base/kb_cases.json'
         embedding_model = 'sentence-transformers/all-MiniLM-L6-v2'
         embedding_model_type = 'auto'
         embedding_cache_dir = None
         ollama_base_url = 'http://localhost:11434'
+        text_embedding_cache_dir = None
+        build_workers = 1
+        max_worker_memory_mb = None
     
     # 创建构建器
     builder = KnowledgeBaseBuilder(
@@ -1138,7 +1395,11 @@ def main():
         embedding_model_type=embedding_model_type,
         embedding_cache_dir=embedding_cache_dir,
         ollama_base_url=ollama_base_url,
-        config_file=str(config_path) if config_path.exists() else None
+        config_file=str(config_path) if config_path.exists() else None,
+        text_embedding_cache_dir=text_embedding_cache_dir,
+        use_build_cache=not args.no_build_cache,
+        num_workers=args.workers if args.workers is not None else build_workers,
+        max_worker_memory_mb=args.max_worker_memory_mb or max_worker_memory_mb
     )
     
     # 显示统计信息
@@ -0,0 +1,165 @@
+"""
+嵌入模型对比脚本
+在知识库案例文本上对比不同嵌入模型（如内置哈希嵌入与MiniLM）的加载时间、编码吞吐，
+以及以参考模型为准的近邻重合度（recall@k）
+
+用法：
+    # 以MiniLM为参考评估哈希嵌入
+    python scripts/compare_embedding_models.py --kb-file data/knowledge_base/kb_cases.json \
+        --models sentence-transformers/all-MiniLM-L6-v2 hashing
+
+    # 使用合成案例文本
+    python scripts/compare_embedding_models.py --synthetic 20000 --models hashing hashing:256
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.knowledge_base import KnowledgeBase
+from src.rag_retriever import RAGRetriever
+from src.utils.embedding_loader import load_embedding_model
+
+
+def synthetic_texts(num_texts: int, seed: int = 0) -> List[str]:
+    """生成与_case_to_text格式一致的合成案例文本"""
+    rng = np.random.default_rng(seed)
+    families = ['mgc_fft', 'mgc_matrix_mult', 'mgc_des_perf', 'mgc_edit_dist', 'mgc_pci_bridge32',
+                'mgc_superblue', 'sparcT1_core', 'bitonic_mesh', 'cholesky_mc', 'openCV']
+    scales = np.exp(rng.uniform(np.log(1e3), np.log(1e6), num_texts)).astype(int)
+    texts = []
+    for i, modules in enumerate(scales):
+        family = families[rng.integers(len(families))]
+        nets = int(modules * rng.uniform(0.8, 1.5))
+        texts.append(f"Design: {family}_{i} Modules: {modules} Nets: {nets} "
+                     f"Partitions: {rng.integers(2, 9)}")
+    return texts
+
+
+def _top_k(embeddings: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """每个查询（不含自身）相似度最高的k个位置"""
+    scores = embeddings[queries] @ embeddings.T
+    scores[np.arange(len(queries)), queries] = -np.inf
+    k = min(k, embeddings.shape[0] - 1)
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+def compare(
+    texts: List[str],
+    model_names: List[str],
+    k_values: List[int],
+    num_queries: int,
+    batch_size: int = 1024
+) -> List[Dict[str, Any]]:
+    """
+    逐个模型编码文本并对比
+
+    Args:
+        texts: 案例文本
+        model_names: 模型名称列表，第一个可加载的模型作为近邻参考
+        k_values: 需要评估的k列表
+        num_queries: 用作查询的文本数
+        batch_size: 编码批大小
+
+    Returns:
+        每个模型的报告
+    """
+    rng = np.random.default_rng(1)
+    queries = rng.choice(len(texts), size=min(num_queries, len(texts)), replace=False)
+    reports = []
+    reference = None
+    for name in model_names:
+        start = time.perf_counter()
+        try:
+            model = load_embedding_model(name)
+        except Exception as e:
+            print(f"⚠️  跳过模型 {name}: {e}")
+            continue
+        load_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        embeddings = np.vstack([
+            np.asarray(model.encode(texts[i:i + batch_size]), dtype=np.float32)
+            for i in range(0, len(texts), batch_size)
+        ])
+        encode_seconds = time.perf_counter() - start
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+        report: Dict[str, Any] = {
+            'model': model.model_name,
+            'dim': int(embeddings.shape[1]),
+            'load_seconds': load_seconds,
+            'texts_per_second': len(texts) / max(encode_seconds, 1e-9),
+        }
+        neighbours = {k: _top_k(embeddings, queries, k) for k in k_values}
+        if reference is None:
+            reference = (model.model_name, neighbours)
+        else:
+            report['reference'] = reference[0]
+            for k in k_values:
+                hits = [len(set(found) & set(truth))
+                        for found, truth in zip(neighbours[k].tolist(), reference[1][k].tolist())]
+                report[f'recall@{k}'] = float(np.sum(hits) / reference[1][k].size)
+        reports.append(report)
+    return reports
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='对比嵌入模型的速度与近邻重合度')
+    parser.add_argument('--kb-file', type=str, default=None,
+                       help='知识库文件路径')
+    parser.add_argument('--synthetic', type=int, default=None,
+                       help='使用指定数量的合成案例文本代替知识库')
+    parser.add_argument('--models', type=str, nargs='+',
+                       default=['sentence-transformers/all-MiniLM-L6-v2', 'hashing'],
+                       help='要对比的模型（第一个为参考）')
+    parser.add_argument('--num-queries', type=int, default=200,
+                       help='查询数量')
+    parser.add_argument('--k', type=int, nargs='+', default=[1, 10],
+                       help='评估的k值')
+    parser.add_argument('--output', type=str, default=None,
+                       help='报告输出JSON文件')
+
+    args = parser.parse_args()
+
+    if args.synthetic:
+        texts = synthetic_texts(args.synthetic)
+        source = f"synthetic({args.synthetic})"
+    elif args.kb_file:
+        kb = KnowledgeBase(args.kb_file)
+        kb.load()
+        # _case_to_text不依赖检索器状态，直接复用其文本格式
+        texts = [RAGRetriever._case_to_text(None, case)
+                 for case in kb.get_all_cases(with_payloads=False)]
+        source = args.kb_file
+    else:
+        print("错误：必须指定 --kb-file 或 --synthetic")
+        return
+
+    if len(texts) < 2:
+        print("案例文本不足，无法评估")
+        return
+
+    reports = compare(texts, args.models, args.k, args.num_queries)
+    result = {'source': source, 'num_texts': len(texts), 'reports': reports}
+
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.output:
+        output_path = Path(args.output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+知识库存储格式转换工具
+在 json（kb_cases.json）与 sqlite（kb_cases.db + 向量旁路文件）之间转换，
+也可对sqlite知识库执行压缩
+
+用法：
+    # json -> sqlite
+    python scripts/convert_kb_storage.py --input data/knowledge_base/kb_cases.json --output data/knowledge_base/kb_cases.db
+
+    # sqlite -> json（导出为原有格式）
+    python scripts/convert_kb_storage.py --input data/knowledge_base/kb_cases.db --output kb_export.json
+
+    # 压缩sqlite知识库
+    python scripts/convert_kb_storage.py --input data/knowledge_base/kb_cases.db --compact
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.utils.kb_storage import open_case_store
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='知识库存储格式转换')
+    parser.add_argument('--input', type=str, required=True,
+                       help='输入知识库文件（.json 或 .db）')
+    parser.add_argument('--output', type=str, default=None,
+                       help='输出知识库文件（扩展名决定格式）')
+    parser.add_argument('--compact', action='store_true',
+                       help='压缩输入的sqlite知识库')
+
+    args = parser.parse_args()
+
+    source = open_case_store(args.input)
+    if not source.exists():
+        print(f"错误：知识库文件不存在: {args.input}")
+        return
+
+    if args.compact:
+        start = time.perf_counter()
+        source.compact()
+        print(f"✓ 压缩完成: {args.input} ({time.perf_counter() - start:.2f}s)")
+
+    if args.output:
+        start = time.perf_counter()
+        cases = source.load()
+        target = open_case_store(args.output)
+        if target.exists():
+            print(f"错误：输出文件已存在: {args.output}")
+            return
+        target.commit(cases, cases, [])
+        print(f"✓ 转换完成: {len(cases)} 个案例 -> {args.output} "
+              f"({time.perf_counter() - start:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+ANN索引评估脚本
+对比近似最近邻索引与精确检索，输出recall@k和查询延迟报告
+
+用法：
+    # 评估知识库中的案例嵌入
+    python scripts/evaluate_ann_index.py --kb-file data/knowledge_base/kb_cases.json --kind embeddings
+
+    # 使用合成数据评估大规模场景
+    python scripts/evaluate_ann_index.py --synthetic 1000000 --dim 384 --backend ivf --nprobe 8
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.knowledge_base import KnowledgeBase
+from src.utils.ann_index import create_index, recall_report
+
+
+def synthetic_vectors(num_vectors: int, dim: int, num_clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """生成带簇结构的归一化合成向量"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((num_clusters, dim)).astype(np.float32)
+    vectors = np.empty((num_vectors, dim), dtype=np.float32)
+    chunk = 65536
+    for start in range(0, num_vectors, chunk):
+        end = min(start + chunk, num_vectors)
+        labels = rng.integers(0, num_clusters, end - start)
+        vectors[start:end] = centers[labels] + 0.5 * rng.standard_normal((end - start, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def make_queries(vectors: np.ndarray, num_queries: int, noise: float = 0.1, seed: int = 1) -> np.ndarray:
+    """从已有向量加噪声生成查询"""
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.integers(0, len(vectors), num_queries)]
+    queries = picked + noise * rng.standard_normal(picked.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='评估ANN索引的recall@k和延迟')
+    parser.add_argument('--kb-file', type=str, default=None,
+                       help='知识库文件路径')
+    parser.add_argument('--kind', type=str, default='embeddings', choices=['embeddings', 'features'],
+                       help='评估的向量类型')
+    parser.add_argument('--synthetic', type=int, default=None,
+                       help='使用指定数量的合成向量代替知识库')
+    parser.add_argument('--dim', type=int, default=384,
+                       help='合成向量维度')
+    parser.add_argument('--backend', type=str, default='ivf', choices=['flat', 'ivf', 'faiss'],
+                       help='索引类型')
+    parser.add_argument('--nlist', type=int, default=None,
+                       help='IVF质心数量（默认4*sqrt(n)）')
+    parser.add_argument('--nprobe', type=int, default=8,
+                       help='IVF探测列表数')
+    parser.add_argument('--num-queries', type=int, default=200,
+                       help='查询数量')
+    parser.add_argument('--k', type=int, nargs='+', default=[1, 10, 50],
+                       help='评估的k值')
+    parser.add_argument('--output', type=str, default=None,
+                       help='报告输出JSON文件')
+
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dim)
+        source = f"synthetic({args.synthetic}x{args.dim})"
+    elif args.kb_file:
+        kb = KnowledgeBase(args.kb_file)
+        kb.load()
+        if args.kind == 'embeddings':
+            vectors = np.asarray(kb.embeddings_matrix[kb.embedding_mask])
+        else:
+            vectors = np.asarray(kb.features_matrix[kb.feature_mask])
+        source = f"{args.kb_file}:{args.kind}"
+    else:
+        print("错误：必须指定 --kb-file 或 --synthetic")
+        return
+
+    if len(vectors) == 0:
+        print("没有可评估的向量")
+        return
+
+    params = {'nprobe': args.nprobe}
+    if args.nlist:
+        params['nlist'] = args.nlist
+    if args.backend in ('ivf', 'faiss'):
+        # 知识库通常较小，强制训练以评估近似检索
+        params['train_threshold'] = min(len(vectors), 2048)
+    index = create_index(args.backend, vectors.shape[1], **params)
+
+    start = time.perf_counter()
+    index.add(np.arange(len(vectors)), vectors)
+    build_seconds = time.perf_counter() - start
+
+    queries = make_queries(vectors, args.num_queries)
+    report = recall_report(index, vectors, queries, k_values=args.k)
+    report['source'] = source
+    report['build_seconds'] = build_seconds
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        output_path = Path(args.output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
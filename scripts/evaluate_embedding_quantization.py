@@ -0,0 +1,160 @@
+"""
+嵌入量化评估脚本
+对比知识库嵌入矩阵以float32/float16/int8存储时的内存占用与检索精度，
+int8/float16同时报告用全精度嵌入重排序前若干候选后的recall
+
+用法：
+    # 评估知识库（如ISPD/Titan知识库）
+    python scripts/evaluate_embedding_quantization.py --kb-file data/knowledge_base/kb_cases.json
+
+    # 使用合成数据评估
+    python scripts/evaluate_embedding_quantization.py --synthetic 100000 --dim 384
+"""
+
+import sys
+import json
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.knowledge_base import KnowledgeBase
+from scripts.evaluate_ann_index import make_queries, synthetic_vectors
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """每个查询分数最高的k个位置（无序）"""
+    k = min(k, scores.shape[1])
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+def _scores(kb: KnowledgeBase, rows: np.ndarray, queries: np.ndarray,
+            exact: bool = False, chunk: int = 65536) -> np.ndarray:
+    """分块计算查询与知识库嵌入的相似度 (q, len(rows))"""
+    scores = np.empty((len(queries), len(rows)), dtype=np.float32)
+    for start in range(0, len(rows), chunk):
+        part = rows[start:start + chunk]
+        vectors = kb.get_exact_embedding_rows(part) if exact else kb.get_embedding_rows(part)
+        scores[:, start:start + len(part)] = queries @ vectors.T
+    return scores
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = [len(set(f.tolist()) & set(t.tolist())) for f, t in zip(found, truth)]
+    return float(np.sum(hits) / truth.size)
+
+
+def evaluate(
+    cases: List[Dict[str, Any]],
+    queries: np.ndarray,
+    k_values: List[int],
+    rerank: int,
+    quantizations: List[Optional[str]]
+) -> List[Dict[str, Any]]:
+    """
+    逐种存储精度建立知识库并评估
+
+    Args:
+        cases: 带嵌入的案例
+        queries: 查询向量 (q, dim)，已归一化
+        k_values: 需要评估的k列表
+        rerank: 重排序倍数（对前rerank*k个量化候选用全精度重新打分）
+        quantizations: 要评估的存储精度（None为float32）
+
+    Returns:
+        每种精度的报告
+    """
+    reports = []
+    truth = None
+    for quantization in quantizations:
+        kb = KnowledgeBase(str(Path(tempfile.gettempdir()) / 'kb_quantization_eval.json'),
+                           max_cases=len(cases), embedding_quantization=quantization)
+        for case in cases:
+            kb.add_case(case)
+        rows = np.flatnonzero(kb.embedding_mask)
+        scores = _scores(kb, rows, queries)
+        if truth is None:
+            truth_scores = _scores(kb, rows, queries, exact=True)
+            truth = {k: _top_k(truth_scores, k) for k in k_values}
+        report: Dict[str, Any] = {
+            'quantization': quantization or 'float32',
+            'num_vectors': int(len(rows)),
+            'matrix_bytes': kb.embedding_nbytes,
+            'bytes_per_vector': kb.embedding_nbytes / max(len(rows), 1),
+            'projected_mb_1e6': kb.embedding_nbytes / max(len(rows), 1) * 1e6 / 2 ** 20,
+            'score_mae': float(np.abs(scores - truth_scores).mean()),
+        }
+        for k in k_values:
+            report[f'recall@{k}'] = _recall(_top_k(scores, k), truth[k])
+            if quantization is not None and rerank > 0:
+                # 对量化相似度的前rerank*k个候选用全精度嵌入重新打分
+                head = _top_k(scores, rerank * k)
+                reranked = []
+                for q, candidates in enumerate(head):
+                    exact = kb.get_exact_embedding_rows(rows[candidates]) @ queries[q]
+                    reranked.append(candidates[np.argsort(-exact)[:k]])
+                report[f'recall@{k}_rerank{rerank}'] = _recall(np.array(reranked), truth[k])
+        reports.append(report)
+    return reports
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='评估嵌入量化的内存占用与recall')
+    parser.add_argument('--kb-file', type=str, default=None,
+                       help='知识库文件路径')
+    parser.add_argument('--synthetic', type=int, default=None,
+                       help='使用指定数量的合成向量代替知识库')
+    parser.add_argument('--dim', type=int, default=384,
+                       help='合成向量维度')
+    parser.add_argument('--num-queries', type=int, default=200,
+                       help='查询数量')
+    parser.add_argument('--k', type=int, nargs='+', default=[1, 10],
+                       help='评估的k值')
+    parser.add_argument('--rerank', type=int, default=4,
+                       help='重排序倍数（0表示不重排序）')
+    parser.add_argument('--output', type=str, default=None,
+                       help='报告输出JSON文件')
+
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dim)
+        cases = [{'design_id': f'synthetic_{i}', 'embedding': vector}
+                 for i, vector in enumerate(vectors)]
+        source = f"synthetic({args.synthetic}x{args.dim})"
+    elif args.kb_file:
+        kb = KnowledgeBase(args.kb_file)
+        kb.load()
+        cases = [case for case in kb.get_all_cases(with_payloads=False)
+                 if case.get('embedding') is not None]
+        vectors = np.asarray(kb.embeddings_matrix[kb.embedding_mask])
+        source = args.kb_file
+    else:
+        print("错误：必须指定 --kb-file 或 --synthetic")
+        return
+
+    if len(vectors) == 0:
+        print("没有可评估的向量")
+        return
+
+    queries = make_queries(vectors, args.num_queries)
+    reports = evaluate(cases, queries, args.k, args.rerank, [None, 'float16', 'int8'])
+    result = {'source': source, 'num_queries': len(queries), 'reports': reports}
+
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.output:
+        output_path = Path(args.output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
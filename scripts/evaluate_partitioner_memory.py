@@ -0,0 +1,186 @@
+"""
+VerilogPartitioner网表内存评估脚本
+对比紧凑网表模型（__slots__对象、符号表ID数组）与原dataclass模型（名称字符串、
+connected_instances列表、逐实例connections字典）的内存占用，输出JSON报告
+
+用法：
+    # 评估ISPD2015设计（需已有K-SpecPart分区结果）
+    python scripts/evaluate_partitioner_memory.py \
+        --design-dir data/ispd2015/mgc_fft_1 --kspecpart-dir results/kspecpart/mgc_fft_1 --partitions 4
+
+    # 使用合成网表评估大规模场景
+    python scripts/evaluate_partitioner_memory.py --synthetic 1000000 --partitions 16
+"""
+
+import gc
+import sys
+import json
+import time
+import random
+import argparse
+import logging
+import tempfile
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.utils.netlist_reader import read_netlist
+from src.utils.verilog_partitioner import VerilogPartitioner
+
+
+@dataclass
+class _LegacyNet:
+    """原网表模型中的net"""
+    name: str
+    width: int = 1
+    is_vector: bool = False
+    connected_instances: List[str] = None
+
+
+@dataclass
+class _LegacyInstance:
+    """原网表模型中的实例"""
+    name: str
+    module_type: str
+    connections: Dict[str, str]
+
+
+def write_synthetic_design(output_dir: Path, num_instances: int, num_partitions: int, seed: int = 0):
+    """生成合成门级网表及对应的分区结果（.part.K + .mapping.json）"""
+    rng = random.Random(seed)
+    num_wires = max(16, num_instances // 2)
+    cells = [('NAND2_X1', ('A1', 'A2'), 'ZN'), ('AOI21_X1', ('A', 'B1', 'B2'), 'ZN'), ('DFF_X1', ('D', 'CK'), 'Q')]
+    with open(output_dir / 'design.v', 'w') as f:
+        f.write("module top (clk, din, dout);\n  input clk;\n  input [31:0] din;\n  output [31:0] dout;\n")
+        for i in range(num_wires):
+            f.write(f"  wire n{i};\n")
+        for i in range(num_instances):
+            cell, inputs, output = cells[i % len(cells)]
+            pins = [f".{pin}(n{rng.randrange(num_wires)})" for pin in inputs]
+            if cell == 'DFF_X1':
+                pins[1] = ".CK(clk)"
+            elif i % 50 == 0:
+                pins[0] = f".{inputs[0]}(din[{rng.randrange(32)}])"
+            target = f"dout[{i % 32}]" if i % 1000 == 0 else f"n{rng.randrange(num_wires)}"
+            pins.append(f".{output}({target})")
+            f.write(f"  {cell} u{i} ( {', '.join(pins)} );\n")
+        f.write("endmodule\n")
+    mapping = {'vertex_to_id': {f"u{i}": i + 1 for i in range(num_instances)}}
+    with open(output_dir / 'design.mapping.json', 'w') as f:
+        json.dump(mapping, f)
+    with open(output_dir / f'design.part.{num_partitions}', 'w') as f:
+        for i in range(num_instances):
+            f.write(f"{i * num_partitions // num_instances}\n")
+
+
+def legacy_model(partitioner: VerilogPartitioner):
+    """由紧凑模型还原原dataclass模型（instances, nets）"""
+    instances = {
+        name: _LegacyInstance(name, inst.module_type, inst.connections)
+        for name, inst in partitioner.instances.items()
+    }
+    nets = {
+        name: _LegacyNet(name, net.width, net.is_vector, net.connected_instances)
+        for name, net in partitioner.nets.items()
+    }
+    return instances, nets
+
+
+def measure(design_v: Path, part_file: Path, mapping_file: Path) -> Dict:
+    """测量单个设计的网表模型内存"""
+    # 预先读取网表（读取器缓存不计入模型内存）
+    read_netlist(design_v)
+    partitioner = VerilogPartitioner(design_v, part_file, mapping_file)
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    partitioner._parse_design_netlist()
+    parse_seconds = time.perf_counter() - start
+    compact_bytes = tracemalloc.get_traced_memory()[0]
+    partitioner._parse_kspecpart_result()
+    partitioner._identify_boundary_nets()
+    compact_total, compact_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    gc.collect()
+    tracemalloc.start()
+    legacy = legacy_model(partitioner)
+    legacy_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del legacy
+
+    # 两种模型的名称字符串均引用读取器解析结果中的字符串，不计入模型内存
+    return {
+        'design': str(design_v),
+        'num_instances': len(partitioner.instances),
+        'num_nets': len(partitioner.nets),
+        'num_boundary_nets': len(partitioner.boundary_nets),
+        'parse_seconds': parse_seconds,
+        'compact_model_mb': compact_bytes / 2 ** 20,
+        'legacy_model_mb': legacy_bytes / 2 ** 20,
+        'reduction': 1 - compact_bytes / legacy_bytes if legacy_bytes else None,
+        'compact_with_partition_analysis_mb': compact_total / 2 ** 20,
+        'compact_peak_mb': compact_peak / 2 ** 20,
+    }
+
+
+def find_partition_files(kspecpart_dir: Path, num_partitions: int):
+    """查找K-SpecPart分区文件与映射文件"""
+    part_files = sorted(kspecpart_dir.glob(f"*.part.{num_partitions}"))
+    mapping_files = sorted(kspecpart_dir.glob("*.mapping.json"))
+    if not part_files or not mapping_files:
+        raise FileNotFoundError(f"{kspecpart_dir} 中缺少 .part.{num_partitions} 或 .mapping.json")
+    return part_files[0], mapping_files[0]
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='评估VerilogPartitioner网表模型的内存占用')
+    parser.add_argument('--design-dir', type=str, default=None,
+                       help='设计目录（包含design.v）')
+    parser.add_argument('--kspecpart-dir', type=str, default=None,
+                       help='K-SpecPart结果目录（包含.part.K, .mapping.json），默认与设计目录相同')
+    parser.add_argument('--synthetic', type=int, default=None,
+                       help='使用指定实例数的合成网表代替设计')
+    parser.add_argument('--partitions', type=int, default=4,
+                       help='分区数量')
+    parser.add_argument('--output', type=str, default=None,
+                       help='报告输出路径（JSON）')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    if args.synthetic:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmpdir = Path(tmpdir)
+            write_synthetic_design(tmpdir, args.synthetic, args.partitions)
+            report = measure(
+                tmpdir / 'design.v',
+                tmpdir / f'design.part.{args.partitions}',
+                tmpdir / 'design.mapping.json'
+            )
+            report['design'] = f"synthetic({args.synthetic})"
+    elif args.design_dir:
+        design_dir = Path(args.design_dir)
+        kspecpart_dir = Path(args.kspecpart_dir) if args.kspecpart_dir else design_dir
+        part_file, mapping_file = find_partition_files(kspecpart_dir, args.partitions)
+        report = measure(design_dir / 'design.v', part_file, mapping_file)
+    else:
+        print("错误：必须指定 --design-dir 或 --synthetic")
+        return
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        output_path = Path(args.output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
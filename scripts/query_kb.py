@@ -14,6 +14,7 @@ project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
 from src.knowledge_base import KnowledgeBase
+from src.retrieval_daemon import connect_retriever
 import yaml
 
 
@@ -175,20 +176,11 @@ def delete_case(kb_file: str, design_id: str):
     kb = KnowledgeBase(kb_file)
     kb.load()
     
-    if design_id not in kb._case_index:
+    # 删除案例
+    if not kb.remove_case(design_id):
         print(f"错误：未找到设计 {design_id}")
         return False
     
-    # 删除案例
-    idx = kb._case_index[design_id]
-    del kb.cases[idx]
-    
-    # 重建索引
-    kb._case_index = {
-        case['design_id']: i 
-        for i, case in enumerate(kb.cases)
-    }
-    
     print(f"删除案例: {design_id}")
     
     # 保存
@@ -227,6 +219,40 @@ def export_case(kb_file: str, design_id: str, output_file: str):
     return True
 
 
+def similar_cases(config: Dict[str, Any], kb_file: str, design_id: str, socket_path: Optional[str] = None):
+    """
+    检索与指定案例相似的案例（优先通过检索守护进程，不可用时进程内检索）
+    
+    Args:
+        config: 配置字典
+        kb_file: 知识库文件路径
+        design_id: 设计ID
+        socket_path: 检索守护进程套接字路径（默认使用配置）
+    """
+    retriever = connect_retriever(config, socket_path, kb_file)
+    case = retriever.get_case(design_id)
+    if not case:
+        print(f"错误：未找到设计 {design_id}")
+        return False
+    
+    metrics = case.get('quality_metrics', {})
+    query_text = f"Design: {design_id}"
+    if 'num_modules' in metrics:
+        query_text += f" Modules: {metrics['num_modules']}"
+    results = retriever.retrieve(
+        case['features'], query_text=query_text, design_scale=metrics.get('num_modules')
+    )
+    retriever.close()
+    
+    print(f"与 {design_id} 相似的案例（共 {len(results)} 个）:")
+    print("-" * 60)
+    for i, result in enumerate(results, 1):
+        result_metrics = result.get('quality_metrics', {})
+        print(f"{i:3d}. {result.get('design_id', 'unknown'):30s} | "
+              f"模块: {str(result_metrics.get('num_modules', 'N/A')):>6s}")
+    return True
+
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(description='知识库查询和修改工具')
@@ -244,11 +270,16 @@ def main():
                        help='删除指定设计案例')
     parser.add_argument('--export', type=str, nargs=2, metavar=('DESIGN_ID', 'OUTPUT_FILE'),
                        help='导出指定设计案例到文件')
+    parser.add_argument('--similar', type=str, metavar='DESIGN_ID',
+                       help='检索与指定设计相似的案例（优先使用检索守护进程）')
+    parser.add_argument('--socket', type=str, default=None,
+                       help='检索守护进程套接字路径（覆盖配置文件）')
     
     args = parser.parse_args()
     
     # 加载配置
     config_path = Path(args.config)
+    config = {}
     if config_path.exists():
         with open(config_path, 'r') as f:
             config = yaml.safe_load(f)
@@ -273,6 +304,8 @@ def main():
     elif args.export:
         design_id, output_file = args.export
         export_case(kb_file, design_id, output_file)
+    elif args.similar:
+        similar_cases(config, kb_file, args.similar, args.socket)
     else:
         query_kb(kb_file, args.query, args.details)
 
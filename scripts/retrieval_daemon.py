@@ -0,0 +1,72 @@
+"""
+检索守护进程启动脚本
+加载嵌入模型、知识库矩阵和ANN索引后常驻，通过Unix域套接字为其他进程提供RAG检索，
+避免每个脚本重复加载模型和知识库
+
+用法：
+    # 前台启动（Ctrl+C 停止）
+    python scripts/retrieval_daemon.py --config configs/default.yaml
+
+    # 指定知识库和套接字
+    python scripts/retrieval_daemon.py --kb-file data/knowledge_base/kb_cases.db --socket /tmp/chipmas_rag.sock
+
+客户端（守护进程不可用时自动回退到进程内检索）：
+    from src.retrieval_daemon import connect_retriever
+    retriever = connect_retriever(config)
+    results = retriever.retrieve(query_features, query_text="Design: ...")
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import yaml
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.retrieval_daemon import RetrievalServer, build_retriever
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='RAG检索守护进程')
+    parser.add_argument('--config', type=str, default='configs/default.yaml',
+                       help='配置文件路径')
+    parser.add_argument('--kb-file', type=str, default=None,
+                       help='知识库文件路径（覆盖配置文件）')
+    parser.add_argument('--socket', type=str, default=None,
+                       help='Unix域套接字路径（覆盖配置文件中的rag.daemon_socket）')
+    parser.add_argument('--max-batch', type=int, default=256,
+                       help='一次合并执行的最大查询数')
+    parser.add_argument('--batch-window-ms', type=float, default=2.0,
+                       help='合并请求的等待窗口（毫秒）')
+
+    args = parser.parse_args()
+
+    config = {}
+    config_path = Path(args.config)
+    if config_path.exists():
+        with open(config_path, 'r') as f:
+            config = yaml.safe_load(f) or {}
+    socket_path = args.socket or config.get('rag', {}).get(
+        'daemon_socket', 'data/knowledge_base/retrieval.sock'
+    )
+
+    start = time.perf_counter()
+    retriever = build_retriever(config, args.kb_file)
+    print(f"✓ 检索器加载完成 ({time.perf_counter() - start:.1f}s)")
+
+    server = RetrievalServer(
+        retriever,
+        socket_path,
+        max_batch=args.max_batch,
+        batch_window=args.batch_window_ms / 1000.0
+    )
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -19,6 +19,8 @@ import math
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
+from src.knowledge_base import KnowledgeBase
+
 
 def load_existing_kb(kb_path: Path) -> dict:
     """加载现有知识库"""
@@ -74,15 +76,11 @@ def calculate_design_features(result: dict) -> list:
     return features
 
 
-def update_case_in_kb(kb: dict, design_id: str, result: dict) -> bool:
+def update_case_in_kb(kb: KnowledgeBase, design_id: str, result: dict) -> bool:
     """更新知识库中的案例，或添加新案例"""
     
     # 查找是否已存在该设计
-    existing_idx = None
-    for idx, case in enumerate(kb['cases']):
-        if case.get('design_id') == design_id:
-            existing_idx = idx
-            break
+    existing_case = kb.get_case(design_id)
     
     # 准备新的质量指标
     quality_metrics = {
@@ -101,11 +99,12 @@ def update_case_in_kb(kb: dict, design_id: str, result: dict) -> bool:
         "timestamp": result.get('timestamp')
     }
     
-    if existing_idx is not None:
+    if existing_case is not None:
         # 更新现有案例
-        kb['cases'][existing_idx]['quality_metrics'].update(quality_metrics)
-        kb['cases'][existing_idx]['features'] = calculate_design_features(result)
-        kb['cases'][existing_idx]['timestamp'] = datetime.now().isoformat()
+        existing_case.setdefault('quality_metrics', {}).update(quality_metrics)
+        existing_case['features'] = calculate_design_features(result)
+        existing_case['timestamp'] = datetime.now().isoformat()
+        kb.add_case(existing_case)
         return True
     else:
         # 添加新案例
@@ -118,7 +117,7 @@ def update_case_in_kb(kb: dict, design_id: str, result: dict) -> bool:
             "timestamp": datetime.now().isoformat(),
             "embedding": [0.0] * 128  # 占位符，后续可用真实embedding
         }
-        kb['cases'].append(new_case)
+        kb.add_case(new_case)
         return False
 
 
@@ -133,9 +132,11 @@ def main():
     print()
     
     # 1. 加载现有知识库
+    # 通过KnowledgeBase保存：按design_id合并并原子替换，不会覆盖并行实验同时写入的案例
     print(f"📖 加载现有知识库: {kb_path}")
-    kb = load_existing_kb(kb_path)
-    original_count = len(kb['cases'])
+    kb = KnowledgeBase(str(kb_path))
+    kb.load()
+    original_count = kb.size()
     print(f"   原有案例数: {original_count}")
     print()
     
@@ -163,20 +164,15 @@ def main():
             print(f"      运行时间: {result.get('runtime_seconds'):.1f}s")
             added_count += 1
     
-    # 4. 更新元数据
-    kb['num_cases'] = len(kb['cases'])
-    kb['last_updated'] = datetime.now().isoformat()
-    kb['exp_002_integrated'] = True
-    
     print()
     print(f"📝 更新统计:")
     print(f"   原有案例: {original_count}")
     print(f"   更新案例: {updated_count}")
     print(f"   新增案例: {added_count}")
-    print(f"   最终案例数: {kb['num_cases']}")
+    print(f"   最终案例数: {kb.size()}")
     print()
     
-    # 5. 保存更新后的知识库
+    # 4. 保存更新后的知识库
     # 先备份原有知识库
     if kb_path.exists():
         backup_path = kb_path.parent / f"kb_cases_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
@@ -185,8 +181,9 @@ def main():
             json.dump(load_existing_kb(kb_path), f, indent=2)
     
     print(f"💾 保存更新后的知识库: {kb_path}")
-    with open(kb_path, 'w') as f:
-        json.dump(kb, f, indent=2)
+    if not kb.save():
+        print("❌ 保存知识库失败")
+        return
     
     print()
     print("=" * 80)
@@ -194,7 +191,7 @@ def main():
     print("=" * 80)
     print()
     print("📊 知识库统计:")
-    print(f"   - 总案例数: {kb['num_cases']}")
+    print(f"   - 总案例数: {kb.size()}")
     print(f"   - OpenROAD完整数据: {len(results)} 个设计")
     print(f"   - 文件大小: {kb_path.stat().st_size / 1024:.1f} KB")
     print()
@@ -5,26 +5,395 @@
 
 import json
 import os
+import time
 import numpy as np
-from typing import Dict, List, Optional, Any
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Any, Tuple, Union
 from pathlib import Path
 
+from .utils.ann_index import VectorIndex, create_index
+from .utils.kb_eviction import (
+    RETRIEVAL_STATS_FIELD, EvictionPolicy, case_retrieval_stats, create_eviction_policy
+)
+from .utils.kb_storage import (
+    CaseStore, as_flat_vector, merge_case_payload, open_case_store, split_case_payload
+)
+
+
+def _as_vector(value: Any) -> Optional[np.ndarray]:
+    """将案例中的向量字段转换为一维float32数组，无效时返回None"""
+    if value is None:
+        return None
+    try:
+        vector = np.asarray(value, dtype=np.float32).reshape(-1)
+    except (TypeError, ValueError):
+        return None
+    if vector.size == 0:
+        return None
+    return vector
+
+
+def _case_scale(case: Dict[str, Any]) -> Optional[float]:
+    """读取案例的规模（quality_metrics.num_modules），缺失或非数值时返回None"""
+    metrics = case.get('quality_metrics')
+    if not isinstance(metrics, dict):
+        return None
+    value = metrics.get('num_modules')
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return value
+
+
+# 向量矩阵支持的存储精度（int8为按行缩放的对称量化）
+_QUANTIZATION_DTYPES = {None: np.float32, 'float16': np.float16, 'int8': np.int8}
+
+
+class _VectorMatrix:
+    """
+    按行存储的预归一化向量矩阵
+    
+    第i行对应知识库中的第i个案例；缺失或维度不一致的向量对应行置零，
+    并在mask中标记为无效。容量按倍数增长，add_case时只写入一行。
+    quantization为'float16'/'int8'时以低精度存储，读取时反量化为float32。
+    """
+    
+    def __init__(self, quantization: Optional[str] = None):
+        if quantization not in _QUANTIZATION_DTYPES:
+            raise ValueError(f"不支持的量化类型: {quantization}")
+        self.quantization = quantization
+        self._dtype = _QUANTIZATION_DTYPES[quantization]
+        self.dim: Optional[int] = None
+        self.num_rows = 0
+        self._data = np.zeros((0, 0), dtype=self._dtype)
+        self._scales = np.zeros(0, dtype=np.float32)  # int8每行的缩放系数
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._valid = np.zeros(0, dtype=bool)
+    
+    def reset(self, vectors: List[Optional[np.ndarray]]):
+        """根据向量列表整体重建矩阵（维度取出现次数最多的维度）"""
+        dims = Counter(v.size for v in vectors if v is not None)
+        self.dim = dims.most_common(1)[0][0] if dims else None
+        self.num_rows = 0
+        capacity = max(len(vectors), 16)
+        self._data = np.zeros((capacity, self.dim or 0), dtype=self._dtype)
+        self._scales = np.zeros(capacity, dtype=np.float32)
+        self._norms = np.zeros(capacity, dtype=np.float32)
+        self._valid = np.zeros(capacity, dtype=bool)
+        for vector in vectors:
+            self.append(vector)
+    
+    def append(self, vector: Optional[np.ndarray]):
+        """追加一行"""
+        if self.num_rows >= len(self._valid):
+            self._grow(max(16, 2 * len(self._valid)))
+        self.num_rows += 1
+        self.set(self.num_rows - 1, vector)
+    
+    def set(self, row: int, vector: Optional[np.ndarray]):
+        """写入指定行（归一化后存储）"""
+        if vector is not None and self.dim is None:
+            self.dim = vector.size
+            self._data = np.zeros((len(self._valid), self.dim), dtype=self._dtype)
+        if vector is None or vector.size != self.dim:
+            self._data[row] = 0
+            self._scales[row] = 0.0
+            self._norms[row] = 0.0
+            self._valid[row] = False
+            return
+        norm = float(np.linalg.norm(vector))
+        normalized = vector / norm if norm > 0 else vector
+        if self.quantization == 'int8':
+            scale = float(np.abs(normalized).max()) / 127.0
+            self._scales[row] = scale
+            self._data[row] = np.rint(normalized / scale) if scale > 0 else 0
+        else:
+            self._data[row] = normalized
+        self._norms[row] = norm
+        self._valid[row] = True
+    
+    def swap_remove(self, row: int):
+        """删除指定行：最后一行移入该位置（O(dim)）"""
+        last = self.num_rows - 1
+        if row != last:
+            self._data[row] = self._data[last]
+            self._scales[row] = self._scales[last]
+            self._norms[row] = self._norms[last]
+            self._valid[row] = self._valid[last]
+        self._valid[last] = False
+        self.num_rows -= 1
+    
+    def _grow(self, capacity: int):
+        data = np.zeros((capacity, self.dim or 0), dtype=self._dtype)
+        data[:self.num_rows] = self._data[:self.num_rows]
+        scales = np.zeros(capacity, dtype=np.float32)
+        scales[:self.num_rows] = self._scales[:self.num_rows]
+        norms = np.zeros(capacity, dtype=np.float32)
+        norms[:self.num_rows] = self._norms[:self.num_rows]
+        valid = np.zeros(capacity, dtype=bool)
+        valid[:self.num_rows] = self._valid[:self.num_rows]
+        self._data, self._scales, self._norms, self._valid = data, scales, norms, valid
+    
+    def take(self, rows: Any) -> np.ndarray:
+        """读取指定行的归一化向量（float32，量化存储时只反量化这些行）"""
+        data = self._data[:self.num_rows][rows]
+        if self.quantization is None:
+            return data
+        data = data.astype(np.float32)
+        if self.quantization == 'int8':
+            data *= self._scales[:self.num_rows][rows][..., None]
+        return data
+    
+    def dot(self, query: np.ndarray, rows: Any = None, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        指定行（None为全部行）的归一化向量与query的内积
+        
+        量化存储时先按存储精度取出这些行再乘缩放系数，不构造反量化矩阵；
+        out为预分配的float32输出缓冲区
+        """
+        data = self._data[:self.num_rows]
+        if rows is not None:
+            data = data[rows]
+        if self.quantization is not None:
+            data = data.astype(np.float32)
+        scores = np.matmul(data, query, out=out)
+        if self.quantization == 'int8':
+            scales = self._scales[:self.num_rows]
+            scores *= scales if rows is None else scales[rows]
+        return scores
+    
+    @property
+    def matrix(self) -> np.ndarray:
+        """只读的归一化矩阵视图 (num_rows, dim)；量化存储时为反量化后的副本"""
+        view = self._data[:self.num_rows] if self.quantization is None else self.take(slice(None))
+        view.flags.writeable = False
+        return view
+    
+    @property
+    def mask(self) -> np.ndarray:
+        """只读的有效行标记 (num_rows,)"""
+        view = self._valid[:self.num_rows]
+        view.flags.writeable = False
+        return view
+    
+    @property
+    def nbytes(self) -> int:
+        """有效行占用的内存（字节）"""
+        per_row = (self.dim or 0) * np.dtype(self._dtype).itemsize + 4 + 1
+        if self.quantization == 'int8':
+            per_row += 4
+        return per_row * self.num_rows
+    
+    def raw(self) -> np.ndarray:
+        """还原未归一化的有效行（保持原有get_*_matrix语义）"""
+        valid = self._valid[:self.num_rows]
+        if self.dim is None or not valid.any():
+            return np.array([])
+        data = self.take(valid)
+        return data * self._norms[:self.num_rows][valid, None]
+
+
+class _CaseVectors:
+    """
+    按行存储的案例原始向量（从案例字典中移出，避免每个元素一个Python float）
+    
+    从sqlite加载的向量只记录在内存映射旁路文件中的偏移；新增/更新的向量追加到
+    内存缓冲区（偏移从len(base)开始），缓冲区中失效数据多于有效数据时整理。
+    position为字段在案例字典中的下标，还原完整案例时插回原位置。
+    """
+    
+    def __init__(self, dtype):
+        self.dtype = dtype
+        self.clear()
+    
+    def clear(self):
+        """清空所有行"""
+        self.num_rows = 0
+        self._base = np.zeros(0, dtype=self.dtype)
+        self._buffer = np.zeros(0, dtype=self.dtype)
+        self._used = 0  # 缓冲区已写入的元素数
+        self._live = 0  # 缓冲区中仍被引用的元素数
+        self._offsets = np.zeros(16, dtype=np.int64)
+        self._lengths = np.full(16, -1, dtype=np.int64)  # -1表示该行没有向量
+        self._positions = np.zeros(16, dtype=np.int64)
+    
+    def reset(self, base: np.ndarray, offsets: np.ndarray, lengths: np.ndarray, positions: np.ndarray):
+        """以基础数组（通常为内存映射）中的向量整体重建"""
+        self.clear()
+        self._base = base
+        self._grow(max(16, len(offsets)))
+        self.num_rows = len(offsets)
+        self._offsets[:self.num_rows] = offsets
+        self._lengths[:self.num_rows] = lengths
+        self._positions[:self.num_rows] = positions
+    
+    def append(self, vector: Optional[np.ndarray], position: int = 0):
+        """追加一行"""
+        if self.num_rows >= len(self._lengths):
+            self._grow(2 * len(self._lengths))
+        self.num_rows += 1
+        self._lengths[self.num_rows - 1] = -1
+        self.set(self.num_rows - 1, vector, position)
+    
+    def set(self, row: int, vector: Optional[np.ndarray], position: int = 0):
+        """写入指定行（vector为None时清除）"""
+        self._release(row)
+        if vector is None:
+            return
+        size = vector.size
+        if self._used + size > len(self._buffer):
+            self._compact(size)
+        self._buffer[self._used:self._used + size] = vector
+        self._offsets[row] = len(self._base) + self._used
+        self._lengths[row] = size
+        self._positions[row] = position
+        self._used += size
+        self._live += size
+    
+    def swap_remove(self, row: int):
+        """删除指定行：最后一行移入该位置"""
+        self._release(row)
+        last = self.num_rows - 1
+        if row != last:
+            self._offsets[row] = self._offsets[last]
+            self._lengths[row] = self._lengths[last]
+            self._positions[row] = self._positions[last]
+        self._lengths[last] = -1
+        self.num_rows -= 1
+    
+    def get(self, row: int) -> Optional[np.ndarray]:
+        """指定行的向量（只读视图），没有时返回None"""
+        length = self._lengths[row]
+        if length < 0:
+            return None
+        offset = self._offsets[row]
+        if offset < len(self._base):
+            return self._base[offset:offset + length]
+        view = self._buffer[offset - len(self._base):offset - len(self._base) + length]
+        view.flags.writeable = False
+        return view
+    
+    def position(self, row: int) -> int:
+        """字段在案例字典中的下标"""
+        return int(self._positions[row])
+    
+    def gather(self, rows: np.ndarray, dim: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        按行读取维度为dim的向量（float32）
+        
+        Returns:
+            (matrix, valid)：没有向量或维度不同的行为零向量，valid为False
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        offsets = self._offsets[rows]
+        valid = self._lengths[rows] == dim
+        matrix = np.zeros((len(rows), dim), dtype=np.float32)
+        columns = np.arange(dim)
+        in_base = valid & (offsets < len(self._base))
+        in_buffer = valid & ~in_base
+        if in_base.any():
+            matrix[in_base] = self._base[offsets[in_base, None] + columns]
+        if in_buffer.any():
+            matrix[in_buffer] = self._buffer[offsets[in_buffer, None] - len(self._base) + columns]
+        return matrix, valid
+    
+    def _release(self, row: int):
+        if self._lengths[row] >= 0 and self._offsets[row] >= len(self._base):
+            self._live -= int(self._lengths[row])
+        self._lengths[row] = -1
+    
+    def _grow(self, capacity: int):
+        for name, fill in (('_offsets', 0), ('_lengths', -1), ('_positions', 0)):
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=np.int64)
+            new[:len(old)] = old
+            setattr(self, name, new)
+    
+    def _compact(self, extra: int):
+        """只保留仍被引用的缓冲区数据，容量为有效数据的两倍"""
+        capacity = max(1024, 2 * (self._live + extra))
+        buffer = np.empty(capacity, dtype=self.dtype)
+        used = 0
+        split = len(self._base)
+        lengths = self._lengths[:self.num_rows]
+        for row in np.flatnonzero((lengths >= 0) & (self._offsets[:self.num_rows] >= split)):
+            start = self._offsets[row] - split
+            length = self._lengths[row]
+            buffer[used:used + length] = self._buffer[start:start + length]
+            self._offsets[row] = split + used
+            used += length
+        self._buffer, self._used = buffer, used
+
 
 class KnowledgeBase:
     """知识库管理类"""
     
-    def __init__(self, case_file: str, max_cases: int = 1000):
+    def __init__(
+        self,
+        case_file: str,
+        max_cases: int = 1000,
+        ann_backend: Optional[str] = None,
+        ann_params: Optional[Dict[str, Any]] = None,
+        storage: Optional[str] = None,
+        eviction_policy: Union[str, EvictionPolicy] = 'fifo',
+        eviction_params: Optional[Dict[str, Any]] = None,
+        payload_cache_size: int = 256,
+        embedding_quantization: Optional[str] = None
+    ):
         """
         初始化知识库
         
         Args:
             case_file: 知识库文件路径
             max_cases: 最大案例数量
+            ann_backend: 近似最近邻索引类型（None表示不建索引，'flat'/'ivf'/'faiss'）
+            ann_params: 传给索引构造函数的参数（如nlist、nprobe）
+            storage: 存储后端（'json'/'sqlite'；None时按文件扩展名判断，.db为sqlite）
+            eviction_policy: 超过max_cases时的淘汰策略（'fifo'/'lru'/'utility'或策略实例）
+            eviction_params: 传给淘汰策略构造函数的参数（如hit_weight、quality_weight）
+            payload_cache_size: 内存中缓存的案例大字段数量（仅sqlite后端按需加载大字段）
+            embedding_quantization: 嵌入矩阵的存储精度（None为float32，'float16'或'int8'）
         """
         self.case_file = Path(case_file)
         self.max_cases = max_cases
         self.cases: List[Dict[str, Any]] = []
         self._case_index: Dict[str, int] = {}  # design_id -> index
+        # 持久化存储及自上次保存以来的修改（增量提交）
+        self._store: CaseStore = open_case_store(str(self.case_file), storage)
+        self._dirty: Dict[str, None] = {}  # 新增/修改的design_id（保持顺序）
+        self._removed: set = set()  # 删除的design_id
+        # sqlite后端：self.cases只保存精简记录，大字段在get_case()时按需读取
+        self._lazy = self._store.lazy_payloads
+        self.payload_cache_size = payload_cache_size
+        self._pending_payloads: Dict[str, Optional[Dict[str, Any]]] = {}  # 未保存案例的大字段
+        self._payload_cache: 'OrderedDict[str, Optional[Dict[str, Any]]]' = OrderedDict()
+        # 淘汰策略（按design_id记录加入顺序/检索命中/质量）
+        if isinstance(eviction_policy, EvictionPolicy):
+            self._eviction = eviction_policy
+        else:
+            self._eviction = create_eviction_policy(eviction_policy, **(eviction_params or {}))
+        # 预归一化的特征/嵌入矩阵，第i行对应self.cases[i]（删除时末行移入空位）
+        self._features = _VectorMatrix()
+        self._embeddings = _VectorMatrix(embedding_quantization)
+        # 从案例字典中移出的原始向量（field -> 存储）：sqlite后端留在内存映射中；
+        # 嵌入量化时全精度嵌入以float32保存，供重排序使用，不再以列表留在案例中
+        self._vectors: Dict[str, _CaseVectors] = {}
+        if self._lazy:
+            self._vectors['features'] = _CaseVectors(np.float64)
+        if self._lazy or embedding_quantization is not None:
+            self._vectors['embedding'] = _CaseVectors(np.float32)
+        # ANN索引使用稳定的整数key（行号会随删除变化）
+        self.ann_backend = ann_backend
+        self.ann_params = ann_params or {}
+        self._ann: Dict[str, VectorIndex] = {}
+        self._row_keys: List[int] = []  # row -> key
+        self._key_rows: Dict[int, int] = {}  # key -> row
+        self._next_key = 0
+        # 粗粒度筛选用的二级索引（按key记录）
+        self._scale_index: List[Tuple[float, int]] = []  # 按(num_modules, key)排序
+        self._type_index: Dict[Any, set] = {}  # design_type -> {key}
+        self._indexed_attrs: Dict[int, Tuple[Optional[float], Any]] = {}  # key -> (规模, 类型)
+        self._row_scales: Optional[np.ndarray] = None  # 按行的规模（缺失为NaN），二级索引变化时失效
         
     def load(self) -> bool:
         """
@@ -33,27 +402,258 @@ class KnowledgeBase:
         Returns:
             是否成功加载
         """
-        if not self.case_file.exists():
+        self._dirty = {}
+        self._removed = set()
+        self._pending_payloads = {}
+        self._payload_cache.clear()
+        if not self._store.exists():
             # 如果文件不存在，创建空知识库
             self.cases = []
+            self._reset_vectors(None)
+            self._rebuild_index()
             return True
             
         try:
-            with open(self.case_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.cases = data.get('cases', [])
+            self.cases, vectors = self._store.load_records()
+            self._reset_vectors(vectors)
                 
-            # 构建索引
-            self._case_index = {
-                case['design_id']: i 
-                for i, case in enumerate(self.cases)
-            }
+            # 构建索引和矩阵
+            self._rebuild_index()
+            if self.ann_backend is not None and not self._load_ann():
+                self._rebuild_ann()
             
             return True
         except Exception as e:
             print(f"加载知识库失败: {e}")
             self.cases = []
+            self._reset_vectors(None)
+            self._rebuild_index()
+            return False
+    
+    def _reset_vectors(self, vectors: Optional[Dict[str, Tuple]]):
+        """根据存储返回的向量偏移（或self.cases中的向量字段）重建移出的原始向量"""
+        if vectors is not None:
+            for field, store in self._vectors.items():
+                store.reset(*vectors[field])
+            return
+        for store in self._vectors.values():
+            store.clear()
+        for i, case in enumerate(self.cases):
+            self.cases[i], detached = self._detach(case)
+            for field, store in self._vectors.items():
+                store.append(*detached.get(field, (None,)))
+    
+    def _detach(self, case: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Tuple[np.ndarray, int]]]:
+        """
+        从案例中移出需要单独存储的向量字段（不修改传入的字典）
+        
+        Returns:
+            (case, detached)：detached[字段] = (向量, 字段在案例字典中的下标)
+        """
+        detached = {}
+        for field, store in self._vectors.items():
+            vector = as_flat_vector(case.get(field), store.dtype)
+            if vector is None:
+                continue
+            if not detached:
+                case = dict(case)
+            detached[field] = (vector, list(case).index(field))
+            del case[field]
+        return case, detached
+    
+    def _attach(self, row: int) -> Dict[str, Any]:
+        """还原第row个案例的向量字段（按移出时的逆序插回原位置）"""
+        case = self.cases[row]
+        items = None
+        for field, store in reversed(list(self._vectors.items())):
+            vector = store.get(row)
+            if vector is None:
+                continue
+            items = list(case.items()) if items is None else items
+            items.insert(store.position(row), (field, vector.tolist()))
+        return case if items is None else dict(items)
+    
+    def _rebuild_index(self):
+        """根据self.cases重建design_id索引和特征/嵌入矩阵"""
+        self._case_index = {
+            case['design_id']: i 
+            for i, case in enumerate(self.cases)
+        }
+        self._features.reset([self.get_case_vector(row, 'features') for row in range(len(self.cases))])
+        self._embeddings.reset([self.get_case_vector(row, 'embedding') for row in range(len(self.cases))])
+        self._row_keys = list(range(len(self.cases)))
+        self._key_rows = {key: key for key in self._row_keys}
+        self._next_key = len(self.cases)
+        self._ann = {}
+        self._rebuild_secondary_index()
+        self._eviction.reset(self.cases)
+    
+    def _rebuild_secondary_index(self):
+        """重建规模/类型二级索引"""
+        self._row_scales = None
+        self._indexed_attrs = {
+            key: (_case_scale(case), case.get('design_type'))
+            for case, key in zip(self.cases, self._row_keys)
+        }
+        self._scale_index = sorted(
+            (scale, key) for key, (scale, _) in self._indexed_attrs.items()
+            if scale is not None
+        )
+        self._type_index = {}
+        for key, (_, design_type) in self._indexed_attrs.items():
+            if design_type is not None:
+                self._type_index.setdefault(design_type, set()).add(key)
+    
+    def _index_case(self, case: Dict[str, Any], key: int):
+        """将案例加入二级索引"""
+        scale, design_type = _case_scale(case), case.get('design_type')
+        self._row_scales = None
+        # 记录建索引时的取值，案例字典被原地修改后仍能正确移除
+        self._indexed_attrs[key] = (scale, design_type)
+        if scale is not None:
+            insort(self._scale_index, (scale, key))
+        if design_type is not None:
+            self._type_index.setdefault(design_type, set()).add(key)
+    
+    def _unindex_key(self, key: int):
+        """将案例从二级索引中移除"""
+        scale, design_type = self._indexed_attrs.pop(key, (None, None))
+        self._row_scales = None
+        if scale is not None:
+            pos = bisect_left(self._scale_index, (scale, key))
+            if pos < len(self._scale_index) and self._scale_index[pos] == (scale, key):
+                del self._scale_index[pos]
+        bucket = self._type_index.get(design_type)
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self._type_index[design_type]
+    
+    def _vector_matrix(self, kind: str) -> '_VectorMatrix':
+        if kind == 'features':
+            return self._features
+        if kind == 'embeddings':
+            return self._embeddings
+        raise ValueError(f"未知的向量类型: {kind}")
+    
+    def _ann_file(self, kind: str) -> Path:
+        """ANN索引文件路径（与kb_cases.json同目录）"""
+        return self.case_file.with_name(f"{self.case_file.stem}.{kind}.ann")
+    
+    def _ann_meta_file(self) -> Path:
+        return self.case_file.with_name(f"{self.case_file.stem}.ann.json")
+    
+    def _rebuild_ann(self):
+        """根据当前矩阵重建ANN索引"""
+        self._ann = {}
+        if self.ann_backend is None:
+            return
+        for kind in ('features', 'embeddings'):
+            matrix = self._vector_matrix(kind)
+            if matrix.dim is None:
+                continue
+            index = create_index(self.ann_backend, matrix.dim, **self.ann_params)
+            rows = np.flatnonzero(matrix.mask)
+            if len(rows) > 0:
+                index.add(np.asarray(self._row_keys, dtype=np.int64)[rows], matrix.take(rows))
+            self._ann[kind] = index
+    
+    def _ann_set_row(self, row: int):
+        """将某一行的最新向量同步到ANN索引"""
+        if self.ann_backend is None:
+            return
+        key = self._row_keys[row]
+        for kind in ('features', 'embeddings'):
+            matrix = self._vector_matrix(kind)
+            if kind not in self._ann:
+                if matrix.dim is None:
+                    continue
+                self._ann[kind] = create_index(self.ann_backend, matrix.dim, **self.ann_params)
+            if matrix.mask[row]:
+                self._ann[kind].add([key], matrix.take(slice(row, row + 1)))
+            else:
+                self._ann[kind].remove([key])
+    
+    def _save_ann(self):
+        """保存ANN索引及key映射（与kb_cases.json放在一起）"""
+        for kind, index in self._ann.items():
+            index.save(str(self._ann_file(kind)))
+        meta = {
+            'backend': self.ann_backend,
+            'kinds': sorted(self._ann.keys()),
+            'storage': self._store.fingerprint(),
+            'next_key': self._next_key,
+            'keys': {
+                case['design_id']: key
+                for case, key in zip(self.cases, self._row_keys)
+            }
+        }
+        with open(self._ann_meta_file(), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+    
+    def _load_ann(self) -> bool:
+        """
+        加载持久化的ANN索引
+        
+        只有当索引保存后知识库文件未被其他程序修改时才复用，否则返回False由调用方重建
+        """
+        meta_file = self._ann_meta_file()
+        if not meta_file.exists():
             return False
+        try:
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if (meta.get('backend') != self.ann_backend
+                    or meta.get('storage') != self._store.fingerprint()):
+                return False
+            keys = meta['keys']
+            if len(keys) != len(self.cases) or any(
+                case['design_id'] not in keys for case in self.cases
+            ):
+                return False
+            ann = {kind: VectorIndex.load(str(self._ann_file(kind))) for kind in meta['kinds']}
+        except Exception as e:
+            print(f"加载ANN索引失败，将重建: {e}")
+            return False
+        
+        self._row_keys = [int(keys[case['design_id']]) for case in self.cases]
+        self._key_rows = {key: row for row, key in enumerate(self._row_keys)}
+        self._next_key = int(meta['next_key'])
+        self._ann = ann
+        self._rebuild_secondary_index()
+        return True
+    
+    def has_ann(self, kind: str) -> bool:
+        """
+        是否存在可用的ANN索引
+        
+        Args:
+            kind: 'features' 或 'embeddings'
+        """
+        return kind in self._ann
+    
+    def search_ann(
+        self,
+        kind: str,
+        query: np.ndarray,
+        k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        使用ANN索引检索最相似的案例
+        
+        Args:
+            kind: 'features' 或 'embeddings'
+            query: 已归一化的查询向量
+            k: 返回数量
+        
+        Returns:
+            (rows, scores): 矩阵行号和余弦相似度（按相似度降序）
+        """
+        keys, scores = self._ann[kind].search(query, k)
+        keys, scores = keys[0], scores[0]
+        found = keys >= 0
+        rows = np.array([self._key_rows[key] for key in keys[found]], dtype=np.int64)
+        return rows, scores[found]
     
     def save(self) -> bool:
         """
@@ -63,23 +663,33 @@ class KnowledgeBase:
             是否成功保存
         """
         try:
-            # 确保目录存在
-            self.case_file.parent.mkdir(parents=True, exist_ok=True)
-            
-            data = {
-                'version': '1.0',
-                'num_cases': len(self.cases),
-                'cases': self.cases
-            }
+            # json后端整体重写；sqlite后端只提交自上次保存以来的修改
+            upserts = [
+                merge_case_payload(self._attach(self._case_index[design_id]),
+                                   self._pending_payloads.get(design_id))
+                for design_id in self._dirty
+            ]
+            # 只有新建json文件时才整体写出全部案例
+            cases = self.cases
+            if self._vectors and not self._store.exists():
+                cases = [self._attach(row) for row in range(len(self.cases))]
+            self._store.commit(cases, upserts, sorted(self._removed))
+            self._dirty = {}
+            self._removed = set()
+            self._pending_payloads = {}
             
-            with open(self.case_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            if self._ann:
+                self._save_ann()
             
             return True
         except Exception as e:
             print(f"保存知识库失败: {e}")
             return False
     
+    def compact(self):
+        """压缩存储（sqlite后端清理向量旁路文件中的过期数据；json后端无操作）"""
+        self._store.compact()
+    
     def add_case(self, case: Dict[str, Any]) -> bool:
         """
         添加新案例
@@ -101,33 +711,117 @@ class KnowledgeBase:
             return False
         
         design_id = case['design_id']
+        if self._lazy:
+            # 只在内存中保留精简记录，大字段保存前暂存
+            case, payload = split_case_payload(case)
+            self._pending_payloads[design_id] = payload
+            self._payload_cache.pop(design_id, None)
+        case, detached = self._detach(case)
         
         # 检查是否已存在
         if design_id in self._case_index:
             # 更新现有案例
             idx = self._case_index[design_id]
+            self._unindex_key(self._row_keys[idx])
+            previous = self.cases[idx]
+            if RETRIEVAL_STATS_FIELD in previous and RETRIEVAL_STATS_FIELD not in case:
+                # 重新生成的案例保留已有的检索命中统计
+                case = {**case, RETRIEVAL_STATS_FIELD: previous[RETRIEVAL_STATS_FIELD]}
             self.cases[idx] = case
+            for field, store in self._vectors.items():
+                store.set(idx, *detached.get(field, (None,)))
+            self._features.set(idx, self.get_case_vector(idx, 'features'))
+            self._embeddings.set(idx, self.get_case_vector(idx, 'embedding'))
+            self._eviction.update(design_id, case)
         else:
+            # 达到最大数量时先按淘汰策略删除一个案例
+            while self.cases and len(self.cases) >= self.max_cases:
+                if not self.remove_case(self._eviction.victim()):
+                    break
             # 添加新案例
             self.cases.append(case)
-            self._case_index[design_id] = len(self.cases) - 1
-        
-        # 如果超过最大数量，删除最旧的案例
-        if len(self.cases) > self.max_cases:
-            # 删除第一个案例（FIFO）
-            removed_id = self.cases[0]['design_id']
-            del self.cases[0]
-            # 重建索引
-            self._case_index = {
-                case['design_id']: i 
-                for i, case in enumerate(self.cases)
-            }
+            idx = len(self.cases) - 1
+            self._case_index[design_id] = idx
+            for field, store in self._vectors.items():
+                store.append(*detached.get(field, (None,)))
+            self._features.append(self.get_case_vector(idx, 'features'))
+            self._embeddings.append(self.get_case_vector(idx, 'embedding'))
+            self._row_keys.append(self._next_key)
+            self._key_rows[self._next_key] = idx
+            self._next_key += 1
+            self._eviction.insert(design_id, case)
+        self._dirty[design_id] = None
+        self._removed.discard(design_id)
+        self._index_case(case, self._row_keys[idx])
+        self._ann_set_row(idx)
         
         return True
     
+    def remove_case(self, design_id: str) -> bool:
+        """
+        删除指定案例（同步更新索引和矩阵）
+        
+        最后一行案例移入被删除的位置，删除为O(1)；其余案例的行号不变
+        
+        Args:
+            design_id: 设计ID
+        
+        Returns:
+            是否成功删除
+        """
+        if design_id not in self._case_index:
+            return False
+        
+        idx = self._case_index.pop(design_id)
+        self._dirty.pop(design_id, None)
+        self._pending_payloads.pop(design_id, None)
+        self._payload_cache.pop(design_id, None)
+        self._removed.add(design_id)
+        self._eviction.remove(design_id)
+        key = self._row_keys[idx]
+        del self._key_rows[key]
+        self._unindex_key(key)
+        for index in self._ann.values():
+            index.remove([key])
+        
+        last = len(self.cases) - 1
+        if idx != last:
+            moved = self.cases[last]
+            self.cases[idx] = moved
+            self._row_keys[idx] = self._row_keys[last]
+            self._case_index[moved['design_id']] = idx
+            self._key_rows[self._row_keys[idx]] = idx
+        self.cases.pop()
+        self._row_keys.pop()
+        self._features.swap_remove(idx)
+        self._embeddings.swap_remove(idx)
+        for store in self._vectors.values():
+            store.swap_remove(idx)
+        return True
+    
+    def record_hits(self, rows: Iterable[int]):
+        """
+        记录检索命中（由检索器在返回结果时调用，供lru/utility淘汰策略使用）
+        
+        命中次数和最近命中时间写入案例的retrieval_stats字段，下次save()时随案例保存
+        
+        Args:
+            rows: 命中案例的矩阵行号
+        """
+        if not self._eviction.tracks_hits:
+            return
+        design_ids = [self.cases[row]['design_id'] for row in rows]
+        self._eviction.hit(design_ids)
+        now = time.time()
+        for design_id, count in Counter(design_ids).items():
+            case = self.cases[self._case_index[design_id]]
+            hits, _ = case_retrieval_stats(case)
+            case[RETRIEVAL_STATS_FIELD] = {'hits': hits + count, 'last_access': now}
+            self._dirty[design_id] = None
+    
     def get_case(self, design_id: str) -> Optional[Dict[str, Any]]:
         """
-        获取指定案例
+        获取指定案例（完整案例，sqlite后端在首次访问时读取大字段）
         
         Args:
             design_id: 设计ID
@@ -139,16 +833,45 @@ class KnowledgeBase:
             return None
         
         idx = self._case_index[design_id]
-        return self.cases[idx]
+        if not self._lazy:
+            return self._attach(idx)
+        if design_id in self._pending_payloads:
+            payload = self._pending_payloads[design_id]
+        elif design_id in self._payload_cache:
+            payload = self._payload_cache[design_id]
+            self._payload_cache.move_to_end(design_id)
+        else:
+            payload = self._store.load_payloads([design_id]).get(design_id)
+            self._payload_cache[design_id] = payload
+            while len(self._payload_cache) > self.payload_cache_size:
+                self._payload_cache.popitem(last=False)
+        return merge_case_payload(self._attach(idx), payload)
     
-    def get_all_cases(self) -> List[Dict[str, Any]]:
+    def get_all_cases(self, with_payloads: bool = True) -> List[Dict[str, Any]]:
         """
-        获取所有案例
+        获取所有案例（含特征/嵌入向量）
+        
+        Args:
+            with_payloads: False时不读取大字段（sqlite后端）
         
         Returns:
             案例列表
         """
-        return self.cases.copy()
+        if self._vectors:
+            cases = [self._attach(row) for row in range(len(self.cases))]
+        else:
+            cases = self.cases.copy()
+        if not self._lazy or not with_payloads:
+            return cases
+        stored = self._store.load_payloads(
+            case['design_id'] for case in cases
+            if case['design_id'] not in self._pending_payloads
+        )
+        return [
+            merge_case_payload(case, self._pending_payloads.get(case['design_id'],
+                                                                stored.get(case['design_id'])))
+            for case in cases
+        ]
     
     def get_features_matrix(self) -> np.ndarray:
         """
@@ -157,18 +880,7 @@ class KnowledgeBase:
         Returns:
             特征矩阵 (num_cases, feature_dim)
         """
-        if not self.cases:
-            return np.array([])
-        
-        features_list = []
-        for case in self.cases:
-            if 'features' in case and case['features'] is not None:
-                features_list.append(np.array(case['features']))
-        
-        if not features_list:
-            return np.array([])
-        
-        return np.vstack(features_list)
+        return self._features.raw()
     
     def get_embeddings_matrix(self) -> np.ndarray:
         """
@@ -177,18 +889,155 @@ class KnowledgeBase:
         Returns:
             嵌入矩阵 (num_cases, embedding_dim)
         """
-        if not self.cases:
-            return np.array([])
+        return self._embeddings.raw()
+    
+    @property
+    def feature_dim(self) -> Optional[int]:
+        """特征向量维度（知识库为空时为None）"""
+        return self._features.dim
+    
+    @property
+    def embedding_dim(self) -> Optional[int]:
+        """嵌入向量维度（知识库为空时为None）"""
+        return self._embeddings.dim
+    
+    @property
+    def features_matrix(self) -> np.ndarray:
+        """
+        预归一化的float32特征矩阵（只读）
         
-        embeddings_list = []
-        for case in self.cases:
-            if 'embedding' in case and case['embedding'] is not None:
-                embeddings_list.append(np.array(case['embedding']))
+        第i行对应get_case_at(i)；无效行为零向量，见feature_mask
+        """
+        return self._features.matrix
+    
+    @property
+    def feature_mask(self) -> np.ndarray:
+        """特征矩阵中有效行的标记（只读）"""
+        return self._features.mask
+    
+    @property
+    def embeddings_matrix(self) -> np.ndarray:
+        """
+        预归一化的float32嵌入矩阵（只读）
         
-        if not embeddings_list:
-            return np.array([])
+        第i行对应get_case_at(i)；无效行为零向量，见embedding_mask。
+        量化存储时返回整个矩阵的反量化副本，检索时应使用get_embedding_rows
+        """
+        return self._embeddings.matrix
+    
+    @property
+    def embedding_quantization(self) -> Optional[str]:
+        """嵌入矩阵的存储精度（None表示float32）"""
+        return self._embeddings.quantization
+    
+    @property
+    def embedding_nbytes(self) -> int:
+        """嵌入矩阵占用的内存（字节）"""
+        return self._embeddings.nbytes
+    
+    def get_embedding_rows(self, rows: np.ndarray) -> np.ndarray:
+        """
+        读取指定行的预归一化嵌入（float32；量化存储时只反量化这些行）
+        
+        Args:
+            rows: 矩阵行号
         
-        return np.vstack(embeddings_list)
+        Returns:
+            嵌入矩阵 (len(rows), embedding_dim)
+        """
+        return self._embeddings.take(rows)
+    
+    def get_exact_embedding_rows(self, rows: np.ndarray) -> np.ndarray:
+        """
+        读取指定行的全精度（float32）预归一化嵌入，用于量化检索后的重排序
+        
+        从单独存储的原始嵌入（float32缓冲区或sqlite内存映射）按行批量读取后归一化；
+        没有原始嵌入的行使用矩阵中的值
+        
+        Args:
+            rows: 矩阵行号
+        
+        Returns:
+            嵌入矩阵 (len(rows), embedding_dim)
+        """
+        result = self._embeddings.take(rows)
+        if self._embeddings.quantization is None:
+            return result
+        result = np.array(result, dtype=np.float32)
+        exact, valid = self._vectors['embedding'].gather(rows, self._embeddings.dim)
+        if valid.any():
+            exact = exact[valid]
+            norms = np.linalg.norm(exact, axis=1, keepdims=True)
+            result[valid] = exact / np.where(norms > 0, norms, 1.0)
+        return result
+    
+    def score_embeddings(
+        self,
+        query: np.ndarray,
+        rows: Optional[np.ndarray] = None,
+        out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        预归一化嵌入与查询向量的内积（量化存储时按存储精度计算，不反量化整个矩阵）
+        
+        Args:
+            query: 已归一化的查询嵌入
+            rows: 矩阵行号（None表示全部行）
+            out: 预分配的float32输出缓冲区（可选）
+        
+        Returns:
+            相似度 (len(rows),)；无效行为0，见embedding_mask
+        """
+        return self._embeddings.dot(query, rows, out)
+    
+    @property
+    def embedding_mask(self) -> np.ndarray:
+        """嵌入矩阵中有效行的标记（只读）"""
+        return self._embeddings.mask
+    
+    def get_case_vector(self, row: int, field: str) -> Optional[np.ndarray]:
+        """
+        读取案例的原始（未归一化）向量
+        
+        Args:
+            row: 矩阵行号
+            field: 'features' 或 'embedding'
+        
+        Returns:
+            一维float32数组，没有有效向量时返回None
+        """
+        store = self._vectors.get(field)
+        vector = store.get(row) if store is not None else None
+        if vector is not None:
+            return _as_vector(vector)
+        return _as_vector(self.cases[row].get(field))
+    
+    def get_case_at(self, row: int) -> Dict[str, Any]:
+        """
+        根据矩阵行号获取案例（检索路径使用）
+        
+        sqlite后端返回不含大字段的精简记录；sqlite后端及嵌入量化时记录中不含
+        单独存储的向量字段，使用get_case_vector读取
+        
+        Args:
+            row: 矩阵行号
+        
+        Returns:
+            案例字典
+        """
+        return self.cases[row]
+    
+    def get_row(self, design_id: str) -> Optional[int]:
+        """
+        获取案例在矩阵中的行号
+        
+        Args:
+            design_id: 设计ID
+        
+        Returns:
+            行号，如果不存在返回None
+        """
+        return self._case_index.get(design_id)
     
     def get_cases_by_scale(self, min_scale: int, max_scale: int) -> List[Dict[str, Any]]:
         """
@@ -201,16 +1050,62 @@ class KnowledgeBase:
         Returns:
             符合条件的案例列表
         """
-        filtered = []
-        for case in self.cases:
-            if 'quality_metrics' in case:
-                metrics = case['quality_metrics']
-                # 假设quality_metrics中有num_modules字段
-                if 'num_modules' in metrics:
-                    num_modules = metrics['num_modules']
-                    if min_scale <= num_modules <= max_scale:
-                        filtered.append(case)
-        return filtered
+        return [self.cases[row] for row in self.get_rows_by_scale(min_scale, max_scale)]
+    
+    def get_rows_by_scale(self, min_scale: float, max_scale: float) -> np.ndarray:
+        """
+        根据设计规模筛选案例（有序数组上二分查找）
+        
+        Args:
+            min_scale: 最小规模
+            max_scale: 最大规模
+        
+        Returns:
+            符合条件的案例行号（升序）
+        """
+        lo = bisect_left(self._scale_index, (min_scale, -1))
+        hi = bisect_right(self._scale_index, (max_scale, float('inf')))
+        rows = np.fromiter(
+            (self._key_rows[key] for _, key in self._scale_index[lo:hi]),
+            dtype=np.int64, count=hi - lo
+        )
+        rows.sort()
+        return rows
+    
+    def get_row_scales(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        按行读取案例规模（quality_metrics.num_modules）
+        
+        Args:
+            rows: 矩阵行号（None表示全部行）
+        
+        Returns:
+            float64数组，缺少规模的案例为NaN
+        """
+        if self._row_scales is None:
+            scales = (self._indexed_attrs.get(key, (None, None))[0] for key in self._row_keys)
+            self._row_scales = np.fromiter(
+                (np.nan if scale is None else scale for scale in scales),
+                dtype=np.float64, count=len(self._row_keys)
+            )
+            self._row_scales.flags.writeable = False
+        return self._row_scales if rows is None else self._row_scales[rows]
+    
+    def get_rows_by_type(self, design_type: Any) -> np.ndarray:
+        """
+        根据设计类型筛选案例（哈希桶）
+        
+        Args:
+            design_type: 设计类型
+        
+        Returns:
+            符合条件的案例行号（升序）
+        """
+        bucket = self._type_index.get(design_type, ())
+        rows = np.fromiter((self._key_rows[key] for key in bucket),
+                           dtype=np.int64, count=len(bucket))
+        rows.sort()
+        return rows
     
     def size(self) -> int:
         """
@@ -238,7 +1133,7 @@ class KnowledgeBase:
             data = {
                 'version': '1.0',
                 'num_cases': len(self.cases),
-                'cases': self.cases
+                'cases': self.get_all_cases()
             }
             
             with open(export_path, 'w', encoding='utf-8') as f:
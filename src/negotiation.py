@@ -78,6 +78,8 @@ class NegotiationProtocol:
         # 提取协商模式
         negotiation_cases = []
         for case in rag_results:
+            # 检索结果可能是不含迁移记录等大字段的精简记录，从知识库读取完整案例
+            case = self.rag_retriever.get_case(case['design_id']) or case
             if 'negotiation_patterns' in case:
                 negotiation_cases.append(case['negotiation_patterns'])
         
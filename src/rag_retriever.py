@@ -1,6 +1,6 @@
 """
 RAG检索模块
-实现三级检索：粗粒度→细粒度→语义检索
+实现三级检索：粗粒度→细粒度→语义检索（可选按加权分数排序：对级联候选重排序，或对筛选后的全部案例单遍融合打分）
 """
 
 import warnings
@@ -8,11 +8,84 @@ import warnings
 warnings.filterwarnings('ignore', category=UserWarning, module='torchvision')
 
 import numpy as np
-from typing import List, Dict, Any, Optional
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import List, Dict, Any, Optional, Sequence
 
 from .knowledge_base import KnowledgeBase
 from .utils.embedding_loader import load_embedding_model, EmbeddingModel
+from .utils.embedding_cache import CachedEmbeddingModel
+
+
+def _normalize(vector: Any) -> np.ndarray:
+    """将向量展平为float32并做L2归一化（零向量保持不变）"""
+    vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """按行L2归一化（零行保持不变）"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    按分数降序返回前k个位置（分数相同时保持原顺序）
+    
+    k远小于候选数时先用partition找到第k大的分数，只对入选位置稳定排序；
+    与第k大分数相同的位置按原顺序取前面的，结果与完整的稳定排序一致
+    """
+    n = len(scores)
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    if 4 * k >= n:
+        return np.argsort(-scores, kind='stable')[:k]
+    kth = -np.partition(-scores, k - 1)[k - 1]
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[:k - len(above)]
+    head = np.concatenate([above, ties])
+    head.sort()
+    return head[np.argsort(-scores[head], kind='stable')]
+
+
+def _batched_scores(candidates: np.ndarray, valid: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """
+    每个查询与各自候选向量的内积
+    
+    Args:
+        candidates: 补齐后的候选向量 (q, k, d)
+        valid: 有效位置掩码 (q, k)
+        queries: 查询向量 (q, d)
+    
+    Returns:
+        相似度 (q, k)，补齐位置为-inf
+    """
+    scores = np.einsum('qkd,qd->qk', candidates, queries)
+    scores[~valid] = -np.inf
+    return scores
+
+
+def _scale_proximity(scales: np.ndarray, design_scale: Optional[float]) -> np.ndarray:
+    """规模接近度 min(r, 1/r)（r为案例规模与查询规模之比），案例或查询缺少规模时为0"""
+    if not design_scale:
+        return np.zeros(np.shape(scales), dtype=np.float32)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = scales / float(design_scale)
+        proximity = np.minimum(ratio, 1.0 / ratio)
+    proximity[np.isnan(proximity)] = 0.0
+    return proximity.astype(np.float32)
+
+
+def _pad_rows(rows_list: List[np.ndarray]) -> tuple:
+    """将长度不一的行号列表补齐为 (q, max_k) 矩阵，返回 (行号矩阵, 有效位置掩码)"""
+    max_k = max(len(rows) for rows in rows_list)
+    padded = np.zeros((len(rows_list), max_k), dtype=np.int64)
+    valid = np.zeros((len(rows_list), max_k), dtype=bool)
+    for j, rows in enumerate(rows_list):
+        padded[j, :len(rows)] = rows
+        valid[j, :len(rows)] = True
+    return padded, valid
 
 
 class RAGRetriever:
@@ -28,7 +101,15 @@ class RAGRetriever:
         coarse_top_k: int = 50,
         fine_top_k: int = 20,
         semantic_top_k: int = 10,
-        similarity_threshold: float = 0.7
+        similarity_threshold: float = 0.7,
+        ann_min_candidates: int = 4096,
+        ann_oversample: int = 4,
+        text_embedding_cache_dir: Optional[str] = None,
+        text_embedding_lru_size: int = 4096,
+        quantized_rerank: int = 4,
+        weighted_rerank: bool = False,
+        rerank_weights: Optional[Dict[str, float]] = None,
+        rerank_scope: str = 'cascade'
     ):
         """
         初始化RAG检索器
@@ -39,19 +120,41 @@ class RAGRetriever:
                 - sentence-transformers模型: "sentence-transformers/all-MiniLM-L6-v2"
                 - 本地模型路径: "/path/to/local/model"
                 - Ollama模型: "ollama:nomic-embed-text" 或 "nomic-embed-text" (需要设置model_type="ollama")
-            embedding_model_type: 模型类型 ('sentence-transformers', 'ollama', 'auto')
+                - 内置哈希嵌入: "hashing" 或 "hashing:384"
+            embedding_model_type: 模型类型 ('sentence-transformers', 'ollama', 'hashing', 'auto')
             embedding_cache_dir: 模型缓存目录
             ollama_base_url: Ollama服务地址（如果使用Ollama）
             coarse_top_k: 粗粒度检索返回top-k
             fine_top_k: 细粒度检索返回top-k
             semantic_top_k: 语义检索返回top-k（最终结果）
             similarity_threshold: 相似度阈值
+            ann_min_candidates: 候选数达到该值且知识库建有ANN索引时使用近似检索
+            ann_oversample: 候选集为知识库子集时ANN检索的过采样倍数
+            text_embedding_cache_dir: 文本嵌入磁盘缓存目录（与build_kb.py共享；None则只用内存LRU）
+            text_embedding_lru_size: 文本嵌入内存LRU容量
+            quantized_rerank: 知识库嵌入量化存储时，按量化相似度取前
+                quantized_rerank * semantic_top_k 个候选用全精度嵌入重排序（0表示不重排序）
+            weighted_rerank: 按加权分数排序（范围见rerank_scope）
+            rerank_weights: 加权排序的权重 {'scale', 'feature', 'embedding'}，
+                默认只使用嵌入相似度
+            rerank_scope: 加权排序的范围
+                - 'cascade': 级联选出的细粒度候选（见_reweighted_rows_many），默认权重下结果与三级检索一致
+                - 'all': 规模/类型筛选后的全部案例单遍融合打分（见_fused_rows_many），不经过粗/细粒度截断
         """
+        if rerank_scope not in ('cascade', 'all'):
+            raise ValueError(f"不支持的加权排序范围: {rerank_scope}")
         self.kb = knowledge_base
         self.coarse_top_k = coarse_top_k
         self.fine_top_k = fine_top_k
         self.semantic_top_k = semantic_top_k
         self.similarity_threshold = similarity_threshold
+        self.ann_min_candidates = ann_min_candidates
+        self.ann_oversample = ann_oversample
+        self.quantized_rerank = quantized_rerank
+        self.weighted_rerank = weighted_rerank
+        self.rerank_weights = {'scale': 0.0, 'feature': 0.0, 'embedding': 1.0}
+        self.rerank_weights.update(rerank_weights or {})
+        self.rerank_scope = rerank_scope
         
         # 加载嵌入模型
         try:
@@ -61,6 +164,11 @@ class RAGRetriever:
                 cache_dir=embedding_cache_dir,
                 ollama_base_url=ollama_base_url
             )
+            self.embedding_model = CachedEmbeddingModel(
+                self.embedding_model,
+                cache_dir=text_embedding_cache_dir,
+                lru_size=text_embedding_lru_size
+            )
         except Exception as e:
             print(f"警告：加载嵌入模型失败: {e}")
             print("\n解决方案：")
@@ -71,7 +179,9 @@ class RAGRetriever:
             print("   - 安装Ollama: https://ollama.com/download")
             print("   - 下载嵌入模型: ollama pull nomic-embed-text")
             print("   - 在配置中设置: embedding_model_name: 'ollama:nomic-embed-text'")
-            print("3. 跳过语义嵌入功能，仅使用特征向量检索")
+            print("3. 使用内置哈希嵌入（无需下载模型，知识库须用同一模型构建）:")
+            print("   - 在配置中设置: embedding_model: 'hashing'")
+            print("4. 跳过语义嵌入功能，仅使用特征向量检索")
             self.embedding_model = None
     
     def coarse_retrieve(
@@ -91,40 +201,8 @@ class RAGRetriever:
         Returns:
             候选案例列表
         """
-        all_cases = self.kb.get_all_cases()
-        
-        if not all_cases:
-            return []
-        
-        # 如果指定了规模，进行规模筛选
-        if design_scale is not None:
-            # 规模范围：±50%
-            min_scale = int(design_scale * 0.5)
-            max_scale = int(design_scale * 1.5)
-            filtered_cases = self.kb.get_cases_by_scale(min_scale, max_scale)
-        else:
-            filtered_cases = all_cases
-        
-        # 如果指定了类型，进行类型筛选
-        if design_type is not None:
-            filtered_cases = [
-                case for case in filtered_cases
-                if case.get('design_type') == design_type
-            ]
-        
-        # 如果筛选后数量仍然很多，使用特征相似度进行初步筛选
-        if len(filtered_cases) > self.coarse_top_k:
-            # 计算特征相似度
-            query_features = query_features.reshape(1, -1)
-            case_features = self.kb.get_features_matrix()
-            
-            if case_features.size > 0 and query_features.shape[1] == case_features.shape[1]:
-                similarities = cosine_similarity(query_features, case_features)[0]
-                # 获取top-k
-                top_indices = np.argsort(similarities)[::-1][:self.coarse_top_k]
-                filtered_cases = [filtered_cases[i] for i in top_indices if i < len(filtered_cases)]
-        
-        return filtered_cases[:self.coarse_top_k]
+        rows = self._coarse_rows(query_features, design_scale, design_type)
+        return self._rows_to_cases(rows)
     
     def fine_retrieve(
         self,
@@ -144,30 +222,37 @@ class RAGRetriever:
         if not candidate_cases:
             return []
         
-        # 提取候选案例的特征
+        rows = self._cases_to_rows(candidate_cases)
+        if rows is not None:
+            return self._rows_to_cases(self._fine_rows(query_features, rows))
+        
+        # 候选案例不在知识库中，逐个提取特征
         candidate_features = []
         valid_cases = []
         
         for case in candidate_cases:
             if 'features' in case and case['features'] is not None:
-                candidate_features.append(np.array(case['features']))
+                candidate_features.append(np.asarray(case['features'], dtype=np.float32))
                 valid_cases.append(case)
         
         if not candidate_features:
             return []
         
-        candidate_features = np.vstack(candidate_features)
-        query_features = query_features.reshape(1, -1)
+        try:
+            candidate_features = _normalize_rows(np.vstack(candidate_features))
+        except ValueError:
+            # 特征维度不一致，返回所有候选
+            return valid_cases
+        query = _normalize(query_features)
         
         # 计算余弦相似度
-        if query_features.shape[1] == candidate_features.shape[1]:
-            similarities = cosine_similarity(query_features, candidate_features)[0]
-        else:
+        if query.shape[0] != candidate_features.shape[1]:
             # 特征维度不匹配，返回所有候选
             return valid_cases
+        similarities = candidate_features @ query
         
         # 获取top-k
-        top_indices = np.argsort(similarities)[::-1][:self.fine_top_k]
+        top_indices = _top_k(similarities, self.fine_top_k)
         return [valid_cases[i] for i in top_indices]
     
     def semantic_retrieve(
@@ -188,56 +273,341 @@ class RAGRetriever:
         if not candidate_cases or self.embedding_model is None:
             return candidate_cases[:self.semantic_top_k]
         
-        # 生成查询嵌入
+        rows = self._cases_to_rows(candidate_cases)
+        if rows is not None:
+            return self._rows_to_cases(self._semantic_rows_many([query_text], [rows])[0])
+        
+        # 候选案例不在知识库中：逐个提取嵌入，缺失的实时生成
         try:
-            query_embedding = self.embedding_model.encode(query_text, convert_to_numpy=True)
-            query_embedding = query_embedding.reshape(1, -1)
+            query_embedding = _normalize(self.embedding_model.encode(query_text))
         except Exception as e:
             print(f"生成查询嵌入失败: {e}")
             return candidate_cases[:self.semantic_top_k]
+        dim = query_embedding.shape[0]
+        candidate_embeddings = np.zeros((len(candidate_cases), dim), dtype=np.float32)
+        valid = np.zeros(len(candidate_cases), dtype=bool)
         
-        # 提取候选案例的嵌入
-        candidate_embeddings = []
-        valid_cases = []
-        
-        for case in candidate_cases:
+        to_encode = []
+        for i, case in enumerate(candidate_cases):
             if 'embedding' in case and case['embedding'] is not None:
-                candidate_embeddings.append(np.array(case['embedding']))
-                valid_cases.append(case)
+                case_embedding = np.asarray(case['embedding'], dtype=np.float32).reshape(-1)
+                if case_embedding.shape[0] == dim:
+                    candidate_embeddings[i] = _normalize(case_embedding)
+                    valid[i] = True
             else:
-                # 如果没有预计算的嵌入，实时生成
-                try:
-                    case_text = self._case_to_text(case)
-                    case_embedding = self.embedding_model.encode(case_text)
-                    if not isinstance(case_embedding, np.ndarray):
-                        case_embedding = np.array(case_embedding)
-                    candidate_embeddings.append(case_embedding)
-                    valid_cases.append(case)
-                except Exception as e:
-                    print(f"生成案例嵌入失败: {e}")
-                    continue
+                to_encode.append(i)
+        
+        if to_encode:
+            # 没有预计算嵌入的案例合并为一次编码（命中嵌入缓存的文本不会重新编码）
+            try:
+                case_texts = [self._case_to_text(candidate_cases[i]) for i in to_encode]
+                encoded = np.asarray(self.embedding_model.encode(case_texts), dtype=np.float32)
+                encoded = encoded.reshape(len(to_encode), -1)
+                if encoded.shape[1] == dim:
+                    candidate_embeddings[to_encode] = _normalize_rows(encoded)
+                    valid[to_encode] = True
+            except Exception as e:
+                print(f"生成案例嵌入失败: {e}")
         
-        if not candidate_embeddings:
+        if not valid.any():
             return []
         
-        candidate_embeddings = np.vstack(candidate_embeddings)
+        valid_indices = np.flatnonzero(valid)
         
         # 计算语义相似度
-        similarities = cosine_similarity(query_embedding, candidate_embeddings)[0]
+        similarities = candidate_embeddings[valid_indices] @ query_embedding
+        top_indices = self._semantic_top(similarities)
         
-        # 应用相似度阈值
-        filtered_indices = np.where(similarities >= self.similarity_threshold)[0]
+        return [candidate_cases[valid_indices[i]] for i in top_indices]
+    
+    def _semantic_top(self, similarities: np.ndarray) -> np.ndarray:
+        """应用相似度阈值并选出语义检索的top-k位置"""
+        filtered_indices = np.flatnonzero(similarities >= self.similarity_threshold)
         
         if len(filtered_indices) == 0:
             # 如果没有满足阈值的，返回top-k
-            top_indices = np.argsort(similarities)[::-1][:self.semantic_top_k]
-        else:
-            # 在满足阈值的案例中选择top-k
-            filtered_similarities = similarities[filtered_indices]
-            top_filtered_indices = np.argsort(filtered_similarities)[::-1][:self.semantic_top_k]
-            top_indices = filtered_indices[top_filtered_indices]
+            return _top_k(similarities, self.semantic_top_k)
         
-        return [valid_cases[i] for i in top_indices]
+        # 在满足阈值的案例中选择top-k
+        filtered_similarities = similarities[filtered_indices]
+        return filtered_indices[_top_k(filtered_similarities, self.semantic_top_k)]
+    
+    def _filter_rows(
+        self,
+        design_scale: Optional[int],
+        design_type: Optional[str]
+    ) -> np.ndarray:
+        """规模（有序索引）和类型（哈希桶）筛选，取交集；都未指定时返回全部行"""
+        rows = None
+        if design_scale is not None:
+            # 规模范围：±50%
+            min_scale = int(design_scale * 0.5)
+            max_scale = int(design_scale * 1.5)
+            rows = self.kb.get_rows_by_scale(min_scale, max_scale)
+        if design_type is not None:
+            type_rows = self.kb.get_rows_by_type(design_type)
+            rows = type_rows if rows is None else np.intersect1d(
+                rows, type_rows, assume_unique=True
+            )
+        if rows is None:
+            rows = np.arange(self.kb.size(), dtype=np.int64)
+        return rows
+    
+    def _coarse_rows(
+        self,
+        query_features: np.ndarray,
+        design_scale: Optional[int],
+        design_type: Optional[str]
+    ) -> np.ndarray:
+        """粗粒度检索，返回知识库矩阵行号"""
+        queries = np.asarray(query_features, dtype=np.float32).reshape(1, -1)
+        return self._coarse_rows_many(queries, [design_scale], [design_type])[0]
+    
+    def _coarse_rows_many(
+        self,
+        queries: np.ndarray,
+        design_scales: Sequence[Optional[int]],
+        design_types: Sequence[Optional[str]]
+    ) -> List[np.ndarray]:
+        """
+        批量粗粒度检索
+        
+        每个查询各自用一次矩阵-向量乘法打分（不与其他查询合并为矩阵乘法：
+        BLAS对 (N, d) x (d, q) 的分块累加顺序随q变化，float32舍入不同会使
+        近似并列的案例在top-k截断处换位，导致结果随同批查询而变化）。
+        
+        Returns:
+            每个查询的知识库矩阵行号
+        """
+        num_cases = self.kb.size()
+        if num_cases == 0:
+            return [np.array([], dtype=np.int64) for _ in range(len(queries))]
+        
+        results = [
+            self._filter_rows(scale, design_type)
+            for scale, design_type in zip(design_scales, design_types)
+        ]
+        normalized = _normalize_rows(queries)
+        
+        # 如果筛选后数量仍然很多，使用特征相似度进行初步筛选
+        dense = []
+        for j, rows in enumerate(results):
+            if len(rows) <= self.coarse_top_k:
+                continue
+            found = self._ann_select('features', normalized[j], rows, self.coarse_top_k)
+            if found is not None:
+                results[j] = found[0]
+            elif self.kb.feature_dim == normalized.shape[1]:
+                dense.append(j)
+        
+        for j in dense:
+            rows = results[j]
+            if len(rows) == num_cases:
+                similarities = self.kb.features_matrix @ normalized[j]
+            else:
+                similarities = self.kb.features_matrix[rows] @ normalized[j]
+            # 没有特征的案例排在最后
+            similarities[~self.kb.feature_mask[rows]] = -np.inf
+            results[j] = rows[_top_k(similarities, self.coarse_top_k)]
+        
+        return [rows[:self.coarse_top_k] for rows in results]
+    
+    def _fine_rows(self, query_features: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """细粒度检索，输入输出均为知识库矩阵行号"""
+        queries = np.asarray(query_features, dtype=np.float32).reshape(1, -1)
+        return self._fine_rows_many(queries, [rows])[0]
+    
+    def _fine_rows_many(self, queries: np.ndarray, rows_list: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        批量细粒度检索：各查询的候选行补齐为 (q, k) 后一次性计算相似度
+        
+        Returns:
+            每个查询的知识库矩阵行号
+        """
+        results = [rows[self.kb.feature_mask[rows]] for rows in rows_list]
+        if self.kb.feature_dim != queries.shape[1]:
+            # 特征维度不匹配，返回所有候选
+            return results
+        normalized = _normalize_rows(queries)
+        
+        batch = []
+        for j, rows in enumerate(results):
+            if len(rows) == 0:
+                continue
+            found = self._ann_select('features', normalized[j], rows, self.fine_top_k)
+            if found is not None:
+                results[j] = found[0]
+            else:
+                batch.append(j)
+        
+        if batch:
+            padded, valid = _pad_rows([results[j] for j in batch])
+            scores = _batched_scores(self.kb.features_matrix[padded], valid, normalized[batch])
+            for j, similarities in zip(batch, scores):
+                rows = results[j]
+                results[j] = rows[_top_k(similarities[:len(rows)], self.fine_top_k)]
+        
+        return results
+    
+    def _semantic_rows_many(
+        self,
+        query_texts: Sequence[Optional[str]],
+        rows_list: List[np.ndarray]
+    ) -> List[np.ndarray]:
+        """
+        批量语义检索
+        
+        所有查询文本与缺少嵌入的候选案例文本合并为一次编码调用；
+        没有查询文本的查询直接截取前semantic_top_k个候选。
+        
+        Returns:
+            每个查询的知识库矩阵行号
+        """
+        results = [rows[:self.semantic_top_k] for rows in rows_list]
+        active = [
+            j for j, (text, rows) in enumerate(zip(query_texts, rows_list))
+            if text is not None and len(rows) > 0
+        ]
+        if not active or self.embedding_model is None:
+            return results
+        
+        # 知识库矩阵中没有有效嵌入、案例中也没有预计算嵌入的行需要实时生成
+        missing = []
+        for j in active:
+            for row in rows_list[j][~self.kb.embedding_mask[rows_list[j]]]:
+                if self.kb.get_case_vector(row, 'embedding') is None:
+                    missing.append(int(row))
+        missing = list(dict.fromkeys(missing))
+        
+        texts = [query_texts[j] for j in active]
+        texts += [self._case_to_text(self.kb.get_case_at(row)) for row in missing]
+        try:
+            encoded = np.asarray(self.embedding_model.encode(texts), dtype=np.float32)
+            encoded = encoded.reshape(len(texts), -1)
+        except Exception as e:
+            print(f"生成查询嵌入失败: {e}")
+            return results
+        query_embeddings = _normalize_rows(encoded[:len(active)])
+        missing_embeddings = dict(zip(missing, _normalize_rows(encoded[len(active):])))
+        dim = query_embeddings.shape[1]
+        
+        batch = []
+        for i, j in enumerate(active):
+            rows = rows_list[j]
+            query_embedding = query_embeddings[i]
+            
+            # 候选集很大时使用嵌入ANN索引
+            found = self._ann_select('embeddings', query_embedding, rows, self.semantic_top_k)
+            if found is not None:
+                found_rows, similarities = found
+                results[j] = found_rows[self._semantic_top(similarities)]
+                continue
+            
+            # 提取候选案例的嵌入：知识库中的案例直接使用预归一化矩阵的行
+            embeddings = np.zeros((len(rows), dim), dtype=np.float32)
+            valid = np.zeros(len(rows), dtype=bool)
+            if self.kb.embedding_dim == dim:
+                valid = self.kb.embedding_mask[rows].copy()
+                embeddings[valid] = self.kb.get_embedding_rows(rows[valid])
+            from_kb = valid.copy()
+            for k in np.flatnonzero(~valid):
+                case_embedding = self.kb.get_case_vector(rows[k], 'embedding')
+                if case_embedding is not None:
+                    if case_embedding.shape[0] != dim:
+                        continue
+                    embeddings[k] = _normalize(case_embedding)
+                elif int(rows[k]) in missing_embeddings:
+                    embeddings[k] = missing_embeddings[int(rows[k])]
+                else:
+                    continue
+                valid[k] = True
+            
+            if not valid.any():
+                results[j] = rows[:0]
+                continue
+            valid_indices = np.flatnonzero(valid)
+            results[j] = rows[valid_indices]
+            batch.append((i, j, embeddings[valid_indices], from_kb[valid_indices]))
+        
+        if batch:
+            # 计算语义相似度
+            max_k = max(len(embeddings) for _, _, embeddings, _ in batch)
+            candidates = np.zeros((len(batch), max_k, dim), dtype=np.float32)
+            valid = np.zeros((len(batch), max_k), dtype=bool)
+            for b, (_, _, embeddings, _) in enumerate(batch):
+                candidates[b, :len(embeddings)] = embeddings
+                valid[b, :len(embeddings)] = True
+            scores = _batched_scores(candidates, valid, query_embeddings[[i for i, _, _, _ in batch]])
+            rerank = self.kb.embedding_quantization is not None and self.quantized_rerank > 0
+            for (i, j, embeddings, from_kb), similarities in zip(batch, scores):
+                similarities = similarities[:len(embeddings)]
+                if rerank:
+                    # 量化相似度的前若干个候选用全精度嵌入重新打分
+                    head = _top_k(similarities, self.quantized_rerank * self.semantic_top_k)
+                    head = head[from_kb[head]]
+                    if len(head) > 0:
+                        exact = self.kb.get_exact_embedding_rows(results[j][head])
+                        similarities[head] = exact @ query_embeddings[i]
+                top_indices = self._semantic_top(similarities)
+                results[j] = results[j][top_indices]
+        
+        return results
+    
+
+    def _ann_select(
+        self,
+        kind: str,
+        query: np.ndarray,
+        rows: np.ndarray,
+        k: int
+    ) -> Optional[tuple]:
+        """
+        在候选行中用ANN索引近似选出top-k
+        
+        候选集为知识库子集时先过采样检索再过滤；索引不可用、候选集较小或
+        过滤后不足k个时返回None，由调用方回退到精确计算
+        
+        Returns:
+            (rows, scores) 或 None
+        """
+        num_cases = self.kb.size()
+        if (len(rows) < self.ann_min_candidates or not self.kb.has_ann(kind)
+                or len(rows) <= k):
+            return None
+        dim = self.kb.feature_dim if kind == 'features' else self.kb.embedding_dim
+        if dim != query.shape[0]:
+            return None
+        
+        search_k = k
+        if len(rows) < num_cases:
+            search_k = int(np.ceil(k * self.ann_oversample * num_cases / len(rows)))
+            if search_k * 2 >= num_cases:
+                # 过采样后接近全量扫描，直接精确计算
+                return None
+        
+        found_rows, scores = self.kb.search_ann(kind, query, search_k)
+        if len(rows) < num_cases:
+            candidate_mask = np.zeros(num_cases, dtype=bool)
+            candidate_mask[rows] = True
+            keep = candidate_mask[found_rows]
+            found_rows, scores = found_rows[keep], scores[keep]
+            if len(found_rows) < k:
+                return None
+        return found_rows[:k], scores[:k]
+    
+    def _cases_to_rows(self, cases: List[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """将案例映射为知识库矩阵行号；任一案例不在知识库中时返回None"""
+        rows = np.empty(len(cases), dtype=np.int64)
+        for i, case in enumerate(cases):
+            row = self.kb.get_row(case.get('design_id'))
+            if row is None or self.kb.get_case_at(row) is not case:
+                return None
+            rows[i] = row
+        return rows
+    
+    def _rows_to_cases(self, rows: np.ndarray) -> List[Dict[str, Any]]:
+        """将知识库矩阵行号映射为案例"""
+        return [self.kb.get_case_at(row) for row in rows]
     
     def _case_to_text(self, case: Dict[str, Any]) -> str:
         """
@@ -287,28 +657,390 @@ class RAGRetriever:
         Returns:
             最终检索结果列表（top-k=10）
         """
-        # 1. 粗粒度检索
-        coarse_results = self.coarse_retrieve(
-            query_features,
-            design_scale=design_scale,
-            design_type=design_type
-        )
+        queries = np.asarray(query_features, dtype=np.float32).reshape(1, -1)
+        return self.retrieve_many(
+            queries,
+            query_texts=[query_text],
+            design_scales=[design_scale],
+            design_types=[design_type]
+        )[0]
+    
+    def retrieve_many(
+        self,
+        query_features: np.ndarray,
+        query_texts: Optional[Sequence[Optional[str]]] = None,
+        design_scales: Optional[Sequence[Optional[int]]] = None,
+        design_types: Optional[Sequence[Optional[str]]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        批量检索接口：多个查询（如同一步中各分区智能体的查询）一起执行三级检索
         
-        if not coarse_results:
+        各阶段以矩阵运算同时处理所有查询，语义检索只调用一次嵌入模型；
+        每个查询的结果与单独调用retrieve()一致。
+        
+        Args:
+            query_features: 查询特征矩阵 (Q, d)
+            query_texts: 每个查询的文本（可选，元素为None时跳过该查询的语义检索）
+            design_scales: 每个查询的设计规模（可选）
+            design_types: 每个查询的设计类型（可选）
+        
+        Returns:
+            每个查询的检索结果列表
+        """
+        queries = np.asarray(query_features, dtype=np.float32)
+        num_queries = len(queries)
+        if num_queries == 0:
             return []
+        queries = queries.reshape(num_queries, -1)
+        query_texts = list(query_texts) if query_texts is not None else [None] * num_queries
+        design_scales = list(design_scales) if design_scales is not None else [None] * num_queries
+        design_types = list(design_types) if design_types is not None else [None] * num_queries
+        if not (len(query_texts) == len(design_scales) == len(design_types) == num_queries):
+            raise ValueError("query_texts/design_scales/design_types 的长度必须与查询数量一致")
+        
+        if self.weighted_rerank and self.rerank_scope == 'all':
+            rows_list = self._fused_rows_many(queries, query_texts, design_scales, design_types)
+        elif self.weighted_rerank:
+            rows_list = self._reweighted_rows_many(queries, query_texts, design_scales, design_types)
+        else:
+            rows_list = self._staged_rows_many(queries, query_texts, design_scales, design_types)
+        
+        # 记录命中（供知识库的lru/utility淘汰策略使用）
+        self.kb.record_hits(np.concatenate(rows_list))
+        
+        return [self._rows_to_cases(rows) for rows in rows_list]
+    
+    def _staged_rows_many(
+        self,
+        queries: np.ndarray,
+        query_texts: Sequence[Optional[str]],
+        design_scales: Sequence[Optional[int]],
+        design_types: Sequence[Optional[str]]
+    ) -> List[np.ndarray]:
+        """三级级联检索，返回每个查询的知识库矩阵行号"""
+        # 1. 粗粒度检索
+        rows_list = self._coarse_rows_many(queries, design_scales, design_types)
         
         # 2. 细粒度检索
-        fine_results = self.fine_retrieve(query_features, coarse_results)
+        rows_list = self._fine_rows_many(queries, rows_list)
         
-        if not fine_results:
-            return []
+        # 3. 语义检索（没有查询文本的查询直接返回细粒度结果）
+        return self._semantic_rows_many(query_texts, rows_list)
+    
+    def _reweighted_rows_many(
+        self,
+        queries: np.ndarray,
+        query_texts: Sequence[Optional[str]],
+        design_scales: Sequence[Optional[int]],
+        design_types: Sequence[Optional[str]]
+    ) -> List[np.ndarray]:
+        """
+        加权重排序的级联检索
+        
+        候选仍由级联的前两级选出：对规模/类型筛选后的案例计算特征相似度，用partition
+        选出coarse_top_k个候选写入预分配数组，所有查询的候选一次性重新打分取前
+        fine_top_k个（与级联的细粒度检索计算相同，保证舍入一致）。只有最后一级不同：
+        对这fine_top_k个候选一次性计算全精度嵌入相似度，按
+        scale * 规模接近度 + feature * 特征相似度 + embedding * 嵌入相似度
+        打分并应用相似度阈值选出最终结果。加权分数不参与前两级的截断，
+        特征相似度未进入前fine_top_k的案例不会因规模或嵌入得分高而入选
+        （需要对全部案例加权排序时使用rerank_scope='all'，见_fused_rows_many）。
+        规模接近度为 min(规模比, 1/规模比)，未给出查询规模时为0。
+        
+        ANN索引生效、维度不匹配或候选缺少矩阵嵌入的查询回退到三级级联检索。
+        
+        Returns:
+            每个查询的知识库矩阵行号
+        """
+        num_queries = len(queries)
+        num_cases = self.kb.size()
+        if num_cases == 0 or self.kb.feature_dim != queries.shape[1]:
+            return self._staged_rows_many(queries, query_texts, design_scales, design_types)
+        
+        pool_k = self.coarse_top_k
+        pool_rows = np.zeros((num_queries, pool_k), dtype=np.int64)
+        pool_scores = np.zeros((num_queries, pool_k), dtype=np.float32)
+        pool_sizes = np.zeros(num_queries, dtype=np.int64)
+        fallback = []
+        
+        # 1. 特征相似度，选出粗粒度候选
+        normalized = _normalize_rows(queries)
+        features = self.kb.features_matrix
+        feature_mask = self.kb.feature_mask
+        filtered = {}
+        for j, (scale, design_type) in enumerate(zip(design_scales, design_types)):
+            if scale is not None or design_type is not None:
+                filtered[j] = self._filter_rows(scale, design_type)
+        full = [j for j in range(num_queries) if j not in filtered]
+        
+        if full and num_cases >= self.ann_min_candidates and self.kb.has_ann('features'):
+            fallback += full
+            full = []
+        for j in full:
+            # 逐查询打分，与单独调用retrieve()的舍入一致（见_coarse_rows_many）
+            similarities = features @ normalized[j]
+            similarities[~feature_mask] = -np.inf
+            self._fill_pool(j, np.arange(num_cases), similarities, pool_rows, pool_scores, pool_sizes)
+        for j, rows in filtered.items():
+            if len(rows) > self.coarse_top_k and len(rows) >= self.ann_min_candidates \
+                    and self.kb.has_ann('features'):
+                fallback.append(j)
+                continue
+            rows = rows[feature_mask[rows]]
+            self._fill_pool(j, rows, features[rows] @ normalized[j], pool_rows, pool_scores, pool_sizes)
+        
+        # 2. 所有查询的候选补齐后一次重新打分，取前fine_top_k个
+        skip = set(fallback)
+        ranked = [j for j in range(num_queries) if j not in skip and pool_sizes[j] > 0]
+        if ranked:
+            valid = np.arange(pool_k) < pool_sizes[ranked, None]
+            scores = _batched_scores(features[pool_rows[ranked]], valid, normalized[ranked])
+            for j, similarities in zip(ranked, scores):
+                top_indices = _top_k(similarities[:pool_sizes[j]], self.fine_top_k)
+                pool_rows[j, :len(top_indices)] = pool_rows[j, top_indices]
+                pool_scores[j, :len(top_indices)] = similarities[top_indices]
+                pool_sizes[j] = len(top_indices)
+        
+        # 3. 嵌入相似度：有查询文本的查询一次编码，候选一次取出
+        weights = self.rerank_weights
+        active = [
+            j for j in range(num_queries)
+            if j not in skip and query_texts[j] is not None and pool_sizes[j] > 0
+        ]
+        if active and self.embedding_model is not None:
+            try:
+                encoded = np.asarray(
+                    self.embedding_model.encode([query_texts[j] for j in active]), dtype=np.float32
+                ).reshape(len(active), -1)
+            except Exception as e:
+                print(f"生成查询嵌入失败: {e}")
+                encoded = None
+            if encoded is not None and encoded.shape[1] != self.kb.embedding_dim:
+                fallback += active
+                active = []
+            elif encoded is not None:
+                query_embeddings = _normalize_rows(encoded)
+                candidates = pool_rows[active, :self.fine_top_k]
+                has_embedding = self.kb.embedding_mask[candidates]
+                flat = candidates.reshape(-1)
+                embeddings = self.kb.get_exact_embedding_rows(flat).reshape(
+                    candidates.shape + (-1,)
+                )
+                semantic = np.einsum('qkd,qd->qk', embeddings, query_embeddings)
+                combined = weights['embedding'] * semantic
+                combined += weights['feature'] * pool_scores[active, :self.fine_top_k]
+                if weights['scale']:
+                    row_scales = self.kb.get_row_scales(candidates)
+                    for i, j in enumerate(active):
+                        combined[i] += weights['scale'] * _scale_proximity(row_scales[i], design_scales[j])
+                for i, j in enumerate(active):
+                    size = pool_sizes[j]
+                    if not has_embedding[i, :size].all():
+                        # 缺少矩阵嵌入的候选需要实时编码，交给级联检索处理
+                        fallback.append(j)
+                        continue
+                    top_indices = self._semantic_top(combined[i, :size])
+                    pool_rows[j, :len(top_indices)] = pool_rows[j, top_indices]
+                    pool_sizes[j] = len(top_indices)
+        
+        results = [
+            pool_rows[j, :min(pool_sizes[j], self.semantic_top_k)].copy()
+            for j in range(num_queries)
+        ]
+        if fallback:
+            staged = self._staged_rows_many(
+                queries[fallback],
+                [query_texts[j] for j in fallback],
+                [design_scales[j] for j in fallback],
+                [design_types[j] for j in fallback]
+            )
+            for j, rows in zip(fallback, staged):
+                results[j] = rows
+        return results
+    
+    def _fused_rows_many(
+        self,
+        queries: np.ndarray,
+        query_texts: Sequence[Optional[str]],
+        design_scales: Sequence[Optional[int]],
+        design_types: Sequence[Optional[str]]
+    ) -> List[np.ndarray]:
+        """
+        单遍融合打分检索（rerank_scope='all'）
+        
+        对规模/类型筛选后的每个案例只打分一次：
+        scale * 规模接近度 + feature * 特征相似度 + embedding * 嵌入相似度，
+        应用相似度阈值后用partition选出前semantic_top_k个，不经过粗/细粒度截断。
+        三项分数都按候选行向量化计算并写入预分配的缓冲区；候选数达到ann_min_candidates
+        且建有ANN索引时，候选为特征与嵌入ANN检索结果的并集。
+        
+        没有特征的案例不参与排序；没有查询文本（或编码失败）的查询把嵌入权重计入特征相似度，
+        且不应用阈值（与级联检索一致）。矩阵中缺少嵌入的候选使用案例中的嵌入，
+        仍没有的与查询文本一样实时编码。查询嵌入维度与知识库不一致的查询回退到三级级联检索。
+        
+        Returns:
+            每个查询的知识库矩阵行号
+        """
+        num_queries = len(queries)
+        num_cases = self.kb.size()
+        if num_cases == 0 or self.kb.feature_dim != queries.shape[1]:
+            return self._staged_rows_many(queries, query_texts, design_scales, design_types)
+        weights = self.rerank_weights
+        normalized = _normalize_rows(queries)
+        results = [np.array([], dtype=np.int64) for _ in range(num_queries)]
+        fallback = []
+        
+        # 1. 查询文本一次编码
+        query_embeddings: Dict[int, np.ndarray] = {}
+        active = [j for j in range(num_queries) if query_texts[j] is not None]
+        if active and self.embedding_model is not None:
+            try:
+                encoded = np.asarray(
+                    self.embedding_model.encode([query_texts[j] for j in active]), dtype=np.float32
+                ).reshape(len(active), -1)
+            except Exception as e:
+                print(f"生成查询嵌入失败: {e}")
+                encoded = None
+            if encoded is not None and encoded.shape[1] != self.kb.embedding_dim:
+                fallback += active
+            elif encoded is not None:
+                query_embeddings = dict(zip(active, _normalize_rows(encoded)))
         
-        # 3. 语义检索（如果有查询文本）
-        if query_text is not None:
-            semantic_results = self.semantic_retrieve(query_text, fine_results)
+        # 2. 候选行：规模/类型筛选，候选很多时取特征与嵌入ANN结果的并集；没有特征的案例不参与
+        feature_mask = self.kb.feature_mask
+        candidates: Dict[int, np.ndarray] = {}
+        skip = set(fallback)
+        for j in range(num_queries):
+            if j in skip:
+                continue
+            rows = self._filter_rows(design_scales[j], design_types[j])
+            if len(rows) >= self.ann_min_candidates:
+                found = [self._ann_select('features', normalized[j], rows, self.coarse_top_k)]
+                if j in query_embeddings:
+                    found.append(self._ann_select(
+                        'embeddings', query_embeddings[j], rows, self.coarse_top_k
+                    ))
+                if all(f is not None for f in found):
+                    rows = np.unique(np.concatenate([f[0] for f in found]))
+            candidates[j] = rows[feature_mask[rows]]
+        
+        # 矩阵中缺少嵌入的候选：先取案例中的嵌入，仍没有的与查询文本一样实时编码
+        case_embeddings: Dict[int, np.ndarray] = {}
+        missing, seen = [], set()
+        for j, rows in candidates.items():
+            if j not in query_embeddings:
+                continue
+            for row in rows[~self.kb.embedding_mask[rows]]:
+                row = int(row)
+                if row in seen:
+                    continue
+                seen.add(row)
+                vector = self.kb.get_case_vector(row, 'embedding')
+                if vector is None:
+                    missing.append(row)
+                elif vector.shape[0] == self.kb.embedding_dim:
+                    case_embeddings[row] = _normalize(vector)
+        if missing:
+            try:
+                encoded = np.asarray(self.embedding_model.encode(
+                    [self._case_to_text(self.kb.get_case_at(row)) for row in missing]
+                ), dtype=np.float32).reshape(len(missing), -1)
+                case_embeddings.update(zip(missing, _normalize_rows(encoded)))
+            except Exception as e:
+                print(f"生成案例嵌入失败: {e}")
+        
+        # 3. 三项分数写入预分配的缓冲区后加权合并
+        max_rows = max((len(rows) for rows in candidates.values()), default=0)
+        buffers = np.zeros((4, max_rows), dtype=np.float32)
+        features = self.kb.features_matrix
+        rerank = self.kb.embedding_quantization is not None and self.quantized_rerank > 0
+        for j, rows in candidates.items():
+            n = len(rows)
+            if n == 0:
+                continue
+            feature, embedding, scale, combined = buffers[:, :n]
+            # 逐查询矩阵-向量乘法，与单独调用retrieve()的舍入一致（见_coarse_rows_many）
+            np.matmul(features if n == num_cases else features[rows], normalized[j], out=feature)
+            if weights['scale']:
+                scale[:] = _scale_proximity(self.kb.get_row_scales(rows), design_scales[j])
+            else:
+                scale[:] = 0.0
+            
+            if j not in query_embeddings:
+                np.multiply(feature, weights['feature'] + weights['embedding'], out=combined)
+                combined += weights['scale'] * scale
+                results[j] = rows[_top_k(combined, self.semantic_top_k)]
+                continue
+            
+            query_embedding = query_embeddings[j]
+            self.kb.score_embeddings(query_embedding, None if n == num_cases else rows, out=embedding)
+            from_kb = self.kb.embedding_mask[rows]
+            valid = from_kb.copy()
+            for k in np.flatnonzero(~from_kb):
+                vector = case_embeddings.get(int(rows[k]))
+                if vector is not None:
+                    embedding[k] = vector @ query_embedding
+                    valid[k] = True
+            np.multiply(embedding, weights['embedding'], out=combined)
+            combined += weights['feature'] * feature
+            combined += weights['scale'] * scale
+            
+            indices = np.flatnonzero(valid)
+            if rerank and len(indices) > 0:
+                # 量化相似度的前若干个候选用全精度嵌入重新打分
+                head = indices[_top_k(combined[indices], self.quantized_rerank * self.semantic_top_k)]
+                head = head[from_kb[head]]
+                if len(head) > 0:
+                    exact = self.kb.get_exact_embedding_rows(rows[head]) @ query_embedding
+                    combined[head] += weights['embedding'] * (exact - embedding[head])
+            results[j] = rows[indices[self._semantic_top(combined[indices])]]
+        
+        if fallback:
+            staged = self._staged_rows_many(
+                queries[fallback],
+                [query_texts[j] for j in fallback],
+                [design_scales[j] for j in fallback],
+                [design_types[j] for j in fallback]
+            )
+            for j, rows in zip(fallback, staged):
+                results[j] = rows
+        return results
+    
+    @staticmethod
+    def _fill_pool(
+        j: int,
+        rows: np.ndarray,
+        scores: np.ndarray,
+        pool_rows: np.ndarray,
+        pool_scores: np.ndarray,
+        pool_sizes: np.ndarray
+    ):
+        """
+        按特征相似度选出前pool_k个候选写入第j行
+        
+        候选不超过pool_k个时保持行号顺序（与级联的粗粒度检索一致），否则按分数降序
+        """
+        pool_k = pool_rows.shape[1]
+        if len(scores) > pool_k:
+            head = _top_k(scores, pool_k)
+            head = head[scores[head] > -np.inf]
         else:
-            # 如果没有查询文本，直接返回细粒度结果
-            semantic_results = fine_results[:self.semantic_top_k]
+            head = np.flatnonzero(scores > -np.inf)
+        k = len(head)
+        if k == 0:
+            return
+        pool_rows[j, :k] = rows[head]
+        pool_scores[j, :k] = scores[head]
+        pool_sizes[j] = k
+    
+    def get_case(self, design_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取完整案例（检索结果可能是不含大字段的精简记录）
         
-        return semantic_results
-
+        Args:
+            design_id: 设计ID
+        
+        Returns:
+            案例字典，如果不存在返回None
+        """
+        return self.kb.get_case(design_id)
@@ -0,0 +1,455 @@
+"""
+检索守护进程模块
+常驻进程保持嵌入模型、知识库矩阵和ANN索引在内存中，通过Unix域套接字提供RAG检索；
+RetrievalClient与RAGRetriever.retrieve/retrieve_many接口一致，守护进程不可用时回退到进程内检索。
+
+协议：每条消息为4字节大端长度 + UTF-8 JSON，一个连接上可以连续发送多个请求
+    请求 {"op": "retrieve_many", "query_features": [[...]], "query_texts": [...],
+          "design_scales": [...], "design_types": [...]}
+    响应 {"ok": true, "result": ...} 或 {"ok": false, "error": "..."}
+    其他op：ping、get_case（design_id）、reload（重新加载知识库文件）
+
+所有请求由同一个工作线程执行：同一时间窗口内到达的多个retrieve_many请求
+合并为一次RAGRetriever.retrieve_many调用（语义检索只调用一次嵌入模型）。
+"""
+
+import json
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .knowledge_base import KnowledgeBase
+from .rag_retriever import RAGRetriever
+
+
+_HEADER = struct.Struct('>I')
+
+
+def _json_default(value: Any) -> Any:
+    """案例中可能残留的numpy类型"""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+
+def send_message(sock: socket.socket, message: Dict[str, Any]):
+    """发送一条消息"""
+    data = json.dumps(message, ensure_ascii=False, default=_json_default).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def recv_message(sock: socket.socket) -> Optional[Dict[str, Any]]:
+    """接收一条消息，对端关闭连接时返回None"""
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+    (length,) = _HEADER.unpack(header)
+    data = _recv_exact(sock, length)
+    if data is None:
+        raise ConnectionError("连接在消息中途关闭")
+    return json.loads(data.decode('utf-8'))
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = sock.recv(min(remaining, 1 << 20))
+        if not chunk:
+            if remaining == size:
+                return None
+            raise ConnectionError("连接在消息中途关闭")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+def build_retriever(config: Dict[str, Any], kb_file: Optional[str] = None) -> RAGRetriever:
+    """
+    根据配置文件（configs/default.yaml格式）创建知识库和检索器
+
+    Args:
+        config: 配置字典
+        kb_file: 知识库文件路径（覆盖配置文件）
+
+    Returns:
+        检索器实例（知识库已加载）
+    """
+    kb_config = config.get('knowledge_base', {})
+    rag_config = config.get('rag', {})
+    kb = KnowledgeBase(
+        kb_file or kb_config.get('case_file', 'data/knowledge_base/kb_cases.json'),
+        max_cases=kb_config.get('max_cases', 1000),
+        ann_backend=kb_config.get('ann_backend'),
+        ann_params=kb_config.get('ann_params'),
+        eviction_policy=kb_config.get('eviction_policy', 'fifo'),
+        embedding_quantization=kb_config.get('embedding_quantization')
+    )
+    kb.load()
+    return RAGRetriever(
+        kb,
+        embedding_model_name=kb_config.get('embedding_model', "sentence-transformers/all-MiniLM-L6-v2"),
+        embedding_model_type=kb_config.get('embedding_model_type'),
+        ollama_base_url=kb_config.get('ollama_base_url', "http://localhost:11434"),
+        coarse_top_k=rag_config.get('coarse_top_k', 50),
+        fine_top_k=rag_config.get('fine_top_k', 20),
+        semantic_top_k=rag_config.get('semantic_top_k', 10),
+        similarity_threshold=kb_config.get('similarity_threshold', 0.7),
+        ann_min_candidates=rag_config.get('ann_min_candidates', 4096),
+        text_embedding_cache_dir=kb_config.get('text_embedding_cache_dir'),
+        quantized_rerank=rag_config.get('quantized_rerank', 4),
+        weighted_rerank=rag_config.get('weighted_rerank', False),
+        rerank_weights=rag_config.get('rerank_weights'),
+        rerank_scope=rag_config.get('rerank_scope', 'cascade')
+    )
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """每个客户端连接一个线程：读取请求，交给工作线程，等待结果后回复"""
+
+    def handle(self):
+        while True:
+            try:
+                request = recv_message(self.request)
+            except (ConnectionError, OSError, ValueError):
+                return
+            if request is None:
+                return
+            future = self.server.retrieval_server.submit(request)
+            try:
+                response = {'ok': True, 'result': future.result()}
+            except Exception as e:
+                response = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+            try:
+                send_message(self.request, response)
+            except OSError:
+                return
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    # 大量客户端同时连接时，默认的监听队列（5）会让connect失败（EAGAIN）
+    request_queue_size = 1024
+
+
+class RetrievalServer:
+    """检索守护进程"""
+
+    def __init__(
+        self,
+        retriever: RAGRetriever,
+        socket_path: str,
+        max_batch: int = 256,
+        batch_window: float = 0.002
+    ):
+        """
+        Args:
+            retriever: 进程内检索器（模型、知识库常驻）
+            socket_path: Unix域套接字路径
+            max_batch: 一次合并执行的最大查询数
+            batch_window: 收到第一个请求后等待更多请求的时间（秒）
+        """
+        self.retriever = retriever
+        self.socket_path = Path(socket_path)
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self._requests: 'queue.Queue[Optional[tuple]]' = queue.Queue()
+        self._server: Optional[_UnixServer] = None
+        self._worker: Optional[threading.Thread] = None
+
+    def submit(self, request: Dict[str, Any]) -> Future:
+        """提交请求到工作线程"""
+        future: Future = Future()
+        self._requests.put((request, future))
+        return future
+
+    def start(self):
+        """在后台线程中开始服务"""
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.socket_path.exists():
+            # 残留的套接字文件：确认没有守护进程在监听后删除
+            if RetrievalClient(str(self.socket_path), fallback=None).ping():
+                raise RuntimeError(f"检索守护进程已在运行: {self.socket_path}")
+            self.socket_path.unlink()
+        self._server = _UnixServer(str(self.socket_path), _Handler)
+        self._server.retrieval_server = self
+        self._worker = threading.Thread(target=self._work, daemon=True)
+        self._worker.start()
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def serve_forever(self):
+        """前台服务直到KeyboardInterrupt"""
+        self.start()
+        print(f"✓ 检索守护进程已启动: {self.socket_path} (知识库 {self.retriever.kb.size()} 个案例)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """停止服务并删除套接字文件"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._worker is not None:
+            self._requests.put(None)
+            self._worker.join()
+            self._worker = None
+        self.socket_path.unlink(missing_ok=True)
+
+    def _work(self):
+        """工作线程：按时间窗口收集请求，合并检索"""
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            batch = [item]
+            num_queries = len(item[0].get('query_features') or ())
+            deadline = time.monotonic() + self.batch_window
+            while num_queries < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._requests.put(None)
+                    break
+                batch.append(item)
+                num_queries += len(item[0].get('query_features') or ())
+            self._execute(batch)
+
+    def _execute(self, batch: List[tuple]):
+        retrievals = []
+        for request, future in batch:
+            op = request.get('op')
+            if op == 'retrieve_many':
+                retrievals.append((request, future))
+                continue
+            try:
+                if op == 'ping':
+                    future.set_result({'num_cases': self.retriever.kb.size()})
+                elif op == 'get_case':
+                    future.set_result(self.retriever.get_case(request['design_id']))
+                elif op == 'reload':
+                    future.set_result(self.retriever.kb.load())
+                else:
+                    raise ValueError(f"未知的请求类型: {op}")
+            except Exception as e:
+                future.set_exception(e)
+        if retrievals:
+            self._retrieve(retrievals)
+
+    def _retrieve(self, retrievals: List[tuple]):
+        """合并多个retrieve_many请求为一次检索；特征维度不同的请求分组执行"""
+        groups: Dict[int, List[tuple]] = {}
+        for request, future in retrievals:
+            try:
+                queries = np.asarray(request['query_features'], dtype=np.float32)
+                queries = queries.reshape(len(queries), -1)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            groups.setdefault(queries.shape[1], []).append((request, future, queries))
+
+        for members in groups.values():
+            texts, scales, types = [], [], []
+            for request, _, queries in members:
+                n = len(queries)
+                texts += list(request.get('query_texts') or [None] * n)
+                scales += list(request.get('design_scales') or [None] * n)
+                types += list(request.get('design_types') or [None] * n)
+            try:
+                results = self.retriever.retrieve_many(
+                    np.concatenate([queries for _, _, queries in members]), texts, scales, types
+                )
+            except Exception as e:
+                if len(members) == 1:
+                    members[0][1].set_exception(e)
+                    continue
+                # 合并执行失败（如某个请求参数长度不一致）时逐个执行，只让出错的请求失败
+                for request, future, queries in members:
+                    self._retrieve_one(request, future, queries)
+                continue
+            start = 0
+            for _, future, queries in members:
+                future.set_result(results[start:start + len(queries)])
+                start += len(queries)
+
+    def _retrieve_one(self, request: Dict[str, Any], future: Future, queries: np.ndarray):
+        try:
+            future.set_result(self.retriever.retrieve_many(
+                queries, request.get('query_texts'), request.get('design_scales'),
+                request.get('design_types')
+            ))
+        except Exception as e:
+            future.set_exception(e)
+
+
+class RetrievalClient:
+    """
+    检索守护进程客户端
+
+    接口与RAGRetriever一致（retrieve / retrieve_many / get_case）；
+    连接不到守护进程时调用fallback创建进程内检索器处理本次请求，
+    之后的请求仍先尝试连接守护进程；已连接后请求超时或读写出错时直接抛出异常
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        fallback: Optional[Callable[[], RAGRetriever]] = None,
+        timeout: float = 300.0
+    ):
+        """
+        Args:
+            socket_path: 守护进程的Unix域套接字路径
+            fallback: 创建进程内检索器的函数（None时守护进程不可用直接抛出异常）
+            timeout: 单次请求超时（秒）
+        """
+        self.socket_path = str(socket_path)
+        self.fallback = fallback
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._local: Optional[RAGRetriever] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _request(self, request: Dict[str, Any]) -> Any:
+        with self._lock:
+            for attempt in range(2):
+                if self._sock is None:
+                    self._sock = self._connect()
+                try:
+                    send_message(self._sock, request)
+                    response = recv_message(self._sock)
+                    if response is None:
+                        raise ConnectionError("守护进程关闭了连接")
+                    break
+                except (ConnectionError, BrokenPipeError):
+                    # 守护进程重启过：重新连接一次
+                    self.close()
+                    if attempt == 1:
+                        raise
+                except OSError:
+                    self.close()
+                    raise
+        if not response.get('ok'):
+            raise RuntimeError(f"检索守护进程返回错误: {response.get('error')}")
+        return response['result']
+
+    def _call(self, request: Dict[str, Any], local: Callable[[RAGRetriever], Any]) -> Any:
+        try:
+            return self._request(request)
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            # 只有连接失败（守护进程未启动）才回退；请求中途的超时等错误照常抛出
+            if self.fallback is None:
+                raise
+            if self._local is None:
+                print(f"警告：检索守护进程不可用（{e}），使用进程内检索")
+                self._local = self.fallback()
+        return local(self._local)
+
+    def ping(self) -> bool:
+        """守护进程是否可用"""
+        try:
+            self._request({'op': 'ping'})
+            return True
+        except (OSError, ConnectionError, RuntimeError):
+            return False
+
+    def retrieve(
+        self,
+        query_features: np.ndarray,
+        query_text: Optional[str] = None,
+        design_scale: Optional[int] = None,
+        design_type: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """与RAGRetriever.retrieve一致"""
+        queries = np.asarray(query_features, dtype=np.float32).reshape(1, -1)
+        return self.retrieve_many(queries, [query_text], [design_scale], [design_type])[0]
+
+    def retrieve_many(
+        self,
+        query_features: np.ndarray,
+        query_texts: Optional[Sequence[Optional[str]]] = None,
+        design_scales: Optional[Sequence[Optional[int]]] = None,
+        design_types: Optional[Sequence[Optional[str]]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """与RAGRetriever.retrieve_many一致"""
+        queries = np.asarray(query_features, dtype=np.float32)
+        if len(queries) == 0:
+            return []
+        queries = queries.reshape(len(queries), -1)
+        request = {
+            'op': 'retrieve_many',
+            'query_features': queries.tolist(),
+            'query_texts': list(query_texts) if query_texts is not None else None,
+            'design_scales': list(design_scales) if design_scales is not None else None,
+            'design_types': list(design_types) if design_types is not None else None,
+        }
+        return self._call(request, lambda local: local.retrieve_many(
+            queries, query_texts, design_scales, design_types
+        ))
+
+    def get_case(self, design_id: str) -> Optional[Dict[str, Any]]:
+        """与RAGRetriever.get_case一致（完整案例）"""
+        return self._call({'op': 'get_case', 'design_id': design_id},
+                          lambda local: local.get_case(design_id))
+
+    def reload(self) -> bool:
+        """让守护进程重新加载知识库文件（进程内检索时重新加载本地知识库）"""
+        return self._call({'op': 'reload'}, lambda local: local.kb.load())
+
+    def close(self):
+        """关闭连接"""
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+
+
+def connect_retriever(
+    config: Dict[str, Any],
+    socket_path: Optional[str] = None,
+    kb_file: Optional[str] = None
+) -> RetrievalClient:
+    """
+    创建检索客户端：优先使用守护进程，不可用时按配置创建进程内检索器
+
+    Args:
+        config: 配置字典
+        socket_path: 守护进程套接字路径（默认使用配置中的rag.daemon_socket）
+        kb_file: 进程内检索时使用的知识库文件（覆盖配置文件）
+
+    Returns:
+        检索客户端
+    """
+    socket_path = socket_path or config.get('rag', {}).get(
+        'daemon_socket', 'data/knowledge_base/retrieval.sock'
+    )
+    return RetrievalClient(socket_path, fallback=lambda: build_retriever(config, kb_file))
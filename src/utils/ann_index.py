@@ -0,0 +1,615 @@
+"""
+近似最近邻（ANN）索引模块
+为知识库的案例嵌入和特征向量提供可插拔的向量索引：
+1. flat: 精确内积检索（NumPy）
+2. ivf: 倒排文件索引（纯NumPy，k-means粗聚类 + 探测nprobe个簇）
+3. faiss: 可选的faiss后端（需要安装faiss）
+
+所有索引均假设输入向量已做L2归一化，以内积作为余弦相似度；
+支持增量插入/删除以及保存到文件（npz格式，faiss后端使用faiss格式）。
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+def _as_matrix(vectors: Any, dim: int) -> np.ndarray:
+    """转换为 (n, dim) 的连续float32矩阵"""
+    matrix = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, dim)
+    return matrix
+
+
+def _top_k_desc(scores: np.ndarray, k: int) -> np.ndarray:
+    """返回分数最高的k个位置（降序，分数相同时按位置升序）"""
+    if k <= 0 or scores.size == 0:
+        return np.array([], dtype=np.int64)
+    if k < scores.size:
+        part = np.argpartition(-scores, k - 1)[:k]
+    else:
+        part = np.arange(scores.size)
+    order = np.lexsort((part, -scores[part]))
+    return part[order]
+
+
+class VectorIndex:
+    """向量索引基类"""
+
+    backend = 'base'
+
+    def __init__(self, dim: int):
+        """
+        Args:
+            dim: 向量维度
+        """
+        self.dim = int(dim)
+
+    def add(self, ids: Iterable[int], vectors: np.ndarray):
+        """
+        插入向量（已存在的id会被覆盖）
+
+        Args:
+            ids: 整数id序列
+            vectors: 向量矩阵 (n, dim)
+        """
+        raise NotImplementedError
+
+    def remove(self, ids: Iterable[int]):
+        """删除向量（不存在的id被忽略）"""
+        raise NotImplementedError
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        检索内积最大的k个向量
+
+        Args:
+            queries: 查询向量 (dim,) 或 (q, dim)
+            k: 返回数量
+
+        Returns:
+            (ids, scores)，形状均为 (q, k)；不足k个时id用-1填充，分数为-inf
+        """
+        queries = _as_matrix(queries, self.dim)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for i, query in enumerate(queries):
+            found_ids, found_scores = self._search_one(query, k)
+            ids[i, :len(found_ids)] = found_ids
+            scores[i, :len(found_ids)] = found_scores
+        return ids, scores
+
+    def _search_one(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def __contains__(self, vector_id: int) -> bool:
+        raise NotImplementedError
+
+    def save(self, path: str):
+        """保存索引到文件（faiss后端使用faiss自身格式，其余为.npz）"""
+        raise NotImplementedError
+
+    @staticmethod
+    def load(path: str) -> 'VectorIndex':
+        """
+        从文件加载索引（根据文件中记录的后端类型分派）
+
+        Args:
+            path: 索引文件路径
+
+        Returns:
+            索引实例
+        """
+        path = Path(path)
+        with open(path, 'rb') as f:
+            is_npz = f.read(2) == b'PK'
+        if not is_npz:
+            return FaissIndex.load_faiss(str(path))
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            arrays = {key: data[key] for key in data.files if key != 'meta'}
+        backend = meta.get('backend')
+        if backend == FlatIndex.backend:
+            return FlatIndex._from_arrays(meta, arrays)
+        if backend == IVFIndex.backend:
+            return IVFIndex._from_arrays(meta, arrays)
+        raise ValueError(f"未知的索引类型: {backend}")
+
+
+class _VectorList:
+    """可增长的 (ids, vectors) 存储，删除时用末尾元素填补空位"""
+
+    def __init__(self, dim: int, capacity: int = 16):
+        self.ids = np.empty(capacity, dtype=np.int64)
+        self.vectors = np.empty((capacity, dim), dtype=np.float32)
+        self.size = 0
+
+    def append(self, ids: np.ndarray, vectors: np.ndarray) -> int:
+        """追加并返回起始位置"""
+        need = self.size + len(ids)
+        if need > len(self.ids):
+            capacity = max(need, 2 * len(self.ids))
+            new_ids = np.empty(capacity, dtype=np.int64)
+            new_vectors = np.empty((capacity, self.vectors.shape[1]), dtype=np.float32)
+            new_ids[:self.size] = self.ids[:self.size]
+            new_vectors[:self.size] = self.vectors[:self.size]
+            self.ids, self.vectors = new_ids, new_vectors
+        start = self.size
+        self.ids[start:need] = ids
+        self.vectors[start:need] = vectors
+        self.size = need
+        return start
+
+    def pop(self, pos: int) -> Optional[int]:
+        """删除指定位置，返回被移动到该位置的id（没有移动时返回None）"""
+        last = self.size - 1
+        moved = None
+        if pos != last:
+            self.ids[pos] = self.ids[last]
+            self.vectors[pos] = self.vectors[last]
+            moved = int(self.ids[pos])
+        self.size = last
+        return moved
+
+
+class FlatIndex(VectorIndex):
+    """精确检索索引（暴力内积）"""
+
+    backend = 'flat'
+
+    def __init__(self, dim: int):
+        super().__init__(dim)
+        self._store = _VectorList(dim)
+        self._positions: Dict[int, int] = {}
+
+    def add(self, ids: Iterable[int], vectors: np.ndarray):
+        ids = np.asarray(list(ids), dtype=np.int64)
+        vectors = _as_matrix(vectors, self.dim)
+        self.remove([i for i in ids if int(i) in self._positions])
+        start = self._store.append(ids, vectors)
+        for offset, vector_id in enumerate(ids):
+            self._positions[int(vector_id)] = start + offset
+
+    def remove(self, ids: Iterable[int]):
+        for vector_id in ids:
+            pos = self._positions.pop(int(vector_id), None)
+            if pos is None:
+                continue
+            moved = self._store.pop(pos)
+            if moved is not None:
+                self._positions[moved] = pos
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        queries = _as_matrix(queries, self.dim)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        n = self._store.size
+        if n == 0:
+            return ids, scores
+        all_scores = queries @ self._store.vectors[:n].T
+        for i in range(len(queries)):
+            top = _top_k_desc(all_scores[i], k)
+            ids[i, :len(top)] = self._store.ids[top]
+            scores[i, :len(top)] = all_scores[i, top]
+        return ids, scores
+
+    def __len__(self) -> int:
+        return self._store.size
+
+    def __contains__(self, vector_id: int) -> bool:
+        return int(vector_id) in self._positions
+
+    def save(self, path: str):
+        n = self._store.size
+        meta = {'backend': self.backend, 'dim': self.dim}
+        with open(path, 'wb') as f:
+            np.savez(f, meta=json.dumps(meta),
+                     ids=self._store.ids[:n], vectors=self._store.vectors[:n])
+
+    @classmethod
+    def _from_arrays(cls, meta: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> 'FlatIndex':
+        index = cls(meta['dim'])
+        if len(arrays['ids']) > 0:
+            index.add(arrays['ids'], arrays['vectors'])
+        return index
+
+
+class IVFIndex(VectorIndex):
+    """
+    倒排文件（IVF）近似索引
+
+    向量数量达到train_threshold后用k-means训练nlist个质心，每个向量归入最近的质心列表；
+    检索时只扫描与查询最相似的nprobe个列表。训练前退化为精确检索。
+    向量数量增长到训练时的retrain_factor倍后自动重新训练。
+    """
+
+    backend = 'ivf'
+
+    def __init__(
+        self,
+        dim: int,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        train_threshold: int = 2048,
+        retrain_factor: float = 4.0,
+        kmeans_iters: int = 10,
+        seed: int = 0
+    ):
+        """
+        Args:
+            dim: 向量维度
+            nlist: 质心数量（None表示训练时取 4*sqrt(n)）
+            nprobe: 检索时探测的列表数
+            train_threshold: 触发训练的最小向量数
+            retrain_factor: 向量数增长到训练规模的多少倍时重新训练
+            kmeans_iters: k-means迭代次数
+            seed: 随机种子
+        """
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self.retrain_factor = retrain_factor
+        self.kmeans_iters = kmeans_iters
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+        self._lists: List[_VectorList] = [_VectorList(dim)]
+        self._positions: Dict[int, Tuple[int, int]] = {}  # id -> (list, pos)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def add(self, ids: Iterable[int], vectors: np.ndarray):
+        ids = np.asarray(list(ids), dtype=np.int64)
+        vectors = _as_matrix(vectors, self.dim)
+        self.remove([i for i in ids if int(i) in self._positions])
+        self._assign(ids, vectors)
+
+        n = len(self)
+        if not self.is_trained and n >= self.train_threshold:
+            self.train()
+        elif self.is_trained and n >= self.retrain_factor * self.trained_size:
+            self.train()
+
+    def _assign(self, ids: np.ndarray, vectors: np.ndarray):
+        if len(ids) == 0:
+            return
+        if self.is_trained:
+            assignment = np.argmax(vectors @ self.centroids.T, axis=1)
+        else:
+            assignment = np.zeros(len(ids), dtype=np.int64)
+        order = np.argsort(assignment, kind='stable')
+        boundaries = np.flatnonzero(np.diff(assignment[order])) + 1
+        for group in np.split(order, boundaries):
+            list_id = int(assignment[group[0]])
+            start = self._lists[list_id].append(ids[group], vectors[group])
+            for offset, vector_id in enumerate(ids[group]):
+                self._positions[int(vector_id)] = (list_id, start + offset)
+
+    def remove(self, ids: Iterable[int]):
+        for vector_id in ids:
+            entry = self._positions.pop(int(vector_id), None)
+            if entry is None:
+                continue
+            list_id, pos = entry
+            moved = self._lists[list_id].pop(pos)
+            if moved is not None:
+                self._positions[moved] = (list_id, pos)
+
+    def _all_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        ids = np.concatenate([lst.ids[:lst.size] for lst in self._lists])
+        vectors = np.concatenate([lst.vectors[:lst.size] for lst in self._lists])
+        return ids, vectors
+
+    def train(self, sample_size: int = 65536):
+        """用当前向量训练（或重新训练）质心并重新分配列表"""
+        ids, vectors = self._all_vectors()
+        n = len(ids)
+        if n == 0:
+            return
+        nlist = self.nlist or max(1, int(4 * np.sqrt(n)))
+        nlist = min(nlist, n)
+
+        rng = np.random.default_rng(self.seed)
+        sample = vectors
+        if n > sample_size:
+            sample = vectors[rng.choice(n, sample_size, replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iters):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(assignment, kind='stable')
+            present, starts = np.unique(assignment[order], return_index=True)
+            sums = np.zeros_like(centroids)
+            sums[present] = np.add.reduceat(sample[order], starts, axis=0)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            nonempty = norms[:, 0] > 0
+            # 空簇保留原质心（球面k-means：质心归一化）
+            centroids[nonempty] = sums[nonempty] / norms[nonempty]
+
+        self.centroids = centroids.astype(np.float32)
+        self.trained_size = n
+        self._lists = [_VectorList(self.dim, capacity=4) for _ in range(nlist)]
+        self._positions = {}
+        self._assign(ids, vectors)
+
+    def _search_one(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self.is_trained:
+            probe = _top_k_desc(self.centroids @ query, self.nprobe)
+            lists = [self._lists[i] for i in probe if self._lists[i].size > 0]
+        else:
+            lists = [lst for lst in self._lists if lst.size > 0]
+        if not lists:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        if len(lists) == 1:
+            ids = lists[0].ids[:lists[0].size]
+            scores = lists[0].vectors[:lists[0].size] @ query
+        else:
+            ids = np.concatenate([lst.ids[:lst.size] for lst in lists])
+            scores = np.concatenate([lst.vectors[:lst.size] @ query for lst in lists])
+        top = _top_k_desc(scores, k)
+        return ids[top], scores[top]
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, vector_id: int) -> bool:
+        return int(vector_id) in self._positions
+
+    def save(self, path: str):
+        ids, vectors = self._all_vectors()
+        assignment = np.concatenate([
+            np.full(lst.size, i, dtype=np.int64) for i, lst in enumerate(self._lists)
+        ])
+        meta = {
+            'backend': self.backend,
+            'dim': self.dim,
+            'nlist': self.nlist,
+            'nprobe': self.nprobe,
+            'train_threshold': self.train_threshold,
+            'retrain_factor': self.retrain_factor,
+            'kmeans_iters': self.kmeans_iters,
+            'seed': self.seed,
+            'trained_size': self.trained_size,
+        }
+        arrays = {'ids': ids, 'vectors': vectors, 'assignment': assignment}
+        if self.is_trained:
+            arrays['centroids'] = self.centroids
+        with open(path, 'wb') as f:
+            np.savez(f, meta=json.dumps(meta), **arrays)
+
+    @classmethod
+    def _from_arrays(cls, meta: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> 'IVFIndex':
+        index = cls(
+            meta['dim'],
+            nlist=meta['nlist'],
+            nprobe=meta['nprobe'],
+            train_threshold=meta['train_threshold'],
+            retrain_factor=meta['retrain_factor'],
+            kmeans_iters=meta['kmeans_iters'],
+            seed=meta['seed'],
+        )
+        if 'centroids' in arrays:
+            index.centroids = arrays['centroids'].astype(np.float32)
+            index.trained_size = meta['trained_size']
+            index._lists = [_VectorList(index.dim, capacity=4) for _ in range(len(index.centroids))]
+        # 直接按保存的分配结果恢复列表，无需重新计算质心距离
+        ids, vectors, assignment = arrays['ids'], arrays['vectors'], arrays['assignment']
+        order = np.argsort(assignment, kind='stable')
+        boundaries = np.flatnonzero(np.diff(assignment[order])) + 1
+        for group in np.split(order, boundaries) if len(order) else []:
+            list_id = int(assignment[group[0]])
+            start = index._lists[list_id].append(ids[group], vectors[group])
+            for offset, vector_id in enumerate(ids[group]):
+                index._positions[int(vector_id)] = (list_id, start + offset)
+        return index
+
+
+class FaissIndex(VectorIndex):
+    """faiss后端（IndexIDMap2 + Flat或IVF，内积度量）"""
+
+    backend = 'faiss'
+
+    def __init__(self, dim: int, nlist: Optional[int] = None, nprobe: int = 8,
+                 train_threshold: int = 2048):
+        """
+        Args:
+            dim: 向量维度
+            nlist: IVF质心数量（None表示使用精确的IndexFlatIP）
+            nprobe: 检索时探测的列表数
+            train_threshold: IVF训练所需的最小向量数（训练前暂存向量）
+        """
+        super().__init__(dim)
+        import faiss
+        self._faiss = faiss
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self._ids: set = set()
+        self._pending = FlatIndex(dim)
+        if nlist is None:
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        else:
+            quantizer = faiss.IndexFlatIP(dim)
+            self._index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            self._index.nprobe = nprobe
+
+    def _ready(self) -> bool:
+        return self._index.is_trained
+
+    def add(self, ids: Iterable[int], vectors: np.ndarray):
+        ids = np.asarray(list(ids), dtype=np.int64)
+        vectors = _as_matrix(vectors, self.dim)
+        self.remove(ids)
+        self._ids.update(int(i) for i in ids)
+        if self._ready():
+            self._index.add_with_ids(vectors, ids)
+            return
+        self._pending.add(ids, vectors)
+        if len(self._pending) >= max(self.train_threshold, self.nlist or 0):
+            pending_ids, pending_vectors = self._pending._store.ids, self._pending._store.vectors
+            n = len(self._pending)
+            self._index.train(pending_vectors[:n])
+            self._index.add_with_ids(pending_vectors[:n], pending_ids[:n].copy())
+            self._pending = FlatIndex(self.dim)
+
+    def remove(self, ids: Iterable[int]):
+        ids = np.asarray([i for i in ids if int(i) in self._ids], dtype=np.int64)
+        if len(ids) == 0:
+            return
+        self._ids.difference_update(int(i) for i in ids)
+        if self._ready():
+            self._index.remove_ids(ids)
+        else:
+            self._pending.remove(ids)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        queries = _as_matrix(queries, self.dim)
+        if not self._ready():
+            return self._pending.search(queries, k)
+        scores, ids = self._index.search(queries, k)
+        scores = scores.astype(np.float32)
+        scores[ids < 0] = -np.inf
+        return ids.astype(np.int64), scores
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, vector_id: int) -> bool:
+        return int(vector_id) in self._ids
+
+    def save(self, path: str):
+        if not self._ready():
+            # 未训练时按flat格式保存暂存的向量
+            self._pending.save(path)
+            return
+        self._faiss.write_index(self._index, str(path))
+
+    @classmethod
+    def load_faiss(cls, path: str) -> 'FaissIndex':
+        import faiss
+        raw = faiss.read_index(path)
+        index = cls.__new__(cls)
+        VectorIndex.__init__(index, raw.d)
+        index._faiss = faiss
+        index._index = raw
+        index.nlist = getattr(raw, 'nlist', None)
+        index.nprobe = getattr(raw, 'nprobe', 8)
+        index.train_threshold = 0
+        index._pending = FlatIndex(raw.d)
+        index._ids = set(int(i) for i in faiss.vector_to_array(raw.id_map)) \
+            if hasattr(raw, 'id_map') else set(int(i) for i in _ivf_ids(raw))
+        return index
+
+
+def _ivf_ids(index: Any) -> List[int]:
+    """读取faiss IVF索引中的全部id"""
+    import faiss
+    invlists = index.invlists
+    ids: List[int] = []
+    for list_no in range(index.nlist):
+        size = invlists.list_size(list_no)
+        if size:
+            ids.extend(faiss.rev_swig_ptr(invlists.get_ids(list_no), size).tolist())
+    return ids
+
+
+def faiss_available() -> bool:
+    """检查faiss是否可用"""
+    try:
+        import faiss  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def create_index(backend: str, dim: int, **kwargs) -> VectorIndex:
+    """
+    创建向量索引
+
+    Args:
+        backend: 'flat', 'ivf', 'faiss'（faiss未安装时退回ivf）
+        dim: 向量维度
+        **kwargs: 传给索引构造函数的参数
+
+    Returns:
+        索引实例
+    """
+    if backend == 'flat':
+        return FlatIndex(dim)
+    if backend == 'ivf':
+        return IVFIndex(dim, **kwargs)
+    if backend == 'faiss':
+        if faiss_available():
+            return FaissIndex(dim, **{
+                key: value for key, value in kwargs.items()
+                if key in ('nlist', 'nprobe', 'train_threshold')
+            })
+        print("警告：未安装faiss，使用纯NumPy的IVF索引代替")
+        return IVFIndex(dim, **kwargs)
+    raise ValueError(f"不支持的索引类型: {backend}")
+
+
+def recall_report(
+    index: VectorIndex,
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k_values: Iterable[int] = (1, 10, 50),
+    ids: Optional[np.ndarray] = None
+) -> Dict[str, Any]:
+    """
+    对比ANN索引与精确检索，计算recall@k和查询延迟
+
+    Args:
+        index: 待评估的索引（已插入vectors）
+        vectors: 索引中的全部向量 (n, dim)，已归一化
+        queries: 查询向量 (q, dim)，已归一化
+        k_values: 需要评估的k列表
+        ids: vectors对应的id（默认为0..n-1）
+
+    Returns:
+        报告字典：recall@k、平均/p50/p99延迟（毫秒）
+    """
+    vectors = _as_matrix(vectors, index.dim)
+    queries = _as_matrix(queries, index.dim)
+    if ids is None:
+        ids = np.arange(len(vectors), dtype=np.int64)
+    k_values = sorted(set(int(k) for k in k_values))
+    max_k = max(k_values)
+
+    exact_scores = queries @ vectors.T
+    exact = [ids[_top_k_desc(row, max_k)] for row in exact_scores]
+
+    latencies = []
+    approx = []
+    for query in queries:
+        start = time.perf_counter()
+        found, _ = index.search(query, max_k)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        approx.append(found[0])
+
+    report: Dict[str, Any] = {
+        'backend': index.backend,
+        'num_vectors': int(len(vectors)),
+        'num_queries': int(len(queries)),
+    }
+    for k in k_values:
+        hits = [
+            len(set(exact_ids[:k].tolist()) & set(found_ids[:k].tolist()))
+            for exact_ids, found_ids in zip(exact, approx)
+        ]
+        expected = min(k, len(vectors)) * len(queries)
+        report[f'recall@{k}'] = float(np.sum(hits) / expected) if expected else 0.0
+    latencies = np.array(latencies)
+    report['latency_ms'] = {
+        'mean': float(latencies.mean()) if len(latencies) else 0.0,
+        'p50': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+        'p99': float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+    }
+    return report
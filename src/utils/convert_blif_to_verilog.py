@@ -2,13 +2,354 @@
 """
 将 BLIF 格式转换为 Verilog 格式的工具
 用于将 titan23 的 BLIF 网表转换为 OpenROAD 可用的 Verilog
+
+除 yosys 综合外，提供流式结构化转换（simple）：逐条读取 BLIF 语句（.names/.latch/.subckt），
+单遍写出结构化 Verilog，或单遍生成 K-SpecPart 超图（.hgr）及顶点映射，
+内存只与net名和引脚数成正比，不保留整个网表
 """
 
+import re
 import sys
 import os
+import json
 import argparse
 import subprocess
+from array import array
 from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+_WRITE_BUFFER = 1 << 20
+
+_SIMPLE_IDENTIFIER_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_$]*\Z')
+_VERILOG_KEYWORDS = frozenset((
+    'module', 'endmodule', 'input', 'output', 'inout', 'wire', 'reg', 'assign',
+    'always', 'begin', 'end', 'if', 'else', 'case', 'default', 'for', 'function',
+    'task', 'parameter', 'localparam', 'supply0', 'supply1', 'tri', 'and', 'or',
+    'not', 'nand', 'nor', 'xor', 'xnor', 'buf',
+))
+
+# 顶层实例类型编码（用于由顶点ID还原实例名）
+_INSTANCE_KINDS = ('names', 'latch', 'subckt')
+
+
+def iter_blif_statements(blif_file: str) -> Iterator[Tuple[str, List[str], Optional[List[str]]]]:
+    """
+    流式读取 BLIF 文件，逐条产生 (关键字, 参数列表, 真值表行)
+
+    处理 # 注释和行尾反斜杠续行；.names 语句的真值表行（如 "1-0 1"）随该语句一并产生，
+    其他语句的真值表行为 None
+
+    Args:
+        blif_file: BLIF 文件路径
+    """
+    pending = None
+    continued = ''
+    with open(blif_file, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            if '#' in line:
+                line = line[:line.index('#')]
+            line = line.rstrip()
+            if line.endswith('\\'):
+                continued += line[:-1] + ' '
+                continue
+            if continued:
+                line = continued + line
+                continued = ''
+            tokens = line.split()
+            if not tokens:
+                continue
+            if tokens[0][0] == '.':
+                if pending is not None:
+                    yield pending
+                keyword = tokens[0]
+                pending = (keyword, tokens[1:], [] if keyword == '.names' else None)
+            elif pending is not None and pending[2] is not None:
+                pending[2].append(' '.join(tokens))
+    if pending is not None:
+        yield pending
+
+
+def _verilog_name(name: str) -> str:
+    """BLIF 名称转换为 Verilog 标识符（非简单标识符时使用转义标识符）"""
+    if _SIMPLE_IDENTIFIER_RE.match(name) and name not in _VERILOG_KEYWORDS:
+        return name
+    return '\\' + name + ' '
+
+
+def _lut_mask(num_inputs: int, cover: List[str]) -> int:
+    """
+    由 .names 真值表计算查找表掩码（第i位为输入编码i时的输出，第一个输入为最低位）
+
+    输出列为1的行描述ON集，为0的行描述OFF集
+    """
+    on_set = 0
+    off_cover = False
+    for row in cover:
+        if num_inputs:
+            plane, value = row.split()
+        else:
+            plane, value = '', row
+        off_cover = value == '0'
+        # 展开无关位
+        minterms = [0]
+        for bit, char in enumerate(plane):
+            if char == '1':
+                minterms = [m | (1 << bit) for m in minterms]
+            elif char == '-':
+                minterms += [m | (1 << bit) for m in minterms]
+        for m in minterms:
+            on_set |= 1 << m
+    if off_cover:
+        on_set = ((1 << (1 << num_inputs)) - 1) & ~on_set
+    return on_set
+
+
+def _instance_statement(keyword: str, args: List[str], cover: Optional[List[str]]):
+    """
+    BLIF 实例语句转换为 (单元类型, 参数, [(引脚, net)])
+
+    - .names in... out      -> LUT<k> #(.INIT(掩码)) (.A0..A<k-1>, .Y)
+    - .latch in out [type control] [init] -> BLIF_LATCH #(.TYPE, .INIT) (.D, .Q[, .C])
+    - .subckt type formal=actual ...      -> type (.formal(actual) ...)
+    """
+    if keyword == '.names':
+        inputs, output = args[:-1], args[-1]
+        k = len(inputs)
+        width = 1 << k
+        mask = _lut_mask(k, cover)
+        params = f".INIT({width}'h{mask:0{(width + 3) // 4}x})"
+        pins = [(f'A{i}', net) for i, net in enumerate(inputs)]
+        pins.append(('Y', output))
+        return f'LUT{k}', params, pins
+    if keyword == '.latch':
+        pins = [('D', args[0]), ('Q', args[1])]
+        latch_type, init = 're', '3'
+        if len(args) >= 4:
+            latch_type = args[2]
+            if args[3] != 'NIL':
+                pins.append(('C', args[3]))
+            if len(args) >= 5:
+                init = args[4]
+        elif len(args) == 3:
+            init = args[2]
+        return 'BLIF_LATCH', f'.TYPE("{latch_type}"), .INIT({init})', pins
+    pins = []
+    for assignment in args[1:]:
+        formal, _, actual = assignment.partition('=')
+        pins.append((formal, actual))
+    return args[0], None, pins
+
+
+class _VerilogModuleWriter:
+    """流式写出一个 BLIF 模型对应的 Verilog 模块（端口声明在第一条实例语句前写出）"""
+
+    def __init__(self, f, name: str):
+        self.f = f
+        self.name = name
+        self.inputs: List[str] = []
+        self.outputs: List[str] = []
+        self.declared = set()
+        self.started = False
+        self.num_instances = 0
+
+    def add_ports(self, keyword: str, names: List[str]):
+        if self.started:
+            raise ValueError(f"模型 {self.name} 的 {keyword} 出现在实例语句之后")
+        (self.outputs if keyword == '.outputs' else self.inputs).extend(names)
+
+    def _start(self):
+        self.started = True
+        ports = list(dict.fromkeys(self.inputs + self.outputs))
+        f = self.f
+        f.write(f"module {_verilog_name(self.name)} (\n")
+        f.write(',\n'.join(f"  {_verilog_name(p)}" for p in ports))
+        f.write("\n);\n")
+        for direction, names in (('input', self.inputs), ('output', self.outputs)):
+            for name in dict.fromkeys(names):
+                if name not in self.declared:
+                    f.write(f"  {direction} {_verilog_name(name)};\n")
+                    self.declared.add(name)
+
+    def add_instance(self, keyword: str, args: List[str], cover: Optional[List[str]]):
+        if not self.started:
+            self._start()
+        self.num_instances += 1
+        cell, params, pins = _instance_statement(keyword, args, cover)
+        f = self.f
+        declared = self.declared
+        for _, net in pins:
+            if net not in declared:
+                declared.add(net)
+                f.write(f"  wire {_verilog_name(net)};\n")
+        instance = f"{keyword[1:]}${self.num_instances}"
+        connections = ', '.join(f".{_verilog_name(pin)}({_verilog_name(net)})" for pin, net in pins)
+        if params:
+            f.write(f"  {_verilog_name(cell)} #({params}) {instance} ({connections});\n")
+        else:
+            f.write(f"  {_verilog_name(cell)} {instance} ({connections});\n")
+
+    def finish(self):
+        if not self.started:
+            self._start()
+        self.f.write("endmodule\n\n")
+
+
+def convert_blif_to_verilog_streaming(blif_file: str, output_verilog: str) -> Dict[str, int]:
+    """
+    单遍流式将 BLIF 转换为结构化 Verilog
+
+    每个非 .blackbox 模型写出为一个模块；实例按语句顺序命名为 names$i / latch$i / subckt$i
+    （i为模型内实例序号，从1开始），与 convert_blif_to_hgr 的顶点命名一致。
+    net 在首次使用前声明为 wire，内存只保留当前模型已声明的名称
+
+    Args:
+        blif_file: 输入的 BLIF 文件路径
+        output_verilog: 输出的 Verilog 文件路径
+
+    Returns:
+        统计信息 {'models', 'instances', 'nets'}
+    """
+    stats = {'models': 0, 'instances': 0, 'nets': 0}
+    module = None
+    with open(output_verilog, 'w', buffering=_WRITE_BUFFER) as f:
+        f.write(f"// Converted from {Path(blif_file).name}\n\n")
+        for keyword, args, cover in iter_blif_statements(blif_file):
+            if keyword == '.model':
+                module = _VerilogModuleWriter(f, args[0] if args else 'top')
+            elif module is None:
+                continue
+            elif keyword in ('.inputs', '.outputs', '.clock'):
+                module.add_ports(keyword, args)
+            elif keyword in ('.names', '.latch', '.subckt'):
+                module.add_instance(keyword, args, cover)
+            elif keyword == '.blackbox':
+                # 原语定义（如 titan23 的 stratixiv_* 单元），不生成模块
+                module = None
+            elif keyword == '.end':
+                module.finish()
+                stats['models'] += 1
+                stats['instances'] += module.num_instances
+                stats['nets'] += len(module.declared)
+                module = None
+        if module is not None:
+            module.finish()
+            stats['models'] += 1
+            stats['instances'] += module.num_instances
+            stats['nets'] += len(module.declared)
+    return stats
+
+
+def _write_mapping(output_mapping: Path, kinds: array, num_hyperedges: int):
+    """流式写出顶点映射 JSON（格式与 json.dump(..., indent=2) 相同）"""
+    num_vertices = len(kinds)
+    names = (f"{_INSTANCE_KINDS[kind]}${vid}" for vid, kind in enumerate(kinds, 1))
+    with open(output_mapping, 'w', buffering=_WRITE_BUFFER) as f:
+        f.write(f'{{\n  "num_vertices": {num_vertices},\n  "num_hyperedges": {num_hyperedges},\n')
+        if num_vertices:
+            f.write('  "vertex_to_id": {\n')
+            f.write(',\n'.join(f'    {json.dumps(name)}: {vid}' for vid, name in enumerate(names, 1)))
+            f.write('\n  },\n  "id_to_vertex": {\n')
+            names = (f"{_INSTANCE_KINDS[kind]}${vid}" for vid, kind in enumerate(kinds, 1))
+            f.write(',\n'.join(f'    "{vid}": {json.dumps(name)}' for vid, name in enumerate(names, 1)))
+            f.write('\n  }\n}')
+        else:
+            f.write('  "vertex_to_id": {},\n  "id_to_vertex": {}\n}')
+
+
+def convert_blif_to_hgr(
+    blif_file: str,
+    output_hgr: str,
+    output_mapping: Optional[str] = None
+) -> Dict[str, int]:
+    """
+    单遍流式将 BLIF 顶层模型转换为 K-SpecPart 超图格式
+
+    顶点为顶层模型的 .names/.latch/.subckt 实例（编号从1开始，按语句顺序），
+    超边为连接2个及以上顶点的net（按net首次出现顺序，顶点升序去重），
+    与 scripts/convert_ispd2015_to_hgr.py 的输出格式相同。
+    引脚以 (net编号, 顶点编号) 紧凑数组记录，读完后按net计数排序写出
+
+    Args:
+        blif_file: 输入的 BLIF 文件路径
+        output_hgr: 输出的 .hgr 文件路径
+        output_mapping: （可选）输出顶点映射关系的 JSON 文件路径
+
+    Returns:
+        统计信息 {'num_vertices', 'num_hyperedges', 'num_nets', 'num_pins'}
+    """
+    net_ids: Dict[str, int] = {}
+    pin_nets = array('i')
+    pin_vertices = array('i')
+    kinds = array('B')
+    in_top = False
+    for keyword, args, cover in iter_blif_statements(blif_file):
+        if keyword == '.model':
+            if in_top:
+                break
+            in_top = True
+        elif keyword == '.end':
+            break
+        elif not in_top:
+            continue
+        elif keyword in ('.names', '.latch', '.subckt'):
+            kinds.append(_INSTANCE_KINDS.index(keyword[1:]))
+            vid = len(kinds)
+            if keyword == '.names':
+                nets = args
+            elif keyword == '.latch':
+                nets = args[:2] + ([args[3]] if len(args) >= 4 and args[3] != 'NIL' else [])
+            else:
+                nets = [a.partition('=')[2] for a in args[1:]]
+            for net in nets:
+                net_id = net_ids.get(net)
+                if net_id is None:
+                    net_id = net_ids[net] = len(net_ids)
+                pin_nets.append(net_id)
+                pin_vertices.append(vid)
+    
+    # 按net计数排序（同一net内顶点保持升序），去除重复引脚
+    num_nets = len(net_ids)
+    del net_ids
+    offsets = array('i', bytes(4 * (num_nets + 1)))
+    for net_id in pin_nets:
+        offsets[net_id + 1] += 1
+    for i in range(num_nets):
+        offsets[i + 1] += offsets[i]
+    fill = array('i', offsets)
+    edge_vertices = array('i', bytes(4 * len(pin_nets)))
+    for net_id, vid in zip(pin_nets, pin_vertices):
+        pos = fill[net_id]
+        if pos > offsets[net_id] and edge_vertices[pos - 1] == vid:
+            continue
+        edge_vertices[pos] = vid
+        fill[net_id] = pos + 1
+    num_pins = len(pin_nets)
+    del pin_nets, pin_vertices
+    
+    # 只保留连接 2 个及以上顶点的超边
+    num_edges = sum(1 for i in range(num_nets) if fill[i] - offsets[i] >= 2)
+    output_hgr = Path(output_hgr)
+    output_hgr.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_hgr, 'w', buffering=_WRITE_BUFFER) as f:
+        f.write(f"{num_edges} {len(kinds)}\n")
+        for i in range(num_nets):
+            start, end = offsets[i], fill[i]
+            if end - start >= 2:
+                f.write(' '.join(map(str, edge_vertices[start:end])))
+                f.write('\n')
+    
+    if output_mapping:
+        output_mapping = Path(output_mapping)
+        output_mapping.parent.mkdir(parents=True, exist_ok=True)
+        _write_mapping(output_mapping, kinds, num_edges)
+    
+    return {
+        'num_vertices': len(kinds),
+        'num_hyperedges': num_edges,
+        'num_nets': num_nets,
+        'num_pins': num_pins,
+    }
 
 
 def convert_blif_to_verilog_yosys(blif_file: str, output_verilog: str, liberty_file: str = None) -> bool:
@@ -98,8 +439,8 @@ write_verilog {output_verilog}
 
 def convert_blif_to_verilog_simple(blif_file: str, output_verilog: str) -> bool:
     """
-    简单的 BLIF 到 Verilog 转换（仅处理基本语法）
-    这是一个简化版本，可能不适用于所有 BLIF 文件
+    流式结构化 BLIF 到 Verilog 转换（不依赖 yosys）
+    .names 转换为 LUT<k> 实例，.latch 转换为 BLIF_LATCH 实例，.subckt 保留原单元类型
     
     Args:
         blif_file: 输入的 BLIF 文件路径
@@ -108,11 +449,13 @@ def convert_blif_to_verilog_simple(blif_file: str, output_verilog: str) -> bool:
     Returns:
         True if successful, False otherwise
     """
-    # 这是一个占位符实现
-    # 完整的 BLIF 到 Verilog 转换需要解析 BLIF 语法
-    print("警告: 简单的 BLIF 转换器尚未实现", file=sys.stderr)
-    print("建议使用 yosys 进行转换", file=sys.stderr)
-    return False
+    try:
+        stats = convert_blif_to_verilog_streaming(blif_file, output_verilog)
+    except (OSError, ValueError, IndexError) as e:
+        print(f"BLIF 转换失败: {e}", file=sys.stderr)
+        return False
+    print(f"  模型: {stats['models']}, 实例: {stats['instances']}, net: {stats['nets']}")
+    return True
 
 
 def main():
@@ -141,6 +484,16 @@ def main():
         type=str,
         help='标准单元库文件路径（.lib格式，用于综合到标准单元）'
     )
+    parser.add_argument(
+        '--hgr',
+        type=str,
+        help='同时流式生成 K-SpecPart 超图文件（.hgr）'
+    )
+    parser.add_argument(
+        '--mapping',
+        type=str,
+        help='超图顶点映射关系的 JSON 文件路径（与 --hgr 一起使用）'
+    )
     
     args = parser.parse_args()
     
@@ -161,6 +514,10 @@ def main():
     else:
         success = convert_blif_to_verilog_simple(str(blif_path), str(output_path))
     
+    if success and args.hgr:
+        stats = convert_blif_to_hgr(str(blif_path), args.hgr, args.mapping)
+        print(f"✓ 超图文件已保存: {args.hgr}（{stats['num_hyperedges']} 个超边, {stats['num_vertices']} 个顶点）")
+    
     if success:
         print(f"✓ 转换成功: {output_path}")
         sys.exit(0)
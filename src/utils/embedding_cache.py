@@ -0,0 +1,281 @@
+"""
+文本嵌入缓存模块
+以 (模型名, 文本哈希) 为键缓存嵌入向量，避免同一文本被重复编码：
+1. 内存LRU：进程内热点文本
+2. 磁盘存储：每个模型一个目录，向量以float32追加写入并通过内存映射读取，
+   跨进程、跨运行共享（追加时使用文件锁）
+
+磁盘目录结构：
+    <cache_dir>/<model>/meta.json     模型名与嵌入维度
+    <cache_dir>/<model>/keys.bin      每条16字节的文本哈希，第i条对应向量第i行
+    <cache_dir>/<model>/vectors.f32   (n, dim) float32 向量
+"""
+
+import os
+import re
+import json
+import hashlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .embedding_loader import EmbeddingModel
+from .file_lock import FileLock
+
+
+_KEY_BYTES = 16
+
+
+def text_key(text: str) -> bytes:
+    """文本哈希（blake2b-128）"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=_KEY_BYTES).digest()
+
+
+def _model_dir_name(model_name: str) -> str:
+    """模型名转换为目录名（保留可读前缀，附加哈希避免冲突）"""
+    readable = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name).strip('_')[:64] or 'model'
+    digest = hashlib.blake2b(model_name.encode('utf-8'), digest_size=4).hexdigest()
+    return f"{readable}-{digest}"
+
+
+class EmbeddingCache:
+    """单个嵌入模型的两级嵌入缓存（内存LRU + 磁盘内存映射存储）"""
+
+    def __init__(
+        self,
+        model_name: str,
+        cache_dir: Optional[str] = None,
+        lru_size: int = 4096
+    ):
+        """
+        Args:
+            model_name: 嵌入模型名称（不同模型的缓存互相隔离）
+            cache_dir: 磁盘缓存根目录（None则只使用内存LRU）
+            lru_size: 内存LRU容量（条）
+        """
+        self.model_name = model_name
+        self.lru_size = max(int(lru_size), 0)
+        self._lru: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        self.dim: Optional[int] = None
+        self._dir: Optional[Path] = None
+        self._rows: Dict[bytes, int] = {}
+        self._keys_offset = 0
+        self._mmap: Optional[np.memmap] = None
+
+        if cache_dir is not None:
+            self._dir = Path(cache_dir) / _model_dir_name(model_name)
+            self._dir.mkdir(parents=True, exist_ok=True)
+            self._refresh()
+
+    @property
+    def persistent(self) -> bool:
+        """是否启用磁盘存储"""
+        return self._dir is not None
+
+    def __len__(self) -> int:
+        if self.persistent:
+            self._refresh()
+            return len(self._rows)
+        return len(self._lru)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """查询单个文本的嵌入，未命中返回None"""
+        return self.get_many([text])[0]
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        批量查询嵌入
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            与texts等长的列表，未命中的位置为None
+        """
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        disk_pending = []
+        for i, text in enumerate(texts):
+            key = text_key(text)
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+                results[i] = vector
+            else:
+                disk_pending.append((i, key))
+
+        if disk_pending and self.persistent:
+            if any(key not in self._rows for _, key in disk_pending):
+                # 其他进程可能已写入新条目
+                self._refresh()
+            for i, key in disk_pending:
+                row = self._rows.get(key)
+                if row is not None:
+                    vector = np.array(self._vectors(row + 1)[row])
+                    self._remember(key, vector)
+                    results[i] = vector
+
+        found = sum(r is not None for r in results)
+        self.hits += found
+        self.misses += len(texts) - found
+        return results
+
+    def put(self, text: str, vector: np.ndarray):
+        """写入单个文本的嵌入"""
+        self.put_many([text], [vector])
+
+    def put_many(self, texts: Sequence[str], vectors: Union[np.ndarray, Sequence[np.ndarray]]):
+        """
+        批量写入嵌入（已存在的文本被忽略）
+
+        含NaN/Inf的向量视为编码失败，不写入内存LRU和磁盘，下次查询时重新编码
+
+        Args:
+            texts: 文本列表
+            vectors: 与texts对应的嵌入向量
+        """
+        entries: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        for text, vector in zip(texts, vectors):
+            vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+            if self.dim is not None and vector.shape[0] != self.dim:
+                # 维度与已存储的不一致（模型被替换），不缓存
+                continue
+            if not np.isfinite(vector).all():
+                continue
+            key = text_key(text)
+            entries[key] = vector
+            self._remember(key, vector)
+        if entries and self.persistent:
+            self._append(entries)
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        if self.lru_size == 0:
+            return
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def _refresh(self):
+        """读取keys.bin中新增的条目"""
+        keys_file = self._dir / 'keys.bin'
+        if not keys_file.exists():
+            return
+        if self.dim is None:
+            self._load_meta()
+        size = keys_file.stat().st_size
+        # 只读取完整的条目（写入方可能正在追加）
+        end = size - size % _KEY_BYTES
+        if end <= self._keys_offset:
+            return
+        with open(keys_file, 'rb') as f:
+            f.seek(self._keys_offset)
+            data = f.read(end - self._keys_offset)
+        first_row = self._keys_offset // _KEY_BYTES
+        for j in range(len(data) // _KEY_BYTES):
+            key = data[j * _KEY_BYTES:(j + 1) * _KEY_BYTES]
+            self._rows.setdefault(key, first_row + j)
+        self._keys_offset = end
+
+    def _load_meta(self):
+        meta_file = self._dir / 'meta.json'
+        if meta_file.exists():
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                self.dim = int(json.load(f)['dim'])
+
+    def _vectors(self, min_rows: int) -> np.ndarray:
+        """返回至少包含min_rows行的向量内存映射（文件增长后重新映射）"""
+        if self._mmap is None or self._mmap.shape[0] < min_rows:
+            num_rows = self._keys_offset // _KEY_BYTES
+            self._mmap = np.memmap(
+                self._dir / 'vectors.f32', dtype=np.float32, mode='r',
+                shape=(num_rows, self.dim)
+            )
+        return self._mmap
+
+    def _append(self, entries: "OrderedDict[bytes, np.ndarray]"):
+        """在文件锁内追加新条目：先写向量再写键，读取方只会看到完整的行"""
+        with FileLock(self._dir / 'lock'):
+            if self.dim is None:
+                self._load_meta()
+            if self.dim is None:
+                self.dim = int(next(iter(entries.values())).shape[0])
+                with open(self._dir / 'meta.json', 'w', encoding='utf-8') as f:
+                    json.dump({'model_name': self.model_name, 'dim': self.dim}, f)
+            self._refresh()
+
+            new_keys = []
+            new_vectors = []
+            for key, vector in entries.items():
+                if key in self._rows or vector.shape[0] != self.dim:
+                    continue
+                new_keys.append(key)
+                new_vectors.append(vector)
+            if not new_keys:
+                return
+
+            num_rows = self._keys_offset // _KEY_BYTES
+            row_bytes = self.dim * 4
+            with open(self._dir / 'vectors.f32', 'ab') as f:
+                # 丢弃上次中断写入留下的无键向量
+                if f.tell() != num_rows * row_bytes:
+                    f.truncate(num_rows * row_bytes)
+                f.write(np.vstack(new_vectors).astype(np.float32).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self._dir / 'keys.bin', 'ab') as f:
+                f.write(b''.join(new_keys))
+            self._refresh()
+
+
+class CachedEmbeddingModel(EmbeddingModel):
+    """带缓存的嵌入模型包装：未命中的文本合并为一次encode调用"""
+
+    def __init__(
+        self,
+        model: EmbeddingModel,
+        cache_dir: Optional[str] = None,
+        lru_size: int = 4096
+    ):
+        """
+        Args:
+            model: 被包装的嵌入模型
+            cache_dir: 磁盘缓存根目录（None则只使用内存LRU）
+            lru_size: 内存LRU容量（条）
+        """
+        super().__init__(model.model_name)
+        self.model = model
+        self.embedding_dim = model.embedding_dim
+        self.cache = EmbeddingCache(model.model_name, cache_dir=cache_dir, lru_size=lru_size)
+
+    def encode(self, texts: Union[str, list]) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        if len(texts) == 0:
+            return np.zeros((0, self.embedding_dim or 0), dtype=np.float32)
+        cached = self.cache.get_many(texts)
+
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        if missing:
+            # 同一批次中的重复文本只编码一次
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            encoded = np.asarray(self.model.encode(unique_texts), dtype=np.float32)
+            encoded = encoded.reshape(len(unique_texts), -1)
+            self.cache.put_many(unique_texts, encoded)
+            by_text = dict(zip(unique_texts, encoded))
+            for i in missing:
+                cached[i] = by_text[texts[i]]
+            if self.model.embedding_dim is not None:
+                self.embedding_dim = self.model.embedding_dim
+
+        embeddings = np.vstack(cached)
+        if self.embedding_dim is None and len(embeddings) > 0:
+            self.embedding_dim = embeddings.shape[1]
+        return embeddings[0] if len(embeddings) == 1 else embeddings
+
+    def get_embedding_dimension(self) -> int:
+        return self.model.get_embedding_dimension()
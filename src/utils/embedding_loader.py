@@ -4,10 +4,16 @@
 1. sentence-transformers (HuggingFace)
 2. Ollama (本地)
 3. 本地模型文件
+4. hashing: 内置的特征哈希嵌入（无需下载模型，立即可用）
 """
 
 import os
+import re
+import math
+import time
+import hashlib
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Union, Any
 import numpy as np
 
@@ -88,25 +94,56 @@ class SentenceTransformerModel(EmbeddingModel):
 class OllamaEmbeddingModel(EmbeddingModel):
     """使用Ollama的嵌入模型"""
     
-    def __init__(self, model_name: str = "nomic-embed-text", base_url: str = "http://localhost:11434"):
+    # 可重试的HTTP状态码（服务繁忙/临时不可用）
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+    
+    def __init__(
+        self,
+        model_name: str = "nomic-embed-text",
+        base_url: str = "http://localhost:11434",
+        batch_size: int = 32,
+        max_workers: int = 4,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 30
+    ):
         """
         初始化Ollama嵌入模型
         
         Args:
             model_name: Ollama模型名称（如 nomic-embed-text, mxbai-embed-large）
             base_url: Ollama服务地址
+            batch_size: 每个批量请求（/api/embed）包含的文本数
+            max_workers: 并发请求数（同时也是连接池大小）
+            max_retries: 连接失败或服务繁忙时的重试次数
+            backoff: 重试退避基数（秒），第n次重试等待 backoff * 2^n
+            timeout: 单个请求超时（秒）
         """
         super().__init__(model_name)
-        self.base_url = base_url
+        self.base_url = base_url.rstrip('/')
+        self.batch_size = max(int(batch_size), 1)
+        self.max_workers = max(int(max_workers), 1)
+        self.max_retries = max(int(max_retries), 0)
+        self.backoff = backoff
+        self.timeout = timeout
+        # None: 未探测；True/False: 服务是否支持批量接口 /api/embed
+        self._batch_endpoint: Optional[bool] = None
         try:
             import requests
+            from requests.adapters import HTTPAdapter
             self.requests = requests
         except ImportError:
             raise ImportError("使用Ollama需要安装requests库: pip install requests")
         
+        # 复用连接的会话，连接池大小与并发数一致
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
         # 检查Ollama服务是否可用
         try:
-            response = self.requests.get(f"{base_url}/api/tags", timeout=5)
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=5)
             if response.status_code != 200:
                 raise RuntimeError(f"Ollama服务不可用: {base_url}")
         except Exception as e:
@@ -128,6 +165,9 @@ class OllamaEmbeddingModel(EmbeddingModel):
         """
         使用Ollama API生成嵌入
         
+        文本按batch_size分批，批次通过线程池并发发送；服务支持 /api/embed 时
+        每批一个请求，否则回退为逐条调用 /api/embeddings（同样并发）。
+        
         Args:
             texts: 文本或文本列表
         
@@ -137,31 +177,169 @@ class OllamaEmbeddingModel(EmbeddingModel):
         if isinstance(texts, str):
             texts = [texts]
         
-        embeddings = []
-        for text in texts:
-            try:
-                response = self.requests.post(
-                    f"{self.base_url}/api/embeddings",
-                    json={
-                        "model": self.model_name,
-                        "prompt": text
-                    },
-                    timeout=30
-                )
-                response.raise_for_status()
-                embedding = response.json().get('embedding')
-                if embedding is None:
-                    raise ValueError("Ollama返回的嵌入为空")
-                embeddings.append(embedding)
-            except Exception as e:
-                raise RuntimeError(f"Ollama嵌入生成失败: {e}")
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        try:
+            if len(batches) <= 1 or self.max_workers == 1:
+                results = [self._embed_batch(batch) for batch in batches]
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+                    results = list(pool.map(self._embed_batch, batches))
+        except Exception as e:
+            raise RuntimeError(f"Ollama嵌入生成失败: {e}")
         
-        embeddings = np.array(embeddings)
+        embeddings = np.array([embedding for batch in results for embedding in batch])
         # 更新实际维度
         if len(embeddings) > 0:
             self.embedding_dim = len(embeddings[0])
         
         return embeddings[0] if len(embeddings) == 1 else embeddings
+    
+    def _embed_batch(self, texts: list) -> list:
+        """为一批文本生成嵌入（保持顺序）"""
+        if self._batch_endpoint is not False:
+            response = self._post("/api/embed", {"model": self.model_name, "input": texts})
+            if response.status_code == 404 and not self._batch_endpoint:
+                # 旧版本Ollama没有批量接口
+                self._batch_endpoint = False
+            else:
+                response.raise_for_status()
+                self._batch_endpoint = True
+                embeddings = response.json().get('embeddings')
+                if not embeddings or len(embeddings) != len(texts):
+                    raise ValueError("Ollama返回的嵌入为空或数量不匹配")
+                return embeddings
+        
+        embeddings = []
+        for text in texts:
+            response = self._post("/api/embeddings", {"model": self.model_name, "prompt": text})
+            response.raise_for_status()
+            embedding = response.json().get('embedding')
+            if embedding is None:
+                raise ValueError("Ollama返回的嵌入为空")
+            embeddings.append(embedding)
+        return embeddings
+    
+    def _post(self, path: str, payload: dict):
+        """发送POST请求，连接失败或服务繁忙时指数退避重试"""
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                response = self.session.post(
+                    f"{self.base_url}{path}", json=payload, timeout=self.timeout
+                )
+            except (self.requests.ConnectionError, self.requests.Timeout):
+                if last_attempt:
+                    raise
+            else:
+                if response.status_code not in self.RETRY_STATUS or last_attempt:
+                    return response
+            time.sleep(self.backoff * (2 ** attempt))
+
+
+class HashingEmbeddingModel(EmbeddingModel):
+    """
+    零依赖的特征哈希嵌入模型
+    
+    面向_case_to_text生成的案例文本（如 "Design: mgc_fft_1 Modules: 1200 Nets: 3400"）：
+    - 单词（小写）及其按下划线拆分的子词哈希到固定维度，符号位由哈希决定
+    - "键: 数值" 按数值分桶（大于1的数按对数分桶，小数按0.1分桶），
+      同时以一半权重激活相邻的桶，使规模接近的设计相似
+    单词和数值桶的哈希结果会被缓存，编码一批文本只需逐条正则扫描加一次bincount。
+    """
+    
+    _TOKEN_RE = re.compile(r'([A-Za-z][A-Za-z_]*)\s*:\s*(-?\d+(?:\.\d+)?)|([A-Za-z0-9_]+)')
+    
+    def __init__(
+        self,
+        model_name: str = "hashing",
+        embedding_dim: int = 384,
+        numeric_resolution: float = 2.0,
+        max_cache_size: int = 1 << 20
+    ):
+        """
+        Args:
+            model_name: 模型名称（"hashing" 或 "hashing:<维度>"）
+            embedding_dim: 嵌入维度（model_name中指定维度时以其为准）
+            numeric_resolution: 每倍数值范围内的分桶数
+            max_cache_size: 哈希缓存的最大条目数
+        """
+        if ':' in model_name:
+            model_name, dim = model_name.split(':', 1)
+            embedding_dim = int(dim)
+        super().__init__(f"{model_name}:{embedding_dim}")
+        self.embedding_dim = embedding_dim
+        self.numeric_resolution = numeric_resolution
+        self.max_cache_size = max_cache_size
+        self._cache: dict = {}  # 单词 / (键, 数值桶) -> (带符号的维度下标列表, 权重列表)
+    
+    def _slot(self, token: str) -> int:
+        """特征的哈希位置（符号为负时按位取反表示）"""
+        value = int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+        index = value % self.embedding_dim
+        return index if (value >> 63) & 1 else ~index
+    
+    def _expand(self, tokens: list) -> tuple:
+        """将 (特征, 权重) 列表展开为 (带符号下标列表, 权重列表)"""
+        return [self._slot(token) for token, _ in tokens], [weight for _, weight in tokens]
+    
+    def _word(self, word: str) -> tuple:
+        expanded = self._cache.get(word)
+        if expanded is None:
+            lowered = word.lower()
+            tokens = [(f"w:{lowered}", 1.0)]
+            parts = [part for part in lowered.split('_') if part]
+            if len(parts) > 1:
+                tokens += [(f"w:{part}", 0.5) for part in parts]
+            expanded = self._cache[word] = self._expand(tokens)
+        return expanded
+    
+    def _number(self, key: str, number: str) -> tuple:
+        value = float(number)
+        if '.' in number and -1.0 <= value <= 1.0:
+            bucket = ('f', int(round(value * 10)))
+        else:
+            bucket = ('n', int(math.floor(math.log2(1.0 + abs(value)) * self.numeric_resolution)))
+        expanded = self._cache.get((key, bucket))
+        if expanded is None:
+            name = key.lower()
+            kind, level = bucket
+            tokens = [(f"w:{name}", 1.0), (f"{kind}:{name}:{level}", 1.0)]
+            if kind == 'n':
+                tokens += [(f"n:{name}:{level - 1}", 0.5), (f"n:{name}:{level + 1}", 0.5)]
+            expanded = self._cache[(key, bucket)] = self._expand(tokens)
+        return expanded
+    
+    def encode(self, texts: Union[str, list]) -> np.ndarray:
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+        
+        if len(self._cache) > self.max_cache_size:
+            self._cache.clear()
+        findall = self._TOKEN_RE.findall
+        slots, weights, counts = [], [], []
+        for text in texts:
+            start = len(slots)
+            for key, number, word in findall(text):
+                expanded = self._word(word) if word else self._number(key, number)
+                slots += expanded[0]
+                weights += expanded[1]
+            counts.append(len(slots) - start)
+        
+        dim = self.embedding_dim
+        slots = np.asarray(slots, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float32)
+        negative = slots < 0
+        weights[negative] *= -1.0
+        slots[negative] = ~slots[negative]
+        rows = np.repeat(np.arange(len(texts), dtype=np.int64), counts)
+        embeddings = np.bincount(
+            rows * dim + slots, weights=weights, minlength=len(texts) * dim
+        ).astype(np.float32).reshape(len(texts), dim)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        embeddings /= norms
+        return embeddings[0] if single else embeddings
 
 
 def load_embedding_model(
@@ -175,7 +353,7 @@ def load_embedding_model(
     
     Args:
         model_name: 模型名称或路径
-        model_type: 模型类型 ('sentence-transformers', 'ollama', 'auto')
+        model_type: 模型类型 ('sentence-transformers', 'ollama', 'hashing', 'auto')
         cache_dir: 缓存目录（用于sentence-transformers）
         ollama_base_url: Ollama服务地址
     
@@ -194,6 +372,9 @@ def load_embedding_model(
         
         # 自动检测（优先尝试sentence-transformers，失败则尝试Ollama）
         model = load_embedding_model("sentence-transformers/all-MiniLM-L6-v2", model_type="auto")
+        
+        # 内置哈希嵌入（知识库需要用同一模型构建）
+        model = load_embedding_model("hashing:384", model_type="hashing")
     """
     if model_type is None or model_type == "auto":
         # 自动检测
@@ -204,7 +385,10 @@ def load_embedding_model(
         elif model_name.startswith("ollama:"):
             model_name = model_name[7:]  # 移除"ollama:"前缀
             model_type = "ollama"
-        # 3. 否则先尝试sentence-transformers，失败则尝试Ollama
+        # 3. hashing 或 hashing:<维度>，使用内置哈希嵌入
+        elif model_name == "hashing" or model_name.startswith("hashing:"):
+            model_type = "hashing"
+        # 4. 否则先尝试sentence-transformers，失败则尝试Ollama
         else:
             try:
                 return SentenceTransformerModel(model_name, cache_dir)
@@ -226,6 +410,8 @@ def load_embedding_model(
         return SentenceTransformerModel(model_name, cache_dir)
     elif model_type == "ollama":
         return OllamaEmbeddingModel(model_name, ollama_base_url)
+    elif model_type == "hashing":
+        return HashingEmbeddingModel(model_name if model_name.startswith("hashing") else "hashing")
     else:
         raise ValueError(f"不支持的模型类型: {model_type}")
 
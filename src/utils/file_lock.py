@@ -0,0 +1,40 @@
+"""
+跨进程文件锁
+基于fcntl.flock的排他锁，用于多个进程共享同一份磁盘数据（知识库、嵌入缓存）时串行化写入
+"""
+
+import os
+from pathlib import Path
+from typing import Union
+
+try:
+    import fcntl
+except ImportError:  # 非POSIX平台：不加锁，仅保证单进程安全
+    fcntl = None
+
+
+class FileLock:
+    """
+    排他文件锁（上下文管理器）
+
+    用法：
+        with FileLock('data/knowledge_base/kb_cases.json.lock'):
+            ...
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._fd = None
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
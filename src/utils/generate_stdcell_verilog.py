@@ -8,6 +8,8 @@ import re
 from pathlib import Path
 from typing import Dict, List, Set
 
+from .netlist_reader import read_netlist
+
 
 def parse_lef_cell(lef_content: str, cell_name: str) -> Dict:
     """
@@ -50,6 +52,42 @@ def parse_lef_cell(lef_content: str, cell_name: str) -> Dict:
     }
 
 
+def parse_lef_pin_directions(cells_lef: Path) -> Dict[str, Dict[str, str]]:
+    """
+    单遍流式读取LEF，提取所有标准单元的引脚方向
+    
+    Returns:
+        {cell_name: {pin_name: 'INPUT'/'OUTPUT'/'INOUT'}}
+    """
+    directions = {}
+    macro = None  # 当前MACRO名
+    pins = None  # 当前MACRO的引脚方向
+    pin = None  # 当前PIN名
+    
+    with open(cells_lef, 'r', errors='ignore') as f:
+        for line in f:
+            tokens = line.split()
+            if not tokens:
+                continue
+            keyword = tokens[0].upper()
+            if keyword == 'MACRO' and len(tokens) > 1:
+                macro, pin = tokens[1], None
+                pins = directions.setdefault(macro, {})
+            elif macro is None:
+                continue
+            elif keyword == 'PIN' and len(tokens) > 1:
+                pin = tokens[1]
+            elif keyword == 'DIRECTION' and pin is not None and len(tokens) > 1:
+                pins[pin] = tokens[1].rstrip(';').upper()
+            elif keyword == 'END' and len(tokens) > 1:
+                if tokens[1] == pin:
+                    pin = None
+                elif tokens[1] == macro:
+                    macro, pins, pin = None, None, None
+    
+    return directions
+
+
 def generate_verilog_blackbox(cell_info: Dict) -> str:
     """
     生成标准单元的Verilog黑盒定义
@@ -103,23 +141,9 @@ def generate_verilog_blackbox(cell_info: Dict) -> str:
 
 def extract_cells_from_verilog(verilog_file: Path) -> Set[str]:
     """
-    从Verilog网表中提取使用的标准单元类型
+    从Verilog网表中提取使用的标准单元类型（所有模块中实例化的类型）
     """
-    with open(verilog_file, 'r') as f:
-        content = f.read()
-    
-    # 查找标准单元实例化
-    # 格式: cell_type instance_name (...)
-    pattern = re.compile(r'^\s*([a-zA-Z_][a-zA-Z0-9_]*)\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*\(', re.MULTILINE)
-    
-    cell_types = set()
-    for match in pattern.finditer(content):
-        cell_type = match.group(1)
-        # 排除关键字和模块名
-        if cell_type not in ['module', 'wire', 'input', 'output', 'reg', 'assign', 'always', 'if', 'else', 'endmodule']:
-            cell_types.add(cell_type)
-    
-    return cell_types
+    return read_netlist(verilog_file).instance_types()
 
 
 def generate_stdcell_verilog(
@@ -182,7 +206,7 @@ if __name__ == '__main__':
     from pathlib import Path
     
     if len(sys.argv) < 3:
-        print("Usage: python generate_stdcell_verilog.py <cells.lef> <verilog_file1> [verilog_file2 ...] <output.v>")
+        print("Usage: python -m src.utils.generate_stdcell_verilog <cells.lef> <verilog_file1> [verilog_file2 ...] <output.v>")
         sys.exit(1)
     
     cells_lef = Path(sys.argv[1])
@@ -0,0 +1,18 @@
+"""
+文件内容哈希
+供知识库构建清单与网表解析缓存共用
+"""
+
+import hashlib
+
+
+_CHUNK_BYTES = 1 << 20
+
+
+def file_digest(path: str) -> str:
+    """文件内容哈希（blake2b-128）"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
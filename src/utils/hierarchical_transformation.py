@@ -10,24 +10,36 @@ import json
 import re
 from collections import defaultdict
 
+from .generate_stdcell_verilog import parse_lef_pin_directions
+from .netlist_reader import NetlistModule, read_netlist
+
+
+# 连接表达式为net名（可带位索引）
+_NET_RE = re.compile(r'[\w\[\]]+')
+
 
 class HierarchicalTransformation:
     """层级化改造类"""
     
-    def __init__(self, design_name: str, design_dir: Path):
+    def __init__(self, design_name: str, design_dir: Path, cells_lef: Optional[Path] = None):
         """
         初始化
         
         Args:
             design_name: 设计名称
             design_dir: 设计目录（包含design.v）
+            cells_lef: 标准单元LEF（提供引脚方向，用于确定net的driver/load），
+                默认使用设计目录下的cells.lef（不存在时边界端口方向均为inout）
         """
         self.design_name = design_name
         self.design_dir = Path(design_dir)
         self.flat_netlist_path = self.design_dir / 'design.v'
+        if cells_lef is None and (self.design_dir / 'cells.lef').exists():
+            cells_lef = self.design_dir / 'cells.lef'
+        self.cells_lef = Path(cells_lef) if cells_lef else None
         
         # 解析结果
-        self.flat_netlist = None  # 扁平网表内容
+        self.flat_netlist = None  # 扁平网表（StructuralNetlist）
         self.partition_scheme = None  # {module_name: partition_id}
         self.modules = {}  # {module_name: module_info}
         self.nets = {}  # {net_name: net_info}
@@ -36,6 +48,9 @@ class HierarchicalTransformation:
         self.boundary_connections = {}  # 边界连接信息
         self.partition_netlists = {}  # 分区网表
         self.top_netlist = None  # 顶层网表
+        self.output_dir = None  # 网表输出目录（增量更新时复用）
+        self.pin_directions = {}  # {cell_type: {pin: 'INPUT'/'OUTPUT'/'INOUT'}}
+        self._partition_index = None  # (各分区模块, 边界端口, 内部net)，_build_partition_index单遍构建
         
     def analyze_boundary_connections(
         self,
@@ -94,36 +109,83 @@ class HierarchicalTransformation:
         print(f"✓ 发现 {num_boundary_nets} 个边界net（总共 {len(boundary_connections)} 个net）")
         
         self.boundary_connections = boundary_connections
+        self._partition_index = None
         return boundary_connections
     
-    def _parse_flat_netlist(self):
-        """解析扁平网表（Verilog）"""
-        with open(self.flat_netlist_path, 'r') as f:
-            content = f.read()
+    def apply_migration(self, migration: Dict[str, int]) -> List[int]:
+        """
+        增量更新：在已有的边界连接分析上应用一轮模块迁移
         
-        self.flat_netlist = content
+        只重新计算被迁移模块所连net的跨分区状态
+        
+        Args:
+            migration: {module_name: 目标partition_id}
+            
+        Returns:
+            dirty_partitions: 网表内容受影响的分区ID列表（迁移的源/目标分区，
+                以及连接到边界状态发生变化的net的分区）
+        """
+        if self.partition_scheme is None:
+            raise RuntimeError("apply_migration需要先执行analyze_boundary_connections()")
+        
+        # 1. 应用迁移（保持分区方案中模块的原有顺序）
+        dirty = set()
+        affected_nets = set()
+        for module_name, target in migration.items():
+            source = self.partition_scheme.get(module_name)
+            if source == target:
+                continue
+            if source is not None:
+                dirty.add(source)
+            dirty.add(target)
+            self.partition_scheme[module_name] = target
+            if module_name in self.modules:
+                affected_nets.update(self.modules[module_name]['connections'].values())
+        
+        # 2. 重新计算受影响net的跨分区状态
+        for net_name in affected_nets:
+            net_info = self.boundary_connections[net_name]
+            connected_partitions = {
+                self.partition_scheme[module_name]
+                for module_name, pin in net_info['pins']
+                if module_name in self.partition_scheme
+            }
+            is_boundary = len(connected_partitions) > 1
+            if is_boundary != net_info['is_boundary']:
+                # 边界状态翻转：该net在相关分区中由端口变为内部信号（或相反）
+                dirty.update(net_info['partitions'])
+                dirty.update(connected_partitions)
+            net_info['partitions'] = sorted(connected_partitions)
+            net_info['is_boundary'] = is_boundary
+        
+        self._partition_index = None
+        
+        dirty_partitions = sorted(dirty)
+        print(f"✓ 增量更新: 迁移 {len(migration)} 个模块, 重新计算 {len(affected_nets)} 个net, "
+              f"受影响分区 {dirty_partitions}")
+        return dirty_partitions
+    
+    def _parse_flat_netlist(self):
+        """解析扁平网表（经共享的结构化网表读取器）"""
+        self.flat_netlist = read_netlist(self.flat_netlist_path)
+        top = self.flat_netlist.module()
+        if top is None:
+            print(f"✓ 解析完成: 0 个模块, 0 个net")
+            return
         
         # 1. 解析顶层模块定义
-        self._parse_top_module(content)
+        self._parse_top_module(top)
         
-        # 2. 解析模块实例化
-        # 匹配: module_type instance_name ( .port1(net1), .port2(net2), ... );
-        instance_pattern = re.compile(
-            r'(\w+)\s+(\w+)\s*\((.*?)\)\s*;',
-            re.DOTALL
-        )
+        if self.cells_lef is not None and not self.pin_directions:
+            self.pin_directions = parse_lef_pin_directions(self.cells_lef)
+            print(f"✓ 读取标准单元引脚方向: {len(self.pin_directions)} 个单元")
         
-        for match in instance_pattern.finditer(content):
-            module_type = match.group(1)
-            instance_name = match.group(2)
-            connections_str = match.group(3)
-            
-            # 跳过顶层模块定义
-            if module_type == 'module':
-                continue
-            
-            # 解析连接
-            connections = self._parse_connections(connections_str)
+        # 2. 解析模块实例化（只保留 .port(net) 形式的连接），按引脚方向记录driver/load
+        for instance_name, module_type, pin_nets in top.iter_instances():
+            connections = {
+                port: net for port, net in pin_nets
+                if port is not None and net is not None and _NET_RE.fullmatch(net)
+            }
             
             self.modules[instance_name] = {
                 'type': module_type,
@@ -131,64 +193,39 @@ class HierarchicalTransformation:
             }
             
             # 更新nets信息
+            cell_pins = self.pin_directions.get(module_type, {})
             for port, net in connections.items():
-                if net not in self.nets:
-                    self.nets[net] = {
+                net_info = self.nets.get(net)
+                if net_info is None:
+                    net_info = self.nets[net] = {
                         'pins': [],
                         'driver': None,
                         'loads': []
                     }
-                self.nets[net]['pins'].append((instance_name, port))
+                net_info['pins'].append((instance_name, port))
+                
+                direction = cell_pins.get(port)
+                if direction == 'OUTPUT':
+                    # 多驱动时保留第一个driver
+                    if net_info['driver'] is None:
+                        net_info['driver'] = (instance_name, port)
+                elif direction == 'INPUT':
+                    net_info['loads'].append((instance_name, port))
         
         print(f"✓ 解析完成: {len(self.modules)} 个模块, {len(self.nets)} 个net")
     
-    def _parse_top_module(self, content: str):
-        """解析顶层模块定义，提取端口信息"""
-        # 匹配顶层模块定义
-        # module module_name ( port1, port2, ... );
-        module_pattern = re.compile(
-            r'module\s+(\w+)\s*\((.*?)\);',
-            re.DOTALL
-        )
+    def _parse_top_module(self, top: NetlistModule):
+        """提取顶层模块的端口信息（向量端口按位展开）"""
+        self.top_module_name = top.name
         
-        match = module_pattern.search(content)
-        if not match:
-            return
-        
-        self.top_module_name = match.group(1)
-        ports_str = match.group(2)
-        
-        # 解析端口声明（input/output）
-        # 支持格式: input wire [3:0] a, 或 output wire cout
-        port_pattern = re.compile(
-            r'(input|output)\s+wire\s+(?:\[(\d+):(\d+)\]\s+)?(\w+)',
-            re.MULTILINE
-        )
-        
-        for port_match in port_pattern.finditer(content):
-            direction = port_match.group(1)
-            msb = port_match.group(2)
-            lsb = port_match.group(3)
-            port_name = port_match.group(4)
-            
-            # 解析向量端口 (如 a[3:0])
-            if msb and lsb:
-                msb_val, lsb_val = int(msb), int(lsb)
-                # 生成每个bit的net名
-                for i in range(lsb_val, msb_val + 1):
-                    net_name = f"{port_name}[{i}]"
-                    self.top_module_ports[net_name] = {
-                        'direction': direction,
-                        'port_base': port_name,
-                        'bit': i
-                    }
-            else:
-                # 标量端口
-                self.top_module_ports[port_name] = {
-                    'direction': direction,
-                    'port_base': port_name,
-                    'bit': None
-                }
+        for net_name, direction, port_name, bit in top.port_bits():
+            if direction not in ('input', 'output'):
+                continue
+            self.top_module_ports[net_name] = {
+                'direction': direction,
+                'port_base': port_name,
+                'bit': bit
+            }
     
     def _parse_connections(self, connections_str: str) -> Dict[str, str]:
         """解析模块连接字符串"""
@@ -224,42 +261,23 @@ class HierarchicalTransformation:
         
         print(f"\n提取分区 {partition_id} 的网表...")
         
+        if self._partition_index is None:
+            self._build_partition_index()
+        partition_modules, partition_ports, partition_internal_nets = self._partition_index
+        
         # 1. 获取该分区的所有module
-        partition_modules = [
-            name for name, pid in self.partition_scheme.items()
-            if pid == partition_id
-        ]
+        partition_modules = partition_modules.get(partition_id, [])
         
         print(f"  - 模块数: {len(partition_modules)}")
         
-        # 2. 识别边界net和内部net
-        boundary_nets = []
-        internal_nets = []
+        # 2. 边界net（及端口方向）和内部net（均已单遍预计算）
+        boundary_ports = partition_ports.get(partition_id, [])
+        internal_nets = partition_internal_nets.get(partition_id, [])
         
-        for net_name, net_info in self.boundary_connections.items():
-            if partition_id in net_info['partitions']:
-                if net_info['is_boundary']:
-                    boundary_nets.append(net_name)
-                else:
-                    # 纯内部net
-                    pins_in_partition = [
-                        (m, p) for m, p in net_info['pins']
-                        if m in partition_modules
-                    ]
-                    if len(pins_in_partition) > 0:
-                        internal_nets.append(net_name)
-        
-        print(f"  - 边界net: {len(boundary_nets)}")
+        print(f"  - 边界net: {len(boundary_ports)}")
         print(f"  - 内部net: {len(internal_nets)}")
         
-        # 3. 为边界net推断端口方向
-        boundary_ports = self._infer_port_directions(
-            partition_id,
-            partition_modules,
-            boundary_nets
-        )
-        
-        # 4. 生成Verilog模块
+        # 3. 生成Verilog模块
         verilog_content = self._generate_partition_verilog(
             partition_id,
             partition_modules,
@@ -267,7 +285,7 @@ class HierarchicalTransformation:
             internal_nets
         )
         
-        # 5. 保存到文件
+        # 4. 保存到文件
         output_file = output_dir / f'partition_{partition_id}.v'
         with open(output_file, 'w') as f:
             f.write(verilog_content)
@@ -276,48 +294,65 @@ class HierarchicalTransformation:
         
         return output_file
     
-    def _infer_port_directions(
-        self,
-        partition_id: int,
-        partition_modules: List[str],
-        boundary_nets: List[str]
-    ) -> List[Dict]:
+    def _build_partition_index(self):
         """
-        推断边界端口的方向
+        单遍构建所有分区的模块列表、边界端口和内部net
         
-        Returns:
-            boundary_ports: [
-                {'name': net_name, 'direction': 'input'/'output'/'inout'},
-                ...
-            ]
+        模块按分区方案顺序、net按边界连接分析顺序排列；
+        每个边界net只访问一次其driver/load即得到它在所有相关分区中的端口方向
         """
-        boundary_ports = []
+        partition_modules = defaultdict(list)
+        for module_name, pid in self.partition_scheme.items():
+            partition_modules[pid].append(module_name)
         
-        for net_name in boundary_nets:
-            net_info = self.boundary_connections[net_name]
-            
-            # 分析driver和load的位置
-            driver = net_info.get('driver')
-            loads = net_info.get('loads', [])
+        partition_ports = defaultdict(list)
+        partition_internal_nets = defaultdict(list)
+        for net_name, net_info in self.boundary_connections.items():
+            if not net_info['is_boundary']:
+                # 纯内部net
+                for pid in net_info['partitions']:
+                    partition_internal_nets[pid].append(net_name)
+                continue
             
+            directions = self._infer_port_directions(net_info)
+            for pid in net_info['partitions']:
+                partition_ports[pid].append({
+                    'name': net_name,
+                    'direction': directions[pid]
+                })
+        
+        self._partition_index = (partition_modules, partition_ports, partition_internal_nets)
+    
+    def _infer_port_directions(self, net_info: Dict) -> Dict[int, str]:
+        """
+        推断边界net在其连接的各分区中的端口方向
+        
+        Returns:
+            {partition_id: 'input'/'output'/'inout'}
+        """
+        # 分析driver和load所在的分区
+        driver = net_info.get('driver')
+        driver_partition = self.partition_scheme.get(driver[0]) if driver else None
+        load_partitions = {
+            self.partition_scheme.get(module_name)
+            for module_name, pin in net_info.get('loads', [])
+        }
+        
+        directions = {}
+        for pid in net_info['partitions']:
             # 简单推断规则（后续可以改进）
-            driver_in_partition = driver and driver[0] in partition_modules
-            loads_in_partition = any(m in partition_modules for m, p in loads)
+            driver_in_partition = driver_partition == pid
+            loads_in_partition = pid in load_partitions
             
             if driver_in_partition and not loads_in_partition:
-                direction = 'output'
+                directions[pid] = 'output'
             elif not driver_in_partition and loads_in_partition:
-                direction = 'input'
+                directions[pid] = 'input'
             else:
                 # 既有driver又有load，或者无法确定
-                direction = 'inout'
-            
-            boundary_ports.append({
-                'name': net_name,
-                'direction': direction
-            })
+                directions[pid] = 'inout'
         
-        return boundary_ports
+        return directions
     
     def _generate_partition_verilog(
         self,
@@ -437,7 +472,8 @@ def perform_hierarchical_transformation(
     design_name: str,
     design_dir: Path,
     partition_scheme: Dict[str, int],
-    output_dir: Path
+    output_dir: Path,
+    transformer: Optional[HierarchicalTransformation] = None
 ) -> Dict:
     """
     执行完整的层级化改造
@@ -447,6 +483,8 @@ def perform_hierarchical_transformation(
         design_dir: 设计目录
         partition_scheme: 分区方案 {module: partition_id}
         output_dir: 输出目录
+        transformer: 上一轮的改造状态（result['transformer']）。给定且输出目录相同时，
+            只对与上一轮分区方案不同的模块做增量更新，并只重写受影响的分区网表和顶层网表
         
     Returns:
         result: {
@@ -457,7 +495,9 @@ def perform_hierarchical_transformation(
                 'num_partitions': int,
                 'num_boundary_nets': int,
                 'partition_sizes': {0: int, 1: int, ...}
-            }
+            },
+            'dirty_partitions': [本轮重写的分区ID],
+            'transformer': HierarchicalTransformation（供下一轮增量更新，不写入JSON）
         }
     """
     output_dir = Path(output_dir)
@@ -467,16 +507,37 @@ def perform_hierarchical_transformation(
     print(f"开始层级化改造: {design_name}")
     print(f"{'='*80}\n")
     
-    transformer = HierarchicalTransformation(design_name, design_dir)
+    num_partitions = max(partition_scheme.values()) + 1
+    previous_scheme = transformer.partition_scheme if transformer is not None else None
+    # 设计网表未变化时读取器返回同一个解析结果
+    incremental = (
+        previous_scheme is not None
+        and transformer.output_dir == output_dir
+        and read_netlist(Path(design_dir) / 'design.v') is transformer.flat_netlist
+        and previous_scheme.keys() == partition_scheme.keys()
+        and max(previous_scheme.values()) + 1 == num_partitions
+    )
     
-    # 1. 分析边界连接
-    boundary_conns = transformer.analyze_boundary_connections(partition_scheme)
+    if incremental:
+        # 1. 增量更新边界连接
+        migration = {
+            module: pid for module, pid in partition_scheme.items()
+            if previous_scheme[module] != pid
+        }
+        dirty_partitions = transformer.apply_migration(migration)
+        boundary_conns = transformer.boundary_connections
+    else:
+        transformer = HierarchicalTransformation(design_name, design_dir)
+        transformer.output_dir = output_dir
+        
+        # 1. 分析边界连接（复制分区方案，增量更新时原地修改）
+        boundary_conns = transformer.analyze_boundary_connections(dict(partition_scheme))
+        dirty_partitions = list(range(num_partitions))
     
-    # 2. 提取各分区网表
-    partition_netlists = {}
-    num_partitions = max(partition_scheme.values()) + 1
+    # 2. 提取各分区网表（增量更新时只重写受影响的分区）
+    partition_netlists = {pid: output_dir / f'partition_{pid}.v' for pid in range(num_partitions)}
     
-    for pid in range(num_partitions):
+    for pid in dirty_partitions:
         netlist_path = transformer.extract_partition_netlist(pid, output_dir)
         partition_netlists[pid] = netlist_path
     
@@ -510,6 +571,9 @@ def perform_hierarchical_transformation(
     with open(result_file, 'w') as f:
         json.dump(result, f, indent=2, default=str)
     
+    result['dirty_partitions'] = dirty_partitions
+    result['transformer'] = transformer
+    
     print(f"\n{'='*80}")
     print(f"层级化改造完成!")
     print(f"{'='*80}")
@@ -519,6 +583,7 @@ def perform_hierarchical_transformation(
     print(f"  - 总模块数: {statistics['total_modules']}")
     print(f"  - 总net数: {statistics['total_nets']}")
     print(f"  - 分区大小: {statistics['partition_sizes']}")
+    print(f"  - 重写分区: {dirty_partitions}")
     print(f"  - 结果保存至: {output_dir}")
     print()
     
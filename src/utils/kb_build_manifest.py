@@ -0,0 +1,165 @@
+"""
+知识库构建清单模块
+按输入文件内容哈希缓存每个设计的构建结果（特征、分区策略、协商模式、质量指标和嵌入），
+重新构建时只重新计算输入发生变化的设计。
+
+清单为与知识库同目录的JSON文件：
+    {
+        'builder_version': 构建器版本（版本变化时全部失效）,
+        'files': {绝对路径: [大小, mtime_ns, 内容哈希]},   # 文件未变化时不重新计算哈希
+        'designs': {设计键: {'inputs': 输入指纹, 'case': 案例, 'embedding_model': 模型名}}
+    }
+"""
+
+import os
+import json
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .hashing import file_digest
+
+
+class BuildManifest:
+    """设计级构建结果缓存"""
+
+    def __init__(self, manifest_file: str, builder_version: Any):
+        """
+        Args:
+            manifest_file: 清单文件路径
+            builder_version: 构建器版本（特征提取逻辑变化时递增，使旧结果全部失效）
+        """
+        self.manifest_file = Path(manifest_file)
+        self.builder_version = builder_version
+        self._files: Dict[str, List[Any]] = {}
+        self._designs: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self.summary: List[Tuple[str, bool]] = []  # (设计ID, 是否命中)
+        self.load()
+
+    def load(self):
+        """读取清单；文件不存在、损坏或构建器版本不同时从空清单开始"""
+        self._files, self._designs = {}, {}
+        if not self.manifest_file.exists():
+            return
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取构建清单失败，将重新构建: {e}")
+            return
+        self._files = data.get('files', {})
+        if data.get('builder_version') == self.builder_version:
+            self._designs = data.get('designs', {})
+
+    def digest(self, path: Optional[str]) -> Optional[str]:
+        """
+        输入文件的内容哈希（文件不存在时为None）
+
+        大小和修改时间与清单记录一致时直接使用记录的哈希
+        """
+        if path is None:
+            return None
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        entry = self._files.get(path)
+        if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+        digest = file_digest(path)
+        self._files[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        self._dirty = True
+        return digest
+
+    def fingerprint(self, inputs: Dict[str, Optional[str]], **params) -> Dict[str, Any]:
+        """
+        设计输入指纹：各输入文件（按角色）的路径与内容哈希，加上影响结果的其他参数
+
+        Args:
+            inputs: 角色 -> 文件路径（None表示没有该输入）
+            **params: 其他参数（如runtime）
+        """
+        return {
+            'files': {
+                role: [os.path.abspath(path) if path else None, self.digest(path)]
+                for role, path in sorted(inputs.items())
+            },
+            'params': params,
+        }
+
+    def lookup(
+        self,
+        key: str,
+        fingerprint: Dict[str, Any],
+        embedding_model: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        查找缓存的案例（返回副本）；指纹不一致时返回None
+
+        嵌入模型与缓存时不同时，返回的案例不含嵌入，由调用方重新生成
+        """
+        entry = self._designs.get(key)
+        if entry is None or entry['inputs'] != fingerprint:
+            return None
+        case = json.loads(json.dumps(entry['case']))
+        if entry.get('embedding_model') != embedding_model:
+            case.pop('embedding', None)
+        return case
+
+    def store(
+        self,
+        key: str,
+        fingerprint: Dict[str, Any],
+        case: Dict[str, Any],
+        embedding_model: Optional[str]
+    ):
+        """记录设计的构建结果"""
+        self._designs[key] = {
+            'inputs': fingerprint,
+            'case': json.loads(json.dumps(case)),
+            'embedding_model': embedding_model if case.get('embedding') is not None else None,
+        }
+        self._dirty = True
+
+    def record(self, design_id: str, hit: bool):
+        """记录本次构建中设计的命中情况"""
+        self.summary.append((design_id, hit))
+
+    def print_summary(self):
+        """打印并清空本次构建的逐设计命中/未命中汇总"""
+        if not self.summary:
+            return
+        hits = sum(1 for _, hit in self.summary if hit)
+        print(f"构建缓存: 命中 {hits}, 重新计算 {len(self.summary) - hits}")
+        for design_id, hit in self.summary:
+            print(f"  {'命中' if hit else '重新计算'}: {design_id}")
+        self.summary = []
+
+    def save(self) -> bool:
+        """写出清单（写入临时文件后原子替换）"""
+        if not self._dirty:
+            return True
+        data = {
+            'builder_version': self.builder_version,
+            'files': self._files,
+            'designs': self._designs,
+        }
+        path = self.manifest_file
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            print(f"保存构建清单失败: {e}")
+            return False
+        self._dirty = False
+        return True
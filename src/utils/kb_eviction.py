@@ -0,0 +1,230 @@
+"""
+知识库淘汰策略模块
+案例数超过max_cases时由策略选出被淘汰的案例：
+1. fifo: 淘汰最早加入的案例
+2. lru: 淘汰最久未被检索命中的案例
+3. utility: 淘汰效用最低的案例（检索命中频次 + 边界代价质量）
+
+fifo/lru 基于有序字典，插入/命中/淘汰均为O(1)；
+utility 基于带懒删除的最小堆，更新和淘汰为O(log n)。
+策略只按design_id记录状态，与矩阵行号、ANN key无关。
+检索命中次数和最近命中时间由知识库写入案例的retrieval_stats字段并随案例持久化，
+重新加载时lru按最近命中时间、utility按命中次数恢复状态。
+"""
+
+import heapq
+import math
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+# 案例中保存检索命中统计的字段：{'hits': 命中次数, 'last_access': 最近命中的时间戳}
+RETRIEVAL_STATS_FIELD = 'retrieval_stats'
+
+
+def case_quality(case: Dict[str, Any]) -> float:
+    """
+    根据边界代价计算案例质量，范围(0, 1]
+
+    边界代价（quality_metrics.boundary_cost，百分比）越低质量越高；
+    缺失或非数值时返回中性值0.5
+    """
+    metrics = case.get('quality_metrics')
+    value = metrics.get('boundary_cost') if isinstance(metrics, dict) else None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        return 0.5
+    return 1.0 / (1.0 + max(float(value), 0.0) / 100.0)
+
+
+def case_retrieval_stats(case: Dict[str, Any]) -> Tuple[int, Optional[float]]:
+    """读取案例持久化的(命中次数, 最近命中时间)，缺失时为(0, None)"""
+    stats = case.get(RETRIEVAL_STATS_FIELD)
+    if not isinstance(stats, dict):
+        return 0, None
+    hits = stats.get('hits')
+    last_access = stats.get('last_access')
+    if isinstance(hits, bool) or not isinstance(hits, int):
+        hits = 0
+    if isinstance(last_access, bool) or not isinstance(last_access, (int, float)):
+        last_access = None
+    return max(hits, 0), last_access
+
+
+class EvictionPolicy:
+    """淘汰策略基类"""
+
+    name = 'base'
+    # 是否需要检索命中信息（不需要时知识库跳过命中记录）
+    tracks_hits = False
+
+    def reset(self, cases: Iterable[Dict[str, Any]]):
+        """按加入顺序重建策略状态"""
+        self.clear()
+        for case in cases:
+            self.insert(case['design_id'], case)
+
+    def clear(self):
+        raise NotImplementedError
+
+    def insert(self, design_id: str, case: Dict[str, Any]):
+        """新案例加入"""
+        raise NotImplementedError
+
+    def update(self, design_id: str, case: Dict[str, Any]):
+        """已有案例被更新"""
+
+    def remove(self, design_id: str):
+        """案例被删除"""
+        raise NotImplementedError
+
+    def hit(self, design_ids: Iterable[str]):
+        """记录检索命中"""
+
+    def victim(self) -> Optional[str]:
+        """返回应被淘汰的案例（不修改状态），为空时返回None"""
+        raise NotImplementedError
+
+
+class FIFOPolicy(EvictionPolicy):
+    """先进先出：淘汰最早加入的案例（更新不改变顺序）"""
+
+    name = 'fifo'
+
+    def __init__(self):
+        self._order: 'OrderedDict[str, None]' = OrderedDict()
+
+    def clear(self):
+        self._order.clear()
+
+    def insert(self, design_id: str, case: Dict[str, Any]):
+        self._order[design_id] = None
+
+    def remove(self, design_id: str):
+        self._order.pop(design_id, None)
+
+    def victim(self) -> Optional[str]:
+        return next(iter(self._order), None)
+
+
+class LRUPolicy(FIFOPolicy):
+    """最近最少使用：检索命中或更新时移到队尾，淘汰队首"""
+
+    name = 'lru'
+    tracks_hits = True
+
+    def reset(self, cases: Iterable[Dict[str, Any]]):
+        # 按持久化的最近命中时间恢复顺序，没有命中记录的案例按加入顺序排在最前
+        cases = list(cases)
+        last_access = [case_retrieval_stats(case)[1] for case in cases]
+        self.clear()
+        for i in sorted(range(len(cases)), key=lambda i: (last_access[i] is not None, last_access[i] or 0)):
+            self.insert(cases[i]['design_id'], cases[i])
+
+    def update(self, design_id: str, case: Dict[str, Any]):
+        self._order.move_to_end(design_id)
+
+    def hit(self, design_ids: Iterable[str]):
+        for design_id in design_ids:
+            if design_id in self._order:
+                self._order.move_to_end(design_id)
+
+
+class UtilityPolicy(EvictionPolicy):
+    """
+    效用淘汰：utility = hit_weight * log(1 + 命中次数) + quality_weight * 质量
+
+    质量见case_quality。堆中保存(效用, 版本, design_id)，分数变化时压入新条目，
+    旧条目在淘汰时按版本号跳过；过期条目过多时整体重建堆。
+    """
+
+    name = 'utility'
+    tracks_hits = True
+
+    def __init__(self, hit_weight: float = 1.0, quality_weight: float = 1.0):
+        """
+        Args:
+            hit_weight: 检索命中频次的权重
+            quality_weight: 边界代价质量的权重
+        """
+        self.hit_weight = float(hit_weight)
+        self.quality_weight = float(quality_weight)
+        self._entries: Dict[str, List[Any]] = {}  # design_id -> [命中次数, 质量, 版本]
+        self._heap: List[Tuple[float, int, str]] = []
+        self._version = 0
+
+    def clear(self):
+        self._entries = {}
+        self._heap = []
+
+    def hits(self, design_id: str) -> int:
+        """案例的检索命中次数"""
+        entry = self._entries.get(design_id)
+        return entry[0] if entry else 0
+
+    def utility(self, design_id: str) -> float:
+        """案例当前的效用值"""
+        hits, quality, _ = self._entries[design_id]
+        return self.hit_weight * math.log1p(hits) + self.quality_weight * quality
+
+    def _push(self, design_id: str):
+        self._version += 1
+        self._entries[design_id][2] = self._version
+        heapq.heappush(self._heap, (self.utility(design_id), self._version, design_id))
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [
+                (self.utility(key), entry[2], key) for key, entry in self._entries.items()
+            ]
+            heapq.heapify(self._heap)
+
+    def insert(self, design_id: str, case: Dict[str, Any]):
+        self._entries[design_id] = [case_retrieval_stats(case)[0], case_quality(case), 0]
+        self._push(design_id)
+
+    def update(self, design_id: str, case: Dict[str, Any]):
+        entry = self._entries.get(design_id)
+        if entry is None:
+            self.insert(design_id, case)
+            return
+        entry[1] = case_quality(case)
+        self._push(design_id)
+
+    def remove(self, design_id: str):
+        # 堆中的条目留到淘汰时懒删除
+        self._entries.pop(design_id, None)
+
+    def hit(self, design_ids: Iterable[str]):
+        for design_id in design_ids:
+            entry = self._entries.get(design_id)
+            if entry is not None:
+                entry[0] += 1
+                self._push(design_id)
+
+    def victim(self) -> Optional[str]:
+        heap = self._heap
+        while heap:
+            _, version, design_id = heap[0]
+            entry = self._entries.get(design_id)
+            if entry is not None and entry[2] == version:
+                return design_id
+            heapq.heappop(heap)
+        return None
+
+
+def create_eviction_policy(policy: str = 'fifo', **kwargs) -> EvictionPolicy:
+    """
+    创建淘汰策略
+
+    Args:
+        policy: 'fifo', 'lru', 'utility'
+        **kwargs: 传给策略构造函数的参数（utility: hit_weight、quality_weight）
+
+    Returns:
+        策略实例
+    """
+    if policy == 'fifo':
+        return FIFOPolicy()
+    if policy == 'lru':
+        return LRUPolicy()
+    if policy == 'utility':
+        return UtilityPolicy(**kwargs)
+    raise ValueError(f"不支持的淘汰策略: {policy}")
@@ -0,0 +1,593 @@
+"""
+知识库持久化存储后端
+1. json: 原有的 kb_cases.json 格式（每次保存在文件锁内合并其他进程的修改后原子替换）
+2. sqlite: 案例元数据存放在SQLite（WAL模式，按design_id增量提交），
+   特征/嵌入向量以二进制追加写入旁路文件并通过内存映射读取
+
+sqlite后端的文件布局（以 kb_cases.db 为例）：
+    kb_cases.db                        案例元数据（JSON文本，不含向量）及向量偏移
+    kb_cases.features.<gen>.f64        特征向量（float64，保持原精度）
+    kb_cases.embeddings.<gen>.f32      嵌入向量（float32）
+
+向量旁路文件只追加，被更新/删除的案例留下的旧数据在compact()时清理；
+compact()写出新一代(<gen>)文件后在同一事务中切换，正在读取旧文件的进程不受影响。
+
+sqlite后端把案例中的大字段（模块名列表、模块层次、分区分配、协商迁移记录等，
+见_PAYLOAD_FIELDS）单独存放在payloads表中：load(with_payloads=False)只读取精简记录，
+大字段通过load_payloads()按需读取，知识库常驻内存与案例的大字段无关。
+load_records()返回的精简记录也不含向量：向量只记录在旁路文件中的偏移，
+由知识库从内存映射中按需读取，不展开为Python列表。
+
+多进程并发：两种后端的提交都按design_id合并（新增/更新覆盖同ID案例，删除只影响
+本进程删除的案例），不会丢失其他进程同时写入的案例；读取方总是看到某次完整提交后的快照。
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .file_lock import FileLock
+
+
+# 存放在向量旁路文件中的字段及其存储精度
+_VECTOR_FIELDS = {
+    'features': ('features', np.float64, 'f64'),
+    'embedding': ('embeddings', np.float32, 'f32'),
+}
+
+
+# 存放在payloads表中的大字段：顶层字段名 -> None（整个字段）或需要移出的子字段
+_PAYLOAD_FIELDS = {
+    'module_names': None,
+    'module_hierarchy': None,
+    'partition_strategy': ('partitions', 'boundary_modules'),
+    'negotiation_patterns': ('migrations',),
+}
+
+
+def split_case_payload(case: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    将案例拆分为精简记录和大字段
+
+    精简记录保留检索需要的字段（特征、嵌入、质量指标、分区数等标量）；
+    大字段记录原字段顺序及被移出的完整字段值。案例没有大字段时原样返回，大字段为None
+
+    Returns:
+        (slim, payload)
+    """
+    fields = {}
+    slim = None
+    for field, subfields in _PAYLOAD_FIELDS.items():
+        if field not in case:
+            continue
+        value = case[field]
+        if subfields is None:
+            fields[field] = value
+            slim = slim if slim is not None else dict(case)
+            del slim[field]
+        elif isinstance(value, dict) and any(key in value for key in subfields):
+            fields[field] = value
+            slim = slim if slim is not None else dict(case)
+            slim[field] = {key: item for key, item in value.items() if key not in subfields}
+    if slim is None:
+        return case, None
+    return slim, {'order': list(case.keys()), 'fields': fields}
+
+
+def merge_case_payload(slim: Dict[str, Any], payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """split_case_payload的逆操作（按原字段顺序还原完整案例）"""
+    if not payload:
+        return slim
+    fields = payload['fields']
+    case = {
+        key: fields[key] if key in fields else slim[key]
+        for key in payload['order'] if key in fields or key in slim
+    }
+    for key, value in slim.items():
+        case.setdefault(key, value)
+    return case
+
+
+def as_flat_vector(value: Any, dtype) -> Optional[np.ndarray]:
+    """可以存入旁路文件的一维数值向量，否则返回None（保留在JSON中）"""
+    if value is None or isinstance(value, (str, bytes, dict)):
+        return None
+    try:
+        vector = np.asarray(value, dtype=dtype)
+    except (TypeError, ValueError):
+        return None
+    if vector.ndim != 1 or vector.size == 0:
+        return None
+    return vector
+
+
+def _json_dump_cases(cases: List[Dict[str, Any]], path: Path):
+    """以原有JSON格式写出案例列表（写入临时文件后原子替换，读取方不会看到写了一半的文件）"""
+    data = {
+        'version': '1.0',
+        'num_cases': len(cases),
+        'cases': cases
+    }
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class CaseStore:
+    """案例存储基类"""
+
+    backend = 'base'
+    # 是否支持只加载精简记录、大字段按需读取
+    lazy_payloads = False
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    def exists(self) -> bool:
+        """存储文件是否存在"""
+        return self.path.exists()
+
+    def load(self, with_payloads: bool = True) -> List[Dict[str, Any]]:
+        """
+        读取全部案例（按插入顺序）
+
+        Args:
+            with_payloads: False时（lazy_payloads后端）只返回精简记录，见split_case_payload
+        """
+        raise NotImplementedError
+
+    def load_records(self) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Tuple]]]:
+        """
+        读取全部精简记录，向量可以留在存储中不展开
+
+        Returns:
+            (cases, vectors)：vectors为None时向量字段保留在案例字典中；否则案例字典中
+            没有存入旁路文件的向量字段，vectors[字段] = (基础数组, 偏移, 长度, 位置)，
+            后三者为按案例顺序的int64数组，长度为-1表示该案例的字段不在基础数组中，
+            位置为字段在案例字典中的下标（依次移出features、embedding时计算）
+        """
+        return self.load(with_payloads=False), None
+
+    def load_payloads(self, design_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """读取指定案例的大字段（design_id -> payload，没有大字段的案例不出现在结果中）"""
+        return {}
+
+    def commit(
+        self,
+        cases: List[Dict[str, Any]],
+        upserts: List[Dict[str, Any]],
+        deletes: List[str]
+    ):
+        """
+        提交修改
+
+        Args:
+            cases: 当前全部案例（整体重写的后端使用）
+            upserts: 自上次提交以来新增或修改的案例
+            deletes: 自上次提交以来删除的design_id
+        """
+        raise NotImplementedError
+
+    def compact(self):
+        """清理存储中的过期数据（默认无操作）"""
+
+    def fingerprint(self) -> Dict[str, Any]:
+        """存储内容的版本标识，用于判断派生数据（如ANN索引）是否过期"""
+        raise NotImplementedError
+
+
+class JSONCaseStore(CaseStore):
+    """原有的 kb_cases.json 格式"""
+
+    backend = 'json'
+
+    def _lock_file(self) -> Path:
+        return self.path.with_name(f"{self.path.name}.lock")
+
+    def load(self, with_payloads: bool = True) -> List[Dict[str, Any]]:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data.get('cases', [])
+
+    def commit(self, cases, upserts, deletes):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with FileLock(self._lock_file()):
+            if not self.exists():
+                _json_dump_cases(cases, self.path)
+                return
+            if not upserts and not deletes:
+                return
+            # 在锁内重新读取磁盘上的最新内容，按design_id合并本进程的修改
+            merged = self.load()
+            positions = {case.get('design_id'): i for i, case in enumerate(merged)}
+            for case in upserts:
+                pos = positions.get(case['design_id'])
+                if pos is None:
+                    positions[case['design_id']] = len(merged)
+                    merged.append(case)
+                else:
+                    merged[pos] = case
+            removed = set(deletes)
+            if removed:
+                merged = [case for case in merged if case.get('design_id') not in removed]
+            _json_dump_cases(merged, self.path)
+
+    def fingerprint(self) -> Dict[str, Any]:
+        stat = self.path.stat()
+        return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+class SQLiteCaseStore(CaseStore):
+    """SQLite元数据 + 二进制向量旁路文件"""
+
+    backend = 'sqlite'
+    lazy_payloads = True
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cases (
+            design_id TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            features_off INTEGER,
+            features_len INTEGER,
+            embeddings_off INTEGER,
+            embeddings_len INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS cases_seq ON cases(seq);
+        CREATE TABLE IF NOT EXISTS payloads (
+            design_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, compact_min_bytes: int = 1 << 20, compact_ratio: float = 2.0):
+        """
+        Args:
+            path: 数据库文件路径
+            compact_min_bytes: 旁路文件中过期数据超过该大小时才考虑自动压缩
+            compact_ratio: 旁路文件大小超过有效数据的该倍数时自动压缩
+        """
+        super().__init__(path)
+        self.compact_min_bytes = compact_min_bytes
+        self.compact_ratio = compact_ratio
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=60, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(self._SCHEMA)
+        return conn
+
+    def _sidecar(self, kind: str, generation: int) -> Path:
+        suffix = 'f64' if kind == 'features' else 'f32'
+        return self.path.with_name(f"{self.path.stem}.{kind}.{generation}.{suffix}")
+
+    @staticmethod
+    def _generation(conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'sidecar_generation'").fetchone()
+        return int(row[0]) if row else 0
+
+    @staticmethod
+    def _bump_version(conn: sqlite3.Connection):
+        conn.execute(
+            "INSERT INTO meta(key, value) VALUES ('version', '1') "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+
+    def load(self, with_payloads: bool = True) -> List[Dict[str, Any]]:
+        cases, vectors, payloads = self._load_records(with_payloads)
+        for i, case in enumerate(cases):
+            # 按移出时的逆序把向量插回原位置，再合并大字段（大字段记录的字段顺序包含向量字段）
+            items = None
+            for field in reversed(list(_VECTOR_FIELDS)):
+                base, offsets, lengths, positions = vectors[field]
+                if lengths[i] < 0:
+                    continue
+                items = list(case.items()) if items is None else items
+                items.insert(int(positions[i]), (field, base[offsets[i]:offsets[i] + lengths[i]].tolist()))
+            if items is not None:
+                case = dict(items)
+            if case['design_id'] in payloads:
+                case = merge_case_payload(case, json.loads(payloads[case['design_id']]))
+            cases[i] = case
+        return cases
+
+    def load_records(self):
+        cases, vectors, _ = self._load_records(with_payloads=False)
+        return cases, vectors
+
+    def _load_records(self, with_payloads: bool):
+        """读取不含向量的精简记录、向量偏移及（可选）大字段的JSON文本"""
+        for _ in range(3):
+            snapshot = self._read_snapshot(with_payloads)
+            if snapshot is not None:
+                break
+        else:
+            raise RuntimeError(f"读取知识库向量文件失败: {self.path}")
+        rows, mapped, payloads = snapshot
+
+        vectors = {
+            field: (mapped[kind], np.zeros(len(rows), dtype=np.int64),
+                    np.full(len(rows), -1, dtype=np.int64), np.zeros(len(rows), dtype=np.int64))
+            for field, (kind, _, _) in _VECTOR_FIELDS.items()
+        }
+        cases = []
+        for i, (_, data, f_off, f_len, e_off, e_len) in enumerate(rows):
+            case = json.loads(data)
+            for field, offset, length in (('features', f_off, f_len), ('embedding', e_off, e_len)):
+                if offset is None:
+                    continue
+                # 去掉提交时留下的占位，向量留在内存映射中
+                _, offsets, lengths, positions = vectors[field]
+                positions[i] = list(case).index(field)
+                del case[field]
+                offsets[i], lengths[i] = offset, length
+            cases.append(case)
+        return cases, vectors, payloads
+
+    def load_payloads(self, design_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        design_ids = list(design_ids)
+        payloads = {}
+        if not design_ids or not self.exists():
+            return payloads
+        conn = self._connect()
+        try:
+            # 分批查询，避免超过SQLite的参数数量上限
+            for start in range(0, len(design_ids), 500):
+                batch = design_ids[start:start + 500]
+                placeholders = ', '.join('?' * len(batch))
+                for design_id, data in conn.execute(
+                    f"SELECT design_id, data FROM payloads WHERE design_id IN ({placeholders})",
+                    batch
+                ):
+                    payloads[design_id] = json.loads(data)
+        finally:
+            conn.close()
+        return payloads
+
+    def _read_snapshot(self, with_payloads: bool = True):
+        """
+        在一个读事务内读取元数据并映射对应代的向量文件
+
+        读取期间其他进程完成compact()并删除了旧文件时返回None，由调用方重试
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN")
+            generation = self._generation(conn)
+            rows = conn.execute(
+                "SELECT design_id, data, features_off, features_len, embeddings_off, embeddings_len "
+                "FROM cases ORDER BY seq"
+            ).fetchall()
+            payloads = dict(conn.execute("SELECT design_id, data FROM payloads")) if with_payloads else {}
+            vectors = {}
+            for column, (kind, dtype, _) in zip((2, 4), _VECTOR_FIELDS.values()):
+                path = self._sidecar(kind, generation)
+                referenced = any(row[column] is not None for row in rows)
+                if referenced and not path.exists():
+                    return None
+                vectors[kind] = self._map(path, dtype)
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return rows, vectors, payloads
+
+    @staticmethod
+    def _map(path: Path, dtype) -> np.ndarray:
+        if not path.exists() or path.stat().st_size == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r')
+
+    def commit(self, cases, upserts, deletes):
+        conn = self._connect()
+        if not upserts and not deletes:
+            conn.close()
+            return
+        try:
+            # BEGIN IMMEDIATE 取得写锁，多个写入进程在此串行化（旁路文件追加也在锁内）
+            conn.execute("BEGIN IMMEDIATE")
+            generation = self._generation(conn)
+            records = []
+            pending = {kind: [] for kind, _, _ in _VECTOR_FIELDS.values()}
+            offsets = {
+                kind: self._sidecar_size(kind, generation, dtype)
+                for kind, dtype, _ in _VECTOR_FIELDS.values()
+            }
+            for case in upserts:
+                data, payload = split_case_payload(case)
+                data = dict(data)
+                placed = {}
+                for field, (kind, dtype, _) in _VECTOR_FIELDS.items():
+                    vector = as_flat_vector(data.get(field), dtype)
+                    if vector is None:
+                        placed[kind] = (None, None)
+                        continue
+                    # 保留字段占位，加载时按原字段顺序还原
+                    data[field] = None
+                    placed[kind] = (offsets[kind], vector.size)
+                    offsets[kind] += vector.size
+                    pending[kind].append(vector)
+                records.append((
+                    case['design_id'], json.dumps(data, ensure_ascii=False),
+                    *placed['features'], *placed['embeddings'],
+                    json.dumps(payload, ensure_ascii=False) if payload else None
+                ))
+
+            # 先写向量再提交元数据：崩溃时旁路文件只会多出未被引用的尾部
+            for kind, dtype, _ in _VECTOR_FIELDS.values():
+                if pending[kind]:
+                    with open(self._sidecar(kind, generation), 'ab') as f:
+                        f.write(np.concatenate(pending[kind]).astype(dtype).tobytes())
+                        f.flush()
+                        os.fsync(f.fileno())
+
+            next_seq = conn.execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM cases").fetchone()[0]
+            for design_id, data, f_off, f_len, e_off, e_len, payload in records:
+                conn.execute(
+                    "INSERT INTO cases(design_id, seq, data, features_off, features_len, "
+                    "embeddings_off, embeddings_len) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(design_id) DO UPDATE SET data = excluded.data, "
+                    "features_off = excluded.features_off, features_len = excluded.features_len, "
+                    "embeddings_off = excluded.embeddings_off, embeddings_len = excluded.embeddings_len",
+                    (design_id, next_seq, data, f_off, f_len, e_off, e_len)
+                )
+                if payload is None:
+                    conn.execute("DELETE FROM payloads WHERE design_id = ?", (design_id,))
+                else:
+                    conn.execute(
+                        "INSERT INTO payloads(design_id, data) VALUES (?, ?) "
+                        "ON CONFLICT(design_id) DO UPDATE SET data = excluded.data",
+                        (design_id, payload)
+                    )
+                next_seq += 1
+            conn.executemany("DELETE FROM cases WHERE design_id = ?", [(d,) for d in deletes])
+            conn.executemany("DELETE FROM payloads WHERE design_id = ?", [(d,) for d in deletes])
+            self._bump_version(conn)
+            conn.execute("COMMIT")
+
+            if self._needs_compaction(conn):
+                self._compact(conn)
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _sidecar_size(self, kind: str, generation: int, dtype) -> int:
+        """旁路文件当前的元素数量"""
+        path = self._sidecar(kind, generation)
+        if not path.exists():
+            return 0
+        return path.stat().st_size // np.dtype(dtype).itemsize
+
+    def _needs_compaction(self, conn: sqlite3.Connection) -> bool:
+        generation = self._generation(conn)
+        live = conn.execute(
+            "SELECT COALESCE(SUM(features_len), 0), COALESCE(SUM(embeddings_len), 0) FROM cases"
+        ).fetchone()
+        total_bytes = live_bytes = 0
+        for (kind, dtype, _), count in zip(_VECTOR_FIELDS.values(), live):
+            itemsize = np.dtype(dtype).itemsize
+            total_bytes += self._sidecar_size(kind, generation, dtype) * itemsize
+            live_bytes += count * itemsize
+        dead_bytes = total_bytes - live_bytes
+        return dead_bytes >= self.compact_min_bytes and total_bytes > self.compact_ratio * live_bytes
+
+    def compact(self):
+        """重写向量旁路文件，只保留仍被引用的数据"""
+        if not self.exists():
+            return
+        conn = self._connect()
+        try:
+            self._compact(conn)
+        finally:
+            conn.close()
+
+    def _compact(self, conn: sqlite3.Connection):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            generation = self._generation(conn)
+            new_generation = generation + 1
+            rows = conn.execute(
+                "SELECT design_id, features_off, features_len, embeddings_off, embeddings_len "
+                "FROM cases ORDER BY seq"
+            ).fetchall()
+            new_offsets = {row[0]: {} for row in rows}
+            for column, (kind, dtype, _) in zip((1, 3), _VECTOR_FIELDS.values()):
+                old = self._map(self._sidecar(kind, generation), dtype)
+                offset = 0
+                with open(self._sidecar(kind, new_generation), 'wb') as f:
+                    for row in rows:
+                        off, length = row[column], row[column + 1]
+                        if off is None:
+                            continue
+                        f.write(np.asarray(old[off:off + length], dtype=dtype).tobytes())
+                        new_offsets[row[0]][kind] = offset
+                        offset += length
+                    f.flush()
+                    os.fsync(f.fileno())
+                del old
+            for design_id, placed in new_offsets.items():
+                conn.execute(
+                    "UPDATE cases SET features_off = ?, embeddings_off = ? WHERE design_id = ?",
+                    (placed.get('features'), placed.get('embeddings'), design_id)
+                )
+            conn.execute(
+                "INSERT INTO meta(key, value) VALUES ('sidecar_generation', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (str(new_generation),)
+            )
+            self._bump_version(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            for kind, _, _ in _VECTOR_FIELDS.values():
+                self._sidecar(kind, generation + 1).unlink(missing_ok=True)
+            raise
+        # 已打开旧文件的读取方仍持有映射，删除文件不影响它们
+        for kind, _, _ in _VECTOR_FIELDS.values():
+            self._sidecar(kind, generation).unlink(missing_ok=True)
+        conn.execute("VACUUM")
+
+    def fingerprint(self) -> Dict[str, Any]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        finally:
+            conn.close()
+        return {'version': int(row[0]) if row else 0}
+
+    def export_json(self, output_file: str) -> int:
+        """
+        导出为原有的JSON格式
+
+        Args:
+            output_file: 输出文件路径
+
+        Returns:
+            导出的案例数量
+        """
+        cases = self.load()
+        output_path = Path(output_file)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        _json_dump_cases(cases, output_path)
+        return len(cases)
+
+
+def open_case_store(path: str, backend: Optional[str] = None) -> CaseStore:
+    """
+    创建案例存储
+
+    Args:
+        path: 存储文件路径
+        backend: 'json' 或 'sqlite'；None时按扩展名判断（.db/.sqlite/.sqlite3 为sqlite）
+
+    Returns:
+        存储实例
+    """
+    if backend is None:
+        backend = 'sqlite' if Path(path).suffix.lower() in ('.db', '.sqlite', '.sqlite3') else 'json'
+    if backend == 'json':
+        return JSONCaseStore(path)
+    if backend == 'sqlite':
+        return SQLiteCaseStore(path)
+    raise ValueError(f"不支持的知识库存储后端: {backend}")
@@ -0,0 +1,441 @@
+"""
+结构化Verilog网表读取器
+流式读取门级网表（design.v），提取各模块的端口、wire（可按位展开）与实例（引脚 -> net连接），
+名称统一驻留到符号表，实例与连接以整数数组紧凑存储；
+解析结果按文件内容哈希缓存为二进制文件，供VerilogPartitioner、HierarchicalTransformation、
+OpenRoadInterface与标准单元黑盒生成共享。
+"""
+
+import os
+import pickle
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from .hashing import file_digest
+from .verilog_scanner import (
+    BLOCK_KEYWORDS,
+    MODULE_KEYWORDS,
+    is_identifier,
+    iter_verilog_lines,
+)
+
+
+# 解析结果格式版本（变化时旧缓存失效）
+NETLIST_FORMAT_VERSION = 1
+
+_DIRECTIONS = frozenset(('input', 'output', 'inout'))
+_NET_TYPES = frozenset(('wire', 'tri', 'tri0', 'tri1', 'wand', 'wor', 'supply0', 'supply1', 'reg', 'logic'))
+_TYPE_MODIFIERS = _NET_TYPES | frozenset(('signed', 'unsigned'))
+_OPEN = {'(': ')', '[': ']', '{': '}'}
+
+# 进程内已解析网表（按路径、大小、修改时间），避免重复计算文件哈希
+_MEMO: Dict[Tuple[str, int, int], 'StructuralNetlist'] = {}
+_MEMO_SIZE = 4
+
+
+def expand_bus(name: str, msb: Optional[int], lsb: Optional[int]) -> List[str]:
+    """将向量信号按位展开为 name[i]（标量返回[name]），位序从低到高"""
+    if msb is None or lsb is None:
+        return [name]
+    return [f"{name}[{i}]" for i in range(min(msb, lsb), max(msb, lsb) + 1)]
+
+
+class NetlistModule:
+    """单个模块的结构化网表（实例与连接为符号表ID数组）"""
+
+    __slots__ = (
+        'name', 'ports', 'wires', 'assigns', 'span', 'symbols',
+        'inst_names', 'inst_types', 'conn_offsets', 'conn_pins', 'conn_nets',
+    )
+
+    def __init__(self, name: str, symbols: List[str]):
+        self.name = name
+        self.ports: List[Tuple[str, str, Optional[int], Optional[int]]] = []  # (名称, 方向, msb, lsb)
+        self.wires: List[Tuple[str, Optional[int], Optional[int]]] = []  # (名称, msb, lsb)
+        self.assigns: List[Tuple[str, str]] = []  # (左值, 右值)
+        self.span: Tuple[int, int] = (0, 0)  # 模块在源文件中的字节区间（整行）
+        self.symbols = symbols
+        self.inst_names = array('i')
+        self.inst_types = array('i')
+        self.conn_offsets = array('q', [0])
+        self.conn_pins = array('i')  # 引脚名ID，-1表示按位置连接
+        self.conn_nets = array('i')  # 连接表达式ID，-1表示悬空
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+    @property
+    def num_instances(self) -> int:
+        return len(self.inst_names)
+
+    def iter_instances(self) -> Iterator[Tuple[str, str, List[Tuple[Optional[str], Optional[str]]]]]:
+        """
+        按源文件顺序产生实例
+
+        Yields:
+            (实例名, 模块类型, [(引脚名或None, 连接表达式或None), ...])
+        """
+        symbols = self.symbols
+        offsets, pins, nets = self.conn_offsets, self.conn_pins, self.conn_nets
+        for index in range(len(self.inst_names)):
+            connections = [
+                (symbols[pins[i]] if pins[i] >= 0 else None, symbols[nets[i]] if nets[i] >= 0 else None)
+                for i in range(offsets[index], offsets[index + 1])
+            ]
+            yield symbols[self.inst_names[index]], symbols[self.inst_types[index]], connections
+
+    def instance_types(self) -> Set[str]:
+        """实例化的模块类型集合"""
+        return {self.symbols[type_id] for type_id in set(self.inst_types)}
+
+    def port_bits(self) -> List[Tuple[str, str, str, Optional[int]]]:
+        """端口按位展开: [(位名称, 方向, 端口名, 位序号或None), ...]"""
+        bits = []
+        for name, direction, msb, lsb in self.ports:
+            if msb is None or lsb is None:
+                bits.append((name, direction, name, None))
+            else:
+                for i in range(min(msb, lsb), max(msb, lsb) + 1):
+                    bits.append((f"{name}[{i}]", direction, name, i))
+        return bits
+
+
+class StructuralNetlist:
+    """结构化网表（多个模块共享一个符号表）"""
+
+    def __init__(self, source: str, symbols: List[str], modules: Dict[str, NetlistModule]):
+        self.source = source
+        self.symbols = symbols
+        self.modules = modules
+
+    @property
+    def top_module(self) -> Optional[str]:
+        """顶层模块名（文件中第一个模块）"""
+        return next(iter(self.modules), None)
+
+    @property
+    def module_names(self) -> List[str]:
+        return list(self.modules)
+
+    def module(self, name: Optional[str] = None) -> Optional[NetlistModule]:
+        """获取模块（默认顶层模块）"""
+        return self.modules.get(name or self.top_module)
+
+    def instance_types(self) -> Set[str]:
+        """所有模块中实例化的模块类型集合"""
+        types: Set[str] = set()
+        for module in self.modules.values():
+            types.update(module.instance_types())
+        return types
+
+    def module_text(self, name: str) -> str:
+        """读取模块在源文件中的原始文本（从module所在行到endmodule所在行）"""
+        start, end = self.modules[name].span
+        with open(self.source, 'rb') as f:
+            f.seek(start)
+            text = f.read(end - start).decode('utf-8', errors='ignore')
+        return text[:-1] if text.endswith('\n') else text
+
+    def module_texts(self) -> Dict[str, str]:
+        """所有模块的原始文本 {模块名: 文本}（单次顺序读取源文件）"""
+        texts = {}
+        with open(self.source, 'rb') as f:
+            for name, module in self.modules.items():
+                start, end = module.span
+                f.seek(start)
+                text = f.read(end - start).decode('utf-8', errors='ignore')
+                texts[name] = text[:-1] if text.endswith('\n') else text
+        return texts
+
+
+class _NetlistParser:
+    """单遍流式解析器"""
+
+    def __init__(self, verilog_file: str):
+        self.verilog_file = verilog_file
+        self.symbols: List[str] = []
+        self.symbol_ids: Dict[str, int] = {}
+        self.line_start = 0
+        self.line_end = 0
+        # 下一个词法单元（文件结束后始终返回None）
+        self.next = self._tokens().__next__
+
+    def _tokens(self) -> Iterator[Optional[str]]:
+        for start, end, tokens in iter_verilog_lines(self.verilog_file):
+            self.line_start, self.line_end = start, end
+            yield from tokens
+        while True:
+            yield None
+
+    def intern(self, name: str) -> int:
+        symbol_id = self.symbol_ids.get(name)
+        if symbol_id is None:
+            symbol_id = len(self.symbols)
+            self.symbol_ids[name] = symbol_id
+            self.symbols.append(name)
+        return symbol_id
+
+    def skip_to(self, token: Optional[str], end: str) -> Optional[str]:
+        while token is not None and token != end:
+            token = self.next()
+        return token
+
+    def read_expr(self, stops: Tuple[str, ...], token: Optional[str] = None) -> Tuple[str, Optional[str]]:
+        """读取表达式直到深度0处的停止符（可从已读入的token开始），返回(表达式文本, 停止符)"""
+        parts = []
+        closers = []
+        if token is None:
+            token = self.next()
+        while token is not None:
+            if not closers and token in stops:
+                break
+            if token in _OPEN:
+                closers.append(_OPEN[token])
+            elif closers and token == closers[-1]:
+                closers.pop()
+            parts.append(token)
+            token = self.next()
+        return ''.join(parts), token
+
+    def read_range(self) -> Tuple[Optional[int], Optional[int]]:
+        """读取 [msb:lsb]（已读入'['），非常量位宽返回(None, None)"""
+        text, _ = self.read_expr((']',))
+        msb, _, lsb = text.partition(':')
+        try:
+            return int(msb), int(lsb)
+        except ValueError:
+            return None, None
+
+    def parse(self) -> StructuralNetlist:
+        modules: Dict[str, NetlistModule] = {}
+        token = self.next()
+        while token is not None:
+            if token in MODULE_KEYWORDS:
+                start = self.line_start
+                name = self.next()
+                if name is None:
+                    break
+                module = NetlistModule(name, self.symbols)
+                self.parse_module(module)
+                module.span = (start, self.line_end)
+                modules[name] = module
+            token = self.next()
+        return StructuralNetlist(os.path.abspath(self.verilog_file), self.symbols, modules)
+
+    def parse_module(self, module: NetlistModule):
+        token = self.next()
+        if token == '#':
+            if self.next() == '(':
+                self.read_expr((')',))
+            token = self.next()
+        if token == '(':
+            self.parse_header(module)
+            token = self.next()
+        self.skip_to(token, ';')
+
+        token = self.next()
+        while token is not None and token != 'endmodule':
+            if token in _DIRECTIONS:
+                token = self.parse_declaration(module, token)
+            elif token in _NET_TYPES:
+                token = self.parse_declaration(module, None)
+            elif token == 'assign':
+                token = self.parse_assign(module)
+            elif token in BLOCK_KEYWORDS:
+                pass
+            elif is_identifier(token):
+                token = self.parse_instances(module, token)
+            else:
+                token = self.skip_to(token, ';')
+            token = self.next()
+
+    def parse_header(self, module: NetlistModule):
+        """解析端口列表（已读入'('）；ANSI风格的声明直接记为端口"""
+        direction = None
+        msb = lsb = None
+        token = self.next()
+        while token is not None and token != ')':
+            if token in _DIRECTIONS:
+                direction, msb, lsb = token, None, None
+            elif token == '[':
+                msb, lsb = self.read_range()
+            elif direction is not None and token not in _TYPE_MODIFIERS and is_identifier(token):
+                module.ports.append((token, direction, msb, lsb))
+            token = self.next()
+
+    def parse_declaration(self, module: NetlistModule, direction: Optional[str]) -> Optional[str]:
+        """解析端口或wire声明，返回结束的';'"""
+        msb = lsb = None
+        token = self.next()
+        while token is not None and token != ';':
+            if token == '[':
+                msb, lsb = self.read_range()
+            elif token == '=':
+                # 带初始值/连续赋值的声明，跳过右值
+                _, token = self.read_expr((',', ';'))
+                continue
+            elif token not in _TYPE_MODIFIERS and is_identifier(token):
+                if direction is None:
+                    module.wires.append((token, msb, lsb))
+                else:
+                    module.ports.append((token, direction, msb, lsb))
+            token = self.next()
+        return token
+
+    def parse_assign(self, module: NetlistModule) -> Optional[str]:
+        token = ','
+        while token == ',':
+            lhs, token = self.read_expr(('=', ';'))
+            if token != '=':
+                break
+            rhs, token = self.read_expr((',', ';'))
+            module.assigns.append((lhs, rhs))
+        return token
+
+    def parse_instances(self, module: NetlistModule, module_type: str) -> Optional[str]:
+        """解析实例化语句: 类型 [#(参数)] 实例名 [位宽] (连接) {, 实例名 (连接)} ;"""
+        token = self.next()
+        if token == '#':
+            if self.next() == '(':
+                self.read_expr((')',))
+            token = self.next()
+        type_id = None
+        while token is not None and is_identifier(token):
+            instance_name = token
+            token = self.next()
+            if token == '[':
+                self.read_expr((']',))
+                token = self.next()
+            if token != '(':
+                break
+            if type_id is None:
+                type_id = self.intern(module_type)
+            module.inst_names.append(self.intern(instance_name))
+            module.inst_types.append(type_id)
+            self.parse_connections(module)
+            module.conn_offsets.append(len(module.conn_pins))
+            token = self.next()
+            if token != ',':
+                break
+            token = self.next()
+        return self.skip_to(token, ';')
+
+    def parse_connections(self, module: NetlistModule):
+        """解析连接列表（已读入'('，读到匹配的')'为止）"""
+        pins, nets = module.conn_pins, module.conn_nets
+        next_token, intern = self.next, self.intern
+        token = next_token()
+        while token is not None and token != ')':
+            if token == '.':
+                pin = next_token()
+                if next_token() != '(':
+                    token = self.skip_to(next_token(), ')')
+                    break
+                pins.append(intern(pin))
+                token = next_token()
+                if token == ')':
+                    nets.append(-1)
+                else:
+                    following = next_token()
+                    if following == ')' and token not in _OPEN:
+                        # 常见情形：.pin(net)
+                        nets.append(intern(token))
+                    else:
+                        parts = [token]
+                        closers = [_OPEN[token]] if token in _OPEN else []
+                        token = following
+                        while token is not None and (closers or token != ')'):
+                            if token in _OPEN:
+                                closers.append(_OPEN[token])
+                            elif closers and token == closers[-1]:
+                                closers.pop()
+                            parts.append(token)
+                            token = next_token()
+                        nets.append(intern(''.join(parts)))
+                token = next_token()
+            elif token == ',':
+                token = next_token()
+                continue
+            else:
+                # 按位置连接：当前词法单元为表达式开头
+                expr, token = self.read_expr((',', ')'), token)
+                pins.append(-1)
+                nets.append(intern(expr))
+            if token == ',':
+                token = next_token()
+
+
+def parse_netlist(verilog_file: str) -> StructuralNetlist:
+    """解析Verilog网表（不使用缓存）"""
+    return _NetlistParser(str(verilog_file)).parse()
+
+
+def _write_cache(cache_file: Path, netlist: StructuralNetlist):
+    """原子写出网表缓存"""
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=str(cache_file.parent), prefix=f".{cache_file.name}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(netlist, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_file)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+    except OSError as e:
+        print(f"警告：写入网表缓存失败: {e}")
+
+
+def read_netlist(
+    verilog_file: str,
+    cache_dir: Optional[str] = None,
+    use_cache: bool = True
+) -> StructuralNetlist:
+    """
+    读取结构化网表，优先使用按文件内容哈希命名的二进制缓存
+
+    Args:
+        verilog_file: Verilog网表路径
+        cache_dir: 缓存目录（默认为网表所在目录下的.netlist_cache）
+        use_cache: 是否读写磁盘缓存
+
+    Returns:
+        StructuralNetlist
+    """
+    path = os.path.abspath(str(verilog_file))
+    stat = os.stat(path)
+    memo_key = (path, stat.st_size, stat.st_mtime_ns)
+    netlist = _MEMO.get(memo_key)
+    if netlist is not None:
+        return netlist
+
+    cache_file = None
+    if use_cache:
+        cache_root = Path(cache_dir) if cache_dir else Path(path).parent / '.netlist_cache'
+        cache_file = cache_root / f"{file_digest(path)}.v{NETLIST_FORMAT_VERSION}.pkl"
+        if cache_file.exists():
+            try:
+                with open(cache_file, 'rb') as f:
+                    netlist = pickle.load(f)
+                netlist.source = path
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError,
+                    ImportError, ValueError, TypeError) as e:
+                print(f"警告：读取网表缓存失败，重新解析: {e}")
+                netlist = None
+
+    if netlist is None:
+        netlist = parse_netlist(path)
+        if cache_file is not None:
+            _write_cache(cache_file, netlist)
+
+    if len(_MEMO) >= _MEMO_SIZE:
+        _MEMO.pop(next(iter(_MEMO)))
+    _MEMO[memo_key] = netlist
+    return netlist
@@ -5,12 +5,56 @@ OpenRoad接口模块
 
 import os
 import json
+import bisect
+import hashlib
 import subprocess
 import tempfile
 import time
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
 from .def_parser import DEFParser
+from .netlist_reader import read_netlist
+
+
+class _ModuleNameIndex:
+    """
+    模块名子串索引
+    
+    所有模块名以换行符连接为一个字符串（Verilog模块名不含空白字符），
+    子串查找由str.find在C层完成，命中位置二分映射回模块名；构建为O(总长度)，
+    每个module_id只扫描一次，结果与逐个检查 `module_id in module_name` 相同
+    """
+    
+    def __init__(self, module_names: List[str]):
+        self.names = list(module_names)
+        self._text = '\n'.join(self.names)
+        self._starts = []  # 每个模块名在_text中的起始位置
+        start = 0
+        for name in self.names:
+            self._starts.append(start)
+            start += len(name) + 1
+        self._resolved: Dict[str, List[str]] = {}
+    
+    def resolve(self, module_id: str) -> List[str]:
+        """包含module_id的所有模块名（按模块定义顺序）"""
+        names = self._resolved.get(module_id)
+        if names is None:
+            if not module_id:
+                names = list(self.names)
+            elif '\n' in module_id:
+                names = [name for name in self.names if module_id in name]
+            else:
+                names = []
+                pos = self._text.find(module_id)
+                while pos >= 0:
+                    i = bisect.bisect_right(self._starts, pos) - 1
+                    names.append(self.names[i])
+                    # 同一模块名只记录一次，从下一个模块名继续查找
+                    if i + 1 == len(self._starts):
+                        break
+                    pos = self._text.find(module_id, self._starts[i + 1])
+            self._resolved[module_id] = names
+        return names
 
 
 class OpenRoadInterface:
@@ -33,6 +77,9 @@ class OpenRoadInterface:
         self.timeout = timeout if timeout and timeout > 0 else None
         self.use_api = use_api
         self.threads = threads  # OpenROAD线程数
+        # save_partition_netlists的设计级缓存：
+        # {design.v路径: {'netlist', 'modules', 'index', 'partitions', 'consistency'}}
+        self._partition_netlist_cache: Dict[str, Dict[str, Any]] = {}
     
     def convert_partition_to_def_constraints(
         self,
@@ -1409,45 +1456,68 @@ write_def {output_def_path}
             # 如果没有Verilog文件，返回空字典
             return {}
         
-        # 读取原始Verilog文件
-        with open(verilog_file, 'r') as f:
-            verilog_content = f.read()
-        
-        # 解析Verilog文件，提取模块定义
-        modules = self._parse_verilog_modules(verilog_content)
+        # 解析后的模块表与名称索引按设计缓存（网表文件变化时重新读取）
+        cache = self._design_module_cache(verilog_file)
+        modules = cache['modules']
+        index = cache['index']
         
         # 为每个partition生成netlist
         partition_netlists = {}
+        skipped = 0
         for partition_id, module_ids in partition_scheme.items():
-            # 提取属于该partition的模块
+            # 提取属于该partition的模块（支持部分匹配，因为module_id可能是模块名的前缀）
             partition_modules = {}
             for module_id in module_ids:
-                # 查找匹配的模块（支持部分匹配，因为module_id可能是模块名的前缀）
-                for module_name, module_def in modules.items():
-                    if module_id in module_name or module_name.startswith(module_id):
-                        partition_modules[module_name] = module_def
+                for module_name in index.resolve(module_id):
+                    partition_modules[module_name] = modules[module_name]
+            
+            # 模块集合未变化且上次生成的netlist仍存在时直接复用
+            module_set_hash = hashlib.blake2b(
+                '\n'.join(partition_modules).encode('utf-8'), digest_size=16
+            ).hexdigest()
+            partition_key = (str(output_dir), partition_id)
+            previous = cache['partitions'].get(partition_key)
+            if previous is not None and previous[0] == module_set_hash and os.path.exists(previous[1]):
+                partition_netlists[partition_id] = previous[1]
+                skipped += 1
+                continue
             
             # 生成partition的netlist文件（保存在与log、layout.def同一目录）
             netlist_file = output_dir / f"{partition_id}_{timestamp}.v"
             self._write_partition_netlist(
                 partition_modules=partition_modules,
                 partition_id=partition_id,
-                output_file=netlist_file,
-                original_verilog=verilog_content
+                output_file=netlist_file
             )
             
             partition_netlists[partition_id] = str(netlist_file)
+            cache['partitions'][partition_key] = (module_set_hash, str(netlist_file))
+        
+        if skipped:
+            print(f"  partition netlist未变化，复用 {skipped}/{len(partition_scheme)} 个")
         
         # 保存partition方案JSON（用于回溯，与log、layout.def同一目录）
         partition_scheme_file = output_dir / f"partition_scheme_{timestamp}.json"
         
         # 验证一致性：确保partition netlist与floorplan_with_partition.def中的分区信息一致
-        consistency_report = self._verify_partition_consistency(
-            partition_scheme=partition_scheme,
-            design_dir=design_dir,
-            partition_netlists=partition_netlists,
-            modules=modules
-        )
+        # （分区方案和DEF均未变化时复用上次的报告）
+        def_with_partition = design_path / "floorplan_with_partition.def"
+        try:
+            def_stat = os.stat(def_with_partition)
+            def_key = (def_stat.st_size, def_stat.st_mtime_ns)
+        except OSError:
+            def_key = None
+        consistency_key = (json.dumps(partition_scheme, sort_keys=True), def_key)
+        if cache['consistency'] is not None and cache['consistency'][0] == consistency_key:
+            consistency_report = cache['consistency'][1]
+        else:
+            consistency_report = self._verify_partition_consistency(
+                partition_scheme=partition_scheme,
+                design_dir=design_dir,
+                partition_netlists=partition_netlists,
+                modules=modules
+            )
+            cache['consistency'] = (consistency_key, consistency_report)
         
         with open(partition_scheme_file, 'w') as f:
             json.dump({
@@ -1459,65 +1529,44 @@ write_def {output_def_path}
         
         return partition_netlists
     
-    def _parse_verilog_modules(self, verilog_content: str) -> Dict[str, str]:
+    def _design_module_cache(self, verilog_file: Path) -> Dict[str, Any]:
+        """
+        获取设计的模块表缓存（模块文本、名称索引、各分区上次生成的netlist）
+        
+        网表读取器返回的对象变化（design.v被修改）时重建
+        """
+        key = os.path.abspath(str(verilog_file))
+        netlist = read_netlist(key)
+        cache = self._partition_netlist_cache.get(key)
+        if cache is None or cache['netlist'] is not netlist:
+            modules = self._parse_verilog_modules(key)
+            cache = {
+                'netlist': netlist,
+                'modules': modules,
+                'index': _ModuleNameIndex(list(modules)),
+                'partitions': {},  # {(输出目录, partition_id): (模块集合哈希, netlist路径)}
+                'consistency': None,  # (方案与DEF指纹, 一致性报告)
+            }
+            self._partition_netlist_cache[key] = cache
+        return cache
+    
+    def _parse_verilog_modules(self, verilog_file: str) -> Dict[str, str]:
         """
-        解析Verilog文件，提取模块定义
+        解析Verilog文件，提取模块定义（经共享的结构化网表读取器，带缓存）
         
         Args:
-            verilog_content: Verilog文件内容
+            verilog_file: Verilog文件路径
         
         Returns:
             字典：{module_name: module_definition}
         """
-        modules = {}
-        lines = verilog_content.split('\n')
-        
-        i = 0
-        while i < len(lines):
-            line = lines[i].strip()
-            
-            # 查找module定义
-            if line.startswith('module '):
-                # 提取模块名
-                parts = line.split()
-                if len(parts) >= 2:
-                    module_name = parts[1].split('(')[0].strip()  # 移除参数列表
-                    
-                    # 提取整个模块定义（从module到endmodule）
-                    module_start = i
-                    module_end = i
-                    brace_count = 0
-                    in_module = False
-                    
-                    for j in range(i, len(lines)):
-                        line_j = lines[j]
-                        if 'module ' in line_j and not in_module:
-                            in_module = True
-                            # 计算开括号数
-                            brace_count += line_j.count('(') - line_j.count(')')
-                        elif in_module:
-                            brace_count += line_j.count('(') - line_j.count(')')
-                            if 'endmodule' in line_j and brace_count == 0:
-                                module_end = j
-                                break
-                    
-                    # 提取模块内容
-                    if module_end > module_start:
-                        module_def = '\n'.join(lines[module_start:module_end+1])
-                        modules[module_name] = module_def
-                        i = module_end + 1
-                        continue
-            
-            i += 1
-        
-        return modules
+        return read_netlist(verilog_file).module_texts()
     
     def _write_partition_netlist(
         self,
         partition_modules: Dict[str, str],
         partition_id: str,
-        output_file: Path,
-        original_verilog: str
+        output_file: Path
     ):
         """
         写入partition的netlist文件
@@ -1526,7 +1575,6 @@ write_def {output_def_path}
             partition_modules: 该partition包含的模块定义 {module_name: module_definition}
             partition_id: 分区ID
             output_file: 输出文件路径
-            original_verilog: 原始Verilog文件内容（用于提取依赖）
         """
         with open(output_file, 'w') as f:
             # 写入文件头
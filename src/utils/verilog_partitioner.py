@@ -13,24 +13,75 @@ Verilog Partitioner - 基于K-SpecPart结果生成分区网表
 日期：2025-11-15
 """
 
+import os
 import re
 import json
+import multiprocessing
+import concurrent.futures
+from array import array
+from collections import Counter
 from pathlib import Path
-from typing import Dict, List, Tuple, Set, Optional
-from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Tuple, Set, Optional
 import logging
 
+from .netlist_reader import read_netlist
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 简单net连接：net 或 net[i]
+_SIMPLE_NET_RE = re.compile(r'\w+(?:\[\d+\])?$')
+
+# 网表写出缓冲区大小
+_WRITE_BUFFER = 1 << 20
+
+# 自动并行写出分区网表的最小instance数
+_PARALLEL_EMIT_MIN_INSTANCES = 200000
+
+# 并行写出时由fork的工作进程继承的分区器
+_EMIT_PARTITIONER: Optional['VerilogPartitioner'] = None
+
+
+class SymbolTable:
+    """名称驻留表：设计内所有net、instance、引脚和单元类型名称 <-> 整数ID"""
+    
+    __slots__ = ('names', '_ids')
+    
+    def __init__(self, names: Iterable[str] = ()):
+        self.names: List[str] = list(names)
+        self._ids: Optional[Dict[str, int]] = None  # 名称 -> ID（首次intern时构建）
+    
+    def intern(self, name: str) -> int:
+        """名称对应的ID（不存在时新增）"""
+        if self._ids is None:
+            self._ids = {symbol_name: symbol_id for symbol_id, symbol_name in enumerate(self.names)}
+        symbol_id = self._ids.get(name)
+        if symbol_id is None:
+            symbol_id = len(self.names)
+            self._ids[name] = symbol_id
+            self.names.append(name)
+        return symbol_id
+    
+    def __getitem__(self, symbol_id: int) -> str:
+        return self.names[symbol_id]
+    
+    def __len__(self) -> int:
+        return len(self.names)
+
 
-@dataclass
 class Port:
     """端口信息"""
-    name: str
-    direction: str  # 'input' or 'output' or 'inout'
-    width: int = 1  # 位宽
-    is_vector: bool = False  # 是否是向量
+    
+    __slots__ = ('name', 'direction', 'width', 'is_vector')
+    
+    def __init__(self, name: str, direction: str, width: int = 1, is_vector: bool = False):
+        self.name = name
+        self.direction = direction  # 'input' or 'output' or 'inout'
+        self.width = width  # 位宽
+        self.is_vector = is_vector  # 是否是向量
+    
+    def __repr__(self) -> str:
+        return f"Port({self.name!r}, {self.direction!r}, {self.width}, {self.is_vector})"
     
     def to_verilog(self) -> str:
         """转换为Verilog声明"""
@@ -40,25 +91,96 @@ class Port:
             return f"{self.direction} {self.name}"
 
 
-@dataclass
 class Net:
-    """网络信息"""
-    name: str
-    width: int = 1
-    is_vector: bool = False
-    connected_instances: List[str] = None  # 连接的instance名称列表
-    
-    def __post_init__(self):
-        if self.connected_instances is None:
-            self.connected_instances = []
+    """网络信息（连接的instance以符号表ID数组存储）"""
+    
+    __slots__ = ('name', 'width', 'is_vector', 'instance_ids', 'symbols')
+    
+    def __init__(self, name: str, symbols: SymbolTable, width: int = 1, is_vector: bool = False):
+        self.name = name
+        self.width = width
+        self.is_vector = is_vector
+        self.instance_ids = array('i')  # 连接的instance名称ID（按连接顺序，不重复）
+        self.symbols = symbols
+    
+    def __repr__(self) -> str:
+        return f"Net({self.name!r}, width={self.width}, instances={len(self.instance_ids)})"
+    
+    @property
+    def connected_instances(self) -> List[str]:
+        """连接的instance名称列表"""
+        names = self.symbols.names
+        return [names[inst_id] for inst_id in self.instance_ids]
 
 
-@dataclass
 class Instance:
-    """实例信息"""
-    name: str
-    module_type: str
-    connections: Dict[str, str]  # {pin_name: net_name}
+    """实例信息（单元类型与连接以符号表ID存于一个数组：[type, pin, net, pin, net, ...]）"""
+    
+    __slots__ = ('name', 'ids', 'symbols')
+    
+    def __init__(self, name: str, ids: array, symbols: SymbolTable):
+        self.name = name
+        self.ids = ids
+        self.symbols = symbols
+    
+    def __repr__(self) -> str:
+        return f"Instance({self.name!r}, {self.module_type!r}, pins={len(self.ids) // 2})"
+    
+    @property
+    def type_id(self) -> int:
+        return self.ids[0]
+    
+    @property
+    def module_type(self) -> str:
+        return self.symbols.names[self.ids[0]]
+    
+    @property
+    def connections(self) -> Dict[str, str]:
+        """{pin_name: net_name}"""
+        return dict(self.iter_connections())
+    
+    def iter_connections(self) -> Iterator[Tuple[str, str]]:
+        """按源文件顺序产生(引脚名, net名)"""
+        names = self.symbols.names
+        ids = self.ids
+        for i in range(1, len(ids), 2):
+            yield names[ids[i]], names[ids[i + 1]]
+
+
+class _NetlistWriter:
+    """流式网表写出：逐行写入缓冲文件，结果与"\n".join(lines)一致"""
+    
+    def __init__(self, output_file: Path):
+        self._file = open(output_file, 'w', buffering=_WRITE_BUFFER)
+        self._first = True
+    
+    def line(self, text: str):
+        """写出一行"""
+        if self._first:
+            self._first = False
+        else:
+            self._file.write("\n")
+        self._file.write(text)
+    
+    def join(self, items: Iterable[str], separator: str = ",\n"):
+        """写出一行 separator.join(items)"""
+        iterator = iter(items)
+        self.line(next(iterator, ""))
+        for item in iterator:
+            self._file.write(separator)
+            self._file.write(item)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self._file.close()
+
+
+def _emit_partition_worker(partition_id: int, output_file: str) -> str:
+    """进程池任务：写出单个分区网表（分区器由fork继承）"""
+    _EMIT_PARTITIONER._generate_partition_netlist(partition_id, Path(output_file))
+    return output_file
 
 
 class VerilogPartitioner:
@@ -68,7 +190,13 @@ class VerilogPartitioner:
     基于K-SpecPart的逻辑分区决策，生成实际的分区网表
     """
     
-    def __init__(self, design_v: Path, part_file: Path, mapping_file: Path):
+    def __init__(
+        self,
+        design_v: Path,
+        part_file: Path,
+        mapping_file: Path,
+        emit_workers: Optional[int] = None
+    ):
         """
         初始化
         
@@ -76,23 +204,42 @@ class VerilogPartitioner:
             design_v: 原始flatten门级网表路径
             part_file: K-SpecPart输出的.part.K文件
             mapping_file: component名称到vertex ID的映射文件
+            emit_workers: 并行写出分区网表的进程数（None为自动：instance数达到
+                _PARALLEL_EMIT_MIN_INSTANCES时使用min(分区数, CPU核数)，1为串行）
         """
         self.design_v = Path(design_v)
         self.part_file = Path(part_file)
         self.mapping_file = Path(mapping_file)
         
-        # 解析结果
+        # 解析结果（名称经符号表驻留，instance与net以ID引用）
+        self.symbols = SymbolTable()
         self.top_module_name = None
         self.top_ports = []  # List[Port]
         self.instances = {}  # {instance_name: Instance}
         self.nets = {}  # {net_name: Net}
         self.partition_scheme = {}  # {instance_name: partition_id}
         self.num_partitions = 0
+        self.emit_workers = emit_workers
         
         # 分区分析结果
         self.internal_nets = {}  # {partition_id: [net_names]}
         self.boundary_nets = {}  # {net_name: {'partitions': [ids], 'type': 'inter'}}
         
+        # 按分区分桶的索引（_build_partition_index一次构建）
+        self._partition_instances = None  # {partition_id: [instance_names]}
+        self._partition_boundary_nets = None  # {partition_id: [boundary_net_names]}
+        self._port_partitions = None  # {port_name: {partition_ids}}
+        self._boundary_signals = None  # {boundary_net_name: 分区内信号名}
+        self._connection_signals = None  # {连接net符号ID: 分区内信号名}
+        self._top_output_ports = None  # 顶层输出端口名集合
+        
+        # 增量更新状态（apply_migration首次使用时按需构建）
+        self._partition_sizes = Counter()  # {partition_id: instance数}
+        self._net_partition_counts = {}  # {net_name: Counter({partition_id: 连接的instance数})}
+        self._net_order = None  # {net_name: 在self.nets中的序号}
+        self._instance_order = None  # {instance_name: 在self.instances中的序号}
+        self._boundary_json_fragments = None  # {net_name: (条目, 已编码JSON片段)}
+        
         logger.info(f"初始化VerilogPartitioner")
         logger.info(f"  设计网表: {self.design_v}")
         logger.info(f"  分区文件: {self.part_file}")
@@ -111,6 +258,7 @@ class VerilogPartitioner:
             - top_file: Path
             - boundary_nets: Dict
             - stats: Dict
+            - dirty_partitions: 本次重新生成的分区ID列表（全部分区）
         """
         output_dir = Path(output_dir)
         output_dir.mkdir(parents=True, exist_ok=True)
@@ -128,8 +276,11 @@ class VerilogPartitioner:
         logger.info("\nStep 2: 解析K-SpecPart分区结果...")
         self._parse_kspecpart_result()
         logger.info(f"  ✅ 分区方案加载完成：{self.num_partitions} 个分区")
+        self._partition_sizes = Counter(self.partition_scheme.values())
+        self._net_partition_counts = {}
+        self._boundary_json_fragments = None
         for pid in range(self.num_partitions):
-            count = sum(1 for p in self.partition_scheme.values() if p == pid)
+            count = self._partition_sizes[pid]
             pct = count / len(self.partition_scheme) * 100
             logger.info(f"     Partition {pid}: {count} instances ({pct:.1f}%)")
         
@@ -140,13 +291,11 @@ class VerilogPartitioner:
         logger.info(f"  ✅ Boundary nets: {len(self.boundary_nets)}")
         logger.info(f"  ✅ Internal nets: {total_internal}")
         
-        # Step 4: 生成partition子网表
+        # Step 4: 生成partition子网表（一次分桶后写出所有分区）
         logger.info("\nStep 4: 生成partition子网表...")
-        partition_files = {}
+        self._build_partition_index()
+        partition_files = self._generate_partition_netlists(output_dir)
         for pid in range(self.num_partitions):
-            partition_file = output_dir / f"partition_{pid}.v"
-            self._generate_partition_netlist(pid, partition_file)
-            partition_files[pid] = partition_file
             logger.info(f"  ✅ partition_{pid}.v 生成完成")
         
         # Step 5: 生成顶层网表
@@ -162,17 +311,7 @@ class VerilogPartitioner:
         logger.info(f"  ✅ boundary_nets.json 保存完成")
         
         # 统计信息
-        stats = {
-            'num_partitions': self.num_partitions,
-            'num_instances': len(self.instances),
-            'num_nets': len(self.nets),
-            'num_boundary_nets': len(self.boundary_nets),
-            'num_internal_nets': total_internal,
-            'partition_sizes': {
-                pid: sum(1 for p in self.partition_scheme.values() if p == pid)
-                for pid in range(self.num_partitions)
-            }
-        }
+        stats = self._partition_stats()
         
         logger.info("\n" + "=" * 60)
         logger.info("Verilog分区处理完成！")
@@ -189,39 +328,226 @@ class VerilogPartitioner:
             'top_file': top_file,
             'boundary_nets': self.boundary_nets,
             'boundary_file': boundary_file,
-            'stats': stats
+            'stats': stats,
+            'dirty_partitions': list(range(self.num_partitions))
+        }
+    
+    def apply_migration(self, migration: Dict[str, int], output_dir: Path) -> Dict:
+        """
+        增量更新：在partition()的结果上应用一轮instance迁移
+        
+        只重新判定被迁移instance所连net的boundary/internal状态，
+        只重写受影响的分区网表，并重写顶层网表和boundary_nets.json。
+        结果与用迁移后的分区方案完整执行partition()一致。
+        
+        分区p受影响（dirty）当且仅当：p是某个被迁移instance的源或目标分区，
+        或p连接到某个boundary/internal状态发生变化的net。
+        
+        Args:
+            migration: {instance_name: 目标partition_id}
+            output_dir: 输出目录（与partition()相同）
+            
+        Returns:
+            与partition()相同格式的结果字典，dirty_partitions为重写的分区ID列表
+        """
+        if self._partition_instances is None:
+            raise RuntimeError("apply_migration需要先执行partition()")
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        
+        if self._boundary_json_fragments is None:
+            self._boundary_json_fragments = {}
+        
+        # 1. 过滤实际发生变化的迁移
+        moves = {}
+        for inst_name, target in migration.items():
+            if inst_name not in self.partition_scheme:
+                raise KeyError(f"未知instance: {inst_name}")
+            if not 0 <= target < self.num_partitions:
+                raise ValueError(f"目标分区 {target} 超出范围 [0, {self.num_partitions})")
+            if self.partition_scheme[inst_name] != target:
+                moves[inst_name] = target
+        
+        logger.info(f"增量更新：迁移 {len(moves)} 个instance")
+        
+        # 2. 收集受影响的net，记录迁移前的分区计数与状态
+        names = self.symbols.names
+        affected_nets = {}  # {net_name: 迁移前连接的分区集合}
+        instance_nets = {}  # {instance_name: [net_name]}
+        for inst_name in moves:
+            ids = self.instances[inst_name].ids
+            inst_nets = instance_nets[inst_name] = []
+            for i in range(2, len(ids), 2):
+                net_name = names[ids[i]].split('[')[0]
+                if net_name in inst_nets:
+                    continue
+                inst_nets.append(net_name)
+                if net_name not in affected_nets:
+                    counts = self._net_partitions(net_name)
+                    affected_nets[net_name] = {pid for pid, count in counts.items() if count}
+        was_boundary = {net_name: net_name in self.boundary_nets for net_name in affected_nets}
+        
+        # 3. 应用迁移
+        dirty = set()
+        for inst_name, target in moves.items():
+            source = self.partition_scheme[inst_name]
+            self.partition_scheme[inst_name] = target
+            self._partition_sizes[source] -= 1
+            self._partition_sizes[target] += 1
+            for net_name in instance_nets[inst_name]:
+                counts = self._net_partition_counts[net_name]
+                counts[source] -= 1
+                counts[target] += 1
+            dirty.update((source, target))
+            
+            # 分区内instance保持网表中的顺序
+            self._partition_instances[source].remove(inst_name)
+            target_instances = self._partition_instances[target]
+            target_instances.append(inst_name)
+            target_instances.sort(key=self._instance_position)
+        
+        # 4. 重新判定受影响net的状态
+        flipped = False
+        changed_internal = set()  # internal net列表发生变化的分区
+        changed_boundary = set()  # boundary net列表发生变化的分区
+        for net_name, old_partitions in affected_nets.items():
+            new_partitions = {pid for pid, count in self._net_partition_counts[net_name].items() if count}
+            boundary_entry, internal_pid = self._classify_net(net_name, new_partitions)
+            is_boundary = boundary_entry is not None
+            
+            if was_boundary[net_name]:
+                old_boundary_partitions, old_internal = old_partitions, None
+            else:
+                old_boundary_partitions = set()
+                old_internal = next(iter(old_partitions)) if old_partitions else None
+            new_boundary_partitions = new_partitions if is_boundary else set()
+            
+            if was_boundary[net_name] != is_boundary:
+                # 状态翻转：连接到该net的分区中的信号名和声明都会变化
+                flipped = True
+                dirty |= old_partitions | new_partitions
+            
+            # 4.1 boundary nets
+            if is_boundary:
+                self.boundary_nets[net_name] = boundary_entry
+                self._boundary_signals[net_name] = (
+                    net_name if net_name in self._top_output_ports else f"bnet_{net_name}"
+                )
+            elif was_boundary[net_name]:
+                del self.boundary_nets[net_name]
+                del self._boundary_signals[net_name]
+                self._boundary_json_fragments.pop(net_name, None)
+            for pid in old_boundary_partitions - new_boundary_partitions:
+                self._partition_boundary_nets[pid].remove(net_name)
+            for pid in new_boundary_partitions - old_boundary_partitions:
+                self._partition_boundary_nets[pid].append(net_name)
+                changed_boundary.add(pid)
+            
+            # 4.2 internal nets
+            if old_internal != internal_pid:
+                if old_internal is not None:
+                    self.internal_nets[old_internal].remove(net_name)
+                if internal_pid is not None:
+                    self.internal_nets[internal_pid].append(net_name)
+                    changed_internal.add(internal_pid)
+            
+            if net_name in self._port_partitions:
+                self._port_partitions[net_name] = new_partitions
+        
+        # 5. 新增的条目按net在网表中的顺序归位（与完整生成的顺序一致）
+        if flipped:
+            self.boundary_nets = {
+                net_name: self.boundary_nets[net_name]
+                for net_name in sorted(self.boundary_nets, key=self._net_position)
+            }
+            # 翻转net的连接信号名缓存失效
+            self._connection_signals = {}
+        for pid in changed_internal:
+            self.internal_nets[pid].sort(key=self._net_position)
+        for pid in changed_boundary:
+            self._partition_boundary_nets[pid].sort(key=self._net_position)
+        
+        # 6. 只重写受影响的分区网表，以及顶层网表和boundary nets信息
+        dirty_partitions = sorted(dirty)
+        partition_files = self._generate_partition_netlists(output_dir, dirty_partitions)
+        for pid in dirty_partitions:
+            logger.info(f"  ✅ partition_{pid}.v 重新生成")
+        top_file = output_dir / "top.v"
+        self._generate_top_netlist(top_file)
+        boundary_file = output_dir / "boundary_nets.json"
+        self._save_boundary_nets(boundary_file)
+        logger.info(f"  ✅ 受影响分区: {dirty_partitions}")
+        
+        return {
+            'partition_files': {
+                pid: output_dir / f"partition_{pid}.v" for pid in range(self.num_partitions)
+            },
+            'top_file': top_file,
+            'boundary_nets': self.boundary_nets,
+            'boundary_file': boundary_file,
+            'stats': self._partition_stats(),
+            'dirty_partitions': dirty_partitions
+        }
+    
+    def _partition_stats(self) -> Dict:
+        """分区统计信息"""
+        return {
+            'num_partitions': self.num_partitions,
+            'num_instances': len(self.instances),
+            'num_nets': len(self.nets),
+            'num_boundary_nets': len(self.boundary_nets),
+            'num_internal_nets': sum(len(nets) for nets in self.internal_nets.values()),
+            'partition_sizes': {
+                pid: self._partition_sizes[pid]
+                for pid in range(self.num_partitions)
+            }
         }
     
+    def _net_partitions(self, net_name: str) -> Counter:
+        """net在各分区中连接的instance数（首次访问时由当前分区方案计算并缓存）"""
+        counts = self._net_partition_counts.get(net_name)
+        if counts is None:
+            names = self.symbols.names
+            counts = Counter()
+            for inst_id in self.nets[net_name].instance_ids:
+                pid = self.partition_scheme.get(names[inst_id])
+                if pid is not None:
+                    counts[pid] += 1
+            self._net_partition_counts[net_name] = counts
+        return counts
+    
+    def _net_position(self, net_name: str) -> int:
+        if self._net_order is None:
+            self._net_order = {name: index for index, name in enumerate(self.nets)}
+        return self._net_order[net_name]
+    
+    def _instance_position(self, inst_name: str) -> int:
+        if self._instance_order is None:
+            self._instance_order = {name: index for index, name in enumerate(self.instances)}
+        return self._instance_order[inst_name]
+    
     def _parse_design_netlist(self):
-        """解析原始门级网表"""
-        with open(self.design_v, 'r') as f:
-            content = f.read()
-        
-        # 1. 解析module定义
-        module_pattern = re.compile(
-            r'module\s+(\w+)\s*\((.*?)\);',
-            re.DOTALL
-        )
-        module_match = module_pattern.search(content)
-        if not module_match:
+        """解析原始门级网表（顶层模块，经共享的结构化网表读取器）"""
+        netlist = read_netlist(self.design_v)
+        top = netlist.module()
+        if top is None:
             raise ValueError("无法找到module定义")
         
-        self.top_module_name = module_match.group(1)
+        # 名称沿用读取器的符号表（复制后供本设计追加新名称）
+        symbols = self.symbols = SymbolTable(netlist.symbols)
+        names = symbols.names
+        self.top_ports = []
+        self.instances = {}
+        self.nets = {}
+        
+        # 1. 顶层模块
+        self.top_module_name = top.name
         logger.info(f"  顶层模块: {self.top_module_name}")
         
-        # 2. 解析端口声明
-        port_pattern = re.compile(
-            r'(input|output|inout)\s+(?:wire\s+)?(?:\[(\d+):(\d+)\]\s+)?(\w+)\s*[;,]',
-            re.MULTILINE
-        )
-        for match in port_pattern.finditer(content):
-            direction = match.group(1)
-            msb = match.group(2)
-            lsb = match.group(3)
-            port_name = match.group(4)
-            
-            if msb and lsb:
-                width = int(msb) - int(lsb) + 1
+        # 2. 端口声明
+        for port_name, direction, msb, lsb in top.ports:
+            if msb is not None and lsb is not None:
+                width = msb - lsb + 1
                 is_vector = True
             else:
                 width = 1
@@ -234,71 +560,61 @@ class VerilogPartitioner:
             # 这样在解析instance连接时，可以正确记录连接关系
             if direction in ['output', 'inout']:
                 if port_name not in self.nets:
-                    self.nets[port_name] = Net(port_name, width, is_vector)
+                    self.nets[port_name] = Net(port_name, symbols, width, is_vector)
         
         logger.info(f"  顶层端口: {len(self.top_ports)}")
         
-        # 3. 解析wire声明
-        wire_pattern = re.compile(
-            r'wire\s+(?:\[(\d+):(\d+)\]\s+)?(\w+)\s*;',
-            re.MULTILINE
-        )
-        for match in wire_pattern.finditer(content):
-            msb = match.group(1)
-            lsb = match.group(2)
-            net_name = match.group(3)
-            
-            if msb and lsb:
-                width = int(msb) - int(lsb) + 1
+        # 3. wire声明
+        for net_name, msb, lsb in top.wires:
+            if msb is not None and lsb is not None:
+                width = msb - lsb + 1
                 is_vector = True
             else:
                 width = 1
                 is_vector = False
             
-            self.nets[net_name] = Net(net_name, width, is_vector)
-        
-        # 4. 解析instance实例化
-        # 匹配模式：module_type instance_name ( .pin(net), .pin(net), ... );
-        instance_pattern = re.compile(
-            r'(\w+)\s+(\w+)\s*\((.*?)\)\s*;',
-            re.DOTALL
-        )
-        
-        # 从module定义之后开始解析
-        module_end = module_match.end()
-        instances_section = content[module_end:]
-        
-        for match in instance_pattern.finditer(instances_section):
-            module_type = match.group(1)
-            instance_name = match.group(2)
-            connections_str = match.group(3)
-            
-            # 跳过module, endmodule等关键字
-            if module_type in ['module', 'endmodule', 'input', 'output', 'inout', 'wire']:
-                continue
-            
-            # 解析连接 .pin(net)
-            connections = {}
-            conn_pattern = re.compile(r'\.(\w+)\s*\(\s*(\w+(?:\[\d+\])?)\s*\)')
-            for conn_match in conn_pattern.finditer(connections_str):
-                pin_name = conn_match.group(1)
-                net_name = conn_match.group(2)
-                connections[pin_name] = net_name
+            self.nets[net_name] = Net(net_name, symbols, width, is_vector)
+        
+        # 4. instance实例化（只保留 .pin(net) / .pin(net[i]) 形式的连接）
+        offsets, conn_pins, conn_nets = top.conn_offsets, top.conn_pins, top.conn_nets
+        inst_types = top.inst_types
+        expr_nets = {}  # 连接表达式ID -> Net（非简单net连接为None）
+        for index, inst_id in enumerate(top.inst_names):
+            connections = {}  # {pin_id: net_id}
+            connected_nets = set()  # 本instance已记录连接的net（避免在高扇出net的列表中查找）
+            for i in range(offsets[index], offsets[index + 1]):
+                pin_id = conn_pins[i]
+                net_id = conn_nets[i]
+                if pin_id < 0 or net_id < 0:
+                    continue
+                if net_id in expr_nets:
+                    net = expr_nets[net_id]
+                else:
+                    net_name = names[net_id]
+                    net = None
+                    if _SIMPLE_NET_RE.match(net_name):
+                        # 处理向量索引，如 net[0] → net
+                        base_net_name = net_name.split('[')[0]
+                        net = self.nets.get(base_net_name)
+                        if net is None:
+                            # 可能是端口或未声明的wire
+                            net = self.nets[base_net_name] = Net(base_net_name, symbols)
+                    expr_nets[net_id] = net
+                if net is None:
+                    continue
+                connections[pin_id] = net_id
                 
                 # 记录net的连接关系
-                # 处理向量索引，如 net[0] → net
-                base_net_name = net_name.split('[')[0]
-                if base_net_name not in self.nets:
-                    # 可能是端口或未声明的wire
-                    self.nets[base_net_name] = Net(base_net_name)
-                
-                if instance_name not in self.nets[base_net_name].connected_instances:
-                    self.nets[base_net_name].connected_instances.append(instance_name)
+                if net not in connected_nets:
+                    connected_nets.add(net)
+                    net.instance_ids.append(inst_id)
             
             if connections:  # 只添加有连接的instance
-                self.instances[instance_name] = Instance(
-                    instance_name, module_type, connections
-                )
+                instance_name = names[inst_id]
+                ids = [inst_types[index]]
+                for pin_id, net_id in connections.items():
+                    ids += (pin_id, net_id)
+                self.instances[instance_name] = Instance(instance_name, array('i', ids), symbols)
         
         logger.info(f"  解析instances: {len(self.instances)}")
         logger.info(f"  解析nets: {len(self.nets)}")
@@ -343,227 +659,270 @@ class VerilogPartitioner:
         
         # 获取顶层输出端口名称集合
         top_output_ports = {port.name for port in self.top_ports if port.direction == 'output'}
+        self._top_output_ports = top_output_ports
         
         # 分析每个net
+        names = self.symbols.names
         for net_name, net in self.nets.items():
             # 找出该net连接的所有partitions
             connected_partitions = set()
-            for inst_name in net.connected_instances:
-                if inst_name in self.partition_scheme:
-                    connected_partitions.add(self.partition_scheme[inst_name])
+            for inst_id in net.instance_ids:
+                pid = self.partition_scheme.get(names[inst_id])
+                if pid is not None:
+                    connected_partitions.add(pid)
             
-            # 特殊处理：顶层输出端口
-            is_top_output = net_name in top_output_ports
+            if len(connected_partitions) == 0 and net_name in top_output_ports:
+                # 在解析时，如果instance的输出直接连接到顶层输出端口，这个连接应该已经被记录
+                # 但如果这里没有connected_partitions，可能是解析问题
+                # 为了安全，我们跳过它（但应该修复解析逻辑）
+                logger.warning(f"  顶层输出端口 {net_name} 没有连接到任何partition的instance，可能存在问题")
             
-            if len(connected_partitions) == 0:
-                # 如果这是顶层输出端口，且连接到某个partition的instance，应该被识别为boundary net
-                if is_top_output:
-                    # 检查是否有instance连接到这个输出端口
-                    # 在解析时，如果instance的输出直接连接到顶层输出端口，这个连接应该已经被记录
-                    # 但如果这里没有connected_partitions，可能是解析问题
-                    # 为了安全，我们跳过它（但应该修复解析逻辑）
-                    logger.warning(f"  顶层输出端口 {net_name} 没有连接到任何partition的instance，可能存在问题")
-                continue
-            elif len(connected_partitions) == 1:
-                # Internal net，但如果它是顶层输出端口，应该是boundary net
-                if is_top_output:
-                    # 顶层输出端口即使只连接到一个partition，也应该是boundary net
-                    # 因为它需要从partition传递到顶层
-                    pid = connected_partitions.pop()
-                    self.boundary_nets[net_name] = {
-                        'partitions': [pid],
-                        'type': 'top_output',
-                        'connected_instances': net.connected_instances
-                    }
-                else:
-                    # 普通internal net
-                    pid = connected_partitions.pop()
-                    self.internal_nets[pid].append(net_name)
-            else:
-                # Boundary net（跨多个partitions或顶层输出）
-                self.boundary_nets[net_name] = {
-                    'partitions': sorted(list(connected_partitions)),
-                    'type': 'top_output' if is_top_output else 'inter_partition',
-                    'connected_instances': net.connected_instances
-                }
+            boundary_entry, internal_pid = self._classify_net(net_name, connected_partitions)
+            if boundary_entry is not None:
+                self.boundary_nets[net_name] = boundary_entry
+            elif internal_pid is not None:
+                self.internal_nets[internal_pid].append(net_name)
     
-    def _generate_partition_netlist(self, partition_id: int, output_file: Path):
-        """生成partition子网表"""
-        lines = []
+    def _classify_net(
+        self,
+        net_name: str,
+        connected_partitions: Set[int]
+    ) -> Tuple[Optional[Dict], Optional[int]]:
+        """
+        按连接的分区判定net状态
         
-        # 1. Module声明
-        module_name = f"partition_{partition_id}"
-        lines.append(f"module {module_name} (")
+        Returns:
+            (boundary net条目或None, internal net所属分区或None)
+        """
+        # 特殊处理：顶层输出端口
+        is_top_output = net_name in self._top_output_ports
+        
+        if len(connected_partitions) == 0:
+            return None, None
+        elif len(connected_partitions) == 1:
+            pid = next(iter(connected_partitions))
+            # Internal net，但如果它是顶层输出端口，应该是boundary net
+            # 顶层输出端口即使只连接到一个partition，也应该是boundary net
+            # 因为它需要从partition传递到顶层
+            if is_top_output:
+                return {
+                    'partitions': [pid],
+                    'type': 'top_output',
+                    'connected_instances': self.nets[net_name].connected_instances
+                }, None
+            # 普通internal net
+            return None, pid
+        else:
+            # Boundary net（跨多个partitions或顶层输出）
+            return {
+                'partitions': sorted(connected_partitions),
+                'type': 'top_output' if is_top_output else 'inter_partition',
+                'connected_instances': self.nets[net_name].connected_instances
+            }, None
+    
+    def _build_partition_index(self):
+        """单遍按分区分桶instance与boundary net，并预计算端口连接的分区和boundary信号名"""
+        self._top_output_ports = {port.name for port in self.top_ports if port.direction == 'output'}
         
-        # 2. 端口列表
-        ports = []
+        self._partition_instances = {pid: [] for pid in range(self.num_partitions)}
+        for inst_name, pid in self.partition_scheme.items():
+            self._partition_instances.setdefault(pid, []).append(inst_name)
         
-        # 2.1 顶层IO端口（如果该partition连接到顶层IO，且不是boundary net）
-        # 注意：如果顶层输出端口是boundary net，它会在2.2中作为boundary net端口添加
-        top_output_ports = {port.name for port in self.top_ports if port.direction == 'output'}
+        self._partition_boundary_nets = {pid: [] for pid in range(self.num_partitions)}
+        self._boundary_signals = {}
+        for net_name, bnet_info in self.boundary_nets.items():
+            for pid in bnet_info['partitions']:
+                self._partition_boundary_nets.setdefault(pid, []).append(net_name)
+            # 顶层输出端口直接使用端口名，其余boundary net使用bnet_前缀
+            if net_name in self._top_output_ports:
+                self._boundary_signals[net_name] = net_name
+            else:
+                self._boundary_signals[net_name] = f"bnet_{net_name}"
+        
+        self._connection_signals = {}
+        
+        names = self.symbols.names
+        self._port_partitions = {}
         for port in self.top_ports:
-            # 检查该端口是否连接到这个partition的instance
-            port_net_name = port.name
-            # 如果这是顶层输出端口且是boundary net，跳过（会在2.2中处理）
-            if port_net_name in top_output_ports and port_net_name in self.boundary_nets:
-                continue
-                
-            if port_net_name in self.nets:
-                net = self.nets[port_net_name]
-                has_connection = any(
-                    inst in self.partition_scheme and 
-                    self.partition_scheme[inst] == partition_id
-                    for inst in net.connected_instances
-                )
-                if has_connection:
-                    ports.append(f"    {port.to_verilog()}")
+            if port.name in self.nets and port.name not in self._port_partitions:
+                self._port_partitions[port.name] = {
+                    self.partition_scheme[names[inst_id]]
+                    for inst_id in self.nets[port.name].instance_ids
+                    if names[inst_id] in self.partition_scheme
+                }
+    
+    def _generate_partition_netlists(
+        self,
+        output_dir: Path,
+        partition_ids: Optional[List[int]] = None
+    ) -> Dict[int, Path]:
+        """写出分区网表（默认全部分区），instance数较多时在进程池中并行写出"""
+        global _EMIT_PARTITIONER
+        if partition_ids is None:
+            partition_ids = range(self.num_partitions)
+        partition_files = {
+            pid: output_dir / f"partition_{pid}.v" for pid in partition_ids
+        }
         
-        # 2.2 Boundary nets作为端口
-        for net_name, bnet_info in self.boundary_nets.items():
-            if partition_id in bnet_info['partitions']:
+        num_workers = self.emit_workers
+        if num_workers is None:
+            num_workers = (os.cpu_count() or 1) if len(self.instances) >= _PARALLEL_EMIT_MIN_INSTANCES else 1
+        num_workers = min(num_workers, len(partition_files))
+        
+        if num_workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            # 工作进程通过fork继承已解析的网表，无需序列化
+            _EMIT_PARTITIONER = self
+            try:
+                with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=num_workers,
+                    mp_context=multiprocessing.get_context('fork')
+                ) as executor:
+                    futures = [
+                        executor.submit(_emit_partition_worker, pid, str(partition_file))
+                        for pid, partition_file in partition_files.items()
+                    ]
+                    for future in futures:
+                        future.result()
+            finally:
+                _EMIT_PARTITIONER = None
+        else:
+            for pid, partition_file in partition_files.items():
+                self._generate_partition_netlist(pid, partition_file)
+        
+        return partition_files
+    
+    def _generate_partition_netlist(self, partition_id: int, output_file: Path):
+        """生成partition子网表"""
+        if self._partition_instances is None:
+            self._build_partition_index()
+        top_output_ports = self._top_output_ports
+        boundary_signals = self._boundary_signals
+        connection_signals = self._connection_signals
+        names = self.symbols.names
+        
+        with _NetlistWriter(output_file) as writer:
+            # 1. Module声明
+            writer.line(f"module partition_{partition_id} (")
+            
+            # 2. 端口列表
+            ports = []
+            
+            # 2.1 顶层IO端口（如果该partition连接到顶层IO，且不是boundary net）
+            # 注意：如果顶层输出端口是boundary net，它会在2.2中作为boundary net端口添加
+            for port in self.top_ports:
+                port_net_name = port.name
+                # 如果这是顶层输出端口且是boundary net，跳过（会在2.2中处理）
+                if port_net_name in top_output_ports and port_net_name in self.boundary_nets:
+                    continue
+                if partition_id in self._port_partitions.get(port_net_name, ()):
+                    ports.append(f"    {port.to_verilog()}")
+            
+            # 2.2 Boundary nets作为端口
+            for net_name in self._partition_boundary_nets.get(partition_id, []):
                 net = self.nets[net_name]
                 # 判断方向：
-                # - 如果是顶层输出端口，应该是output
-                # - 否则，根据是否有该partition的instance作为driver判断
-                is_top_output = net_name in top_output_ports
-                if is_top_output:
-                    direction = "output"
-                    # 对于顶层输出端口，直接使用端口名，不使用bnet_前缀
-                    port_name = net_name
-                else:
-                    direction = "inout"  # 简化处理：默认为inout（双向）
-                    port_name = f"bnet_{net_name}"
-                
+                # - 如果是顶层输出端口，应该是output（直接使用端口名，不使用bnet_前缀）
+                # - 否则简化处理：默认为inout（双向）
+                direction = "output" if net_name in top_output_ports else "inout"
+                port_name = boundary_signals[net_name]
                 if net.is_vector:
                     ports.append(f"    {direction} [{net.width-1}:0] {port_name}")
                 else:
                     ports.append(f"    {direction} {port_name}")
-        
-        if ports:
-            lines.append(",\n".join(ports))
-        lines.append(");\n")
-        
-        # 3. Internal wires声明
-        for net_name in self.internal_nets[partition_id]:
-            net = self.nets[net_name]
-            if net.is_vector:
-                lines.append(f"    wire [{net.width-1}:0] {net_name};")
-            else:
-                lines.append(f"    wire {net_name};")
-        
-        if self.internal_nets[partition_id]:
-            lines.append("")
-        
-        # 4. Instance实例化
-        partition_instances = [
-            inst_name for inst_name, pid in self.partition_scheme.items()
-            if pid == partition_id
-        ]
-        
-        for inst_name in partition_instances:
-            inst = self.instances[inst_name]
-            lines.append(f"    {inst.module_type} {inst_name} (")
             
-            connections = []
-            top_output_ports = {port.name for port in self.top_ports if port.direction == 'output'}
-            for pin_name, net_name in inst.connections.items():
-                # 检查是否是boundary net
-                base_net = net_name.split('[')[0]
-                if base_net in self.boundary_nets:
-                    # 如果是顶层输出端口，直接使用端口名（不使用bnet_前缀）
-                    if base_net in top_output_ports:
-                        signal = base_net
-                    else:
-                        signal = f"bnet_{base_net}"
-                    # 保留向量索引
-                    if '[' in net_name:
-                        idx = net_name[net_name.index('['):]
-                        signal += idx
+            if ports:
+                writer.join(ports)
+            writer.line(");\n")
+            
+            # 3. Internal wires声明
+            internal_nets = self.internal_nets[partition_id]
+            for net_name in internal_nets:
+                net = self.nets[net_name]
+                if net.is_vector:
+                    writer.line(f"    wire [{net.width-1}:0] {net_name};")
                 else:
-                    signal = net_name
+                    writer.line(f"    wire {net_name};")
+            
+            if internal_nets:
+                writer.line("")
+            
+            # 4. Instance实例化（boundary net替换为分区端口信号，保留向量索引）
+            for inst_name in self._partition_instances.get(partition_id, []):
+                inst = self.instances[inst_name]
+                ids = inst.ids
+                writer.line(f"    {names[ids[0]]} {inst_name} (")
                 
-                connections.append(f"        .{pin_name}({signal})")
+                connections = []
+                for i in range(1, len(ids), 2):
+                    net_id = ids[i + 1]
+                    signal = connection_signals.get(net_id)
+                    if signal is None:
+                        net_name = names[net_id]
+                        bracket = net_name.find('[')
+                        base_net = net_name if bracket < 0 else net_name[:bracket]
+                        signal = boundary_signals.get(base_net)
+                        if signal is None:
+                            signal = net_name
+                        elif bracket >= 0:
+                            signal += net_name[bracket:]
+                        connection_signals[net_id] = signal
+                    connections.append(f"        .{names[ids[i]]}({signal})")
+                
+                writer.join(connections)
+                writer.line("    );\n")
             
-            lines.append(",\n".join(connections))
-            lines.append("    );\n")
-        
-        lines.append("endmodule\n")
-        
-        # 写入文件
-        with open(output_file, 'w') as f:
-            f.write("\n".join(lines))
+            writer.line("endmodule\n")
     
     def _generate_top_netlist(self, output_file: Path):
         """生成顶层网表"""
-        lines = []
-        
-        # 1. Module声明
-        lines.append(f"module {self.top_module_name} (")
-        
-        # 2. 顶层端口（保持原样）
-        ports = [f"    {port.to_verilog()}" for port in self.top_ports]
-        lines.append(",\n".join(ports))
-        lines.append(");\n")
+        if self._partition_instances is None:
+            self._build_partition_index()
+        top_output_ports = self._top_output_ports
         
-        # 3. Boundary nets的wire声明（不包括顶层输出端口）
-        top_output_ports = {port.name for port in self.top_ports if port.direction == 'output'}
-        for net_name, bnet_info in self.boundary_nets.items():
-            # 顶层输出端口不需要wire声明，直接连接到顶层输出端口
-            if net_name in top_output_ports:
-                continue
-            net = self.nets[net_name]
-            if net.is_vector:
-                lines.append(f"    wire [{net.width-1}:0] bnet_{net_name};")
-            else:
-                lines.append(f"    wire bnet_{net_name};")
-        
-        if self.boundary_nets:
-            lines.append("")
-        
-        # 4. 实例化各partition module
-        for pid in range(self.num_partitions):
-            module_name = f"partition_{pid}"
-            instance_name = f"u_{module_name}"
+        with _NetlistWriter(output_file) as writer:
+            # 1. Module声明
+            writer.line(f"module {self.top_module_name} (")
             
-            lines.append(f"    {module_name} {instance_name} (")
+            # 2. 顶层端口（保持原样）
+            writer.join(f"    {port.to_verilog()}" for port in self.top_ports)
+            writer.line(");\n")
             
-            # 收集该partition的端口连接
-            connections = []
-            
-            # 4.1 顶层输入端口连接
-            for port in self.top_ports:
-                if port.direction != 'input':
+            # 3. Boundary nets的wire声明（顶层输出端口直接连接，不需要wire声明）
+            for net_name in self.boundary_nets:
+                if net_name in top_output_ports:
                     continue
-                port_net_name = port.name
-                if port_net_name in self.nets:
-                    net = self.nets[port_net_name]
-                    has_connection = any(
-                        inst in self.partition_scheme and 
-                        self.partition_scheme[inst] == pid
-                        for inst in net.connected_instances
-                    )
-                    if has_connection:
-                        connections.append(f"        .{port.name}({port.name})")
+                net = self.nets[net_name]
+                if net.is_vector:
+                    writer.line(f"    wire [{net.width-1}:0] bnet_{net_name};")
+                else:
+                    writer.line(f"    wire bnet_{net_name};")
             
-            # 4.2 Boundary nets连接（包括顶层输出端口）
-            for net_name in self.boundary_nets.keys():
-                if pid in self.boundary_nets[net_name]['partitions']:
-                    # 如果是顶层输出端口，直接连接到顶层输出端口
-                    if net_name in top_output_ports:
-                        connections.append(f"        .{net_name}({net_name})")
-                    else:
-                        port_name = f"bnet_{net_name}"
-                        connections.append(f"        .{port_name}({port_name})")
+            if self.boundary_nets:
+                writer.line("")
             
-            if connections:
-                lines.append(",\n".join(connections))
-            lines.append("    );\n")
-        
-        lines.append("endmodule\n")
-        
-        # 写入文件
-        with open(output_file, 'w') as f:
-            f.write("\n".join(lines))
+            # 4. 实例化各partition module
+            input_ports = [port.name for port in self.top_ports if port.direction == 'input']
+            for pid in range(self.num_partitions):
+                module_name = f"partition_{pid}"
+                writer.line(f"    {module_name} u_{module_name} (")
+                
+                # 4.1 顶层输入端口连接
+                connections = [
+                    f"        .{port_name}({port_name})"
+                    for port_name in input_ports
+                    if pid in self._port_partitions.get(port_name, ())
+                ]
+                
+                # 4.2 Boundary nets连接（包括顶层输出端口）
+                for net_name in self._partition_boundary_nets.get(pid, []):
+                    signal = self._boundary_signals[net_name]
+                    connections.append(f"        .{signal}({signal})")
+                
+                if connections:
+                    writer.join(connections)
+                writer.line("    );\n")
+            
+            writer.line("endmodule\n")
     
     def _save_boundary_nets(self, output_file: Path):
         """保存boundary nets信息到JSON"""
@@ -573,15 +932,33 @@ class VerilogPartitioner:
             'num_partitions': self.num_partitions
         }
         
-        with open(output_file, 'w') as f:
-            json.dump(boundary_data, f, indent=2)
+        fragments = self._boundary_json_fragments
+        if fragments is None or not self.boundary_nets:
+            with open(output_file, 'w') as f:
+                json.dump(boundary_data, f, indent=2)
+            return
+        
+        # 增量更新时逐条目编码并缓存（条目对象不变则复用），输出与json.dump(indent=2)一致
+        with open(output_file, 'w', buffering=_WRITE_BUFFER) as f:
+            f.write(f'{{\n  "num_boundary_nets": {len(self.boundary_nets)},\n  "boundary_nets": {{')
+            separator = "\n    "
+            for net_name, entry in self.boundary_nets.items():
+                fragment = fragments.get(net_name)
+                if fragment is None or fragment[0] is not entry:
+                    text = json.dumps(entry, indent=2).replace("\n", "\n    ")
+                    fragment = fragments[net_name] = (entry, f"{json.dumps(net_name)}: {text}")
+                f.write(separator)
+                f.write(fragment[1])
+                separator = ",\n    "
+            f.write(f'\n  }},\n  "num_partitions": {self.num_partitions}\n}}')
 
 
 def perform_verilog_partitioning(
     design_v: Path,
     part_file: Path,
     mapping_file: Path,
-    output_dir: Path
+    output_dir: Path,
+    emit_workers: Optional[int] = None
 ) -> Dict:
     """
     执行Verilog分区（便利函数）
@@ -591,11 +968,12 @@ def perform_verilog_partitioning(
         part_file: K-SpecPart分区结果
         mapping_file: 映射文件
         output_dir: 输出目录
+        emit_workers: 并行写出分区网表的进程数（None为自动）
         
     Returns:
         分区结果字典
     """
-    partitioner = VerilogPartitioner(design_v, part_file, mapping_file)
+    partitioner = VerilogPartitioner(design_v, part_file, mapping_file, emit_workers=emit_workers)
     return partitioner.partition(output_dir)
 
 
@@ -604,7 +982,7 @@ if __name__ == '__main__':
     import sys
     
     if len(sys.argv) < 5:
-        print("用法: python verilog_partitioner.py <design.v> <part.4> <mapping.json> <output_dir>")
+        print("用法: python -m src.utils.verilog_partitioner <design.v> <part.4> <mapping.json> <output_dir>")
         sys.exit(1)
     
     result = perform_verilog_partitioning(
@@ -0,0 +1,201 @@
+"""
+Verilog流式扫描器
+逐行读取Verilog文件并切分为词法单元（跨行处理块注释），
+单遍收集模块定义、各模块类型的实例化次数和模块层次（父模块 -> 子模块类型）
+"""
+
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+# 转义标识符 | 标识符/关键字 | 带位宽的数字 | 数字 | 字符串 | 其他单个字符
+_TOKEN_RE = re.compile(
+    r"\\\S+"
+    r"|[A-Za-z_][\w$]*"
+    r"|\d*'[sS]?[bBoOdDhH][0-9a-fA-FxXzZ_?]+"
+    r"|\d[\d_]*(?:\.\d+)?"
+    r'|"(?:[^"\\]|\\.)*"'
+    r"|\S"
+)
+_COMMENT_START_RE = re.compile(r"//|/\*")
+
+MODULE_KEYWORDS = frozenset(('module', 'macromodule'))
+
+# 不以分号结束的语句关键字（遇到后仍处于语句起始位置）
+BLOCK_KEYWORDS = frozenset((
+    'begin', 'end', 'else', 'generate', 'endgenerate', 'endcase',
+    'endfunction', 'endtask', 'endspecify', 'endprimitive', 'endtable',
+))
+
+# 语句起始处出现时不是实例化的关键字
+KEYWORDS = frozenset((
+    'input', 'output', 'inout', 'wire', 'reg', 'logic', 'tri', 'tri0', 'tri1',
+    'wand', 'wor', 'supply0', 'supply1', 'integer', 'real', 'time', 'genvar',
+    'parameter', 'localparam', 'defparam', 'assign', 'always', 'initial',
+    'function', 'task', 'specify', 'case', 'casex', 'casez', 'if', 'for',
+    'while', 'repeat', 'forever', 'primitive', 'table', 'signed', 'unsigned',
+)) | BLOCK_KEYWORDS | MODULE_KEYWORDS | frozenset(('endmodule',))
+
+
+def _strip_comments(line: str, in_comment: bool):
+    """去除一行中的注释，返回(剩余文本, 行尾是否仍处于块注释中)"""
+    parts = []
+    pos = 0
+    while pos < len(line):
+        if in_comment:
+            end = line.find('*/', pos)
+            if end < 0:
+                break
+            pos = end + 2
+            in_comment = False
+            parts.append(' ')
+        else:
+            match = _COMMENT_START_RE.search(line, pos)
+            if match is None:
+                parts.append(line[pos:])
+                break
+            parts.append(line[pos:match.start()])
+            if match.group() == '//':
+                break
+            pos = match.end()
+            in_comment = True
+    return ''.join(parts), in_comment
+
+
+def iter_verilog_tokens(verilog_file: str) -> Iterator[str]:
+    """
+    流式读取Verilog文件并逐个产生词法单元（已去除注释）
+
+    Args:
+        verilog_file: Verilog文件路径
+    """
+    in_comment = False
+    with open(verilog_file, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            if in_comment or '/' in line:
+                line, in_comment = _strip_comments(line, in_comment)
+            yield from _TOKEN_RE.findall(line)
+
+
+def iter_verilog_lines(verilog_file: str) -> Iterator[Tuple[int, int, List[str]]]:
+    """
+    流式读取Verilog文件，逐行产生(行起始字节偏移, 行结束字节偏移, 该行词法单元)
+
+    用于需要定位源码位置（如模块文本区间）的解析器
+
+    Args:
+        verilog_file: Verilog文件路径
+    """
+    in_comment = False
+    offset = 0
+    with open(verilog_file, 'rb') as f:
+        for raw in f:
+            start = offset
+            offset += len(raw)
+            line = raw.decode('utf-8', errors='ignore')
+            if in_comment or '/' in line:
+                line, in_comment = _strip_comments(line, in_comment)
+            yield start, offset, _TOKEN_RE.findall(line)
+
+
+def is_identifier(token: Optional[str]) -> bool:
+    """词法单元是否为标识符（非关键字）"""
+    return token is not None and (token[0].isalpha() or token[0] in '_\\') and token not in KEYWORDS
+
+
+def _skip_to(tokens: Iterator[str], token: Optional[str], end: str) -> Optional[str]:
+    """从当前词法单元起跳过到end（含），返回end或None（文件结束）"""
+    if token == end:
+        return token
+    for token in tokens:
+        if token == end:
+            return token
+    return None
+
+
+def _skip_group(tokens: Iterator[str]) -> Optional[str]:
+    """跳过一个括号组（已读入左括号），返回右括号或None"""
+    depth = 1
+    for token in tokens:
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+            if depth == 0:
+                return token
+    return None
+
+
+def scan_verilog_modules(verilog_file: str) -> Dict[str, Any]:
+    """
+    单遍扫描Verilog文件，提取模块信息
+
+    Args:
+        verilog_file: Verilog文件路径
+
+    Returns:
+        模块信息字典:
+            num_modules: 模块定义数（仅统计带端口列表或参数列表的定义）
+            module_names: 模块名列表（按定义顺序）
+            hierarchy: 模块名 -> 该模块在文件中被实例化的次数
+            instance_counts: 模块类型（含标准单元）-> 实例化次数
+            children: 父模块 -> {子模块类型: 实例数}
+    """
+    tokens = iter_verilog_tokens(verilog_file)
+    modules: List[str] = []
+    instance_counts: Dict[str, int] = {}
+    children: Dict[str, Dict[str, int]] = {}
+    current: Optional[str] = None
+
+    token = next(tokens, None)
+    while token is not None:
+        if token in MODULE_KEYWORDS:
+            name = next(tokens, None)
+            following = next(tokens, None)
+            if name is None:
+                break
+            current = name
+            children.setdefault(name, {})
+            if following in ('#', '('):
+                modules.append(name)
+            # 跳过模块头（端口列表）
+            _skip_to(tokens, following, ';')
+        elif token == 'endmodule':
+            current = None
+        elif current is not None and token not in BLOCK_KEYWORDS:
+            if is_identifier(token):
+                # 实例化: 类型 [#(参数)] 实例名 [位宽] (连接) {, 实例名 (连接)} ;
+                module_type = token
+                token = next(tokens, None)
+                if token == '#':
+                    if next(tokens, None) == '(':
+                        _skip_group(tokens)
+                    token = next(tokens, None)
+                count = 0
+                while is_identifier(token):
+                    token = next(tokens, None)
+                    if token == '[':
+                        _skip_to(tokens, token, ']')
+                        token = next(tokens, None)
+                    if token != '(':
+                        break
+                    count += 1
+                    _skip_group(tokens)
+                    token = next(tokens, None)
+                    if token != ',':
+                        break
+                    token = next(tokens, None)
+                if count:
+                    instance_counts[module_type] = instance_counts.get(module_type, 0) + count
+                    siblings = children[current]
+                    siblings[module_type] = siblings.get(module_type, 0) + count
+            _skip_to(tokens, token, ';')
+        token = next(tokens, None)
+
+    return {
+        'num_modules': len(modules),
+        'module_names': modules,
+        'hierarchy': {module: instance_counts.get(module, 0) for module in modules},
+        'instance_counts': instance_counts,
+        'children': children,
+    }
@@ -0,0 +1,112 @@
+"""
+ANN索引单元测试
+"""
+
+import sys
+from pathlib import Path
+import tempfile
+
+import numpy as np
+
+# 添加src到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.utils.ann_index import FlatIndex, IVFIndex, VectorIndex, create_index, recall_report
+from src.knowledge_base import KnowledgeBase
+
+
+def clustered_vectors(n, dim, seed=0):
+    """生成带簇结构的归一化向量"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((32, dim))
+    vectors = centers[rng.integers(0, 32, n)] + 0.3 * rng.standard_normal((n, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_flat_index_is_exact():
+    """测试flat索引与暴力计算一致，并支持删除"""
+    vectors = clustered_vectors(500, 16)
+    index = FlatIndex(16)
+    index.add(np.arange(500), vectors)
+    
+    query = vectors[7]
+    ids, scores = index.search(query, 5)
+    expected = np.argsort(-(vectors @ query), kind='stable')[:5]
+    assert list(ids[0]) == list(expected)
+    
+    index.remove([7])
+    assert 7 not in index
+    assert len(index) == 499
+    ids, _ = index.search(query, 5)
+    assert 7 not in ids[0]
+
+
+def test_ivf_recall_and_incremental_updates():
+    """测试IVF索引的召回率及增量插入/删除"""
+    vectors = clustered_vectors(5000, 32)
+    index = IVFIndex(32, nprobe=16, train_threshold=1000)
+    index.add(np.arange(4000), vectors[:4000])
+    assert index.is_trained
+    index.add(np.arange(4000, 5000), vectors[4000:])
+    assert len(index) == 5000
+    
+    queries = clustered_vectors(50, 32, seed=1)
+    report = recall_report(index, vectors, queries, k_values=(10,))
+    assert report['recall@10'] >= 0.9
+    
+    index.remove(np.arange(0, 5000, 2))
+    assert len(index) == 2500
+    ids, _ = index.search(queries, 10)
+    assert np.all(ids[ids >= 0] % 2 == 1)
+
+
+def test_index_save_load_roundtrip():
+    """测试索引持久化"""
+    vectors = clustered_vectors(3000, 16)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for backend in ('flat', 'ivf'):
+            index = create_index(backend, 16, train_threshold=500) if backend == 'ivf' else create_index(backend, 16)
+            index.add(np.arange(3000) * 3, vectors)
+            path = str(Path(tmpdir) / f'{backend}.ann')
+            index.save(path)
+            loaded = VectorIndex.load(path)
+            assert loaded.backend == backend
+            assert len(loaded) == 3000
+            expected_ids, _ = index.search(vectors[:5], 10)
+            loaded_ids, _ = loaded.search(vectors[:5], 10)
+            assert np.array_equal(expected_ids, loaded_ids)
+
+
+def test_knowledge_base_ann_consistency():
+    """测试知识库增删案例后ANN索引保持一致，并可随知识库持久化"""
+    vectors = clustered_vectors(300, 8)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kb_file = str(Path(tmpdir) / 'kb_cases.json')
+        kb = KnowledgeBase(kb_file, max_cases=250, ann_backend='ivf',
+                           ann_params={'train_threshold': 100, 'nprobe': 64})
+        for i, vector in enumerate(vectors):
+            kb.add_case({'design_id': f'd{i}', 'features': vector.tolist(),
+                         'embedding': vector.tolist(), 'quality_metrics': {}})
+        
+        assert kb.has_ann('embeddings')
+        rows, scores = kb.search_ann('embeddings', vectors[299], 1)
+        assert kb.get_case_at(rows[0])['design_id'] == 'd299'
+        # 被淘汰的案例不会被检索到
+        rows, _ = kb.search_ann('features', vectors[10], 250)
+        assert all(kb.get_case_at(row)['design_id'] != 'd10' for row in rows)
+        
+        assert kb.save()
+        assert Path(tmpdir, 'kb_cases.embeddings.ann').exists()
+        
+        loaded = KnowledgeBase(kb_file, ann_backend='ivf')
+        assert loaded.load()
+        rows, _ = loaded.search_ann('embeddings', vectors[200], 1)
+        assert loaded.get_case_at(rows[0])['design_id'] == 'd200'
+
+
+if __name__ == '__main__':
+    test_flat_index_is_exact()
+    test_ivf_recall_and_incremental_updates()
+    test_index_save_load_roundtrip()
+    test_knowledge_base_ann_consistency()
+    print("✓ ANN索引测试通过！")
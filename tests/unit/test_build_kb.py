@@ -0,0 +1,93 @@
+"""
+知识库并行构建单元测试
+"""
+
+import os
+import sys
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+import pytest
+
+# 添加src到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from scripts.build_kb import KnowledgeBaseBuilder
+
+
+def _make_design(root: Path, name: str, num_modules: int) -> str:
+    design_dir = root / name
+    design_dir.mkdir()
+    modules = "".join(
+        f"module {name}_m{j}(input a, output b);\n  assign b = a;\nendmodule\n"
+        for j in range(num_modules)
+    )
+    (design_dir / "design.v").write_text(modules)
+    return str(design_dir)
+
+
+def _strip(case):
+    return {key: value for key, value in case.items() if key != 'timestamp'}
+
+
+def test_parallel_build_matches_serial():
+    """测试并行构建的案例内容与顺序与串行构建一致"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        # 目录顺序与名称顺序相反，且规模不同，完成顺序与提交顺序不一致
+        design_dirs = [_make_design(root, f"design_{i}", 20 - 2 * i) for i in range(8)][::-1]
+        design_dirs.append(str(root / "missing"))
+
+        results = {}
+        for num_workers in (1, 3):
+            builder = KnowledgeBaseBuilder(
+                str(root / f"kb_{num_workers}.json"),
+                embedding_model_name='hashing',
+                use_build_cache=False,
+                num_workers=num_workers
+            )
+            assert builder.build_from_designs(design_dirs, validate=True) == 8
+            results[num_workers] = [_strip(case) for case in builder.kb.cases]
+
+        assert [case['design_id'] for case in results[3]] == [Path(d).name for d in design_dirs[:-1]]
+        assert results[3] == results[1]
+
+
+_extract = KnowledgeBaseBuilder.extract_design_features
+
+
+def _crashing_extract(self, design_dir, design_id=None):
+    """模拟工作进程被系统终止（如超出内存）"""
+    if Path(design_dir).name == 'design_crash':
+        os._exit(1)
+    return _extract(self, design_dir, design_id)
+
+
+def test_parallel_build_survives_worker_crash():
+    """测试一个工作进程异常退出时，其余设计重新提交后正常构建，只有该设计失败"""
+    if multiprocessing.get_start_method() != 'fork':
+        pytest.skip("需要fork启动方式，工作进程才能继承替换后的提取函数")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        design_dirs = [_make_design(root, f"design_{i}", 5 + i) for i in range(6)]
+        design_dirs.insert(2, _make_design(root, "design_crash", 5))
+        
+        KnowledgeBaseBuilder.extract_design_features = _crashing_extract
+        try:
+            builder = KnowledgeBaseBuilder(
+                str(root / "kb.json"),
+                embedding_model_name='hashing',
+                use_build_cache=False,
+                num_workers=3
+            )
+            assert builder.build_from_designs(design_dirs, validate=True) == 6
+        finally:
+            KnowledgeBaseBuilder.extract_design_features = _extract
+        assert [case['design_id'] for case in builder.kb.cases] == [f"design_{i}" for i in range(6)]
+
+
+if __name__ == '__main__':
+    test_parallel_build_matches_serial()
+    test_parallel_build_survives_worker_crash()
+    print("✓ 知识库并行构建测试通过")
@@ -0,0 +1,108 @@
+"""
+流式BLIF转换（结构化Verilog、K-SpecPart超图）单元测试
+"""
+
+import sys
+import json
+import tempfile
+from pathlib import Path
+
+# 添加src到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.utils.convert_blif_to_verilog import (
+    iter_blif_statements,
+    convert_blif_to_verilog_streaming,
+    convert_blif_to_hgr
+)
+from src.utils.netlist_reader import read_netlist
+
+
+BLIF = """# titan23风格的小网表
+.model top
+.inputs clk a[0] a[1] \\
+  b
+.outputs y
+.names a[0] a[1] n1
+11 1
+.names b n1 n2
+0- 1
+-0 1
+.names vcc
+1
+.latch n2 q re clk 0
+.subckt stratixiv_lcell_comb dataa=n1 datab=q datac=n1 combout=y
+.end
+
+.model stratixiv_lcell_comb
+.inputs dataa datab datac
+.outputs combout
+.blackbox
+.end
+"""
+
+
+def test_iter_blif_statements():
+    """测试续行、注释和.names真值表行"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        blif = Path(tmpdir) / 'top.blif'
+        blif.write_text(BLIF)
+        statements = list(iter_blif_statements(str(blif)))
+        assert statements[1] == ('.inputs', ['clk', 'a[0]', 'a[1]', 'b'], None)
+        assert statements[4] == ('.names', ['b', 'n1', 'n2'], ['0- 1', '-0 1'])
+        assert statements[5] == ('.names', ['vcc'], ['1'])
+
+
+def test_convert_blif_to_verilog_streaming():
+    """测试结构化Verilog可被网表读取器解析，LUT掩码与实例命名正确"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        blif = Path(tmpdir) / 'top.blif'
+        blif.write_text(BLIF)
+        output_v = Path(tmpdir) / 'top.v'
+        stats = convert_blif_to_verilog_streaming(str(blif), str(output_v))
+        assert stats == {'models': 1, 'instances': 5, 'nets': 9}
+
+        text = output_v.read_text()
+        assert "LUT2 #(.INIT(4'h8)) names$1" in text
+        # n2 = ~b | ~n1
+        assert "LUT2 #(.INIT(4'h7)) names$2" in text
+        assert "LUT0 #(.INIT(1'h1)) names$3" in text
+        assert '.TYPE("re"), .INIT(0)' in text
+        assert 'module stratixiv_lcell_comb' not in text
+
+        top = read_netlist(str(output_v), use_cache=False).module('top')
+        instances = list(top.iter_instances())
+        assert [name for name, _, _ in instances] == ['names$1', 'names$2', 'names$3', 'latch$4', 'subckt$5']
+        assert instances[0][2] == [('A0', '\\a[0]'), ('A1', '\\a[1]'), ('Y', 'n1')]
+        assert instances[3][2] == [('D', 'n2'), ('Q', 'q'), ('C', 'clk')]
+        assert instances[4][1] == 'stratixiv_lcell_comb'
+
+
+def test_convert_blif_to_hgr():
+    """测试超图与映射文件（格式与convert_ispd2015_to_hgr相同）"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        blif = Path(tmpdir) / 'top.blif'
+        blif.write_text(BLIF)
+        hgr = Path(tmpdir) / 'top.hgr'
+        mapping = Path(tmpdir) / 'top.mapping.json'
+        stats = convert_blif_to_hgr(str(blif), str(hgr), str(mapping))
+        assert stats['num_vertices'] == 5
+
+        # n1: 1,2,5（subckt两次连接n1只计一次）；n2: 2,4；q: 4,5
+        assert hgr.read_text() == "3 5\n1 2 5\n2 4\n4 5\n"
+
+        names = ['names$1', 'names$2', 'names$3', 'latch$4', 'subckt$5']
+        expected = {
+            'num_vertices': 5,
+            'num_hyperedges': 3,
+            'vertex_to_id': {name: i + 1 for i, name in enumerate(names)},
+            'id_to_vertex': {i + 1: name for i, name in enumerate(names)},
+        }
+        assert mapping.read_text() == json.dumps(expected, indent=2)
+
+
+if __name__ == '__main__':
+    test_iter_blif_statements()
+    test_convert_blif_to_verilog_streaming()
+    test_convert_blif_to_hgr()
+    print("✓ 流式BLIF转换测试通过")
@@ -0,0 +1,134 @@
+"""
+文本嵌入缓存单元测试
+"""
+
+import sys
+from pathlib import Path
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+# 添加src到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.utils.embedding_loader import EmbeddingModel
+from src.utils.embedding_cache import EmbeddingCache, CachedEmbeddingModel
+
+
+class CountingModel(EmbeddingModel):
+    """按文本哈希生成确定性嵌入，并记录被编码的文本"""
+
+    def __init__(self, dim=8):
+        super().__init__('counting-model')
+        self.embedding_dim = dim
+        self.encoded = []
+
+    def encode(self, texts):
+        if isinstance(texts, str):
+            texts = [texts]
+        self.encoded.extend(texts)
+        vectors = np.array([
+            np.random.default_rng(abs(hash(t)) % (2 ** 32)).standard_normal(self.embedding_dim)
+            for t in texts
+        ], dtype=np.float32)
+        return vectors[0] if len(vectors) == 1 else vectors
+
+
+class FlakyModel(CountingModel):
+    """首次编码返回NaN，之后返回正常向量"""
+
+    def encode(self, texts):
+        vectors = super().encode(texts)
+        if len(self.encoded) <= (1 if isinstance(texts, str) else len(texts)):
+            return np.full_like(vectors, np.nan)
+        return vectors
+
+
+def _write_entries(cache_dir, start, count):
+    cache = EmbeddingCache('shared-model', cache_dir=cache_dir, lru_size=0)
+    for i in range(start, start + count):
+        cache.put(f'text {i}', np.full(4, i, dtype=np.float32))
+
+
+def test_cache_lru_and_disk_roundtrip():
+    """测试内存LRU淘汰与磁盘存储跨实例读取"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = EmbeddingCache('m', cache_dir=tmpdir, lru_size=2)
+        cache.put_many(['a', 'b', 'c'], np.eye(3, dtype=np.float32))
+        assert len(cache._lru) == 2
+        assert np.allclose(cache.get('a'), [1, 0, 0])
+        assert cache.get('missing') is None
+
+        reopened = EmbeddingCache('m', cache_dir=tmpdir)
+        assert len(reopened) == 3
+        assert np.allclose(reopened.get('c'), [0, 0, 1])
+
+        # 不同模型的缓存互相隔离
+        assert EmbeddingCache('other', cache_dir=tmpdir).get('a') is None
+
+
+def test_cached_model_encodes_each_text_once():
+    """测试相同文本在批次内、实例间都只编码一次"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        base = CountingModel()
+        model = CachedEmbeddingModel(base, cache_dir=tmpdir)
+        first = model.encode(['x', 'y', 'x'])
+        assert first.shape == (3, 8)
+        assert np.allclose(first[0], first[2])
+        assert sorted(base.encoded) == ['x', 'y']
+
+        single = model.encode('y')
+        assert single.shape == (8,)
+        assert np.allclose(single, first[1])
+
+        other_base = CountingModel()
+        other = CachedEmbeddingModel(other_base, cache_dir=tmpdir)
+        again = other.encode(['x', 'z'])
+        assert other_base.encoded == ['z']
+        assert np.allclose(again[0], first[0])
+
+
+def test_non_finite_embeddings_not_cached():
+    """测试含NaN的嵌入不写入缓存，下次编码重新调用模型"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for cache_dir in (None, tmpdir):
+            base = FlakyModel()
+            model = CachedEmbeddingModel(base, cache_dir=cache_dir)
+            assert np.isnan(model.encode('x')).all()
+            second = model.encode('x')
+            assert base.encoded == ['x', 'x']
+            assert np.isfinite(second).all()
+
+            model.encode('x')
+            assert base.encoded == ['x', 'x']
+
+        reopened = EmbeddingCache('counting-model', cache_dir=tmpdir)
+        assert len(reopened) == 1
+        assert np.isfinite(reopened.get('x')).all()
+
+
+def test_concurrent_writers():
+    """测试多进程并发写入后每条文本都对应正确的向量"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        procs = [
+            multiprocessing.Process(target=_write_entries, args=(tmpdir, start, 50))
+            for start in (0, 25, 50)
+        ]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+
+        cache = EmbeddingCache('shared-model', cache_dir=tmpdir, lru_size=0)
+        assert len(cache) == 100
+        for i in range(100):
+            assert np.allclose(cache.get(f'text {i}'), i)
+
+
+if __name__ == '__main__':
+    test_cache_lru_and_disk_roundtrip()
+    test_cached_model_encodes_each_text_once()
+    test_non_finite_embeddings_not_cached()
+    test_concurrent_writers()
+    print("所有测试通过！")
@@ -0,0 +1,137 @@
+"""
+嵌入模型单元测试（Ollama使用本地替身HTTP服务）
+"""
+
+import sys
+import json
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# 添加src到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.utils.embedding_loader import (
+    HashingEmbeddingModel, OllamaEmbeddingModel, load_embedding_model
+)
+
+
+def fake_embedding(text, dim=4):
+    """按文本生成确定性嵌入"""
+    return [float(len(text)), float(sum(map(ord, text)) % 97), 1.0, float(dim)]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """模拟Ollama的 /api/tags、/api/embed、/api/embeddings"""
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._reply(200, {'models': [{'name': 'fake-embed'}]})
+
+    def do_POST(self):
+        state = self.server.state
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with state['lock']:
+            state['calls'].append(self.path)
+            fail = state['fail_next'] > 0
+            if fail:
+                state['fail_next'] -= 1
+        if fail:
+            self._reply(503, {'error': 'busy'})
+        elif self.path == '/api/embed' and state['batch']:
+            self._reply(200, {'embeddings': [fake_embedding(t) for t in payload['input']]})
+        elif self.path == '/api/embeddings':
+            self._reply(200, {'embedding': fake_embedding(payload['prompt'])})
+        else:
+            self._reply(404, {'error': 'not found'})
+
+
+def start_server(batch=True, fail_next=0):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOllamaHandler)
+    server.state = {'lock': threading.Lock(), 'calls': [], 'batch': batch, 'fail_next': fail_next}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_batch_endpoint_preserves_order():
+    """测试批量接口按batch_size分批并发请求且结果保持顺序"""
+    server, url = start_server()
+    try:
+        model = OllamaEmbeddingModel('fake-embed', url, batch_size=8, max_workers=4)
+        texts = [f'design {i}' * (i % 5 + 1) for i in range(50)]
+        embeddings = model.encode(texts)
+        assert embeddings.shape == (50, 4)
+        assert np.allclose(embeddings, [fake_embedding(t) for t in texts])
+        assert server.state['calls'] == ['/api/embed'] * 7
+        assert model.encode('single').shape == (4,)
+    finally:
+        server.shutdown()
+
+
+def test_fallback_to_legacy_endpoint():
+    """测试服务不支持 /api/embed 时回退为逐条请求"""
+    server, url = start_server(batch=False)
+    try:
+        model = OllamaEmbeddingModel('fake-embed', url, batch_size=4, max_workers=2)
+        texts = [f't{i}' for i in range(6)]
+        embeddings = model.encode(texts)
+        assert np.allclose(embeddings, [fake_embedding(t) for t in texts])
+        assert model._batch_endpoint is False
+        assert server.state['calls'].count('/api/embeddings') == 6
+    finally:
+        server.shutdown()
+
+
+def test_retry_on_busy_server():
+    """测试服务繁忙（503）时退避重试"""
+    server, url = start_server(fail_next=2)
+    try:
+        model = OllamaEmbeddingModel('fake-embed', url, max_retries=3, backoff=0.01)
+        embedding = model.encode('retry me')
+        assert np.allclose(embedding, fake_embedding('retry me'))
+        assert server.state['calls'] == ['/api/embed'] * 3
+    finally:
+        server.shutdown()
+
+
+def test_hashing_model():
+    """测试哈希嵌入确定、归一化，且规模接近的设计更相似"""
+    model = load_embedding_model('hashing:128')
+    assert isinstance(model, HashingEmbeddingModel)
+    assert model.embedding_dim == 128
+
+    texts = [
+        "Design: mgc_fft_1 Modules: 1000 Nets: 2000 Partitions: 4",
+        "Design: mgc_fft_2 Modules: 1100 Nets: 2300 Partitions: 4",
+        "Design: mgc_fft_3 Modules: 90000 Nets: 200000 Partitions: 4",
+        "",
+    ]
+    embeddings = model.encode(texts)
+    assert embeddings.shape == (4, 128) and embeddings.dtype == np.float32
+    assert np.allclose(np.linalg.norm(embeddings[:3], axis=1), 1.0)
+    assert not embeddings[3].any()
+    assert embeddings[0] @ embeddings[1] > embeddings[0] @ embeddings[2]
+
+    fresh = HashingEmbeddingModel(embedding_dim=128)
+    assert np.array_equal(fresh.encode(texts[1]), embeddings[1])
+    assert np.array_equal(fresh.encode(texts[::-1])[::-1], embeddings)
+
+
+if __name__ == '__main__':
+    test_batch_endpoint_preserves_order()
+    test_fallback_to_legacy_endpoint()
+    test_retry_on_busy_server()
+    test_hashing_model()
+    print("所有测试通过！")
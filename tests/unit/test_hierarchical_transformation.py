@@ -119,6 +119,106 @@ endmodule
         traceback.print_exc()
 
 
+def test_incremental_transformation():
+    """测试增量层级化改造：只重写受影响的分区"""
+    test_dir = Path("/tmp/hierarchical_incremental_test")
+    test_dir.mkdir(parents=True, exist_ok=True)
+    
+    verilog_content = """
+module test_design (
+  input clk,
+  input rst,
+  output [7:0] out
+);
+
+  wire net1, net2, net3, net4;
+  
+  inv01 u1 (.A(clk), .Z(net1));
+  and02 u2 (.A(net1), .B(rst), .Z(net2));
+  or02 u3 (.A(net2), .B(net1), .Z(net3));
+  buf01 u4 (.A(net3), .Z(out[0]));
+  inv01 u5 (.A(rst), .Z(net4));
+  buf01 u6 (.A(net4), .Z(out[1]));
+
+endmodule
+"""
+    with open(test_dir / 'design.v', 'w') as f:
+        f.write(verilog_content)
+    
+    partition_scheme = {'u1': 0, 'u2': 0, 'u3': 1, 'u4': 1, 'u5': 2, 'u6': 2}
+    output_dir = test_dir / 'incremental_output'
+    result = perform_hierarchical_transformation('test_design', test_dir, partition_scheme, output_dir)
+    assert result['dirty_partitions'] == [0, 1, 2]
+    
+    # u3迁移到分区0：net2变为分区0的内部net，net3变为边界net；分区2不受影响
+    partition_scheme = dict(partition_scheme, u3=0)
+    result = perform_hierarchical_transformation(
+        'test_design', test_dir, partition_scheme, output_dir, transformer=result['transformer']
+    )
+    assert result['dirty_partitions'] == [0, 1]
+    assert not result['boundary_connections']['net2']['is_boundary']
+    assert result['boundary_connections']['net3']['partitions'] == [0, 1]
+    
+    full = perform_hierarchical_transformation(
+        'test_design', test_dir, partition_scheme, test_dir / 'full_output'
+    )
+    for pid in range(3):
+        assert Path(result['partition_netlists'][pid]).read_text() == \
+            Path(full['partition_netlists'][pid]).read_text()
+    assert result['statistics'] == full['statistics']
+
+
+def test_boundary_port_directions():
+    """测试按LEF引脚方向推断边界端口方向"""
+    test_dir = Path("/tmp/hierarchical_direction_test")
+    test_dir.mkdir(parents=True, exist_ok=True)
+    
+    with open(test_dir / 'design.v', 'w') as f:
+        f.write("""
+module test_design (clk, rst, out);
+  input clk, rst;
+  output out;
+  wire net1, net2, net3;
+  inv01 u1 (.A(clk), .Z(net1));
+  and02 u2 (.A(net1), .B(rst), .Z(net2));
+  or02 u3 (.A(net2), .B(net1), .Z(net3));
+  buf01 u4 (.A(net3), .Z(out));
+endmodule
+""")
+    with open(test_dir / 'cells.lef', 'w') as f:
+        for cell, inputs in [('inv01', ['A']), ('and02', ['A', 'B']), ('or02', ['A', 'B']), ('buf01', ['A'])]:
+            f.write(f"MACRO {cell}\n  CLASS CORE ;\n")
+            for pin, direction in [(p, 'INPUT') for p in inputs] + [('Z', 'OUTPUT')]:
+                f.write(f"  PIN {pin}\n    DIRECTION {direction} ;\n  END {pin}\n")
+            f.write(f"END {cell}\n")
+    
+    from src.utils.generate_stdcell_verilog import parse_lef_pin_directions
+    directions = parse_lef_pin_directions(test_dir / 'cells.lef')
+    assert directions['and02'] == {'A': 'INPUT', 'B': 'INPUT', 'Z': 'OUTPUT'}
+    
+    transformer = HierarchicalTransformation('test_design', test_dir)
+    transformer.analyze_boundary_connections({'u1': 0, 'u2': 0, 'u3': 1, 'u4': 1})
+    assert transformer.boundary_connections['net1']['driver'] == ('u1', 'Z')
+    assert transformer.boundary_connections['net1']['loads'] == [('u2', 'A'), ('u3', 'B')]
+    
+    transformer._build_partition_index()
+    modules, ports, internal_nets = transformer._partition_index
+    assert modules[0] == ['u1', 'u2']
+    # net1: 分区0驱动且有load -> inout；net2: 分区0驱动、分区1接收
+    assert ports[0] == [
+        {'name': 'net1', 'direction': 'inout'},
+        {'name': 'net2', 'direction': 'output'}
+    ]
+    assert ports[1] == [
+        {'name': 'net1', 'direction': 'input'},
+        {'name': 'net2', 'direction': 'input'}
+    ]
+    assert internal_nets[1] == ['net3', 'out']
+    
+    netlist = transformer.extract_partition_netlist(1, test_dir / 'partitions')
+    assert 'input wire net2' in netlist.read_text()
+
+
 if __name__ == '__main__':
     print("="*80)
     print("测试层级化改造模块")
@@ -134,6 +234,12 @@ if __name__ == '__main__':
     test_simple_partition_scheme()
     print("✓ 测试3: 简单分区")
     
+    test_incremental_transformation()
+    print("✓ 测试4: 增量改造")
+    
+    test_boundary_port_directions()
+    print("✓ 测试5: 边界端口方向")
+    
     print("\n" + "="*80)
     print("所有测试完成!")
     print("="*80)
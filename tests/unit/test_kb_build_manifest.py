@@ -0,0 +1,118 @@
+"""
+知识库增量构建（构建清单）单元测试
+"""
+
+import sys
+import json
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# 添加src到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from scripts.build_kb import KnowledgeBaseBuilder
+
+
+def _make_designs(root: Path, count: int):
+    design_dirs = []
+    for i in range(count):
+        design_dir = root / f"design_{i}"
+        design_dir.mkdir()
+        (design_dir / "design.v").write_text(
+            f"module top_{i}(input a, output b);\n  sub_{i} u0(.a(a), .b(b));\nendmodule\n"
+            f"module sub_{i}(input a, output b);\n  assign b = a;\nendmodule\n"
+        )
+        design_dirs.append(str(design_dir))
+    return design_dirs
+
+
+def _build(kb_file: Path, design_dirs, version=None):
+    builder = KnowledgeBaseBuilder(str(kb_file), embedding_model_name='hashing')
+    if version is not None:
+        builder.manifest.builder_version = version
+        builder.manifest.load()
+    calls = []
+    extract = builder.extract_design_features
+
+    def counting_extract(design_dir, design_id=None):
+        calls.append(Path(design_dir).name)
+        return extract(design_dir, design_id)
+
+    builder.extract_design_features = counting_extract
+    builder.build_from_designs(design_dirs, validate=False)
+    return builder, calls
+
+
+def test_incremental_rebuild():
+    """测试输入未变化的设计复用构建结果，修改的设计与版本变化重新计算"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        design_dirs = _make_designs(root, 3)
+        kb_file = root / "kb.json"
+
+        _, calls = _build(kb_file, design_dirs)
+        assert sorted(calls) == ['design_0', 'design_1', 'design_2']
+        manifest_file = root / "kb.build_manifest.json"
+        assert manifest_file.exists()
+        first = json.loads(manifest_file.read_text(encoding='utf-8'))
+        assert all(entry['case'].get('embedding') for entry in first['designs'].values())
+
+        # 输入未变化：全部命中，嵌入直接复用
+        builder, calls = _build(root / "kb.json", design_dirs)
+        assert calls == []
+        assert len(builder.kb.cases) == 3
+        assert all(case.get('embedding') for case in builder.kb.cases)
+
+        # 修改一个设计：只重新计算该设计
+        verilog = Path(design_dirs[1]) / "design.v"
+        verilog.write_text(verilog.read_text() + "module extra(input x);\nendmodule\n")
+        _, calls = _build(kb_file, design_dirs)
+        assert calls == ['design_1']
+
+        # 构建器版本变化：全部失效
+        _, calls = _build(kb_file, design_dirs, version=KnowledgeBaseBuilder.BUILDER_VERSION + 1)
+        assert sorted(calls) == ['design_0', 'design_1', 'design_2']
+
+
+def test_failed_embeddings_not_cached():
+    """测试嵌入生成失败的案例不写入构建清单和知识库，下次构建重新生成"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        design_dirs = _make_designs(root, 3)
+        kb_file = root / "kb.json"
+
+        builder = KnowledgeBaseBuilder(str(kb_file), embedding_model_name='hashing')
+        encode = builder.embedding_model.encode
+
+        def failing_encode(texts):
+            raise RuntimeError("模型服务不可用")
+
+        builder.embedding_model.encode = failing_encode
+        assert builder.build_from_designs(design_dirs, validate=False) == 0
+        assert builder.kb.size() == 0
+        manifest_file = root / "kb.build_manifest.json"
+        assert json.loads(manifest_file.read_text(encoding='utf-8'))['designs'] == {}
+
+        # 只有个别案例的嵌入无效时只跳过这些案例
+        def partial_encode(texts):
+            embeddings = np.asarray(encode(texts), dtype=np.float32)
+            embeddings[1] = np.nan
+            return embeddings
+
+        builder.embedding_model.encode = partial_encode
+        assert builder.build_from_designs(design_dirs, validate=False) == 2
+        assert len(json.loads(manifest_file.read_text(encoding='utf-8'))['designs']) == 2
+
+        # 恢复后重新生成失败的案例
+        builder, calls = _build(kb_file, design_dirs)
+        assert calls == ['design_1']
+        assert builder.kb.size() == 3
+        assert all(np.any(case['embedding']) for case in builder.kb.get_all_cases())
+
+
+if __name__ == '__main__':
+    test_incremental_rebuild()
+    test_failed_embeddings_not_cached()
+    print("✓ 知识库增量构建测试通过")
@@ -0,0 +1,289 @@
+"""
+知识库存储后端单元测试
+"""
+
+import sys
+import json
+from pathlib import Path
+import tempfile
+import tracemalloc
+import multiprocessing
+
+import numpy as np
+
+# 添加src到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.knowledge_base import KnowledgeBase
+from src.utils.kb_storage import open_case_store
+
+
+def make_case(i, rng, embedding_dim=16):
+    """构造测试案例（嵌入值可被float32精确表示）"""
+    return {
+        'design_id': f'design_{i}',
+        'features': rng.random(9).tolist(),
+        'embedding': rng.standard_normal(embedding_dim).astype(np.float32).tolist(),
+        'partition_strategy': {'num_partitions': 4, 'partitions': {'0': ['a', 'b']}},
+        'negotiation_patterns': {},
+        'quality_metrics': {'num_modules': int(rng.integers(10, 1000)), 'hpwl': 1.5},
+    }
+
+
+def _concurrent_writer(case_file, worker, num_cases):
+    """并发写入进程：每添加一个案例就保存一次"""
+    rng = np.random.default_rng(worker)
+    kb = KnowledgeBase(case_file, max_cases=10000)
+    kb.load()
+    for i in range(num_cases):
+        kb.add_case(make_case(worker * 1000 + i, rng))
+        assert kb.save()
+    # 更新一个共享案例、删除一个自己的案例
+    kb.add_case(dict(make_case(0, rng), design_id='shared'))
+    kb.remove_case(f'design_{worker * 1000}')
+    assert kb.save()
+
+
+def test_sqlite_roundtrip_matches_json():
+    """测试sqlite后端保存/加载与json后端内容一致（含更新、删除和非数值特征）"""
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kbs = [KnowledgeBase(str(Path(tmpdir) / 'kb.json')),
+               KnowledgeBase(str(Path(tmpdir) / 'kb.db'))]
+        cases = [make_case(i, rng) for i in range(30)]
+        cases[3]['features'] = 'invalid'
+        cases[4]['embedding'] = None
+        for kb in kbs:
+            for case in cases:
+                kb.add_case(json.loads(json.dumps(case)))
+            kb.save()
+            updated = dict(kb.get_case('design_5'), quality_metrics={'num_modules': 7})
+            kb.add_case(updated)
+            kb.remove_case('design_10')
+            kb.save()
+
+        loaded = []
+        for kb in kbs:
+            fresh = KnowledgeBase(str(kb.case_file))
+            assert fresh.load()
+            loaded.append(fresh.get_all_cases())
+        assert loaded[0] == loaded[1]
+        assert [c['design_id'] for c in loaded[1]][5] == 'design_5'
+        assert loaded[1][5]['quality_metrics'] == {'num_modules': 7}
+        assert 'design_10' not in [c['design_id'] for c in loaded[1]]
+
+
+def test_incremental_commit_and_compaction():
+    """测试增量提交只追加修改的向量，compact后数据不变且旁路文件收缩"""
+    rng = np.random.default_rng(1)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kb = KnowledgeBase(str(Path(tmpdir) / 'kb.db'))
+        for i in range(50):
+            kb.add_case(make_case(i, rng))
+        kb.save()
+        store = kb._store
+        sidecar = store._sidecar('embeddings', 0)
+        size = sidecar.stat().st_size
+        assert size == 50 * 16 * 4
+
+        kb.add_case(make_case(7, rng))
+        kb.save()
+        assert sidecar.stat().st_size == size + 16 * 4
+
+        for i in range(0, 50, 2):
+            kb.remove_case(f'design_{i}')
+        kb.save()
+        before = KnowledgeBase(str(kb.case_file))
+        before.load()
+
+        kb.compact()
+        assert not sidecar.exists()
+        assert store._sidecar('embeddings', 1).stat().st_size == 25 * 16 * 4
+        after = KnowledgeBase(str(kb.case_file))
+        after.load()
+        assert after.get_all_cases() == before.get_all_cases()
+
+        # 导出为原有JSON格式
+        export_file = Path(tmpdir) / 'export.json'
+        assert store.export_json(str(export_file)) == 25
+        exported = open_case_store(str(export_file)).load()
+        assert exported == after.get_all_cases()
+
+
+def test_sqlite_ann_persistence():
+    """测试sqlite后端下ANN索引的持久化与过期检测"""
+    rng = np.random.default_rng(2)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        case_file = str(Path(tmpdir) / 'kb.db')
+        kb = KnowledgeBase(case_file, ann_backend='flat')
+        for i in range(20):
+            kb.add_case(make_case(i, rng))
+        kb.save()
+
+        reloaded = KnowledgeBase(case_file, ann_backend='flat')
+        reloaded.load()
+        assert reloaded._load_ann()
+
+        # 其他进程修改后索引过期
+        other = KnowledgeBase(case_file)
+        other.load()
+        other.add_case(make_case(99, rng))
+        other.save()
+        assert not reloaded._load_ann()
+
+
+def test_concurrent_writers_lose_nothing():
+    """测试多个进程同时写入同一知识库时不丢失案例"""
+    num_workers, num_cases = 8, 15
+    for name in ('kb.json', 'kb.db'):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            case_file = str(Path(tmpdir) / name)
+            procs = [
+                multiprocessing.Process(target=_concurrent_writer, args=(case_file, w, num_cases))
+                for w in range(num_workers)
+            ]
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join()
+            assert all(p.exitcode == 0 for p in procs)
+            
+            kb = KnowledgeBase(case_file, max_cases=10000)
+            assert kb.load()
+            ids = {case['design_id'] for case in kb.get_all_cases()}
+            expected = {
+                f'design_{w * 1000 + i}'
+                for w in range(num_workers) for i in range(1, num_cases)
+            } | {'shared'}
+            assert ids == expected, name
+            assert kb.size() == len(expected)
+
+
+def test_lazy_payloads():
+    """测试sqlite后端只常驻精简记录：检索不读取大字段，get_case按需读取完整案例"""
+    rng = np.random.default_rng(3)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        case_file = str(Path(tmpdir) / 'kb.db')
+        kb = KnowledgeBase(case_file)
+        cases = []
+        for i in range(40):
+            case = make_case(i, rng)
+            case['module_names'] = [f'm{j}' for j in range(50)]
+            case['negotiation_patterns'] = {'num_negotiations': 2, 'migrations': [{'source': '0'}]}
+            cases.append(case)
+            kb.add_case(json.loads(json.dumps(case)))
+        assert kb.get_case('design_3') == cases[3]
+        kb.save()
+        
+        loaded = KnowledgeBase(case_file)
+        assert loaded.load()
+        slim = loaded.get_case_at(loaded.get_row('design_3'))
+        assert 'module_names' not in slim and 'partitions' not in slim['partition_strategy']
+        assert slim['negotiation_patterns'] == {'num_negotiations': 2}
+        assert list(loaded.get_case('design_3').items()) == list(cases[3].items())
+        assert loaded.get_all_cases() == cases
+        
+        # 检索路径不读取大字段
+        from src.rag_retriever import RAGRetriever
+        def fail(design_ids):
+            raise AssertionError('检索时读取了大字段')
+        loaded._store.load_payloads = fail
+        retriever = RAGRetriever(loaded, embedding_model_type='ollama',
+                                 ollama_base_url='http://127.0.0.1:9')
+        assert retriever.retrieve(np.asarray(cases[0]['features']))
+        
+        # 通过get_case修改后保存，大字段保持不变
+        del loaded._store.load_payloads
+        case = loaded.get_case('design_5')
+        case['quality_metrics'] = {'num_modules': 1}
+        loaded.add_case(case)
+        loaded.save()
+        fresh = KnowledgeBase(case_file)
+        fresh.load()
+        assert fresh.get_case('design_5')['module_names'] == cases[5]['module_names']
+        assert fresh.get_case('design_5')['quality_metrics'] == {'num_modules': 1}
+
+
+def test_sqlite_vectors_stay_mapped():
+    """测试sqlite后端加载时向量留在内存映射中，记录不含向量，get_case按原字段顺序还原"""
+    rng = np.random.default_rng(4)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        case_file = str(Path(tmpdir) / 'kb.db')
+        kb = KnowledgeBase(case_file)
+        cases = [make_case(i, rng) for i in range(50)]
+        cases[1]['features'] = 'invalid'
+        cases[2] = {'embedding': cases[2]['embedding'], **cases[2]}
+        for case in cases:
+            kb.add_case(json.loads(json.dumps(case)))
+        kb.save()
+        
+        records, vectors = open_case_store(case_file).load_records()
+        assert all('embedding' not in case for case in records)
+        assert records[1]['features'] == 'invalid'
+        assert isinstance(vectors['features'][0], np.memmap)
+        assert isinstance(vectors['embedding'][0], np.memmap)
+        
+        loaded = KnowledgeBase(case_file)
+        assert loaded.load()
+        for row in range(loaded.size()):
+            slim = loaded.get_case_at(row)
+            assert 'embedding' not in slim
+            assert 'features' not in slim or slim['features'] == 'invalid'
+        assert list(loaded.get_case('design_2').items()) == list(cases[2].items())
+        assert loaded.get_all_cases() == cases
+        row = loaded.get_row('design_7')
+        assert np.array_equal(loaded.get_case_vector(row, 'features'),
+                              np.asarray(cases[7]['features'], dtype=np.float32))
+        
+        # 反复更新/删除后（内存缓冲区整理）仍与JSON后端一致
+        reference = KnowledgeBase(str(Path(tmpdir) / 'kb.json'))
+        for case in cases:
+            reference.add_case(json.loads(json.dumps(case)))
+        for step in range(400):
+            case = make_case(int(rng.integers(0, 60)), rng, embedding_dim=int(rng.choice([16, 24])))
+            for kb in (loaded, reference):
+                kb.add_case(json.loads(json.dumps(case)))
+                if step % 7 == 0:
+                    kb.remove_case(f'design_{step % 50}')
+        assert loaded.get_all_cases() == reference.get_all_cases()
+        assert np.array_equal(loaded.get_embeddings_matrix(), reference.get_embeddings_matrix())
+        loaded.save()
+        fresh = KnowledgeBase(case_file)
+        fresh.load()
+        by_id = {case['design_id']: case for case in reference.get_all_cases()}
+        assert {case['design_id']: case for case in fresh.get_all_cases()} == by_id
+
+
+def test_lazy_load_memory():
+    """测试sqlite后端加载后常驻内存只有检索矩阵和精简记录（不含大字段和向量列表）"""
+    rng = np.random.default_rng(5)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        case_file = str(Path(tmpdir) / 'kb.db')
+        kb = KnowledgeBase(case_file)
+        for i in range(500):
+            case = make_case(i, rng, embedding_dim=256)
+            case['module_names'] = [f'module_{j}' for j in range(200)]
+            kb.add_case(case)
+        kb.save()
+        
+        tracemalloc.start()
+        try:
+            loaded = KnowledgeBase(case_file)
+            loaded.load()
+            resident, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        # 嵌入以Python列表常驻时仅向量就需要约500*256*32字节
+        assert resident < 500 * 256 * 16
+        assert loaded.get_case('design_9')['module_names'][-1] == 'module_199'
+
+
+if __name__ == '__main__':
+    test_sqlite_roundtrip_matches_json()
+    test_incremental_commit_and_compaction()
+    test_sqlite_ann_persistence()
+    test_concurrent_writers_lose_nothing()
+    test_lazy_payloads()
+    test_sqlite_vectors_stay_mapped()
+    test_lazy_load_memory()
+    print("所有测试通过！")
@@ -0,0 +1,206 @@
+"""
+KnowledgeBase单元测试
+"""
+
+import sys
+from pathlib import Path
+import tempfile
+
+import numpy as np
+import pytest
+
+# 添加src到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.knowledge_base import KnowledgeBase
+
+
+def make_case(design_id, features, embedding=None, num_modules=100):
+    """创建测试案例"""
+    case = {
+        'design_id': design_id,
+        'features': list(features),
+        'partition_strategy': {},
+        'negotiation_patterns': {},
+        'quality_metrics': {'num_modules': num_modules, 'hpwl': 1.0},
+    }
+    if embedding is not None:
+        case['embedding'] = list(embedding)
+    return case
+
+
+def test_matrices_follow_add_and_update():
+    """测试矩阵随add_case增量更新"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kb = KnowledgeBase(str(Path(tmpdir) / 'kb_cases.json'))
+        kb.load()
+        
+        kb.add_case(make_case('a', [3.0, 4.0], [1.0, 0.0, 0.0]))
+        kb.add_case(make_case('b', [0.0, 2.0], [0.0, 2.0, 0.0]))
+        
+        assert kb.features_matrix.dtype == np.float32
+        assert kb.features_matrix.shape == (2, 2)
+        np.testing.assert_allclose(kb.features_matrix[0], [0.6, 0.8], rtol=1e-6)
+        np.testing.assert_allclose(kb.embeddings_matrix[1], [0.0, 1.0, 0.0])
+        
+        # 原有接口返回未归一化的矩阵
+        np.testing.assert_allclose(kb.get_features_matrix(), [[3.0, 4.0], [0.0, 2.0]], rtol=1e-6)
+        
+        # 更新已有案例只改写对应行
+        kb.add_case(make_case('a', [1.0, 0.0]))
+        assert kb.size() == 2
+        np.testing.assert_allclose(kb.features_matrix[0], [1.0, 0.0])
+        assert not kb.embedding_mask[0]
+        assert kb.embedding_mask[1]
+        assert kb.get_case_at(kb.get_row('b'))['design_id'] == 'b'
+
+
+def test_matrices_are_read_only():
+    """测试暴露的矩阵只读"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kb = KnowledgeBase(str(Path(tmpdir) / 'kb_cases.json'))
+        kb.add_case(make_case('a', [1.0, 2.0], [1.0, 1.0]))
+        
+        with pytest.raises(ValueError):
+            kb.features_matrix[0, 0] = 5.0
+        with pytest.raises(ValueError):
+            kb.embedding_mask[0] = False
+
+
+def test_eviction_keeps_rows_aligned():
+    """测试超过max_cases时FIFO淘汰后行与案例保持对应"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kb = KnowledgeBase(str(Path(tmpdir) / 'kb_cases.json'), max_cases=3)
+        for i in range(5):
+            kb.add_case(make_case(f'd{i}', [1.0, float(i)]))
+        
+        assert kb.size() == 3
+        assert [case['design_id'] for case in kb.get_all_cases()] == ['d2', 'd3', 'd4']
+        for row in range(kb.size()):
+            case = kb.get_case_at(row)
+            expected = np.array(case['features'], dtype=np.float32)
+            expected /= np.linalg.norm(expected)
+            np.testing.assert_allclose(kb.features_matrix[row], expected, rtol=1e-6)
+            assert kb.get_row(case['design_id']) == row
+        
+        assert kb.remove_case('d3')
+        assert kb.get_row('d4') == 1
+        assert kb.features_matrix.shape[0] == 2
+
+
+def test_save_load_roundtrip():
+    """测试保存后重新加载，矩阵一致且维度不一致的向量被标记为无效"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kb_file = str(Path(tmpdir) / 'kb_cases.json')
+        kb = KnowledgeBase(kb_file)
+        kb.add_case(make_case('a', [1.0, 2.0, 3.0], [0.5] * 4))
+        kb.add_case(make_case('b', [2.0, 2.0, 1.0], [0.1] * 4))
+        kb.add_case(make_case('c', [1.0, 1.0, 1.0], [0.0] * 2))
+        assert kb.save()
+        
+        loaded = KnowledgeBase(kb_file)
+        assert loaded.load()
+        np.testing.assert_allclose(loaded.features_matrix, kb.features_matrix)
+        assert loaded.embedding_dim == 4
+        assert list(loaded.embedding_mask) == [True, True, False]
+
+
+def test_scale_and_type_index():
+    """测试规模/类型二级索引与线性扫描结果一致"""
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kb = KnowledgeBase(str(Path(tmpdir) / 'kb_cases.json'), max_cases=150)
+        for i in range(200):
+            case = make_case(f'd{i}', [1.0, 2.0], num_modules=int(rng.integers(0, 1000)))
+            case['design_type'] = ['ispd', 'titan'][i % 2]
+            kb.add_case(case)
+        
+        # 原地修改案例后重新添加，索引按新值更新
+        case = kb.get_case('d199')
+        case['quality_metrics']['num_modules'] = 5000
+        kb.add_case(case)
+        kb.remove_case('d100')
+        
+        def linear_scan(lo, hi):
+            return [c['design_id'] for c in kb.get_all_cases()
+                    if lo <= c['quality_metrics']['num_modules'] <= hi]
+        
+        for lo, hi in [(0, 1000), (200, 400), (4999, 5001), (2000, 3000)]:
+            assert [c['design_id'] for c in kb.get_cases_by_scale(lo, hi)] == linear_scan(lo, hi)
+        
+        titan_rows = kb.get_rows_by_type('titan')
+        assert [kb.get_case_at(r)['design_id'] for r in titan_rows] == [
+            c['design_id'] for c in kb.get_all_cases() if c['design_type'] == 'titan'
+        ]
+        assert len(kb.get_rows_by_type('unknown')) == 0
+
+
+def test_lru_and_utility_eviction():
+    """测试lru/utility淘汰策略：保留常被命中或边界代价低的案例，索引保持一致"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kb = KnowledgeBase(str(Path(tmpdir) / 'kb_cases.json'), max_cases=3,
+                           eviction_policy='lru', ann_backend='flat')
+        for i in range(3):
+            kb.add_case(make_case(f'd{i}', [1.0, float(i)], num_modules=10 * i))
+        kb.record_hits([kb.get_row('d0')])
+        kb.add_case(make_case('d3', [1.0, 3.0], num_modules=30))
+        assert sorted(c['design_id'] for c in kb.get_all_cases()) == ['d0', 'd2', 'd3']
+        
+        kb = KnowledgeBase(str(Path(tmpdir) / 'kb_cases.json'), max_cases=20,
+                           eviction_policy='utility', ann_backend='flat')
+        rng = np.random.default_rng(1)
+        for i in range(60):
+            case = make_case(f'd{i}', rng.random(4), num_modules=int(rng.integers(0, 100)))
+            case['quality_metrics']['boundary_cost'] = 1.0 if i == 0 else 50.0
+            kb.add_case(case)
+            if i >= 30:
+                kb.record_hits([kb.get_row('d25')] * 3)
+        
+        ids = {c['design_id'] for c in kb.get_all_cases()}
+        assert kb.size() == 20
+        assert {'d0', 'd25', 'd59'} <= ids
+        for row, case in enumerate(kb.get_all_cases()):
+            assert kb.get_row(case['design_id']) == row
+            expected = np.array(case['features'], dtype=np.float32)
+            np.testing.assert_allclose(kb.features_matrix[row], expected / np.linalg.norm(expected),
+                                       rtol=1e-6)
+        assert [c['design_id'] for c in kb.get_cases_by_scale(0, 50)] == [
+            c['design_id'] for c in kb.get_all_cases() if c['quality_metrics']['num_modules'] <= 50
+        ]
+        rows, _ = kb.search_ann('features', kb.features_matrix[5], 20)
+        assert sorted(rows.tolist()) == list(range(20))
+
+
+@pytest.mark.parametrize('case_file', ['kb_cases.json', 'kb_cases.db'])
+def test_eviction_state_persists(case_file):
+    """测试lru/utility的命中统计随案例保存，重新加载后淘汰顺序不变"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for policy in ('lru', 'utility'):
+            path = str(Path(tmpdir) / f'{policy}_{case_file}')
+            kb = KnowledgeBase(path, max_cases=3, eviction_policy=policy)
+            for i in range(3):
+                kb.add_case(make_case(f'd{i}', [1.0, float(i)], embedding=[0.5, float(i)]))
+            kb.record_hits([kb.get_row('d0')] * 2)
+            kb.record_hits([kb.get_row('d0')])
+            assert kb.save()
+            
+            loaded = KnowledgeBase(path, max_cases=3, eviction_policy=policy)
+            assert loaded.load()
+            assert loaded.get_case('d0')['retrieval_stats']['hits'] == 3
+            loaded.add_case(make_case('d3', [1.0, 3.0]))
+            assert sorted(c['design_id'] for c in loaded.get_all_cases()) == ['d0', 'd2', 'd3']
+            # 重新生成的案例保留命中统计
+            loaded.add_case(make_case('d0', [1.0, 0.0], embedding=[0.5, 0.0]))
+            assert loaded.get_case('d0')['retrieval_stats']['hits'] == 3
+
+
+if __name__ == '__main__':
+    test_matrices_follow_add_and_update()
+    test_matrices_are_read_only()
+    test_eviction_keeps_rows_aligned()
+    test_save_load_roundtrip()
+    test_scale_and_type_index()
+    test_lru_and_utility_eviction()
+    test_eviction_state_persists('kb_cases.json')
+    test_eviction_state_persists('kb_cases.db')
+    print("✓ KnowledgeBase测试通过！")
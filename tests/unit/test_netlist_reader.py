@@ -0,0 +1,92 @@
+"""
+结构化网表读取器单元测试
+"""
+
+import sys
+import os
+import tempfile
+from pathlib import Path
+
+# 添加src到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.utils import netlist_reader
+from src.utils.netlist_reader import read_netlist, expand_bus
+from src.utils.generate_stdcell_verilog import extract_cells_from_verilog
+
+
+VERILOG = """// flat netlist
+module top (clk, a, y);
+  input clk;
+  input [3:0] a;
+  output [1:0] y;
+  wire n1, n2;
+  wire [7:0] bus;
+  NAND2_X1 U1 ( .A1(a[0]), .A2(a[1]), .ZN(n1) );
+  /* INV_X1 U_fake ( .A(n1), .ZN(n2) ); */
+  INV_X1 U2 ( .A(n1), .ZN(n2) ), U3 ( .A(), .ZN(y[0]) );
+  AND2_X1 U4 ( a[2], {a[3], n2}, y[1] );
+  assign bus[0] = 1'b0;
+endmodule
+
+module sub (input [1:0] p, output q);
+  BUF_X1 b0 ( .A(p[0]), .Z(q) );
+endmodule
+"""
+
+
+def test_read_netlist_and_cache():
+    """测试端口/wire/实例解析、模块文本区间与二进制缓存"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        design_v = Path(tmpdir) / "design.v"
+        design_v.write_text(VERILOG)
+
+        netlist = read_netlist(design_v)
+        assert netlist.module_names == ['top', 'sub']
+        top = netlist.module()
+        assert top.ports == [('clk', 'input', None, None), ('a', 'input', 3, 0), ('y', 'output', 1, 0)]
+        assert top.wires == [('n1', None, None), ('n2', None, None), ('bus', 7, 0)]
+        assert [bit[0] for bit in top.port_bits()][:3] == ['clk', 'a[0]', 'a[1]']
+        assert expand_bus('y', 1, 0) == ['y[0]', 'y[1]']
+        assert top.assigns == [('bus[0]', "1'b0")]
+        assert list(top.iter_instances()) == [
+            ('U1', 'NAND2_X1', [('A1', 'a[0]'), ('A2', 'a[1]'), ('ZN', 'n1')]),
+            ('U2', 'INV_X1', [('A', 'n1'), ('ZN', 'n2')]),
+            ('U3', 'INV_X1', [('A', None), ('ZN', 'y[0]')]),
+            ('U4', 'AND2_X1', [(None, 'a[2]'), (None, '{a[3],n2}'), (None, 'y[1]')]),
+        ]
+        assert netlist.module('sub').ports == [('p', 'input', 1, 0), ('q', 'output', None, None)]
+        assert netlist.module_text('sub').startswith('module sub (')
+        assert netlist.module_text('sub').endswith('endmodule')
+        assert extract_cells_from_verilog(design_v) == {'NAND2_X1', 'INV_X1', 'AND2_X1', 'BUF_X1'}
+
+        # 二进制缓存：清空进程内缓存后不重新解析
+        cache_files = os.listdir(Path(tmpdir) / '.netlist_cache')
+        assert len(cache_files) == 1
+        netlist_reader._MEMO.clear()
+        original_parse = netlist_reader.parse_netlist
+        netlist_reader.parse_netlist = None
+        try:
+            cached = read_netlist(design_v)
+        finally:
+            netlist_reader.parse_netlist = original_parse
+        assert list(cached.module().iter_instances()) == list(top.iter_instances())
+
+        # 内容变化后按新哈希重新解析
+        design_v.write_text(VERILOG.replace('U1', 'U9'))
+        netlist_reader._MEMO.clear()
+        changed = read_netlist(design_v)
+        assert next(changed.module().iter_instances())[0] == 'U9'
+        assert len(os.listdir(Path(tmpdir) / '.netlist_cache')) == 2
+
+        # 过期缓存（引用已不存在的模块）时重新解析
+        for name in os.listdir(Path(tmpdir) / '.netlist_cache'):
+            (Path(tmpdir) / '.netlist_cache' / name).write_bytes(b"cno_such_module\nNetlist\n.")
+        netlist_reader._MEMO.clear()
+        reparsed = read_netlist(design_v)
+        assert next(reparsed.module().iter_instances())[0] == 'U9'
+
+
+if __name__ == '__main__':
+    test_read_netlist_and_cache()
+    print("✓ 结构化网表读取器测试通过")
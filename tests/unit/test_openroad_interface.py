@@ -0,0 +1,94 @@
+"""
+OpenRoad接口partition netlist保存单元测试
+"""
+
+import sys
+import os
+import json
+import tempfile
+from pathlib import Path
+
+# 添加src到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.utils.openroad_interface import OpenRoadInterface, _ModuleNameIndex
+
+
+VERILOG = """module alu_core (a, y);
+  input a;
+  output y;
+  INV_X1 u0 ( .A(a), .ZN(y) );
+endmodule
+
+module alu_ctrl (a, y);
+  input a;
+  output y;
+  BUF_X1 u0 ( .A(a), .Z(y) );
+endmodule
+
+module fpu_core (a, y);
+  input a;
+  output y;
+  INV_X1 u0 ( .A(a), .ZN(y) );
+endmodule
+
+module top (a, y);
+  input a;
+  output y;
+  alu_core i0 ( .a(a), .y(y) );
+endmodule
+"""
+
+
+def test_module_name_index():
+    """测试名称索引与逐个子串匹配结果一致"""
+    names = ['alu_core', 'alu_ctrl', 'fpu_core', 'top', 'core_top', 'alu_alu_core']
+    index = _ModuleNameIndex(names)
+    for module_id in ['alu', 'core', 'u_c', 'top', 'x', 'alu_core', 'e\nt', 'p', '']:
+        assert index.resolve(module_id) == [name for name in names if module_id in name]
+
+
+def test_save_partition_netlists_cached():
+    """测试模块表缓存、未变化分区跳过和网表变化后重建"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        design_dir = Path(tmpdir) / 'design'
+        output_dir = Path(tmpdir) / 'out'
+        design_dir.mkdir()
+        output_dir.mkdir()
+        design_v = design_dir / 'design.v'
+        design_v.write_text(VERILOG)
+
+        interface = OpenRoadInterface()
+        scheme = {'partition_0': ['alu'], 'partition_1': ['fpu', 'top']}
+        first = interface.save_partition_netlists(scheme, str(design_dir), str(output_dir), 't1')
+        text = Path(first['partition_0']).read_text()
+        assert 'module alu_core' in text and 'module alu_ctrl' in text and 'fpu_core' not in text
+
+        # 重复调用：模块表不重新读取，两个分区均复用
+        interface._parse_verilog_modules = None
+        second = interface.save_partition_netlists(scheme, str(design_dir), str(output_dir), 't2')
+        assert second == first
+        assert not (output_dir / 'partition_0_t2.v').exists()
+        with open(output_dir / 'partition_scheme_t2.json') as f:
+            assert json.load(f)['netlist_files'] == first
+
+        # 只有模块集合变化的分区重新生成
+        moved = {'partition_0': ['alu_core'], 'partition_1': ['fpu', 'top']}
+        third = interface.save_partition_netlists(moved, str(design_dir), str(output_dir), 't3')
+        assert third['partition_0'] == str(output_dir / 'partition_0_t3.v')
+        assert third['partition_1'] == first['partition_1']
+        assert 'alu_ctrl' not in Path(third['partition_0']).read_text()
+
+        # 网表变化后重建模块表
+        del interface._parse_verilog_modules
+        design_v.write_text(VERILOG.replace('fpu_core', 'fpu_unit'))
+        os.utime(design_v, ns=(1, 1))
+        fourth = interface.save_partition_netlists(moved, str(design_dir), str(output_dir), 't4')
+        assert fourth['partition_1'] == str(output_dir / 'partition_1_t4.v')
+        assert 'fpu_unit' in Path(fourth['partition_1']).read_text()
+
+
+if __name__ == '__main__':
+    test_module_name_index()
+    test_save_partition_netlists_cached()
+    print("✓ OpenRoad接口partition netlist测试通过")
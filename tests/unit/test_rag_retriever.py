@@ -0,0 +1,368 @@
+"""
+RAGRetriever单元测试
+"""
+
+import sys
+from pathlib import Path
+import tempfile
+
+import numpy as np
+
+# 添加src到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.knowledge_base import KnowledgeBase
+from src.rag_retriever import RAGRetriever
+
+
+class FakeEmbeddingModel:
+    """按文本哈希生成确定性向量的嵌入模型"""
+    
+    def __init__(self, dim=8):
+        self.model_name = 'fake'
+        self.embedding_dim = dim
+        self.calls = 0
+        self.batches = 0
+    
+    def encode(self, texts):
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+        self.calls += len(texts)
+        self.batches += 1
+        vectors = np.stack([
+            np.random.default_rng(abs(hash(text)) % (2 ** 32)).standard_normal(self.embedding_dim)
+            for text in texts
+        ]).astype(np.float32)
+        return vectors[0] if single else vectors
+
+
+def build_kb(tmpdir, num_cases=60, feature_dim=9, embedding_dim=8, seed=0):
+    """构建随机测试知识库"""
+    rng = np.random.default_rng(seed)
+    kb = KnowledgeBase(str(Path(tmpdir) / 'kb_cases.json'))
+    for i in range(num_cases):
+        kb.add_case({
+            'design_id': f'design_{i}',
+            'features': rng.random(feature_dim).tolist(),
+            'embedding': rng.standard_normal(embedding_dim).tolist(),
+            'partition_strategy': {'num_partitions': 4},
+            'negotiation_patterns': {},
+            'quality_metrics': {'num_modules': int(rng.integers(10, 1000)), 'num_nets': 10},
+        })
+    return kb
+
+
+def make_retriever(kb, **kwargs):
+    """创建使用FakeEmbeddingModel的检索器"""
+    retriever = RAGRetriever(
+        kb,
+        embedding_model_type='ollama',
+        ollama_base_url='http://127.0.0.1:9',
+        **kwargs
+    )
+    retriever.embedding_model = FakeEmbeddingModel()
+    return retriever
+
+
+def reference_fine(query, cases, top_k):
+    """参考实现：逐案例计算余弦相似度"""
+    features = np.array([case['features'] for case in cases], dtype=np.float64)
+    sims = features @ query / (np.linalg.norm(features, axis=1) * np.linalg.norm(query))
+    order = np.argsort(-sims, kind='stable')[:top_k]
+    return [cases[i]['design_id'] for i in order]
+
+
+def test_fine_retrieve_matches_reference():
+    """测试细粒度检索与逐案例计算结果一致"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kb = build_kb(tmpdir)
+        retriever = make_retriever(kb)
+        query = np.random.default_rng(1).random(9)
+        
+        candidates = kb.get_all_cases()[:40]
+        result = retriever.fine_retrieve(query, candidates)
+        assert [c['design_id'] for c in result] == reference_fine(query, candidates, 20)
+        
+        # 不在知识库中的案例（副本）走逐案例路径，结果一致
+        copies = [dict(case) for case in candidates]
+        result = retriever.fine_retrieve(query, copies)
+        assert [c['design_id'] for c in result] == reference_fine(query, candidates, 20)
+
+
+def test_coarse_retrieve_scores_filtered_cases_only():
+    """测试粗粒度检索只在规模筛选后的案例中排序"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kb = build_kb(tmpdir, num_cases=200)
+        retriever = make_retriever(kb, coarse_top_k=10)
+        query = np.random.default_rng(2).random(9)
+        
+        result = retriever.coarse_retrieve(query, design_scale=400)
+        filtered = [c for c in kb.get_all_cases()
+                    if 200 <= c['quality_metrics']['num_modules'] <= 600]
+        assert len(result) == 10
+        assert [c['design_id'] for c in result] == reference_fine(query, filtered, 10)
+        
+        # 规模与类型筛选取交集
+        for i, case in enumerate(kb.get_all_cases()):
+            case['design_type'] = 'titan' if i % 3 == 0 else 'ispd'
+            kb.add_case(case)
+        result = retriever.coarse_retrieve(query, design_scale=400, design_type='titan')
+        filtered = [c for c in filtered if c['design_type'] == 'titan']
+        assert [c['design_id'] for c in result] == reference_fine(query, filtered, 10)
+
+
+def test_semantic_retrieve_uses_stored_embeddings():
+    """测试语义检索使用知识库中的嵌入，只对查询文本编码一次"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kb = build_kb(tmpdir)
+        retriever = make_retriever(kb, similarity_threshold=2.0)
+        candidates = kb.get_all_cases()[:20]
+        
+        result = retriever.semantic_retrieve("Design: query Modules: 100", candidates)
+        assert retriever.embedding_model.calls == 1
+        
+        query = retriever.embedding_model.encode("Design: query Modules: 100")
+        embeddings = np.array([case['embedding'] for case in candidates])
+        sims = embeddings @ query / (np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query))
+        expected = np.argsort(-sims, kind='stable')[:10]
+        assert [c['design_id'] for c in result] == [candidates[i]['design_id'] for i in expected]
+
+
+def test_ann_path_matches_exact():
+    """测试候选集较大时走ANN索引（flat后端应与精确计算一致）"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kb = build_kb(tmpdir, num_cases=200)
+        kb.ann_backend = 'flat'
+        kb._rebuild_ann()
+        exact = make_retriever(kb, coarse_top_k=10)
+        approx = make_retriever(kb, coarse_top_k=10, ann_min_candidates=50)
+        query = np.random.default_rng(4).random(9)
+        
+        assert ([c['design_id'] for c in approx.coarse_retrieve(query)]
+                == [c['design_id'] for c in exact.coarse_retrieve(query)])
+        
+        candidates = kb.get_all_cases()
+        assert ([c['design_id'] for c in approx.semantic_retrieve("Design: q", candidates)]
+                == [c['design_id'] for c in exact.semantic_retrieve("Design: q", candidates)])
+
+
+def test_retrieve_pipeline():
+    """测试三级检索流程"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kb = build_kb(tmpdir, num_cases=100)
+        retriever = make_retriever(kb)
+        query = np.random.default_rng(3).random(9)
+        
+        results = retriever.retrieve(query, query_text="Design: q", design_scale=500)
+        assert 0 < len(results) <= 10
+        
+        staged = retriever.semantic_retrieve(
+            "Design: q",
+            retriever.fine_retrieve(query, retriever.coarse_retrieve(query, design_scale=500))
+        )
+        assert [c['design_id'] for c in results] == [c['design_id'] for c in staged]
+
+
+def test_retrieve_many_matches_loop():
+    """测试批量检索与逐个调用retrieve()结果一致，且只调用一次嵌入模型"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kb = build_kb(tmpdir, num_cases=300)
+        for i, case in enumerate(kb.get_all_cases()):
+            case['design_type'] = 'titan' if i % 2 else 'ispd'
+            if i % 7 == 0:
+                case['embedding'] = None
+            kb.add_case(case)
+        retriever = make_retriever(kb, coarse_top_k=30, similarity_threshold=0.3)
+        
+        rng = np.random.default_rng(5)
+        queries = rng.random((12, 9))
+        texts = [f"Design: q{j}" if j % 4 else None for j in range(12)]
+        scales = [None, 100, 500, 900] * 3
+        types = [None, None, 'titan'] * 4
+        
+        batched = retriever.retrieve_many(queries, texts, scales, types)
+        assert retriever.embedding_model.batches == 1
+        
+        for j in range(12):
+            single = retriever.retrieve(queries[j], texts[j], scales[j], types[j])
+            assert [c['design_id'] for c in batched[j]] == [c['design_id'] for c in single]
+        assert retriever.retrieve_many(np.zeros((0, 9))) == []
+
+
+def test_retrieve_many_near_ties_independent_of_batch():
+    """测试特征近似重复（余弦相似度只差约1e-7）时批量检索结果不随同批查询变化"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        rng = np.random.default_rng(11)
+        base = rng.random((20, 16))
+        kb = KnowledgeBase(str(Path(tmpdir) / 'kb_cases.json'))
+        for i in range(2000):
+            kb.add_case({
+                'design_id': f'design_{i}',
+                'features': (base[i % 20] + rng.standard_normal(16) * 1e-6).tolist(),
+                'embedding': rng.standard_normal(8).tolist(),
+                'quality_metrics': {'num_modules': int(rng.integers(10, 1000))},
+            })
+        retriever = make_retriever(kb, similarity_threshold=0.3)
+        assert kb.size() > retriever.coarse_top_k
+        
+        queries = base[rng.integers(0, 20, 16)] + rng.standard_normal((16, 16)) * 1e-3
+        texts = [f"Design: q{j}" for j in range(16)]
+        scales = [None, None, None, 500] * 4
+        batched = retriever.retrieve_many(queries, texts, scales)
+        for j in range(16):
+            assert batched[j] == retriever.retrieve(queries[j], texts[j], scales[j])
+            assert retriever.retrieve_many(queries[j::-1], texts[j::-1], scales[j::-1])[0] == batched[j]
+
+
+def test_quantized_embeddings_with_rerank():
+    """测试float16/int8嵌入存储：内存减少，重排序后语义检索结果与float32一致"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kb = build_kb(tmpdir, num_cases=80, embedding_dim=64)
+        kb.save()
+        exact = make_retriever(kb, fine_top_k=80, coarse_top_k=80, similarity_threshold=2.0)
+        exact.embedding_model = FakeEmbeddingModel(dim=64)
+        query = np.random.default_rng(6).random(9)
+        expected = [c['design_id'] for c in exact.retrieve(query, "Design: q")]
+        
+        for quantization in ('float16', 'int8'):
+            quantized = KnowledgeBase(str(kb.case_file), embedding_quantization=quantization)
+            quantized.load()
+            assert quantized.embedding_nbytes < kb.embedding_nbytes
+            rows = np.arange(quantized.size())
+            np.testing.assert_allclose(quantized.get_embedding_rows(rows),
+                                       kb.get_embedding_rows(rows), atol=0.02)
+            np.testing.assert_allclose(quantized.get_exact_embedding_rows(rows),
+                                       kb.get_embedding_rows(rows), atol=1e-6)
+            # 全精度嵌入单独以float32保存，不再以列表留在案例记录中
+            assert all('embedding' not in quantized.get_case_at(row) for row in rows)
+            np.testing.assert_allclose(quantized.get_case('design_3')['embedding'],
+                                       kb.get_case('design_3')['embedding'], rtol=1e-6)
+            assert list(quantized.get_case('design_3')) == list(kb.get_case('design_3'))
+            
+            retriever = make_retriever(quantized, fine_top_k=80, coarse_top_k=80,
+                                       similarity_threshold=2.0)
+            retriever.embedding_model = FakeEmbeddingModel(dim=64)
+            assert [c['design_id'] for c in retriever.retrieve(query, "Design: q")] == expected
+            
+            fused = make_retriever(quantized, similarity_threshold=2.0,
+                                   weighted_rerank=True, rerank_scope='all')
+            fused.embedding_model = FakeEmbeddingModel(dim=64)
+            assert [c['design_id'] for c in fused.retrieve(query, "Design: q")] == expected
+
+
+def test_weighted_rerank_matches_staged():
+    """测试默认权重下加权重排序与三级检索结果一致，规模权重使规模接近的案例排在前面"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kb = build_kb(tmpdir, num_cases=300)
+        # 缺少嵌入的案例走级联检索回退路径
+        kb.add_case({'design_id': 'no_embedding', 'features': [1.0] * 9,
+                     'quality_metrics': {'num_modules': 500}})
+        # 特征几乎相同（余弦相似度只在末几位不同）时排序对舍入敏感
+        near_ties = KnowledgeBase(str(Path(tmpdir) / 'near_ties.json'))
+        for case in kb.get_all_cases()[:300]:
+            near_ties.add_case(dict(case, features=(1000.0 + np.asarray(case['features'])).tolist()))
+        queries = np.random.default_rng(9).random((12, 9))
+        texts = [f"Design: q{j}" if j % 3 else None for j in range(12)]
+        scales = [None, 500, 100, None, 800, None, 300, None, 500, 40, None, 900]
+        
+        for base, offset in ((kb, 0.0), (near_ties, 1000.0)):
+            for threshold in (0.3, 2.0):
+                staged = make_retriever(base, similarity_threshold=threshold)
+                reweighted = make_retriever(base, similarity_threshold=threshold, weighted_rerank=True)
+                expected = staged.retrieve_many(queries + offset, texts, scales)
+                assert reweighted.retrieve_many(queries + offset, texts, scales) == expected
+                for j in range(12):
+                    assert reweighted.retrieve(queries[j] + offset, texts[j], scales[j]) == \
+                        staged.retrieve(queries[j] + offset, texts[j], scales[j])
+        staged, reweighted = make_retriever(kb), make_retriever(kb, weighted_rerank=True)
+        assert reweighted.retrieve(np.ones(9), "Design: q", 500) == staged.retrieve(np.ones(9), "Design: q", 500)
+        
+        by_scale = make_retriever(near_ties, weighted_rerank=True, fine_top_k=50,
+                                  rerank_weights={'scale': 1.0, 'embedding': 0.0})
+        result = by_scale.retrieve(queries[0] + 1000.0, "Design: q", design_scale=500)
+        modules = [c['quality_metrics']['num_modules'] for c in result]
+        proximity = [min(m / 500, 500 / m) for m in modules]
+        assert proximity == sorted(proximity, reverse=True)
+
+
+def test_fused_scope_scores_all_filtered_cases():
+    """测试rerank_scope='all'对筛选后的全部案例单遍加权打分，不受粗/细粒度截断影响"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        kb = build_kb(tmpdir, num_cases=300)
+        kb.add_case({'design_id': 'no_embedding', 'features': [1.0] * 9,
+                     'quality_metrics': {'num_modules': 500}})
+        kb.add_case({'design_id': 'no_features', 'embedding': [1.0] * 8,
+                     'quality_metrics': {'num_modules': 500}})
+        queries = np.random.default_rng(9).random((12, 9))
+        texts = [f"Design: q{j}" if j % 3 else None for j in range(12)]
+        scales = [None, 500, 100, None, 800, None, 300, None, 500, 40, None, 900]
+        
+        # 默认权重下与不截断的级联检索一致
+        for threshold in (0.3, 2.0):
+            untruncated = make_retriever(kb, similarity_threshold=threshold,
+                                         coarse_top_k=10 ** 6, fine_top_k=10 ** 6)
+            fused = make_retriever(kb, similarity_threshold=threshold,
+                                   weighted_rerank=True, rerank_scope='all')
+            expected = untruncated.retrieve_many(queries, texts, scales)
+            assert fused.retrieve_many(queries, texts, scales) == expected
+            for j in range(12):
+                assert fused.retrieve(queries[j], texts[j], scales[j]) == expected[j]
+        
+        # 加权分数与逐案例计算的参考结果一致
+        weights = {'scale': 0.5, 'feature': 0.3, 'embedding': 0.2}
+        fused = make_retriever(kb, similarity_threshold=2.0, weighted_rerank=True,
+                               rerank_scope='all', rerank_weights=weights)
+        model = FakeEmbeddingModel()
+        for j in (1, 2, 4):
+            rows = [row for row in range(kb.size()) if kb.get_case_vector(row, 'features') is not None
+                    and 0.5 * scales[j] <= kb.get_case_at(row)['quality_metrics']['num_modules'] <= 1.5 * scales[j]]
+            scores = []
+            for row in rows:
+                features = kb.get_case_vector(row, 'features').astype(np.float64)
+                embedding = kb.get_case_vector(row, 'embedding')
+                if embedding is None:
+                    # 没有嵌入的案例实时编码案例文本
+                    embedding = model.encode(fused._case_to_text(kb.get_case_at(row)))
+                embedding = embedding.astype(np.float64)
+                query_embedding = model.encode(texts[j]).astype(np.float64)
+                ratio = kb.get_case_at(row)['quality_metrics']['num_modules'] / scales[j]
+                scores.append(
+                    weights['scale'] * min(ratio, 1 / ratio)
+                    + weights['feature'] * features @ queries[j] / np.linalg.norm(features) / np.linalg.norm(queries[j])
+                    + weights['embedding'] * embedding @ query_embedding
+                    / np.linalg.norm(embedding) / np.linalg.norm(query_embedding)
+                )
+            reference = [kb.get_case_at(rows[i])['design_id'] for i in np.argsort(scores)[::-1][:10]]
+            assert [c['design_id'] for c in fused.retrieve(queries[j], texts[j], scales[j])] == reference
+        
+        # 只按规模排序时选出全部筛选案例中规模最接近的，而不只是特征相似度前fine_top_k个
+        by_scale = make_retriever(kb, weighted_rerank=True, rerank_scope='all',
+                                  rerank_weights={'scale': 1.0, 'embedding': 0.0})
+        result = by_scale.retrieve(queries[0], "Design: q", design_scale=500)
+        proximity = [min(c['quality_metrics']['num_modules'] / 500, 500 / c['quality_metrics']['num_modules'])
+                     for c in result]
+        modules = [kb.get_case_at(row)['quality_metrics']['num_modules'] for row in range(kb.size())
+                   if kb.get_case_vector(row, 'features') is not None]
+        best = sorted((min(m / 500, 500 / m) for m in modules if 250 <= m <= 750), reverse=True)[:10]
+        assert np.allclose(proximity, best)
+        
+        try:
+            make_retriever(kb, rerank_scope='everything')
+            assert False, "应当拒绝未知的加权排序范围"
+        except ValueError:
+            pass
+
+
+if __name__ == '__main__':
+    test_fine_retrieve_matches_reference()
+    test_coarse_retrieve_scores_filtered_cases_only()
+    test_semantic_retrieve_uses_stored_embeddings()
+    test_ann_path_matches_exact()
+    test_retrieve_pipeline()
+    test_retrieve_many_matches_loop()
+    test_retrieve_many_near_ties_independent_of_batch()
+    test_quantized_embeddings_with_rerank()
+    test_weighted_rerank_matches_staged()
+    test_fused_scope_scores_all_filtered_cases()
+    print("✓ RAGRetriever测试通过！")
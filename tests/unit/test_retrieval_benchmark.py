@@ -0,0 +1,37 @@
+"""
+检索基准测试模块单元测试
+"""
+
+import sys
+from pathlib import Path
+
+# 添加src到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from experiments.retrieval_benchmark import benchmark_retrieval, compare_reports
+
+
+def test_benchmark_retrieval_report():
+    """测试检索基准报告包含各阶段的延迟和recall，精确检索的recall为1，批量检索与逐个检索一致"""
+    results = benchmark_retrieval([300], [None, 'flat'], num_queries=5, embedding_dim=16,
+                                  with_scale=True, retriever_params={'ann_min_candidates': 100})
+    assert [entry['backend'] for entry in results] == ['none', 'flat']
+    for entry in results:
+        assert entry['num_cases'] == 300 and entry['matrix_mb'] > 0
+        stages = entry['stages']
+        assert set(stages) == {'coarse_retrieve', 'fine_retrieve', 'semantic_retrieve',
+                               'retrieve', 'retrieve_reweighted', 'retrieve_fused', 'retrieve_many'}
+        assert stages['coarse_retrieve']['p99_ms'] >= stages['coarse_retrieve']['p50_ms']
+        # 不建索引和flat索引都是精确检索
+        assert stages['coarse_retrieve']['recall@50'] == 1.0
+        assert stages['retrieve']['recall@10'] == 1.0
+        assert stages['retrieve_reweighted']['recall@10'] == 1.0
+        assert stages['retrieve_many']['recall@10'] == stages['retrieve']['recall@10']
+
+    rows = compare_reports({'retrieval': results}, {'retrieval': results})
+    assert len(rows) == 14 and all(row['ratio'] == 1.0 for row in rows)
+
+
+if __name__ == '__main__':
+    test_benchmark_retrieval_report()
+    print("✓ 检索基准测试模块测试通过！")
@@ -0,0 +1,120 @@
+"""
+检索守护进程单元测试
+"""
+
+import sys
+from pathlib import Path
+import socket
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# 添加src到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.retrieval_daemon import RetrievalClient, RetrievalServer
+from tests.unit.test_rag_retriever import build_kb, make_retriever
+
+
+def test_client_matches_in_process_retrieval():
+    """测试并发客户端经守护进程检索的结果与进程内检索一致，且请求被合并执行"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        retriever = make_retriever(build_kb(tmpdir, num_cases=200), similarity_threshold=0.3)
+        server = RetrievalServer(retriever, str(Path(tmpdir) / 'rag.sock'), batch_window=0.05)
+        server.start()
+        try:
+            rng = np.random.default_rng(7)
+            queries = rng.random((16, 9))
+            texts = [f"Design: q{j}" for j in range(16)]
+            expected = [
+                [c['design_id'] for c in retriever.retrieve(queries[j], texts[j], 400)]
+                for j in range(16)
+            ]
+            batches = retriever.embedding_model.batches
+
+            def query(j):
+                client = RetrievalClient(str(server.socket_path))
+                try:
+                    return [c['design_id'] for c in client.retrieve(queries[j], texts[j], 400)]
+                finally:
+                    client.close()
+
+            with ThreadPoolExecutor(max_workers=16) as pool:
+                results = list(pool.map(query, range(16)))
+            assert results == expected
+            assert retriever.embedding_model.batches - batches < 16
+
+            client = RetrievalClient(str(server.socket_path))
+            assert client.ping()
+            assert client.get_case('design_3') == retriever.kb.get_case('design_3')
+            assert client.retrieve_many(np.zeros((0, 9))) == []
+            client.close()
+        finally:
+            server.shutdown()
+        assert not server.socket_path.exists()
+
+
+def test_client_falls_back_without_daemon():
+    """测试守护进程不存在时回退到进程内检索"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        retriever = make_retriever(build_kb(tmpdir))
+        created = []
+
+        def fallback():
+            created.append(retriever)
+            return retriever
+
+        client = RetrievalClient(str(Path(tmpdir) / 'missing.sock'), fallback=fallback)
+        assert not client.ping()
+        query = np.random.default_rng(8).random(9)
+        results = client.retrieve(query, "Design: q")
+        assert [c['design_id'] for c in results] == [
+            c['design_id'] for c in retriever.retrieve(query, "Design: q")
+        ]
+        client.retrieve(query)
+        assert len(created) == 1
+
+        # 守护进程启动后，后续请求改由守护进程处理
+        daemon_dir = Path(tmpdir) / 'daemon'
+        daemon_dir.mkdir()
+        daemon_retriever = make_retriever(build_kb(str(daemon_dir), num_cases=80))
+        server = RetrievalServer(daemon_retriever, str(Path(tmpdir) / 'missing.sock'))
+        server.start()
+        try:
+            assert client.ping()
+            assert client.get_case('design_70') == daemon_retriever.kb.get_case('design_70')
+            assert retriever.kb.get_case('design_70') is None
+            client.close()
+        finally:
+            server.shutdown()
+        assert len(created) == 1
+
+
+def test_client_timeout_does_not_fall_back():
+    """测试已连接的守护进程请求超时时抛出异常而不回退到进程内检索"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        socket_path = str(Path(tmpdir) / 'stuck.sock')
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(socket_path)
+        listener.listen(1)
+        created = []
+        client = RetrievalClient(socket_path, fallback=lambda: created.append(1), timeout=0.2)
+        try:
+            try:
+                client.retrieve(np.zeros(9))
+                assert False, "应当抛出超时异常"
+            except socket.timeout:
+                pass
+            assert created == []
+            assert client._sock is None
+        finally:
+            client.close()
+            listener.close()
+
+
+if __name__ == '__main__':
+    test_client_matches_in_process_retrieval()
+    test_client_falls_back_without_daemon()
+    test_client_timeout_does_not_fall_back()
+    print("✓ 检索守护进程测试通过！")
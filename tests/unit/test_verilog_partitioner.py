@@ -296,6 +296,144 @@ def test_boundary_detection():
         print("\n✓ Boundary Net识别测试通过！")
 
 
+def test_compact_netlist_model():
+    """测试紧凑网表模型（__slots__对象与符号表ID）"""
+    print("\n" + "=" * 60)
+    print("测试: 紧凑网表模型")
+    print("=" * 60)
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        
+        design_v = tmpdir / "design.v"
+        part_file = tmpdir / "design.part.2"
+        mapping_file = tmpdir / "design.mapping.json"
+        
+        with open(design_v, 'w') as f:
+            f.write(create_test_design())
+        
+        part_content, mapping = create_test_partition_scheme()
+        with open(part_file, 'w') as f:
+            f.write(part_content)
+        
+        with open(mapping_file, 'w') as f:
+            json.dump(mapping, f)
+        
+        partitioner = VerilogPartitioner(design_v, part_file, mapping_file)
+        partitioner._parse_design_netlist()
+        
+        inst = partitioner.instances['u_xor1']
+        assert not hasattr(inst, '__dict__'), "Instance应使用__slots__"
+        assert inst.module_type == 'XOR2'
+        assert inst.connections == {'A': 'w2', 'B': 'data_in[3]', 'Y': 'w3'}
+        assert partitioner.symbols[inst.ids[1]] == 'A'
+        
+        net = partitioner.nets['w2']
+        assert not hasattr(net, '__dict__'), "Net应使用__slots__"
+        assert net.connected_instances == ['u_or1', 'u_xor1']
+        assert partitioner.nets['data_in'].connected_instances == ['u_and1', 'u_or1', 'u_xor1']
+        
+        # 重复解析不会重复记录连接
+        partitioner._parse_design_netlist()
+        assert partitioner.nets['w2'].connected_instances == ['u_or1', 'u_xor1']
+        assert len(partitioner.top_ports) == 4
+        
+        print("\n✓ 紧凑网表模型测试通过！")
+
+
+def test_parallel_emission_matches_serial():
+    """测试并行写出的分区网表与串行写出逐字节一致"""
+    print("\n" + "=" * 60)
+    print("测试: 分区网表并行写出")
+    print("=" * 60)
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        
+        design_v = tmpdir / "design.v"
+        part_file = tmpdir / "design.part.2"
+        mapping_file = tmpdir / "design.mapping.json"
+        
+        with open(design_v, 'w') as f:
+            f.write(create_test_design())
+        
+        part_content, mapping = create_test_partition_scheme()
+        with open(part_file, 'w') as f:
+            f.write(part_content)
+        
+        with open(mapping_file, 'w') as f:
+            json.dump(mapping, f)
+        
+        serial = perform_verilog_partitioning(
+            design_v, part_file, mapping_file, tmpdir / "serial", emit_workers=1
+        )
+        parallel = perform_verilog_partitioning(
+            design_v, part_file, mapping_file, tmpdir / "parallel", emit_workers=2
+        )
+        
+        for pid, serial_file in serial['partition_files'].items():
+            assert serial_file.read_bytes() == parallel['partition_files'][pid].read_bytes(), \
+                f"partition_{pid}.v 并行写出结果不一致"
+        assert serial['top_file'].read_bytes() == parallel['top_file'].read_bytes()
+        
+        # boundary net在分区内替换为bnet_端口，顶层输出保留原名和向量索引
+        p1_content = serial['partition_files'][1].read_text()
+        assert "    XOR2 u_xor1 (\n        .A(bnet_w2),\n        .B(bnet_data_in[3]),\n        .Y(w3)\n    );\n" in p1_content
+        assert ".Q(data_out[1])" in p1_content
+        assert p1_content.endswith("endmodule\n")
+        
+        print("\n✓ 分区网表并行写出测试通过！")
+
+
+def test_incremental_migration():
+    """测试增量迁移：只重写受影响分区，结果与完整重新生成一致"""
+    print("\n" + "=" * 60)
+    print("测试: 增量迁移")
+    print("=" * 60)
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        
+        design_v = tmpdir / "design.v"
+        part_file = tmpdir / "design.part.2"
+        mapping_file = tmpdir / "design.mapping.json"
+        
+        with open(design_v, 'w') as f:
+            f.write(create_test_design())
+        
+        part_content, mapping = create_test_partition_scheme()
+        with open(part_file, 'w') as f:
+            f.write(part_content)
+        
+        with open(mapping_file, 'w') as f:
+            json.dump(mapping, f)
+        
+        partitioner = VerilogPartitioner(design_v, part_file, mapping_file)
+        partitioner.partition(tmpdir / "incremental")
+        
+        # u_or1: partition 0 -> 1（w1变为boundary net，w2变为partition 1的internal net）
+        result = partitioner.apply_migration({'u_or1': 1, 'u_and1': 0}, tmpdir / "incremental")
+        assert result['dirty_partitions'] == [0, 1]
+        assert 'w1' in result['boundary_nets'] and 'w2' not in result['boundary_nets']
+        assert 'w2' in partitioner.internal_nets[1]
+        assert result['stats']['partition_sizes'] == {0: 2, 1: 4}
+        
+        # 与用迁移后分区方案完整生成的结果逐字节一致
+        new_part_file = tmpdir / "migrated.part.2"
+        with open(new_part_file, 'w') as f:
+            f.write("0\n1\n1\n1\n0\n1\n")
+        full = perform_verilog_partitioning(design_v, new_part_file, mapping_file, tmpdir / "full")
+        for name in ['partition_0.v', 'partition_1.v', 'top.v', 'boundary_nets.json']:
+            assert (tmpdir / "incremental" / name).read_bytes() == (tmpdir / "full" / name).read_bytes(), \
+                f"{name} 增量结果与完整生成不一致"
+        assert result['stats'] == full['stats']
+        
+        # 没有实际变化的迁移不重写任何分区
+        assert partitioner.apply_migration({'u_or1': 1}, tmpdir / "incremental")['dirty_partitions'] == []
+        
+        print("\n✓ 增量迁移测试通过！")
+
+
 if __name__ == '__main__':
     print("\n" + "=" * 60)
     print("VerilogPartitioner 单元测试")
@@ -305,6 +443,9 @@ if __name__ == '__main__':
         test_verilog_partitioner_parsing()
         test_boundary_detection()
         test_verilog_partitioner_basic()
+        test_compact_netlist_model()
+        test_parallel_emission_matches_serial()
+        test_incremental_migration()
         
         print("\n" + "=" * 60)
         print("✓✓✓ 所有测试通过！✓✓✓")
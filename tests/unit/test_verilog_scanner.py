@@ -0,0 +1,67 @@
+"""
+Verilog流式扫描器单元测试
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加src到路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from src.utils.verilog_scanner import iter_verilog_tokens, scan_verilog_modules
+
+
+VERILOG = r"""
+// module commented_out(input a);
+module top #(parameter W = 2) (input [W-1:0] a, output y);
+  wire n1, n2; /* sub u_fake(.a(a));
+  module also_commented(input b); */
+  sub u0(.a(a[0]), .y(n1));
+  sub #(.D(1)) u1 (a[1], n2), u2 (n1, n2);
+  leaf \u3/x (.a(n1), .y(y));
+  NAND2_X1 g0 (.A1(n1), .A2(n2), .ZN());
+  assign y = n1 & n2;
+endmodule
+
+module sub(input a, output y);
+  leaf l0(.a(a), .y(y));
+endmodule
+
+module leaf(input a, output y);
+  always @(posedge a) begin
+    y <= a;
+  end
+endmodule
+
+module no_ports;
+endmodule
+"""
+
+
+def test_scan_verilog_modules():
+    """测试单遍扫描得到模块定义、实例计数与层次"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        verilog_file = Path(tmpdir) / "design.v"
+        verilog_file.write_text(VERILOG)
+
+        tokens = list(iter_verilog_tokens(str(verilog_file)))
+        assert 'commented_out' not in tokens and 'u_fake' not in tokens
+        assert '\\u3/x' in tokens
+
+        info = scan_verilog_modules(str(verilog_file))
+        assert info['module_names'] == ['top', 'sub', 'leaf']
+        assert info['num_modules'] == 3
+        assert info['hierarchy'] == {'top': 0, 'sub': 3, 'leaf': 2}
+        assert info['instance_counts'] == {'sub': 3, 'leaf': 2, 'NAND2_X1': 1}
+        assert info['children'] == {
+            'top': {'sub': 3, 'leaf': 1, 'NAND2_X1': 1},
+            'sub': {'leaf': 1},
+            'leaf': {},
+            'no_ports': {},
+        }
+
+
+if __name__ == '__main__':
+    test_scan_verilog_modules()
+    print("✓ Verilog流式扫描器测试通过")